@@ -1,25 +1,109 @@
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
 import os
-import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 
 load_dotenv()
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from backend.database import supabase as supabase_admin
-from backend.services.ai_engine import analyze_screenshot
-from backend.services.pdf_service import fetch_questions_for_export, generate_custom_revision_pdf
-from typing import Optional
+from backend.services.analysis_cache import analysis_cache
+from backend.services.analytics_service import (
+    accuracy_trend,
+    analytics_summary,
+    best_study_time,
+    get_question_aggregates,
+    get_question_stats,
+    insights,
+    invalidate_analytics,
+    mastery_distribution,
+    stats_overview,
+    study_heatmap,
+    subject_breakdown,
+    topic_breakdown
+)
+from backend.services.answer_service import AnswerWriteConflict, QuestionNotFound, record_answer, record_review
+from backend.services.auth_service import LocalVerificationUnavailable, token_verifier
+from backend.services.executor import run_blocking
+from backend.services.lazy_analysis import (
+    enqueue_analysis_backfill,
+    ensure_detailed_analysis,
+    needs_analysis,
+    uploaded_today
+)
+from backend.services.upload_service import (
+    AnalysisFailed,
+    UploadQuotaExceeded,
+    analysis_queue,
+    enqueue_upload_analysis,
+    fail_orphaned_pending,
+    is_orphaned_pending,
+    run_batch_upload_pipeline,
+    run_streaming_upload_pipeline,
+    run_upload_pipeline,
+    schedule_pending_recovery,
+    uploads_today
+)
+from backend.services.pdf_export_cache import (
+    etag_for,
+    etag_matches,
+    export_cache_key,
+    open_cached_export,
+    store_export
+)
+from backend.services.pdf_export_jobs import (
+    ExportLimitExceeded,
+    export_artifact_path,
+    export_queue,
+    get_export_job,
+    submit_export
+)
+from backend.services.pdf_service import (
+    PDF_EXPORT_MAX_QUESTIONS,
+    fetch_export_version,
+    fetch_questions_for_export,
+    iter_file_chunks,
+    render_pdf_to_spooled_file
+)
+from backend.services.question_stats import reconcile_status, schedule_reconciliation, submit_reconcile
+from backend.services.review_queue import (
+    BUCKETS,
+    REVIEW_BODY_BATCH_MAX,
+    REVIEW_QUEUE_PAGE_SIZE,
+    InvalidCursor,
+    fetch_bucket_counts,
+    fetch_bucket_page,
+    fetch_question_bodies
+)
+from backend.services.review_batch import (
+    REVIEW_BATCH_MAX,
+    ReviewBatchConflict,
+    review_result,
+    submit_review_batch
+)
+from backend.services.scheduling import ALGORITHMS, FORECAST_MAX_DAYS, SCHEDULER_ALGORITHM, forecast_user_load
+from backend.services.review_scheduler import REVIEW_SESSION_SIZE, next_session, record_question, remove_question
+from typing import List, Optional
 from supabase import create_client, Client
 from pydantic import BaseModel, Field
 
 app = FastAPI(title="SSC CGL Smart Tracker API")
 
+
+@app.on_event("startup")
+async def start_background_jobs():
+    schedule_reconciliation(supabase_admin)
+    schedule_pending_recovery(supabase_admin)
+
+
 ADMIN_USER_ID = os.getenv("ADMIN_USER_ID")
 MASTER_GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 FREE_DAILY_UPLOAD_LIMIT = int(os.getenv("FREE_DAILY_UPLOAD_LIMIT", "15"))
+MAX_BATCH_UPLOAD_FILES = int(os.getenv("MAX_BATCH_UPLOAD_FILES", "25"))
 
 
 class PdfFilters(BaseModel):
@@ -27,7 +111,7 @@ class PdfFilters(BaseModel):
     topic: str = "all"
     question_source: str = "all"
     date_range: str = "all_time"
-    quantity: int = Field(default=50, ge=1, le=500)
+    quantity: int = Field(default=50, ge=1, le=PDF_EXPORT_MAX_QUESTIONS)
 
 
 class PdfOptions(BaseModel):
@@ -61,6 +145,10 @@ class ManualQuestionPayload(BaseModel):
     manual_notes: Optional[str] = ""
     image_url: Optional[str] = None
 
+
+class QuestionBatchPayload(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=REVIEW_BODY_BATCH_MAX)
+
 ALLOWED_ORIGINS=[
         "http://localhost:5173",  # Local Vite frontend
         "http://127.0.0.1:5173",  # Local Vite frontend alternate
@@ -76,6 +164,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PATCH", "DELETE", "OPTIONS"], # Be explicit instead of "*"
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Question-Count"],
 )
 
 # Supabase configuration
@@ -91,20 +180,29 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_AUTH_KEY)
 
 
 async def get_current_user(authorization: Optional[str] = Header(None)):
-    """Extract and verify user from JWT token using Supabase client"""
+    """Extract and verify user from JWT token (locally, against the cached JWKS)"""
 
     if not authorization:
         raise HTTPException(status_code=401, detail="No authorization header")
 
     try:
         token = authorization.replace("Bearer ", "")
-        response = supabase.auth.get_user(token)
-        user = response.user
 
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        try:
+            # Only a cache miss can fetch the JWKS, so only misses leave the event loop
+            claims = token_verifier.cached(token)
+            if claims is None:
+                claims = await run_blocking(token_verifier.verify, token)
+            return claims["sub"]
+        except LocalVerificationUnavailable:
+            # Legacy HS256 project without SUPABASE_JWT_SECRET: ask Supabase Auth
+            response = await run_blocking(supabase.auth.get_user, token)
+            user = response.user
+
+            if not user:
+                raise HTTPException(status_code=401, detail="Invalid token")
 
-        return user.id
+            return user.id
 
     except Exception as e:
         # LOG the detailed error to your server console for debugging
@@ -119,174 +217,320 @@ def read_root():
     return {"status": "active", "message": "SSC Mistake Tracker Backend is Running"}
 
 
+def resolve_gemini_key(user_id: str, x_gemini_api_key: Optional[str]):
+    """Returns (api_key, key_mode, daily_limit); the free-tier limit only applies to the master key"""
+    user_supplied_key = (x_gemini_api_key or "").strip() or None
+    is_admin = bool(ADMIN_USER_ID and user_id == ADMIN_USER_ID)
+
+    if user_supplied_key:
+        effective_api_key = user_supplied_key
+        key_mode = "user"
+    else:
+        effective_api_key = MASTER_GEMINI_API_KEY
+        key_mode = "admin-master" if is_admin else "free-tier"
+
+    if not effective_api_key:
+        raise HTTPException(
+            status_code=503,
+            detail="Gemini API key is unavailable. Please add your own key in settings."
+        )
+
+    return effective_api_key, key_mode, None if user_supplied_key else FREE_DAILY_UPLOAD_LIMIT
+
+
+def lazy_analysis_allowance(user_id: str, question: dict, daily_limit: Optional[int]) -> Optional[int]:
+    """
+    Lazy analyses on the master key fall under the free-tier quota, like eager
+    uploads: a question uploaded today already counted against it (None: not
+    metered), older ones share what today's uploads left of it.
+    """
+    if daily_limit is None or uploaded_today(question):
+        return None
+    return daily_limit - uploads_today(supabase_admin, user_id)
+
+
 @app.post("/upload-screenshot/")
 async def upload_screenshot(
         file: UploadFile = File(...),
+        question_type: Optional[str] = Form(default=None),
         user_id: str = Depends(get_current_user),
         x_gemini_api_key: Optional[str] = Header(default=None)
 ):
     try:
         print(f"\n📤 UPLOAD REQUEST from user: {user_id}")
 
-        user_supplied_key = (x_gemini_api_key or "").strip() or None
-        is_admin = bool(ADMIN_USER_ID and user_id == ADMIN_USER_ID)
-
-        if not user_supplied_key:
-            day_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day_start + timedelta(days=1)
-
-            todays_uploads = supabase_admin.table("questions") \
-                .select("id", count="exact") \
-                .eq("user_id", user_id) \
-                .gte("created_at", day_start.isoformat()) \
-                .lt("created_at", day_end.isoformat()) \
-                .execute()
-
-            used_today = todays_uploads.count or 0
-            if used_today >= FREE_DAILY_UPLOAD_LIMIT:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Free daily limit reached. Add your Gemini API key in settings to continue uploads."
-                )
-
-        if user_supplied_key:
-            effective_api_key = user_supplied_key
-            key_mode = "user"
-        else:
-            effective_api_key = MASTER_GEMINI_API_KEY
-            key_mode = "admin-master" if is_admin else "free-tier"
-
-        if not effective_api_key:
-            raise HTTPException(
-                status_code=503,
-                detail="Gemini API key is unavailable. Please add your own key in settings."
-            )
+        effective_api_key, key_mode, daily_limit = resolve_gemini_key(user_id, x_gemini_api_key)
 
-        # 1. Read the image file
         contents = await file.read()
         print(f"📄 File size: {len(contents)} bytes")
-
-        # 2. Upload image to Supabase Storage
-        image_url = None
-        try:
-            # Generate unique filename
-            file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'png'
-            unique_filename = f"{user_id}/{uuid.uuid4()}.{file_extension}"
-
-            print(f"☁️  Uploading to Supabase Storage: {unique_filename}")
-
-            # Upload to storage
-            storage_response = supabase_admin.storage.from_('question-images').upload(
-                unique_filename,
-                contents,
-                file_options={"content-type": file.content_type or "image/png"}
-            )
-
-            # Get public URL
-            image_url = supabase_admin.storage.from_('question-images').get_public_url(unique_filename)
-            print(f"✅ Image uploaded: {image_url}")
-
-        except Exception as storage_error:
-            print(f"⚠️  Storage upload failed: {storage_error}")
-            # Continue without image URL - not critical
-            image_url = None
-
-        # 3. Get Enhanced Analysis from Gemini
-        print("🤖 Calling Gemini AI for enhanced analysis...")
         print(f"🔐 Upload mode: {key_mode}")
-        ai_data = analyze_screenshot(contents, api_key=effective_api_key)
 
-        if "error" in ai_data:
-            print(f"❌ Gemini error: {ai_data['error']}")
-            raise HTTPException(status_code=500, detail=ai_data["error"])
+        # Quota check, storage upload and Gemini analysis run concurrently
+        result = await run_upload_pipeline(
+            supabase_admin,
+            user_id,
+            contents,
+            filename=file.filename,
+            content_type=file.content_type,
+            api_key=effective_api_key,
+            daily_limit=daily_limit,
+            question_type=question_type
+        )
 
-        print(f"✅ Gemini analysis complete")
-        print(f"   Type: {ai_data.get('question_type')}")
-        print(f"   Visual Elements: {ai_data.get('has_visual_elements')}")
-        print(f"   AI Confidence: {ai_data.get('ai_confidence')}")
+        print(f"✅ Upload complete!\n")
+        return result
 
-        # 4. Prepare database data with enhanced fields
-        question_text = ai_data.get("question_text", "")
+    except UploadQuotaExceeded:
+        raise HTTPException(
+            status_code=403,
+            detail="Free daily limit reached. Add your Gemini API key in settings to continue uploads."
+        )
+    except AnalysisFailed as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ SERVER ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        db_data = {
-            "user_id": user_id,
-            "image_url": image_url,
 
-            # Enhanced question data
-            "question_text": question_text,
-            "question_context": ai_data.get("question_context", ""),
-            "actual_question": ai_data.get("actual_question", question_text),
+@app.post("/upload-screenshot/stream")
+async def upload_screenshot_stream(
+        file: UploadFile = File(...),
+        question_type: Optional[str] = Form(default=None),
+        user_id: str = Depends(get_current_user),
+        x_gemini_api_key: Optional[str] = Header(default=None)
+):
+    """
+    Same as /upload-screenshot/ as server-sent events: `field` events as soon as
+    a top-level field (subject, topic, question_text, options, ...) is complete,
+    `delta` events while the analysis text is generated, then `saved` (the
+    regular upload response plus timing) or `error`.
+    """
+    print(f"\n📤 STREAMING UPLOAD REQUEST from user: {user_id}")
+    effective_api_key, key_mode, daily_limit = resolve_gemini_key(user_id, x_gemini_api_key)
 
-            "subject": ai_data.get("subject"),
-            "topic": ai_data.get("topic"),
+    contents = await file.read()
+    print(f"📄 File size: {len(contents)} bytes")
+    print(f"🔐 Upload mode: {key_mode}")
 
-            # Options and answers
-            "options": ai_data.get("options", []),
-            "correct_option": ai_data.get("correct_answer"),
+    def sse(event_type: str, data: dict) -> str:
+        return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
 
-            # Question metadata
-            "question_type": ai_data.get("question_type", "mcq"),
-            "has_visual_elements": ai_data.get("has_visual_elements", False),
-            "visual_complexity": ai_data.get("visual_complexity", "low"),
-            "ai_confidence": ai_data.get("ai_confidence", "high"),
+    async def stream_events():
+        try:
+            async for event in run_streaming_upload_pipeline(
+                    supabase_admin,
+                    user_id,
+                    contents,
+                    filename=file.filename,
+                    content_type=file.content_type,
+                    api_key=effective_api_key,
+                    daily_limit=daily_limit,
+                    question_type=question_type
+            ):
+                yield sse(event["type"], event)
+        except UploadQuotaExceeded:
+            yield sse("error", {
+                "status_code": 403,
+                "detail": "Free daily limit reached. Add your Gemini API key in settings to continue uploads."
+            })
+        except Exception as e:
+            print(f"❌ STREAMING UPLOAD ERROR: {e}")
+            yield sse("error", {"status_code": 500, "detail": str(e)})
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/upload-screenshot/async", status_code=202)
+async def upload_screenshot_async(
+        file: UploadFile = File(...),
+        question_type: Optional[str] = Form(default=None),
+        user_id: str = Depends(get_current_user),
+        x_gemini_api_key: Optional[str] = Header(default=None)
+):
+    """
+    Same as /upload-screenshot/ but returns as soon as a pending question row exists.
+    Poll /upload-jobs/{job_id} (or stream /upload-jobs/{job_id}/events) for the result.
+    """
+    try:
+        print(f"\n📤 ASYNC UPLOAD REQUEST from user: {user_id}")
 
-            # Complete AI response
-            "content": ai_data,
+        effective_api_key, key_mode, daily_limit = resolve_gemini_key(user_id, x_gemini_api_key)
 
-            "status": "analyzed"
-        }
+        contents = await file.read()
+        print(f"📄 File size: {len(contents)} bytes")
+        print(f"🔐 Upload mode: {key_mode}")
 
-        # 5. Check for duplicates (by question text and user)
-        existing_q = supabase_admin.table("questions") \
-            .select("id") \
-            .eq("question_text", question_text) \
-            .eq("user_id", user_id) \
-            .execute()
+        return await enqueue_upload_analysis(
+            supabase_admin,
+            user_id,
+            contents,
+            filename=file.filename,
+            content_type=file.content_type,
+            api_key=effective_api_key,
+            daily_limit=daily_limit,
+            question_type=question_type
+        )
 
-        new_id = None
-        is_duplicate = False
+    except UploadQuotaExceeded:
+        raise HTTPException(
+            status_code=403,
+            detail="Free daily limit reached. Add your Gemini API key in settings to continue uploads."
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ SERVER ERROR: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if existing_q.data:
-            print(f"♻️ Duplicate found. Using existing ID: {existing_q.data[0]['id']}")
-            new_id = existing_q.data[0]['id']
-            is_duplicate = True
-
-            # Update with new image and analysis if available
-            if image_url:
-                supabase_admin.table("questions").update({
-                    "image_url": image_url,
-                    "content": ai_data
-                }).eq("id", new_id).execute()
-        else:
-            print(f"💾 Inserting new question for user: {user_id}")
 
-            response = supabase_admin.table("questions").insert(db_data).execute()
+async def get_upload_job_status(job_id: str, user_id: str) -> dict:
+    job = analysis_queue.get(job_id)
+    if job is not None and job["owner"] == user_id:
+        return {**analysis_queue.public_view(job), "question_id": job_id}
+
+    # Not queued on this process (other worker, restart, expired): the row is the source of truth
+    response = await run_blocking(
+        supabase_admin.table("questions")
+        .select("id,status,created_at")
+        .eq("id", job_id)
+        .eq("user_id", user_id)
+        .execute
+    )
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+
+    question_status = response.data[0].get("status")
+    if is_orphaned_pending(response.data[0]):
+        # Its job was lost: report it failed now rather than pending forever
+        await run_blocking(fail_orphaned_pending, supabase_admin, [job_id])
+        question_status = "failed"
+    return {
+        "job_id": job_id,
+        "question_id": job_id,
+        "status": {"pending": "pending", "failed": "dead"}.get(question_status, "done"),
+        "question_status": question_status,
+    }
+
+
+@app.get("/upload-jobs/{job_id}")
+async def get_upload_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """Status of an async upload: queued | running | retrying | done | dead (pending if queued elsewhere)"""
+    return await get_upload_job_status(job_id, user_id)
+
+
+@app.get("/upload-jobs/{job_id}/events")
+async def stream_upload_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """Server-sent events with the job status on every change, until it finishes"""
+    status = await get_upload_job_status(job_id, user_id)
+
+    async def stream_status():
+        current = status
+        while True:
+            yield f"data: {json.dumps(current)}\n\n"
+            if current["status"] in ("done", "dead"):
+                return
+            # Wakes up immediately for jobs on this process; otherwise re-reads the row
+            await analysis_queue.wait_for_update(job_id, timeout=5)
+            current = await get_upload_job_status(job_id, user_id)
+
+    return StreamingResponse(stream_status(), media_type="text/event-stream")
+
+
+@app.get("/admin/upload-jobs")
+def get_upload_job_metrics(user_id: str = Depends(get_current_user)):
+    """Queue depth, retry/dead-letter counters and job latency of async uploads (admin only)"""
+    if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return analysis_queue.metrics()
+
+
+@app.get("/admin/pdf-exports")
+def get_pdf_export_metrics(user_id: str = Depends(get_current_user)):
+    """Queue depth, failures and latency of background PDF exports (admin only)"""
+    if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return export_queue.metrics()
+
+
+@app.post("/upload-screenshots/batch")
+async def upload_screenshots_batch(
+        files: List[UploadFile] = File(...),
+        question_type: Optional[str] = Form(default=None),
+        user_id: str = Depends(get_current_user),
+        x_gemini_api_key: Optional[str] = Header(default=None)
+):
+    """
+    Upload many screenshots in one multipart request.
+    Streams NDJSON: one line per item as it is analyzed, one per saved row, then a summary.
+    """
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_UPLOAD_FILES} files per batch")
 
-            if response.data:
-                new_id = response.data[0]['id']
-                print(f"✅ Question saved! ID: {new_id}")
-            else:
-                print(f"⚠️  Insert returned no data")
+    print(f"\n📤 BATCH UPLOAD REQUEST from user: {user_id} ({len(files)} files)")
+    effective_api_key, key_mode, daily_limit = resolve_gemini_key(user_id, x_gemini_api_key)
+    print(f"🔐 Upload mode: {key_mode}")
 
-        print(f"✅ Upload complete!\n")
+    uploads = [(file.filename, file.content_type, await file.read()) for file in files]
 
-        return {
-            "status": "success",
-            "id": new_id,
-            "data": ai_data,
-            "image_url": image_url,
-            "has_visual_elements": ai_data.get("has_visual_elements", False),
-            "ai_confidence": ai_data.get("ai_confidence", "high"),
-            "is_duplicate": is_duplicate
-        }
+    async def stream_events():
+        try:
+            async for event in run_batch_upload_pipeline(
+                    supabase_admin,
+                    user_id,
+                    uploads,
+                    api_key=effective_api_key,
+                    daily_limit=daily_limit,
+                    question_type=question_type
+            ):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            print(f"❌ BATCH UPLOAD ERROR: {e}")
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+
+@app.get("/admin/question-stats")
+def get_question_stats_status(user_id: str = Depends(get_current_user)):
+    """Last reconciliation report of the question stats rollup (admin only)"""
+    if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return reconcile_status()
+
+
+@app.post("/admin/question-stats/reconcile", status_code=202)
+async def reconcile_question_stats(
+        target_user_id: Optional[str] = None,
+        user_id: str = Depends(get_current_user)
+):
+    """Rebuild the stats rollup from scratch for one user (or everyone) and report drift (admin only)"""
+    if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+        raise HTTPException(status_code=403, detail="Admin access required")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"❌ SERVER ERROR: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return submit_reconcile(supabase_admin, [target_user_id] if target_user_id else None)
+
+
+@app.get("/admin/analysis-cache")
+def get_analysis_cache_stats(user_id: str = Depends(get_current_user)):
+    """Hit/miss counters and size of the screenshot analysis cache (admin only)"""
+    if not ADMIN_USER_ID or user_id != ADMIN_USER_ID:
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    if analysis_cache is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **analysis_cache.snapshot()}
 
 
 @app.get("/mistakes/")
@@ -318,8 +562,12 @@ def get_mistakes(limit: int = 25, offset: int = 0, user_id: str = Depends(get_cu
 
 
 @app.get("/question/{question_id}")
-def get_question(question_id: str, user_id: str = Depends(get_current_user)):
-    """Get a specific question with all details"""
+def get_question(
+        question_id: str,
+        user_id: str = Depends(get_current_user),
+        x_gemini_api_key: Optional[str] = Header(default=None)
+):
+    """Get a specific question with all details; generates the detailed analysis on first read"""
     try:
         response = supabase_admin.table("questions") \
             .select("*") \
@@ -328,11 +576,49 @@ def get_question(question_id: str, user_id: str = Depends(get_current_user)):
             .single() \
             .execute()
 
-        return response.data
-
     except Exception as e:
         raise HTTPException(status_code=404, detail="Question not found")
 
+    question = response.data
+    if needs_analysis(question):
+        try:
+            effective_api_key, _, daily_limit = resolve_gemini_key(user_id, x_gemini_api_key)
+        except HTTPException:
+            # No key to generate with: return the extraction as it is
+            return question
+        allowance = lazy_analysis_allowance(user_id, question, daily_limit)
+        question = ensure_detailed_analysis(supabase_admin, question, effective_api_key, allowance=allowance)
+
+    return question
+
+
+@app.post("/questions/analysis/backfill")
+async def backfill_question_analysis(
+        limit: int = 50,
+        user_id: str = Depends(get_current_user),
+        x_gemini_api_key: Optional[str] = Header(default=None)
+):
+    """Queue detailed-analysis generation for questions uploaded in lazy mode"""
+    effective_api_key, _, daily_limit = resolve_gemini_key(user_id, x_gemini_api_key)
+    limit = max(1, min(limit, 200))
+    try:
+        allowance = None
+        if daily_limit is not None:
+            # Each backfilled analysis spends the master key like an upload would
+            allowance = daily_limit - await run_blocking(uploads_today, supabase_admin, user_id)
+        result = await enqueue_analysis_backfill(supabase_admin, user_id, effective_api_key,
+                                                 limit=limit, allowance=allowance)
+    except Exception as e:
+        print(f"❌ Error queueing analysis backfill: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if result["queued"] == 0 and result["over_quota"] > 0:
+        raise HTTPException(
+            status_code=403,
+            detail="Free daily limit reached. Add your Gemini API key in settings to generate analyses."
+        )
+    return result
+
 
 @app.patch("/question/{question_id}")
 def update_question(question_id: str, payload: QuestionUpdatePayload, user_id: str = Depends(get_current_user)):
@@ -350,6 +636,8 @@ def update_question(question_id: str, payload: QuestionUpdatePayload, user_id: s
         if not response.data:
             raise HTTPException(status_code=404, detail="Question not found")
 
+        invalidate_analytics(user_id)
+        record_question(user_id, response.data[0])
         return {"status": "success", "item": response.data[0]}
     except HTTPException:
         raise
@@ -369,6 +657,8 @@ def delete_question(question_id: str, user_id: str = Depends(get_current_user)):
         if not response.data:
             raise HTTPException(status_code=404, detail="Question not found")
 
+        invalidate_analytics(user_id)
+        remove_question(user_id, question_id)
         return {"status": "deleted", "id": question_id}
     except HTTPException:
         raise
@@ -402,6 +692,8 @@ def create_manual_question(payload: ManualQuestionPayload, user_id: str = Depend
         response = supabase_admin.table("questions").insert(db_data).execute()
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to create question")
+        invalidate_analytics(user_id)
+        record_question(user_id, response.data[0])
         return {"status": "success", "item": response.data[0]}
     except HTTPException:
         raise
@@ -419,39 +711,25 @@ def submit_answer(
     try:
         user_answer = answer_data.get("answer")
 
-        # Get the question
-        question = supabase_admin.table("questions") \
-            .select("correct_option, times_attempted, times_correct") \
-            .eq("id", question_id) \
-            .eq("user_id", user_id) \
-            .single() \
-            .execute()
-
-        if not question.data:
-            raise HTTPException(status_code=404, detail="Question not found")
-
-        # Check if correct
-        is_correct = user_answer == question.data["correct_option"]
-
-        # Update statistics
-        times_attempted = (question.data.get("times_attempted") or 0) + 1
-        times_correct = (question.data.get("times_correct") or 0) + (1 if is_correct else 0)
-
-        supabase_admin.table("questions").update({
-            "user_answer": user_answer,
-            "times_attempted": times_attempted,
-            "times_correct": times_correct,
-            "last_attempted_at": datetime.now().isoformat()
-        }).eq("id", question_id).eq("user_id", user_id).execute()
+        # Checks the answer and bumps the counters atomically
+        stats = record_answer(supabase_admin, user_id, question_id, user_answer)
+        times_attempted = stats["times_attempted"]
+        times_correct = stats["times_correct"]
+        invalidate_analytics(user_id)
+        record_question(user_id, {**stats, "id": question_id})
 
         return {
-            "is_correct": is_correct,
-            "correct_answer": question.data["correct_option"],
+            "is_correct": stats["is_correct"],
+            "correct_answer": stats["correct_option"],
             "times_attempted": times_attempted,
             "times_correct": times_correct,
             "accuracy": round((times_correct / times_attempted) * 100, 1) if times_attempted > 0 else 0
         }
 
+    except QuestionNotFound:
+        raise HTTPException(status_code=404, detail="Question not found")
+    except AnswerWriteConflict:
+        raise HTTPException(status_code=409, detail="Question is being answered concurrently, please retry")
     except HTTPException:
         raise
     except Exception as e:
@@ -459,126 +737,264 @@ def submit_answer(
 
 
 @app.post("/api/generate-custom-pdf")
-def generate_custom_pdf(payload: CustomPdfPayload, user_id: str = Depends(get_current_user)):
+def generate_custom_pdf(
+        payload: CustomPdfPayload,
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
     try:
-        questions = fetch_questions_for_export(supabase_admin, user_id, payload.filters.model_dump())
-        pdf_bytes = generate_custom_revision_pdf(questions, payload.options.model_dump())
+        filters = payload.filters.model_dump()
+        options = payload.options.model_dump()
+
+        cache_key = None
+        question_count = None
+        try:
+            data_version, question_count = fetch_export_version(supabase_admin, user_id, filters)
+            cache_key = export_cache_key(user_id, filters, options, data_version)
+        except Exception as version_error:
+            # e.g. the questions.updated_at migration hasn't been applied yet
+            print(f"⚠️  PDF export cache bypassed: {version_error}")
+
+        cache_headers = {}
+        if cache_key is not None:
+            cache_headers = {"ETag": etag_for(cache_key), "Cache-Control": "private, no-cache"}
+            if etag_matches(if_none_match, cache_key):
+                return Response(status_code=304, headers=cache_headers)
+
+        pdf_file = open_cached_export(cache_key) if cache_key is not None else None
+        if pdf_file is not None:
+            print(f"📦 Serving cached PDF export for user: {user_id}")
+        else:
+            questions = fetch_questions_for_export(supabase_admin, user_id, filters, options)
+            question_count = len(questions)
+            pdf_file = render_pdf_to_spooled_file(questions, options)
+            if cache_key is not None:
+                store_export(cache_key, pdf_file)
+
+        pdf_size = pdf_file.seek(0, os.SEEK_END)
+        pdf_file.seek(0)
+
+        headers = {
+            "Content-Disposition": "attachment; filename=ssc-revision-export.pdf",
+            "Content-Length": str(pdf_size),
+            "X-Question-Count": str(question_count),
+            **cache_headers
+        }
 
-        return Response(
-            content=pdf_bytes,
+        # Streamed in chunks from the spooled file instead of one in-memory copy
+        return StreamingResponse(
+            iter_file_chunks(pdf_file),
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=ssc-revision-export.pdf",
-                "X-Question-Count": str(len(questions))
-            },
+            headers=headers,
         )
     except Exception as e:
         print(f"❌ Error generating custom PDF: {e}")
         raise HTTPException(status_code=500, detail="Failed to generate PDF")
 
+
+@app.post("/api/pdf-exports", status_code=202)
+async def create_pdf_export(payload: CustomPdfPayload, user_id: str = Depends(get_current_user)):
+    """
+    Queue a custom PDF export in the background.
+    Poll /api/pdf-exports/{job_id} for progress, then fetch /api/pdf-exports/{job_id}/download.
+    """
+    try:
+        return submit_export(supabase_admin, user_id, payload.filters.model_dump(), payload.options.model_dump())
+    except ExportLimitExceeded:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many exports in progress. Wait for one to finish before starting another."
+        )
+
+
+@app.get("/api/pdf-exports/{job_id}")
+async def get_pdf_export(job_id: str, user_id: str = Depends(get_current_user)):
+    """Status of a background export: queued | running | retrying | done | dead, with rendered/total progress"""
+    job = get_export_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    return export_queue.public_view(job)
+
+
+@app.get("/api/pdf-exports/{job_id}/download")
+async def download_pdf_export(job_id: str, user_id: str = Depends(get_current_user)):
+    job = get_export_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found or expired")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is not ready (status: {job['status']})")
+
+    path = export_artifact_path(job)
+    if path is None:
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+
+    headers = {}
+    if job["result"].get("question_count") is not None:
+        headers["X-Question-Count"] = str(job["result"]["question_count"])
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename="ssc-revision-export.pdf",
+        headers=headers
+    )
+
 class ReviewAnswerPayload(BaseModel):
     answer: str
     is_correct: bool
 
 
-@app.patch("/question/{question_id}/review")
-def submit_review_answer(
-        question_id: str,
-        payload: ReviewAnswerPayload,
-        user_id: str = Depends(get_current_user)
-):
-    """
-    Submit answer for spaced repetition review
-    Updates: times_attempted, times_correct, next_review_date, ease_factor, interval_days, mastery_level
-    """
+class ReviewBatchAnswer(ReviewAnswerPayload):
+    question_id: str
+    # Client-generated per answer; resending the same key never counts twice
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+    # When the answer was given, for answers queued offline
+    answered_at: Optional[datetime] = None
+
+
+class ReviewBatchPayload(BaseModel):
+    answers: List[ReviewBatchAnswer] = Field(..., min_length=1, max_length=REVIEW_BATCH_MAX)
+
+
+def analytics_response(payload, if_none_match: Optional[str]) -> Response:
+    """Small JSON body with an ETag of its content, revalidated by the browser on each visit"""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    headers = {"ETag": etag_for(digest), "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, digest):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def load_analytics(user_id: str, tz_offset: int) -> dict:
     try:
-        # Get current question data
-        question = supabase_admin.table("questions") \
-            .select("*") \
-            .eq("id", question_id) \
-            .eq("user_id", user_id) \
-            .single() \
-            .execute()
+        return await run_blocking(get_question_aggregates, supabase_admin, user_id, tz_offset)
+    except Exception as e:
+        print(f"❌ Error computing analytics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to load analytics")
 
-        if not question.data:
-            raise HTTPException(status_code=404, detail="Question not found")
 
-        q = question.data
+async def load_question_stats(user_id: str) -> dict:
+    try:
+        return await run_blocking(get_question_stats, supabase_admin, user_id)
+    except Exception as e:
+        print(f"❌ Error loading question stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to load analytics")
 
-        # Current values
-        times_attempted = (q.get("times_attempted") or 0) + 1
-        times_correct = (q.get("times_correct") or 0) + (1 if payload.is_correct else 0)
-        current_ease = q.get("ease_factor") or 2.5
-        current_interval = q.get("interval_days") or 1
 
-        # Calculate consecutive correct answers
-        # For simplicity, we'll track this in a separate way
-        # In full implementation, you'd want another column for this
+# tz_offset is the browser's Date.getTimezoneOffset() (minutes, UTC minus local);
+# only the best study time depends on it, the daily buckets are UTC like before.
+TZ_OFFSET_QUERY = Query(0, ge=-14 * 60, le=14 * 60)
 
-        # SM-2 Algorithm Implementation
-        new_ease = current_ease
-        new_interval = current_interval
 
-        if payload.is_correct:
-            # Correct answer - increase interval
-            if times_correct == 1:
-                new_interval = 1  # Review tomorrow
-            elif times_correct == 2:
-                new_interval = 6  # Review in 6 days
-            else:
-                new_interval = round(current_interval * current_ease)
+@app.get("/analytics/summary")
+async def get_analytics_summary(
+        subject: str = "All",
+        tz_offset: int = TZ_OFFSET_QUERY,
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Everything the analytics dashboard draws, aggregated server-side"""
+    aggregates = await load_analytics(user_id, tz_offset)
+    return analytics_response(analytics_summary(aggregates, subject), if_none_match)
 
-            # Adjust ease factor (quality = 4 for "good")
-            new_ease = current_ease + (0.1 - (5 - 4) * (0.08 + (5 - 4) * 0.02))
-            new_ease = max(1.3, new_ease)
 
-        else:
-            # Incorrect answer - reset interval
-            new_interval = 1  # Review tomorrow
+@app.get("/analytics/stats")
+async def get_analytics_stats(
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Question, attempt and accuracy totals plus mastery, read from the per-user rollup"""
+    stats = await load_question_stats(user_id)
+    return analytics_response(stats_overview(stats), if_none_match)
 
-            # Decrease ease factor (quality = 0 for "fail")
-            new_ease = current_ease + (0.1 - (5 - 0) * (0.08 + (5 - 0) * 0.02))
-            new_ease = max(1.3, new_ease)
 
-        # Calculate next review date
-        next_review = datetime.now() + timedelta(days=new_interval)
+@app.get("/analytics/accuracy-trend")
+async def get_analytics_accuracy_trend(
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    aggregates = await load_analytics(user_id, 0)
+    return analytics_response(accuracy_trend(aggregates), if_none_match)
 
-        # Determine mastery level
-        accuracy = times_correct / times_attempted if times_attempted > 0 else 0
 
-        if times_attempted <= 2:
-            mastery_level = "learning"
-        elif accuracy >= 0.8 and times_attempted >= 5:
-            mastery_level = "mastered"
-        elif accuracy >= 0.6:
-            mastery_level = "reviewing"
-        else:
-            mastery_level = "learning"
+@app.get("/analytics/subjects")
+async def get_analytics_subjects(
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    stats = await load_question_stats(user_id)
+    return analytics_response(subject_breakdown(stats), if_none_match)
 
-        # Update database
-        supabase_admin.table("questions").update({
-            "user_answer": payload.answer,
-            "times_attempted": times_attempted,
-            "times_correct": times_correct,
-            "last_attempted_at": datetime.now().isoformat(),
-            "next_review_date": next_review.isoformat(),
-            "ease_factor": round(new_ease, 2),
-            "interval_days": new_interval,
-            "mastery_level": mastery_level
-        }).eq("id", question_id).eq("user_id", user_id).execute()
 
-        return {
-            "is_correct": payload.is_correct,
-            "correct_answer": q["correct_option"],
-            "times_attempted": times_attempted,
-            "times_correct": times_correct,
-            "accuracy": round((times_correct / times_attempted) * 100, 1),
-            "next_review_date": next_review.isoformat(),
-            "interval_days": new_interval,
-            "mastery_level": mastery_level,
-            "message": f"Great! See you in {new_interval} day{'s' if new_interval != 1 else ''}!" if payload.is_correct else "Let's review this again tomorrow!"
-        }
+@app.get("/analytics/topics")
+async def get_analytics_topics(
+        subject: str = "All",
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    stats = await load_question_stats(user_id)
+    return analytics_response(topic_breakdown(stats, subject), if_none_match)
+
+
+@app.get("/analytics/heatmap")
+async def get_analytics_heatmap(
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    aggregates = await load_analytics(user_id, 0)
+    return analytics_response(study_heatmap(aggregates), if_none_match)
+
+
+@app.get("/analytics/mastery")
+async def get_analytics_mastery(
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    stats = await load_question_stats(user_id)
+    return analytics_response(mastery_distribution(stats), if_none_match)
+
+
+@app.get("/analytics/best-time")
+async def get_analytics_best_time(
+        tz_offset: int = TZ_OFFSET_QUERY,
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    aggregates = await load_analytics(user_id, tz_offset)
+    return analytics_response(best_study_time(aggregates), if_none_match)
 
+
+@app.get("/analytics/insights")
+async def get_analytics_insights(
+        user_id: str = Depends(get_current_user),
+        if_none_match: Optional[str] = Header(None)
+):
+    aggregates = await load_analytics(user_id, 0)
+    return analytics_response(insights(aggregates), if_none_match)
+
+
+@app.patch("/question/{question_id}/review")
+def submit_review_answer(
+        question_id: str,
+        payload: ReviewAnswerPayload,
+        user_id: str = Depends(get_current_user)
+):
+    """
+    Submit answer for spaced repetition review
+    Updates: times_attempted, times_correct, next_review_date, ease_factor, interval_days, mastery_level
+    """
+    try:
+        # Written back only if no other answer got in since the read
+        q, update = record_review(supabase_admin, user_id, question_id, payload.answer, payload.is_correct)
+        invalidate_analytics(user_id)
+        record_question(user_id, {**q, **update})
+
+        return review_result(update, payload.is_correct, q["correct_option"])
+
+    except QuestionNotFound:
+        raise HTTPException(status_code=404, detail="Question not found")
+    except AnswerWriteConflict:
+        raise HTTPException(status_code=409, detail="Question is being reviewed concurrently, please retry")
     except HTTPException:
         raise
     except Exception as e:
@@ -586,61 +1002,132 @@ def submit_review_answer(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/questions/review-queue")
-def get_review_queue(user_id: str = Depends(get_current_user)):
+@app.post("/questions/review/batch")
+async def submit_review_batch_answers(payload: ReviewBatchPayload, user_id: str = Depends(get_current_user)):
     """
-    Get questions due for review
-    Returns questions sorted by priority (overdue first, then by next_review_date)
+    Submit a whole study session's review answers at once, in the order given.
+    Each result has status applied, duplicate (its idempotency key was already
+    recorded; the original result is returned) or not_found.
     """
     try:
-        now = datetime.now().isoformat()
+        response, questions = await run_blocking(
+            submit_review_batch, supabase_admin, user_id, [answer.model_dump() for answer in payload.answers]
+        )
+    except ReviewBatchConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        print(f"Error in batch review submission: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Get all questions due within next 7 days
-        response = supabase_admin.table("questions") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .lte("next_review_date", (datetime.now() + timedelta(days=7)).isoformat()) \
-            .order("next_review_date", desc=False) \
-            .execute()
+    if questions:
+        invalidate_analytics(user_id)
+        for question in questions:
+            record_question(user_id, question)
+    return response
 
-        questions = response.data or []
 
-        # Categorize
-        categorized = {
-            "overdue": [],
-            "due_today": [],
-            "due_soon": [],
-            "upcoming": []
+@app.get("/questions/review-queue")
+async def get_review_queue(
+        limit: int = REVIEW_QUEUE_PAGE_SIZE,
+        user_id: str = Depends(get_current_user)
+):
+    """
+    Questions due for review in the next 7 days, by bucket (overdue, due_today,
+    due_soon, upcoming): the count of each bucket and its first page, soonest
+    due first. Items carry only id, subject/topic, due date and the priority
+    inputs; fetch bodies via POST /questions/batch and further pages via
+    GET /questions/review-queue/{bucket}?cursor=...
+    """
+    now = datetime.now()
+    try:
+        counts, *pages = await asyncio.gather(
+            run_blocking(fetch_bucket_counts, supabase_admin, user_id, now),
+            *(run_blocking(fetch_bucket_page, supabase_admin, user_id, bucket, now, None, limit) for bucket in BUCKETS)
+        )
+    except Exception as e:
+        print(f"Error fetching review queue: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "buckets": {
+            bucket: {"count": counts[bucket], **page} for bucket, page in zip(BUCKETS, pages)
+        },
+        "stats": {
+            "total_due": counts["overdue"] + counts["due_today"],
+            "overdue_count": counts["overdue"],
+            "today_count": counts["due_today"],
+            "week_count": sum(counts.values())
         }
+    }
 
-        today = datetime.now().date()
 
-        for q in questions:
-            review_date = datetime.fromisoformat(q["next_review_date"]).date()
+@app.get("/questions/review-queue/{bucket}")
+async def get_review_queue_page(
+        bucket: str,
+        cursor: Optional[str] = None,
+        limit: int = REVIEW_QUEUE_PAGE_SIZE,
+        user_id: str = Depends(get_current_user)
+):
+    """Next page of one review bucket, continuing from `cursor`"""
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=404, detail=f"Unknown bucket, expected one of {', '.join(BUCKETS)}")
+    try:
+        page = await run_blocking(fetch_bucket_page, supabase_admin, user_id, bucket, datetime.now(), cursor, limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error fetching review queue page: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-            if review_date < today:
-                categorized["overdue"].append(q)
-            elif review_date == today:
-                categorized["due_today"].append(q)
-            elif review_date <= (today + timedelta(days=3)):
-                categorized["due_soon"].append(q)
-            else:
-                categorized["upcoming"].append(q)
+    return {"bucket": bucket, **page}
 
-        return {
-            "categorized": categorized,
-            "stats": {
-                "total_due": len(categorized["overdue"]) + len(categorized["due_today"]),
-                "overdue_count": len(categorized["overdue"]),
-                "today_count": len(categorized["due_today"]),
-                "week_count": len(questions)
-            }
-        }
 
+@app.get("/questions/review-session")
+async def get_review_session(
+        limit: int = REVIEW_SESSION_SIZE,
+        user_id: str = Depends(get_current_user)
+):
+    """
+    The next review session: the `limit` due questions with the highest
+    priority (overdue-ness, accuracy, attempts, ease factor and topic weakness),
+    best first. Fetch their bodies via POST /questions/batch.
+    """
+    try:
+        return await run_blocking(next_session, supabase_admin, user_id, limit)
     except Exception as e:
-        print(f"Error fetching review queue: {e}")
+        print(f"Error building review session: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/questions/review-forecast")
+async def get_review_forecast(
+        days: int = Query(30, ge=1, le=FORECAST_MAX_DAYS),
+        algorithm: str = Query(SCHEDULER_ALGORITHM, pattern=f"^({'|'.join(ALGORITHMS)})$"),
+        user_id: str = Depends(get_current_user)
+):
+    """
+    Projected reviews per day for the next `days` days: the user's deck (plus
+    new questions at their recent upload rate) replayed through the scheduler.
+    Seeded, so the same deck gives the same forecast.
+    """
+    try:
+        return await run_blocking(forecast_user_load, supabase_admin, user_id, days, algorithm, 0)
+    except Exception as e:
+        print(f"Error forecasting review load: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/questions/batch")
+async def get_questions_batch(payload: QuestionBatchPayload, user_id: str = Depends(get_current_user)):
+    """Full question rows for up to REVIEW_BODY_BATCH_MAX ids, in the order requested"""
+    try:
+        items = await run_blocking(fetch_question_bodies, supabase_admin, user_id, payload.ids)
+    except Exception as e:
+        print(f"Error fetching question batch: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {"items": items}
+
 
 # Add this to your main.py
 
@@ -758,6 +1245,8 @@ async def import_question(
         if response.data:
             new_id = response.data[0]['id']
             print(f"✅ Question imported! ID: {new_id}")
+            invalidate_analytics(user_id)
+            record_question(user_id, response.data[0])
 
             return {
                 "status": "success",
@@ -4,15 +4,25 @@ Extracts complete questions with options, context, and visual element detection
 WITH the cocky teacher personality and complete analysis structure
 """
 
-import google.generativeai as genai
 import os
-from PIL import Image
-import io
 import json
 import re
+import time
+
+from backend.services.gemini_client import gemini_pool, image_part
+from backend.services.json_stream import IncrementalJSONParser
 
 DEFAULT_GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# "lazy": uploads only run the structured extraction; the long-form analysis is
+# generated on first read (or by the backfill). "eager": one call does both.
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "lazy").lower()
+
+# Long text fields whose partial text is streamed while it is being generated
+STREAMED_FIELDS = ("question_context", "detailed_analysis", "practice_question", "practice_answer")
+
+ANALYSIS_FIELDS = ("detailed_analysis", "practice_question", "practice_answer")
+
 ENHANCED_SYSTEM_PROMPT = """You are an arrogant, cocky, and brutally honest SSC CGL teacher who doesn't tolerate mediocrity. You've cracked every SSC exam with top ranks and now you're here to turn average aspirants into champions. Your tone is dismissive of lazy thinking, impatient with obvious mistakes, but deeply knowledgeable and genuinely invested in making students excel.
 
 **YOUR PERSONALITY:**
@@ -193,6 +203,54 @@ Now analyze this question image with your signature arrogance and expertise:
 """
 
 
+STRUCTURED_EXTRACTION_PROMPT = """Extract this SSC CGL question screenshot into structured JSON for a mock test. Do NOT explain or solve it.
+
+**EXTRACTION REQUIREMENTS:**
+1. **question_context**: The FULL context - entire passage, complete cloze paragraph (blanks as _____ or (1), (2)), full table data, a description of any figure, or each paper folding step. Never truncate.
+2. **actual_question**: Only the question stem being asked.
+3. **question_text**: Context + question combined, as the user should see it.
+4. **options**: ALL options with complete text. For figure options set "is_visual": true with a short "visual_description" and "coordinates" (e.g. "center", "all four corners").
+5. **correct_answer**: The option marked as correct in the screenshot ("A"-"D"), or null if none is marked.
+
+**MATH:** LaTeX with DOUBLE backslash: $\\frac{5}{3}$, $\\sqrt{7}$. Keep descriptions short and free of characters that break JSON.
+
+**question_type**: mcq | passage | cloze | geometry | non_verbal | table_based | arithmetic | algebra
+**visual_complexity**: low (pure text) | medium (simple diagram/table) | high (complex or multiple figures, non-verbal patterns, paper folding)
+**ai_confidence**: high (clear text, standard format) | medium (some visuals, slightly unclear) | low (heavy visuals, unclear text)
+
+**OUTPUT FORMAT (Strict JSON, nothing else):**
+```json
+{
+  "question_type": "mcq",
+  "subject": "Math|English|Reasoning|GK",
+  "topic": "Specific topic name",
+  "question_context": "...",
+  "actual_question": "...",
+  "question_text": "...",
+  "options": [
+    {"label": "A", "text": "...", "is_visual": false, "visual_description": null, "coordinates": null}
+  ],
+  "correct_answer": "A|B|C|D or null",
+  "has_visual_elements": false,
+  "visual_complexity": "low",
+  "ai_confidence": "high"
+}
+```
+"""
+
+DETAILED_ANALYSIS_PROMPT = """Here is an SSC CGL question a student got wrong, already extracted from their screenshot:
+
+{question_json}
+
+Write your analysis of it. Return ONLY this JSON (no markdown):
+{{
+  "detailed_analysis": "Your COMPLETE cocky teacher analysis following the 5-part structure. Use double backslash for LaTeX: \\\\frac{{a}}{{b}}",
+  "practice_question": "A challenging practice question with proper LaTeX math formatting using double backslash",
+  "practice_answer": "Brief answer to practice question with key calculation steps"
+}}
+"""
+
+
 def clean_json_string(text):
     """Clean up common JSON formatting issues from AI responses"""
     # Remove markdown code blocks
@@ -252,6 +310,160 @@ def parse_json_safely(json_string):
     return None
 
 
+def _parse_failure(response_text):
+    """Structured error response when the model output isn't valid JSON"""
+    return {
+        "error": "Failed to parse AI response as valid JSON",
+        "raw_response": response_text[:1000],
+        "subject": "Unknown",
+        "topic": "Parsing Error",
+        "question_text": "The AI response could not be parsed. The question image has been saved.",
+        "options": [
+            {"label": "A", "text": "Option A (not extracted)", "is_visual": True},
+            {"label": "B", "text": "Option B (not extracted)", "is_visual": True},
+            {"label": "C", "text": "Option C (not extracted)", "is_visual": True},
+            {"label": "D", "text": "Option D (not extracted)", "is_visual": True}
+        ],
+        "detailed_analysis": "The AI encountered an error parsing this question. However, the image has been saved and you can view it in your mistake bank. This typically happens with complex visual questions.",
+        "has_visual_elements": True,
+        "visual_complexity": "high",
+        "ai_confidence": "low",
+        "question_type": "non_verbal"
+    }
+
+
+def _analysis_error(e):
+    return {
+        "error": str(e),
+        "subject": "Unknown",
+        "topic": "Error",
+        "question_text": "An error occurred during analysis. The image has been saved.",
+        "options": [
+            {"label": "A", "text": "See image", "is_visual": True},
+            {"label": "B", "text": "See image", "is_visual": True},
+            {"label": "C", "text": "See image", "is_visual": True},
+            {"label": "D", "text": "See image", "is_visual": True}
+        ],
+        "detailed_analysis": f"Error: {str(e)}. The question image has been saved and you can view it in your mistake bank.",
+        "has_visual_elements": True,
+        "visual_complexity": "unknown",
+        "ai_confidence": "low",
+        "question_type": "non_verbal"
+    }
+
+
+def _get_model(api_key):
+    active_api_key = api_key or DEFAULT_GEMINI_API_KEY
+    if not active_api_key:
+        raise ValueError("Missing Gemini API key for analysis")
+
+    # Latest Flash, with a client pinned to this key (reused across calls)
+    return gemini_pool.get_model(active_api_key)
+
+
+def _prepare_request(image_bytes, api_key):
+    """Model bound to the active key + prompt parts for one screenshot"""
+    # Load image (sent as uploaded, the pool doesn't re-encode it)
+    image = image_part(image_bytes)
+
+    model = _get_model(api_key)
+
+    if ANALYSIS_MODE == "eager":
+        # Combine system prompt + extraction prompt
+        full_prompt = ENHANCED_SYSTEM_PROMPT + "\n\n" + ENHANCED_EXTRACTION_PROMPT
+    else:
+        # Extraction only; no persona, no analysis sections
+        full_prompt = STRUCTURED_EXTRACTION_PROMPT
+
+    return model, [full_prompt, image]
+
+
+def _parse_response(response_text):
+    """Parse + validate the full model output; returns the analysis or an error dict"""
+    print(f"   📝 Raw response length: {len(response_text)} chars")
+
+    # Clean and parse JSON
+    cleaned = clean_json_string(response_text)
+    ai_data = parse_json_safely(cleaned)
+
+    if ai_data is None:
+        print(f"   ❌ All JSON parsing methods failed")
+        print(f"   📄 Response preview: {response_text[:500]}...")
+
+        # Return a structured error response
+        return _parse_failure(response_text)
+
+    # Validate required fields
+    required_fields = ["question_type", "subject", "topic", "question_text", "options"]
+    if ANALYSIS_MODE == "eager":
+        required_fields.append("detailed_analysis")
+    for field in required_fields:
+        if field not in ai_data:
+            print(f"   ⚠️  Missing field: {field}")
+            if field == "options":
+                ai_data[field] = []
+            elif field == "detailed_analysis":
+                ai_data[field] = "Analysis not available. The AI needs to work harder."
+            else:
+                ai_data[field] = "N/A"
+
+    # Set defaults for optional fields
+    ai_data.setdefault("question_context", "")
+    ai_data.setdefault("actual_question", ai_data["question_text"])
+    ai_data.setdefault("correct_answer", None)
+    ai_data.setdefault("has_visual_elements", False)
+    ai_data.setdefault("visual_complexity", "low")
+    ai_data.setdefault("ai_confidence", "high")
+    if ANALYSIS_MODE == "eager":
+        ai_data.setdefault("practice_question", "")
+        ai_data.setdefault("practice_answer", "")
+        ai_data["analysis_status"] = "complete"
+    else:
+        # Filled in later by generate_detailed_analysis
+        ai_data["analysis_status"] = "pending"
+
+    # Ensure options have proper structure
+    if ai_data["options"]:
+        for opt in ai_data["options"]:
+            opt.setdefault("is_visual", False)
+            opt.setdefault("visual_description", None)
+            opt.setdefault("coordinates", None)
+    else:
+        # If no options extracted, create placeholders
+        print("   ⚠️  No options extracted, creating placeholders")
+        ai_data["options"] = [
+            {"label": "A", "text": "Option A (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "top"},
+            {"label": "B", "text": "Option B (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "middle-top"},
+            {"label": "C", "text": "Option C (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "middle-bottom"},
+            {"label": "D", "text": "Option D (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "bottom"}
+        ]
+
+    analysis = ai_data.get("detailed_analysis", "")
+    if ANALYSIS_MODE == "eager":
+        _check_analysis_sections(analysis)
+
+    print(f"   ✅ Analysis complete!")
+    print(f"      Type: {ai_data['question_type']}")
+    print(f"      Subject: {ai_data['subject']} - {ai_data['topic']}")
+    print(f"      Options: {len(ai_data['options'])} extracted")
+    print(f"      Visual Elements: {ai_data['has_visual_elements']}")
+    print(f"      Visual Complexity: {ai_data['visual_complexity']}")
+    print(f"      AI Confidence: {ai_data['ai_confidence']}")
+    print(f"      Context Length: {len(ai_data.get('question_context', ''))} chars")
+    print(f"      Analysis Length: {len(analysis)} chars")
+
+    return ai_data
+
+
+def _check_analysis_sections(analysis):
+    # Validate detailed_analysis structure
+    required_sections = ["The Core Concept", "The Examiner's Trap", "Level Up", "Nearby Concepts"]
+    missing_sections = [sec for sec in required_sections if sec not in analysis]
+
+    if missing_sections:
+        print(f"   ⚠️  Analysis missing sections: {missing_sections}")
+
+
 def analyze_screenshot(image_bytes, api_key=None):
     """
     Enhanced analysis with complete question extraction, visual detection,
@@ -260,140 +472,117 @@ def analyze_screenshot(image_bytes, api_key=None):
     try:
         print("   ... Sending image to Gemini Flash (latest) for enhanced analysis ...")
 
-        # Load image
-        image = Image.open(io.BytesIO(image_bytes))
+        model, contents = _prepare_request(image_bytes, api_key)
 
-        active_api_key = api_key or DEFAULT_GEMINI_API_KEY
-        if not active_api_key:
-            raise ValueError("Missing Gemini API key for analysis")
+        # Generate response
+        response = model.generate_content(contents)
 
-        genai.configure(api_key=active_api_key)
+        # Parse response
+        return _parse_response(response.text.strip())
 
-        # Configure model with latest Flash
-        model = genai.GenerativeModel('gemini-flash-latest')
+    except Exception as e:
+        print(f"   ❌ Error in analysis: {str(e)}")
+        import traceback
+        traceback.print_exc()
 
-        # Combine system prompt + extraction prompt
-        full_prompt = ENHANCED_SYSTEM_PROMPT + "\n\n" + ENHANCED_EXTRACTION_PROMPT
+        return _analysis_error(e)
 
-        # Generate response
-        response = model.generate_content([full_prompt, image])
 
-        # Parse response
-        response_text = response.text.strip()
+def analyze_screenshot_stream(image_bytes, api_key=None):
+    """
+    Streaming variant of analyze_screenshot (generator).
 
-        print(f"   📝 Raw response length: {len(response_text)} chars")
+    Yields {"type": "field", "key", "value"} as top-level fields complete,
+    {"type": "delta", "key", "text"} while long text fields are generated, and
+    finally {"type": "result", "data", "timing"} with the same validated dict
+    analyze_screenshot returns. `timing` separates time to first chunk and to
+    first complete field from the total.
+    """
+    started = time.perf_counter()
+    timing = {"first_chunk_ms": None, "first_field_ms": None, "total_ms": None}
 
-        # Clean and parse JSON
-        cleaned = clean_json_string(response_text)
-        ai_data = parse_json_safely(cleaned)
-
-        if ai_data is None:
-            print(f"   ❌ All JSON parsing methods failed")
-            print(f"   📄 Response preview: {response_text[:500]}...")
-
-            # Return a structured error response
-            return {
-                "error": "Failed to parse AI response as valid JSON",
-                "raw_response": response_text[:1000],
-                "subject": "Unknown",
-                "topic": "Parsing Error",
-                "question_text": "The AI response could not be parsed. The question image has been saved.",
-                "options": [
-                    {"label": "A", "text": "Option A (not extracted)", "is_visual": True},
-                    {"label": "B", "text": "Option B (not extracted)", "is_visual": True},
-                    {"label": "C", "text": "Option C (not extracted)", "is_visual": True},
-                    {"label": "D", "text": "Option D (not extracted)", "is_visual": True}
-                ],
-                "detailed_analysis": "The AI encountered an error parsing this question. However, the image has been saved and you can view it in your mistake bank. This typically happens with complex visual questions.",
-                "has_visual_elements": True,
-                "visual_complexity": "high",
-                "ai_confidence": "low",
-                "question_type": "non_verbal"
-            }
-
-        # Validate required fields
-        required_fields = ["question_type", "subject", "topic", "question_text", "options", "detailed_analysis"]
-        for field in required_fields:
-            if field not in ai_data:
-                print(f"   ⚠️  Missing field: {field}")
-                if field == "options":
-                    ai_data[field] = []
-                elif field == "detailed_analysis":
-                    ai_data[field] = "Analysis not available. The AI needs to work harder."
-                else:
-                    ai_data[field] = "N/A"
-
-        # Set defaults for optional fields
-        ai_data.setdefault("question_context", "")
-        ai_data.setdefault("actual_question", ai_data["question_text"])
-        ai_data.setdefault("correct_answer", None)
-        ai_data.setdefault("has_visual_elements", False)
-        ai_data.setdefault("visual_complexity", "low")
-        ai_data.setdefault("ai_confidence", "high")
-        ai_data.setdefault("practice_question", "")
-        ai_data.setdefault("practice_answer", "")
+    def elapsed_ms():
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    try:
+        print("   ... Streaming image analysis from Gemini Flash (latest) ...")
+
+        model, contents = _prepare_request(image_bytes, api_key)
+        parser = IncrementalJSONParser(stream_keys=STREAMED_FIELDS)
+        chunks = []
+
+        for chunk in model.generate_content(contents, stream=True):
+            text = chunk.text
+            if not text:
+                continue
+            if timing["first_chunk_ms"] is None:
+                timing["first_chunk_ms"] = elapsed_ms()
+            chunks.append(text)
 
-        # Ensure options have proper structure
-        if ai_data["options"]:
-            for opt in ai_data["options"]:
-                opt.setdefault("is_visual", False)
-                opt.setdefault("visual_description", None)
-                opt.setdefault("coordinates", None)
-        else:
-            # If no options extracted, create placeholders
-            print("   ⚠️  No options extracted, creating placeholders")
-            ai_data["options"] = [
-                {"label": "A", "text": "Option A (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "top"},
-                {"label": "B", "text": "Option B (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "middle-top"},
-                {"label": "C", "text": "Option C (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "middle-bottom"},
-                {"label": "D", "text": "Option D (not extracted)", "is_visual": True, "visual_description": "See image", "coordinates": "bottom"}
-            ]
-
-        # Validate detailed_analysis structure
-        analysis = ai_data.get("detailed_analysis", "")
-        required_sections = ["The Core Concept", "The Examiner's Trap", "Level Up", "Nearby Concepts"]
-        missing_sections = [sec for sec in required_sections if sec not in analysis]
-
-        if missing_sections:
-            print(f"   ⚠️  Analysis missing sections: {missing_sections}")
-
-        print(f"   ✅ Analysis complete!")
-        print(f"      Type: {ai_data['question_type']}")
-        print(f"      Subject: {ai_data['subject']} - {ai_data['topic']}")
-        print(f"      Options: {len(ai_data['options'])} extracted")
-        print(f"      Visual Elements: {ai_data['has_visual_elements']}")
-        print(f"      Visual Complexity: {ai_data['visual_complexity']}")
-        print(f"      AI Confidence: {ai_data['ai_confidence']}")
-        print(f"      Context Length: {len(ai_data.get('question_context', ''))} chars")
-        print(f"      Analysis Length: {len(analysis)} chars")
-
-        return ai_data
+            for event in parser.feed(text):
+                if event["type"] == "field" and timing["first_field_ms"] is None:
+                    timing["first_field_ms"] = elapsed_ms()
+                yield event
+
+        # The incremental events are for display; the saved data comes from
+        # the same full parse + validation as the non-streaming path
+        ai_data = _parse_response("".join(chunks).strip())
 
     except Exception as e:
         print(f"   ❌ Error in analysis: {str(e)}")
         import traceback
         traceback.print_exc()
 
-        return {
-            "error": str(e),
-            "subject": "Unknown",
-            "topic": "Error",
-            "question_text": "An error occurred during analysis. The image has been saved.",
-            "options": [
-                {"label": "A", "text": "See image", "is_visual": True},
-                {"label": "B", "text": "See image", "is_visual": True},
-                {"label": "C", "text": "See image", "is_visual": True},
-                {"label": "D", "text": "See image", "is_visual": True}
-            ],
-            "detailed_analysis": f"Error: {str(e)}. The question image has been saved and you can view it in your mistake bank.",
-            "has_visual_elements": True,
-            "visual_complexity": "unknown",
-            "ai_confidence": "low",
-            "question_type": "non_verbal"
+        ai_data = _analysis_error(e)
+
+    timing["total_ms"] = elapsed_ms()
+    print(f"   ⏱️  Stream timing: first chunk {timing['first_chunk_ms']}ms, "
+          f"first field {timing['first_field_ms']}ms, total {timing['total_ms']}ms")
+    yield {"type": "result", "data": ai_data, "timing": timing}
+
+
+def generate_detailed_analysis(question_data, image_bytes=None, api_key=None):
+    """
+    Second, lazy call: the long-form analysis + practice question for an
+    already-extracted question. The screenshot is optional (it helps for
+    figure-based questions). Returns {"detailed_analysis", "practice_question",
+    "practice_answer"} or {"error": ...}.
+    """
+    try:
+        print("   ... Generating detailed analysis with Gemini Flash (latest) ...")
+        model = _get_model(api_key)
+
+        question = {
+            key: question_data.get(key)
+            for key in ("question_type", "subject", "topic", "question_context", "actual_question",
+                        "question_text", "options", "correct_answer")
         }
+        prompt = ENHANCED_SYSTEM_PROMPT + "\n\n" + DETAILED_ANALYSIS_PROMPT.format(
+            question_json=json.dumps(question, ensure_ascii=False, indent=2)
+        )
+
+        contents = [prompt]
+        if image_bytes:
+            contents.append(image_part(image_bytes))
+
+        response = model.generate_content(contents)
+        response_text = response.text.strip()
+        print(f"   📝 Raw response length: {len(response_text)} chars")
+
+        result = parse_json_safely(clean_json_string(response_text))
+        if result is None or not result.get("detailed_analysis"):
+            raise ValueError("Failed to parse detailed analysis JSON")
+
+        _check_analysis_sections(result["detailed_analysis"])
+        print(f"   ✅ Detailed analysis complete ({len(result['detailed_analysis'])} chars)")
+        return {field: result.get(field, "") for field in ANALYSIS_FIELDS}
+
+    except Exception as e:
+        print(f"   ❌ Error generating detailed analysis: {str(e)}")
+        return {"error": str(e)}
 
 
-def get_simple_analysis(image_bytes):
+def get_simple_analysis(image_bytes, api_key=None):
     """
     Fallback: Simple analysis without enhanced features
     (for backwards compatibility or if enhanced analysis fails)
@@ -401,7 +590,7 @@ def get_simple_analysis(image_bytes):
     try:
         print("   ... Using simple analysis fallback ...")
 
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
+        model = gemini_pool.get_model(api_key or DEFAULT_GEMINI_API_KEY, 'gemini-1.5-flash-latest')
 
         simple_prompt = """You are a cocky SSC CGL teacher. Analyze this question and provide:
 
@@ -425,8 +614,7 @@ Return ONLY valid JSON (no markdown):
 }
 """
 
-        image = Image.open(io.BytesIO(image_bytes))
-        response = model.generate_content([simple_prompt, image])
+        response = model.generate_content([simple_prompt, image_part(image_bytes)])
 
         response_text = response.text.strip()
         cleaned = clean_json_string(response_text)
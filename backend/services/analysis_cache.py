@@ -0,0 +1,183 @@
+"""
+Content-addressed cache of Gemini analyses.
+
+Re-uploading a screenshot should not cost another Gemini call (or another
+storage upload). Entries are keyed per user by the SHA-256 of the image bytes,
+so only byte-identical uploads hit. There is deliberately no perceptual
+(near-duplicate) tier: screenshots of different questions share a layout and
+differ only in text, which thumbnail hashes can't see, so a fuzzy hit would
+hand a new question the analysis of an old one.
+
+Two tiers:
+- in-process LRU
+- SQLite on local disk, bounded by total payload bytes with LRU eviction
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", os.path.join(".cache", "analysis_cache.sqlite3"))
+ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "256"))
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def content_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(
+            self,
+            path: Optional[str] = ANALYSIS_CACHE_PATH,
+            memory_entries: int = ANALYSIS_CACHE_MEMORY_ENTRIES,
+            max_bytes: int = ANALYSIS_CACHE_MAX_BYTES
+    ):
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+
+        self._memory: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._path = path
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None or not self._path:
+            return self._db
+
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        db = sqlite3.connect(self._path, check_same_thread=False)
+        db.execute(
+            """CREATE TABLE IF NOT EXISTS analysis_cache (
+                user_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                ai_data TEXT NOT NULL,
+                image_url TEXT,
+                size_bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (user_id, content_hash)
+            )"""
+        )
+        # Caches written when there was a perceptual tier keep their (nullable)
+        # phash/band columns; only the indexes on them cost anything
+        for i in range(8):
+            db.execute(f"DROP INDEX IF EXISTS idx_analysis_cache_band{i}")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_access ON analysis_cache (last_access)")
+        db.commit()
+        self._db = db
+        return db
+
+    def _remember(self, key: tuple, entry: Dict[str, Any]) -> None:
+        if not self.memory_entries:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, user_id: str, image_bytes: bytes) -> Optional[Dict[str, Any]]:
+        """Return {"ai_data", "image_url", "match"} for a cached screenshot, or None"""
+        digest = content_hash(image_bytes)
+
+        with self._lock:
+            entry = self._memory.get((user_id, digest))
+            if entry is not None:
+                self._memory.move_to_end((user_id, digest))
+                self.stats["memory_hits"] += 1
+                return {**entry, "match": "exact"}
+
+            db = self._connection()
+            if db is None:
+                self.stats["misses"] += 1
+                return None
+
+            row = db.execute(
+                "SELECT ai_data, image_url FROM analysis_cache WHERE user_id = ? AND content_hash = ?",
+                (user_id, digest)
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE analysis_cache SET last_access = ? WHERE user_id = ? AND content_hash = ?",
+                    (time.time(), user_id, digest)
+                )
+                db.commit()
+                entry = {"ai_data": json.loads(row[0]), "image_url": row[1]}
+                self._remember((user_id, digest), entry)
+                self.stats["disk_hits"] += 1
+                return {**entry, "match": "exact"}
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, user_id: str, image_bytes: bytes, ai_data: Dict[str, Any], image_url: Optional[str]) -> None:
+        digest = content_hash(image_bytes)
+        payload = json.dumps(ai_data)
+
+        with self._lock:
+            self._remember((user_id, digest), {"ai_data": ai_data, "image_url": image_url})
+
+            db = self._connection()
+            if db is None:
+                return
+
+            db.execute(
+                "INSERT OR REPLACE INTO analysis_cache "
+                "(user_id, content_hash, ai_data, image_url, size_bytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    user_id,
+                    digest,
+                    payload,
+                    image_url,
+                    len(payload),
+                    time.time()
+                )
+            )
+            self._evict(db)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        total = db.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM analysis_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for user_id, digest, size in db.execute(
+                "SELECT user_id, content_hash, size_bytes FROM analysis_cache ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM analysis_cache WHERE user_id = ? AND content_hash = ?", (user_id, digest))
+            self._memory.pop((user_id, digest), None)
+            total -= size
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            db = self._connection()
+            if db is not None:
+                count, size = db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM analysis_cache"
+                ).fetchone()
+                stats["disk_entries"] = count
+                stats["disk_bytes"] = size
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+            return stats
+
+
+analysis_cache = AnalysisCache() if ANALYSIS_CACHE_ENABLED else None
@@ -0,0 +1,378 @@
+"""
+Server-side aggregates for the analytics dashboard.
+
+The dashboard used to download every question row (content JSON included)
+and crunch the charts in the browser. Here the rows are grouped once per user
+into a small set of raw aggregates:
+
+- groups: count / attempted / attempts / correct per (subject, topic)
+- mastery: questions per mastery level
+- days: uploads and reviews per UTC day over the last 90 days, plus the
+  attempts behind the 30-day accuracy trend
+- hours: attempts per local hour of the last attempt
+
+The `question_analytics` RPC (supabase/migrations) does the grouping in
+Postgres, reading the groups and mastery from the `user_question_stats`
+rollup (see question_stats.py). Until the migrations are applied the same
+aggregates are built from a narrow, keyset-paginated projection of the rows. Every chart is then shaped
+from the aggregates with the same rules as `frontend/src/utils/analytics.js`,
+and the aggregates are cached in-process for ANALYTICS_CACHE_TTL_SECONDS.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.services.question_stats import fetch_question_stats
+
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "30"))
+ANALYTICS_CACHE_ENTRIES = int(os.getenv("ANALYTICS_CACHE_ENTRIES", "1024"))
+ANALYTICS_PAGE_SIZE = int(os.getenv("ANALYTICS_PAGE_SIZE", "1000"))
+
+ANALYTICS_COLUMNS = "id,subject,topic,mastery_level,created_at,last_attempted_at,times_attempted,times_correct"
+MASTERY_LEVELS = ("new", "learning", "reviewing", "mastered")
+
+TREND_DAYS = 30
+HEATMAP_DAYS = 90
+STREAK_DAYS = 30
+TOP_TOPICS = 10
+BEST_TIME_MIN_ATTEMPTS = 5
+NEEDS_REVIEW_ACCURACY = 70
+NEEDS_REVIEW_MIN_COUNT = 3
+
+_cache: "OrderedDict[Tuple[str, Optional[int]], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _percent(correct: float, total: float) -> int:
+    """Math.round(correct / total * 100): halves round up, unlike round()"""
+    return int(math.floor(correct / total * 100 + 0.5)) if total else 0
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _aggregate_rows(rows: List[Dict[str, Any]], tz_offset_minutes: int, now: datetime) -> Dict[str, Any]:
+    """Python twin of the question_analytics RPC"""
+    groups: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    mastery: Dict[str, int] = {}
+    days: Dict[str, Dict[str, int]] = {}
+    hours: Dict[int, Dict[str, int]] = {}
+
+    heatmap_start = now - timedelta(days=HEATMAP_DAYS)
+    trend_start = now - timedelta(days=TREND_DAYS)
+    local_shift = timedelta(minutes=tz_offset_minutes)
+
+    def day_bucket(moment: datetime) -> Dict[str, int]:
+        key = moment.astimezone(timezone.utc).date().isoformat()
+        bucket = days.get(key)
+        if bucket is None:
+            bucket = days[key] = {"date": key, "uploads": 0, "reviews": 0, "attempts": 0, "correct": 0}
+        return bucket
+
+    for row in rows:
+        attempts = row.get("times_attempted") or 0
+        correct = row.get("times_correct") or 0
+
+        key = (row.get("subject"), row.get("topic"))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "subject": key[0], "topic": key[1],
+                "count": 0, "attempted": 0, "attempts": 0, "correct": 0, "accuracy_sum": 0.0
+            }
+        group["count"] += 1
+        if attempts > 0:
+            group["attempted"] += 1
+            group["attempts"] += attempts
+            group["correct"] += correct
+            group["accuracy_sum"] += correct / attempts
+
+        level = row.get("mastery_level") or "new"
+        mastery[level] = mastery.get(level, 0) + 1
+
+        created_at = _parse_timestamp(row.get("created_at"))
+        if created_at is not None and created_at >= heatmap_start:
+            day_bucket(created_at)["uploads"] += 1
+
+        last_attempted_at = _parse_timestamp(row.get("last_attempted_at"))
+        if last_attempted_at is None:
+            continue
+        if last_attempted_at >= heatmap_start:
+            bucket = day_bucket(last_attempted_at)
+            bucket["reviews"] += 1
+            if attempts > 0 and last_attempted_at >= trend_start:
+                bucket["attempts"] += attempts
+                bucket["correct"] += correct
+        if attempts > 0:
+            hour = (last_attempted_at.astimezone(timezone.utc) - local_shift).hour
+            slot = hours.setdefault(hour, {"hour": hour, "attempts": 0, "correct": 0})
+            slot["attempts"] += attempts
+            slot["correct"] += correct
+
+    return {
+        "groups": list(groups.values()),
+        "mastery": mastery,
+        "days": list(days.values()),
+        "hours": list(hours.values()),
+    }
+
+
+def _fetch_analytics_rows(supabase_admin, user_id: str) -> List[Dict[str, Any]]:
+    """Narrow projection of all the user's questions, keyset-paginated by id"""
+    rows: List[Dict[str, Any]] = []
+    last_id = None
+    while True:
+        query = (
+            supabase_admin.table("questions")
+            .select(ANALYTICS_COLUMNS)
+            .eq("user_id", user_id)
+            .order("id")
+            .limit(ANALYTICS_PAGE_SIZE)
+        )
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.execute().data or []
+        rows.extend(page)
+        if len(page) < ANALYTICS_PAGE_SIZE:
+            return rows
+        last_id = page[-1]["id"]
+
+
+def _load_aggregates(supabase_admin, user_id: str, tz_offset_minutes: int) -> Dict[str, Any]:
+    try:
+        response = supabase_admin.rpc(
+            "question_analytics",
+            {"p_user_id": user_id, "p_tz_offset_minutes": tz_offset_minutes}
+        ).execute()
+        if response.data is not None:
+            return response.data
+    except Exception as rpc_error:
+        # e.g. the question_analytics migration hasn't been applied yet
+        print(f"⚠️  question_analytics RPC unavailable, aggregating in Python: {rpc_error}")
+
+    rows = _fetch_analytics_rows(supabase_admin, user_id)
+    return _aggregate_rows(rows, tz_offset_minutes, datetime.now(timezone.utc))
+
+
+def _cached(key: Tuple[str, Optional[int]], load: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    value = load()
+
+    with _cache_lock:
+        _cache[key] = (now + ANALYTICS_CACHE_TTL_SECONDS, value)
+        _cache.move_to_end(key)
+        while len(_cache) > ANALYTICS_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def get_question_aggregates(supabase_admin, user_id: str, tz_offset_minutes: int = 0) -> Dict[str, Any]:
+    """Raw aggregates for the user, from the in-process cache when fresh"""
+    return _cached(
+        (user_id, tz_offset_minutes),
+        lambda: _load_aggregates(supabase_admin, user_id, tz_offset_minutes)
+    )
+
+
+def _load_stats(supabase_admin, user_id: str) -> Dict[str, Any]:
+    try:
+        return fetch_question_stats(supabase_admin, user_id)
+    except Exception as stats_error:
+        # e.g. the user_question_stats migration hasn't been applied yet
+        print(f"⚠️  Question stats rollup unavailable, using full aggregates: {stats_error}")
+        return get_question_aggregates(supabase_admin, user_id)
+
+
+def get_question_stats(supabase_admin, user_id: str) -> Dict[str, Any]:
+    """
+    Just the (subject, topic) groups and mastery distribution, read from the
+    user_question_stats rollup: enough for the subject, topic and mastery views
+    """
+    return _cached((user_id, None), lambda: _load_stats(supabase_admin, user_id))
+
+
+def invalidate_analytics(user_id: str) -> None:
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == user_id]:
+            del _cache[key]
+
+
+def accuracy_trend(aggregates: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """[{date, accuracy, attempts}] for days with attempts in the last 30 days"""
+    return [
+        {"date": day["date"], "accuracy": _percent(day["correct"], day["attempts"]), "attempts": day["attempts"]}
+        for day in sorted(aggregates["days"], key=lambda day: day["date"])
+        if day["attempts"] > 0
+    ]
+
+
+def subject_breakdown(aggregates: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """[{subject, count, accuracy, attempted}], largest subjects first"""
+    subjects: Dict[str, Dict[str, Any]] = {}
+    for group in aggregates["groups"]:
+        name = group["subject"] or "Unknown"
+        subject = subjects.setdefault(name, {"subject": name, "count": 0, "attempted": 0, "attempts": 0, "correct": 0})
+        subject["count"] += group["count"]
+        subject["attempted"] += group["attempted"]
+        subject["attempts"] += group["attempts"] or 0
+        subject["correct"] += group["correct"] or 0
+
+    ordered = sorted(subjects.values(), key=lambda subject: (-subject["count"], subject["subject"]))
+    return [
+        {
+            "subject": subject["subject"],
+            "count": subject["count"],
+            "accuracy": _percent(subject["correct"], subject["attempts"]),
+            "attempted": subject["attempted"],
+        }
+        for subject in ordered
+    ]
+
+
+def topic_breakdown(aggregates: Dict[str, Any], subject: str = "All") -> List[Dict[str, Any]]:
+    """Top 10 topics [{topic, count, accuracy}] of one subject, or of all subjects for 'All'"""
+    topics: Dict[str, Dict[str, Any]] = {}
+    for group in aggregates["groups"]:
+        if subject != "All" and group["subject"] != subject:
+            continue
+        name = group["topic"] or "Other"
+        topic = topics.setdefault(name, {"topic": name, "count": 0, "attempts": 0, "correct": 0})
+        topic["count"] += group["count"]
+        topic["attempts"] += group["attempts"] or 0
+        topic["correct"] += group["correct"] or 0
+
+    ordered = sorted(topics.values(), key=lambda topic: (-topic["count"], topic["topic"]))
+    return [
+        {"topic": topic["topic"], "count": topic["count"], "accuracy": _percent(topic["correct"], topic["attempts"])}
+        for topic in ordered[:TOP_TOPICS]
+    ]
+
+
+def study_heatmap(aggregates: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """[{date, count, level}] of uploads plus reviews per day over the last 90 days, level 0-4"""
+    counts = [(day["date"], day["uploads"] + day["reviews"]) for day in aggregates["days"]]
+    counts = sorted((date, count) for date, count in counts if count > 0)
+    max_count = max([count for _, count in counts] + [1])
+    return [
+        {"date": date, "count": count, "level": min(4, math.ceil(count / max_count * 4))}
+        for date, count in counts
+    ]
+
+
+def mastery_distribution(aggregates: Dict[str, Any]) -> Dict[str, int]:
+    distribution = {level: 0 for level in MASTERY_LEVELS}
+    for level, count in aggregates["mastery"].items():
+        distribution[level] = distribution.get(level, 0) + count
+    return distribution
+
+
+def best_study_time(aggregates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Local hour with the highest accuracy (at least 5 attempts), or None"""
+    best_hour, best_accuracy = None, 0.0
+    for slot in sorted(aggregates["hours"], key=lambda slot: slot["hour"]):
+        if slot["attempts"] < BEST_TIME_MIN_ATTEMPTS:
+            continue
+        accuracy = slot["correct"] / slot["attempts"] * 100
+        if accuracy > best_accuracy:
+            best_hour, best_accuracy = slot["hour"], accuracy
+
+    if best_hour is None:
+        return None
+
+    meridiem = "PM" if best_hour >= 12 else "AM"
+    label = f"{best_hour % 12 or 12}-{(best_hour + 1) % 12 or 12} {meridiem}"
+    return {"hour": best_hour, "accuracy": _percent(best_accuracy, 100), "label": label}
+
+
+def _streak(heatmap: List[Dict[str, Any]], today) -> int:
+    """Consecutive active days ending today (a quiet today doesn't break it)"""
+    active = {day["date"] for day in heatmap}
+    streak = 0
+    for offset in range(STREAK_DAYS):
+        date = today - timedelta(days=offset)
+        if date.isoformat() in active:
+            streak += 1
+        elif offset > 0:
+            break
+    return streak
+
+
+def insights(aggregates: Dict[str, Any]) -> Dict[str, Any]:
+    attempted_subjects = [subject for subject in subject_breakdown(aggregates) if subject["attempted"] > 0]
+    weakest = min(attempted_subjects, key=lambda subject: subject["accuracy"], default=None)
+    strongest = max(attempted_subjects, key=lambda subject: subject["accuracy"], default=None)
+
+    trend = accuracy_trend(aggregates)
+    recent, older = trend[-7:], trend[:7]
+    recent_accuracy = sum(day["accuracy"] for day in recent) / max(len(recent), 1)
+    older_accuracy = sum(day["accuracy"] for day in older) / max(len(older), 1)
+    improvement = int(math.floor(recent_accuracy - older_accuracy + 0.5))
+
+    needs_review = [
+        topic["topic"] for topic in topic_breakdown(aggregates, "All")
+        if topic["accuracy"] < NEEDS_REVIEW_ACCURACY and topic["count"] >= NEEDS_REVIEW_MIN_COUNT
+    ]
+
+    groups = aggregates["groups"]
+    attempted = sum(group["attempted"] for group in groups)
+    accuracy_sum = sum(group["accuracy_sum"] or 0 for group in groups)
+
+    return {
+        "weakestTopic": {"name": weakest["subject"], "accuracy": weakest["accuracy"]} if weakest else None,
+        "strongestTopic": {"name": strongest["subject"], "accuracy": strongest["accuracy"]} if strongest else None,
+        "improvement": f"+{improvement}%" if improvement > 0 else f"{improvement}%",
+        "isImproving": improvement > 0,
+        "needsReview": needs_review,
+        "streak": _streak(study_heatmap(aggregates), datetime.now(timezone.utc).date()),
+        "totalAttempts": sum(group["attempts"] or 0 for group in groups),
+        "averageAccuracy": _percent(accuracy_sum, attempted),
+    }
+
+
+def analytics_summary(aggregates: Dict[str, Any], subject: str = "All") -> Dict[str, Any]:
+    """Everything the dashboard draws, in one response"""
+    return {
+        "total_questions": sum(group["count"] for group in aggregates["groups"]),
+        "accuracy_trend": accuracy_trend(aggregates),
+        "subjects": subject_breakdown(aggregates),
+        "topics": topic_breakdown(aggregates, subject),
+        "heatmap": study_heatmap(aggregates),
+        "mastery": mastery_distribution(aggregates),
+        "best_time": best_study_time(aggregates),
+        "insights": insights(aggregates),
+    }
+
+
+def stats_overview(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Headline counters straight from the rollup"""
+    groups = stats["groups"]
+    attempted = sum(group["attempted"] for group in groups)
+    attempts = sum(group["attempts"] or 0 for group in groups)
+    correct = sum(group["correct"] or 0 for group in groups)
+    return {
+        "total_questions": sum(group["count"] for group in groups),
+        "attempted_questions": attempted,
+        "total_attempts": attempts,
+        "total_correct": correct,
+        "accuracy": _percent(correct, attempts),
+        "average_accuracy": _percent(sum(group["accuracy_sum"] or 0 for group in groups), attempted),
+        "mastery": mastery_distribution(stats),
+        "subjects": subject_breakdown(stats),
+    }
@@ -0,0 +1,129 @@
+"""
+Single-answer writes without lost updates.
+
+Answers used to read `times_attempted` / `times_correct`, add one in Python and
+write the row back, so two tabs (or the app and the extension) answering at the
+same time could both write "n + 1". Now:
+
+- plain answers go through the `record_answer_attempt` RPC, which checks the
+  answer and increments the counters in one statement and returns the new
+  stats (one round trip instead of two);
+- reviews still read the row, because the scheduling step runs in Python, but write
+  it back only if `times_attempted` is unchanged since the read, re-reading
+  and recomputing when another answer got in first.
+
+Without the RPC (migration not applied) plain answers fall back to the same
+versioned read/update loop as reviews.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from backend.services.db_errors import is_missing_function
+from backend.services.review_batch import REVIEW_BATCH_COLUMNS, conflict_backoff
+from backend.services.scheduling import review_card
+
+ANSWER_WRITE_ATTEMPTS = 5
+
+ANSWER_COLUMNS = "correct_option,times_attempted,times_correct,subject,topic,next_review_date,ease_factor"
+
+
+class QuestionNotFound(LookupError):
+    """The question doesn't exist or belongs to another user"""
+
+
+class AnswerWriteConflict(Exception):
+    """Concurrent answers kept changing the question between read and write"""
+
+
+def _read_question(supabase_admin, user_id: str, question_id: str, columns: str) -> Dict[str, Any]:
+    rows = supabase_admin.table("questions") \
+        .select(columns) \
+        .eq("id", question_id) \
+        .eq("user_id", user_id) \
+        .limit(1) \
+        .execute().data or []
+    if not rows:
+        raise QuestionNotFound(question_id)
+    return rows[0]
+
+
+def _versioned_update(
+        supabase_admin,
+        user_id: str,
+        question_id: str,
+        fields: Dict[str, Any],
+        expected_attempts: Optional[int]
+) -> bool:
+    """Write `fields` only if times_attempted is still `expected_attempts`; False if it moved on"""
+    query = supabase_admin.table("questions") \
+        .update(fields) \
+        .eq("id", question_id) \
+        .eq("user_id", user_id)
+    if expected_attempts is None:
+        query = query.is_("times_attempted", "null")
+    else:
+        query = query.eq("times_attempted", expected_attempts)
+    return bool(query.execute().data)
+
+
+def record_answer(supabase_admin, user_id: str, question_id: str, answer: Optional[str]) -> Dict[str, Any]:
+    """
+    Check an answer and count the attempt. Returns is_correct, correct_option,
+    the new times_attempted / times_correct and the scheduling columns
+    (subject, topic, next_review_date, ease_factor).
+    """
+    try:
+        response = supabase_admin.rpc("record_answer_attempt", {
+            "p_user_id": user_id,
+            "p_question_id": question_id,
+            "p_answer": answer,
+        }).execute()
+    except Exception as rpc_error:
+        # Only before the atomic counters migration: after a timeout the attempt may already be counted
+        if not is_missing_function(rpc_error):
+            raise
+        print(f"⚠️  record_answer_attempt RPC unavailable, using a versioned update: {rpc_error}")
+    else:
+        if not response.data:
+            raise QuestionNotFound(question_id)
+        return response.data
+
+    for attempt in range(1, ANSWER_WRITE_ATTEMPTS + 1):
+        question = _read_question(supabase_admin, user_id, question_id, ANSWER_COLUMNS)
+        is_correct = answer == question["correct_option"]
+        stats = {
+            "times_attempted": (question.get("times_attempted") or 0) + 1,
+            "times_correct": (question.get("times_correct") or 0) + (1 if is_correct else 0),
+        }
+        written = _versioned_update(supabase_admin, user_id, question_id, {
+            "user_answer": answer,
+            **stats,
+            "last_attempted_at": datetime.now().isoformat()
+        }, question.get("times_attempted"))
+        if written:
+            return {**question, **stats, "is_correct": is_correct}
+        conflict_backoff(attempt)
+    raise AnswerWriteConflict(question_id)
+
+
+def record_review(
+        supabase_admin,
+        user_id: str,
+        question_id: str,
+        answer: str,
+        is_correct: bool
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Schedule one review answer; returns the question as read and its new review columns"""
+    for attempt in range(1, ANSWER_WRITE_ATTEMPTS + 1):
+        question = _read_question(supabase_admin, user_id, question_id, REVIEW_BATCH_COLUMNS)
+        update = review_card(question, is_correct, datetime.now())
+        if _versioned_update(supabase_admin, user_id, question_id, {
+            "user_answer": answer,
+            **update
+        }, question.get("times_attempted")):
+            return question, update
+        conflict_backoff(attempt)
+    raise AnswerWriteConflict(question_id)
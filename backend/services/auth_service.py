@@ -0,0 +1,168 @@
+"""
+Local verification of Supabase access tokens.
+
+Tokens are checked against the project's JWKS (fetched once, cached with a TTL
+and re-fetched when an unknown `kid` shows up after a key rotation) instead of
+calling Supabase Auth on every request. Unknown kids refetch the key set at
+most once per JWKS_REFRESH_COOLDOWN_SECONDS, so forged tokens can't hammer the
+JWKS endpoint. Tokens that already passed verification are remembered in a
+small per-process LRU until they expire.
+
+`verify` may fetch the key set over HTTP; async callers run it through
+`run_blocking` and only check `cached` on the event loop.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import jwt
+from jwt import PyJWKClient
+
+SUPABASE_URL = (os.getenv("SUPABASE_URL") or "").rstrip("/")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPABASE_JWT_ISSUER = os.getenv("SUPABASE_JWT_ISSUER") or (f"{SUPABASE_URL}/auth/v1" if SUPABASE_URL else None)
+JWKS_CACHE_TTL_SECONDS = int(os.getenv("JWKS_CACHE_TTL_SECONDS", "600"))
+JWKS_REFRESH_COOLDOWN_SECONDS = int(os.getenv("JWKS_REFRESH_COOLDOWN_SECONDS", "30"))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "2048"))
+
+ASYMMETRIC_ALGORITHMS = ["ES256", "RS256"]
+JWT_LEEWAY_SECONDS = 10
+
+
+class LocalVerificationUnavailable(Exception):
+    """Raised when a token cannot be checked locally (e.g. legacy HS256 without a secret)."""
+
+
+class TokenVerifier:
+    """Verifies Supabase JWTs locally and caches the verified claims per token."""
+
+    def __init__(
+            self,
+            jwks_url: Optional[str],
+            audience: Optional[str] = SUPABASE_JWT_AUDIENCE,
+            issuer: Optional[str] = None,
+            jwt_secret: Optional[str] = None,
+            cache_size: int = VERIFIED_TOKEN_CACHE_SIZE,
+            jwks_ttl: int = JWKS_CACHE_TTL_SECONDS,
+            jwks_refresh_cooldown: int = JWKS_REFRESH_COOLDOWN_SECONDS,
+            jwk_client: Optional[PyJWKClient] = None
+    ):
+        self.audience = audience
+        self.issuer = issuer
+        self.jwt_secret = jwt_secret
+        self.cache_size = max(0, cache_size)
+        self.jwks_ttl = jwks_ttl
+        self.jwks_refresh_cooldown = jwks_refresh_cooldown
+
+        # The key set is cached here rather than inside PyJWKClient, which
+        # refetches on every unknown kid; PyJWKClient only does the fetching.
+        self._jwk_client = jwk_client
+        if self._jwk_client is None and jwks_url:
+            self._jwk_client = PyJWKClient(jwks_url, cache_jwk_set=False)
+        self._signing_keys: Dict[str, Any] = {}
+        self._keys_fetched_at = float("-inf")
+        self._keys_lock = threading.Lock()
+        self.jwks_fetches = 0
+
+        self._verified: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a token verified earlier and not yet expired, without any I/O"""
+        with self._lock:
+            claims = self._verified.get(token)
+            if claims is None:
+                return None
+            if claims["exp"] <= time.time():
+                del self._verified[token]
+                return None
+            self._verified.move_to_end(token)
+            self.hits += 1
+            return claims
+
+    def _remember(self, token: str, claims: Dict[str, Any]) -> None:
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._verified[token] = claims
+            self._verified.move_to_end(token)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+    def _fetch_signing_keys(self) -> None:
+        # Stamped before fetching so a failing endpoint is rate limited too
+        self._keys_fetched_at = time.monotonic()
+        self.jwks_fetches += 1
+        keys = self._jwk_client.get_signing_keys(refresh=True)
+        self._signing_keys = {key.key_id: key.key for key in keys}
+
+    def _signing_key(self, kid: Optional[str]):
+        # Holding the lock across the fetch makes concurrent misses share one request
+        with self._keys_lock:
+            if time.monotonic() - self._keys_fetched_at >= self.jwks_ttl:
+                self._fetch_signing_keys()
+            key = self._signing_keys.get(kid)
+            if key is None and time.monotonic() - self._keys_fetched_at >= self.jwks_refresh_cooldown:
+                # Possibly a key rotation
+                self._fetch_signing_keys()
+                key = self._signing_keys.get(kid)
+        if key is None:
+            raise jwt.InvalidKeyError(f"No signing key matches kid {kid!r}")
+        return key
+
+    def _resolve_key(self, header: Dict[str, Any], algorithm: str):
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            if self._jwk_client is None:
+                raise LocalVerificationUnavailable("No JWKS endpoint configured")
+            return self._signing_key(header.get("kid"))
+
+        if algorithm == "HS256":
+            if not self.jwt_secret:
+                raise LocalVerificationUnavailable("HS256 token but SUPABASE_JWT_SECRET is not set")
+            return self.jwt_secret
+
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the token claims, raising `jwt.InvalidTokenError` if it isn't valid."""
+        cached = self.cached(token)
+        if cached is not None:
+            return cached
+
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        key = self._resolve_key(header, algorithm)
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            issuer=self.issuer,
+            leeway=JWT_LEEWAY_SECONDS,
+            options={"require": ["exp", "sub"], "verify_aud": bool(self.audience)}
+        )
+
+        with self._lock:
+            self.misses += 1
+        self._remember(token, claims)
+        return claims
+
+    def clear(self) -> None:
+        with self._lock:
+            self._verified.clear()
+
+
+token_verifier = TokenVerifier(
+    jwks_url=f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None,
+    issuer=SUPABASE_JWT_ISSUER,
+    jwt_secret=SUPABASE_JWT_SECRET
+)
@@ -0,0 +1,34 @@
+"""
+Telling "that migration isn't applied yet" apart from other database errors.
+
+Several services call an RPC or use a column added by a migration and fall
+back to the older path while it isn't deployed. Only a missing function,
+table or column may take that fallback: a timeout or a 5xx can arrive after the write
+already committed, and redoing it another way would apply it twice.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+# PostgREST's "not in the schema cache" codes and the Postgres ones behind them
+MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+MISSING_TABLE_CODES = {"PGRST205", "42P01"}
+MISSING_COLUMN_CODES = {"PGRST204", "42703"}
+
+
+def error_code(error: BaseException) -> Optional[str]:
+    code = getattr(error, "code", None)
+    return str(code) if code is not None else None
+
+
+def is_missing_function(error: BaseException) -> bool:
+    return error_code(error) in MISSING_FUNCTION_CODES
+
+
+def is_missing_table(error: BaseException) -> bool:
+    return error_code(error) in MISSING_TABLE_CODES
+
+
+def is_missing_column(error: BaseException) -> bool:
+    return error_code(error) in MISSING_COLUMN_CODES
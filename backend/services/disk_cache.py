@@ -0,0 +1,158 @@
+"""
+Size-bounded LRU cache of byte blobs on local disk.
+
+Each entry is one file named after the SHA-256 of its key; the LRU order is
+kept in memory (rebuilt from file mtimes on first use) and evicts the least
+recently used files once the total size exceeds `max_bytes`. Writes go to a
+temp file and are renamed into place, so readers never see partial entries.
+Files removed behind the cache's back (another worker evicting, a cleared
+directory) are treated as misses.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, Optional
+
+
+class DiskLRUCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # file name -> size
+        self._total = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _name(self, key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total += size
+        self._loaded = True
+
+    def _hit(self, name: str, size: int) -> None:
+        with self._lock:
+            self._load()
+            if name not in self._index:
+                self._index[name] = size
+                self._total += size
+            self._index.move_to_end(name)
+            self.stats["hits"] += 1
+
+    def _miss(self, name: str) -> None:
+        with self._lock:
+            self._load()
+            size = self._index.pop(name, None)
+            if size is not None:
+                self._total -= size
+            self.stats["misses"] += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as handle:
+                data = handle.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self._miss(name)
+            return None
+
+        self._hit(name, len(data))
+        return data
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """
+        Open an entry for streaming instead of reading it into memory; the
+        caller closes it. Evicting the entry meanwhile doesn't affect the handle.
+        """
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        try:
+            handle = open(path, "rb")
+            os.utime(path)
+        except FileNotFoundError:
+            self._miss(name)
+            return None
+
+        self._hit(name, os.fstat(handle.fileno()).st_size)
+        return handle
+
+    def _store(self, key: str, write: Callable[[BinaryIO], None]) -> None:
+        name = self._name(key)
+
+        with self._lock:
+            self._load()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                write(handle)
+                size = handle.tell()
+            if size > self.max_bytes:
+                os.unlink(tmp_path)
+                return
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._total += size - self._index.pop(name, 0)
+            self._index[name] = size
+            self.stats["writes"] += 1
+            self._evict()
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        self._store(key, lambda handle: handle.write(data))
+
+    def put_file(self, key: str, source: BinaryIO) -> None:
+        """Copy a file object (from its current position) into the cache"""
+        self._store(key, lambda handle: shutil.copyfileobj(source, handle))
+
+    def delete(self, key: str) -> None:
+        name = self._name(key)
+        with self._lock:
+            self._load()
+            self._total -= self._index.pop(name, 0)
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._index:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            self.stats["evictions"] += 1
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            return {**self.stats, "entries": len(self._index), "bytes": self._total, "max_bytes": self.max_bytes}
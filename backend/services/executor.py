@@ -0,0 +1,70 @@
+"""
+Bounded thread pool for the blocking Supabase/Gemini calls made from async endpoints.
+
+The Supabase (PostgREST/storage) client and the Gemini SDK are synchronous, so
+calling them directly inside an `async def` route freezes the event loop for
+every other request on the worker. Route them through `run_blocking` instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator
+
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the shared pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+_END = object()
+
+
+async def iterate_blocking(func: Callable[..., Iterator[Any]], *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+    """
+    Drive a blocking generator (e.g. a streaming Gemini response) on the shared
+    pool and yield its items as they are produced. If the consumer stops early
+    the generator is closed after the item it is currently producing.
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def pump() -> None:
+        iterator = func(*args, **kwargs)
+        try:
+            for item in iterator:
+                loop.call_soon_threadsafe(items.put_nowait, (item, None))
+                if stop.is_set():
+                    break
+        except BaseException as error:
+            loop.call_soon_threadsafe(items.put_nowait, (_END, error))
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        loop.call_soon_threadsafe(items.put_nowait, (_END, None))
+
+    pumping = loop.run_in_executor(_executor, pump)
+    try:
+        while True:
+            item, error = await items.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        if not pumping.done():
+            pumping.add_done_callback(lambda future: future.exception())
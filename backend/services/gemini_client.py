@@ -0,0 +1,193 @@
+"""
+Per-API-key pool of Gemini clients.
+
+`genai.configure()` swaps process-global state, so two concurrent requests
+with different `x-gemini-api-key` values could end up using each other's key,
+and every call threw away the previous gRPC channel (new TCP + TLS handshake).
+Instead each key gets its own `GenerativeServiceClient`, and requests are
+built with the public `generativelanguage` types rather than through
+`genai.GenerativeModel` (which can only be bound to a client via a private
+attribute). The pool is LRU-bounded and drops clients that have been idle for
+too long; a client evicted while calls are still running on it is closed when
+the last of them finishes.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import google.ai.generativelanguage as glm
+from google.api_core import client_options as client_options_lib
+from PIL import Image
+
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-flash-latest")
+GEMINI_CLIENT_POOL_SIZE = int(os.getenv("GEMINI_CLIENT_POOL_SIZE", "64"))
+GEMINI_CLIENT_IDLE_SECONDS = int(os.getenv("GEMINI_CLIENT_IDLE_SECONDS", "900"))
+
+
+def image_part(image_bytes: bytes) -> glm.Part:
+    """Inline image part with the bytes as uploaded (no re-encoding)"""
+    image_format = Image.open(io.BytesIO(image_bytes)).format
+    return glm.Part(inline_data=glm.Blob(mime_type=Image.MIME.get(image_format, "image/png"), data=image_bytes))
+
+
+def _to_part(item: Any) -> glm.Part:
+    if isinstance(item, glm.Part):
+        return item
+    if isinstance(item, str):
+        return glm.Part(text=item)
+    if isinstance(item, bytes):
+        return image_part(item)
+    raise TypeError(f"Unsupported Gemini content part: {type(item).__name__}")
+
+
+class GeminiResponse:
+    """The bits of a GenerateContentResponse the callers use"""
+
+    def __init__(self, raw: glm.GenerateContentResponse):
+        self.raw = raw
+
+    @property
+    def text(self) -> str:
+        if not self.raw.candidates:
+            block_reason = self.raw.prompt_feedback.block_reason
+            raise ValueError(f"Gemini returned no candidates (block reason: {block_reason.name})")
+        return "".join(part.text for part in self.raw.candidates[0].content.parts)
+
+
+class GeminiModel:
+    """A model name + API key; every call leases that key's pooled client. Safe to share between threads"""
+
+    def __init__(self, pool: "GeminiClientPool", api_key: str, model_name: str):
+        self.pool = pool
+        self.api_key = api_key
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+    def _request(self, contents: Iterable[Any]) -> glm.GenerateContentRequest:
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role="user", parts=[_to_part(item) for item in contents])]
+        )
+
+    def generate_content(self, contents: Iterable[Any], stream: bool = False):
+        """`contents` are prompt strings, image bytes or `glm.Part`s"""
+        request = self._request(contents)
+        if stream:
+            return self._stream(request)
+        with self.pool.lease(self.api_key) as client:
+            return GeminiResponse(client.generate_content(request))
+
+    def _stream(self, request: glm.GenerateContentRequest) -> Iterator[GeminiResponse]:
+        # The lease lasts until the stream is exhausted or closed
+        with self.pool.lease(self.api_key) as client:
+            for chunk in client.stream_generate_content(request):
+                yield GeminiResponse(chunk)
+
+
+class _PooledClient:
+    __slots__ = ("client", "last_used", "in_flight", "retired")
+
+    def __init__(self, client: glm.GenerativeServiceClient, now: float):
+        self.client = client
+        self.last_used = now
+        self.in_flight = 0
+        self.retired = False
+
+
+class GeminiClientPool:
+    def __init__(
+            self,
+            max_clients: int = GEMINI_CLIENT_POOL_SIZE,
+            idle_seconds: int = GEMINI_CLIENT_IDLE_SECONDS,
+            transport: Optional[str] = None,
+            api_endpoint: Optional[str] = None
+    ):
+        self.max_clients = max(1, max_clients)
+        self.idle_seconds = idle_seconds
+        self.transport = transport
+        self.api_endpoint = api_endpoint
+
+        self._entries: "OrderedDict[str, _PooledClient]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.closed = 0
+
+    def _make_client(self, api_key: str) -> glm.GenerativeServiceClient:
+        options = client_options_lib.ClientOptions(api_key=api_key, api_endpoint=self.api_endpoint)
+        return glm.GenerativeServiceClient(transport=self.transport, client_options=options)
+
+    def _close(self, client: glm.GenerativeServiceClient) -> None:
+        try:
+            client.transport.close()
+        except Exception:
+            pass
+        with self._lock:
+            self.closed += 1
+
+    def _evict_idle(self, now: float) -> list:
+        """Drop idle / surplus entries; returns the clients that can be closed right away"""
+        closable = []
+        while self._entries:
+            api_key, entry = next(iter(self._entries.items()))
+            if now - entry.last_used < self.idle_seconds and len(self._entries) <= self.max_clients:
+                break
+            del self._entries[api_key]
+            entry.retired = True
+            self.evicted += 1
+            if not entry.in_flight:
+                closable.append(entry.client)
+        return closable
+
+    @contextmanager
+    def lease(self, api_key: str) -> Iterator[glm.GenerativeServiceClient]:
+        """`api_key`'s client, kept open until the block exits even if it's evicted meanwhile"""
+        if not api_key:
+            raise ValueError("Missing Gemini API key for analysis")
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry is None:
+                entry = self._entries[api_key] = _PooledClient(self._make_client(api_key), now)
+                self.created += 1
+            entry.in_flight += 1
+            entry.last_used = now
+            self._entries.move_to_end(api_key)
+            closable = self._evict_idle(now)
+        for client in closable:
+            self._close(client)
+
+        try:
+            yield entry.client
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+                entry.last_used = time.monotonic()
+                close = entry.retired and not entry.in_flight
+            if close:
+                self._close(entry.client)
+
+    def get_model(self, api_key: str, model_name: str = GEMINI_MODEL_NAME) -> GeminiModel:
+        if not api_key:
+            raise ValueError("Missing Gemini API key for analysis")
+        return GeminiModel(self, api_key, model_name)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "clients": len(self._entries),
+                "in_flight": sum(entry.in_flight for entry in self._entries.values()),
+                "created": self.created,
+                "evicted": self.evicted,
+                "closed": self.closed,
+            }
+
+
+gemini_pool = GeminiClientPool()
@@ -0,0 +1,192 @@
+"""
+Screenshot preprocessing before storage and Gemini.
+
+Phone screenshots arrive at full resolution, often with wide empty margins,
+which wastes upload bandwidth, storage and model input tokens. The pipeline:
+
+1. decode
+2. auto-crop uniform borders
+3. cap the resolution (long edge) without shrinking text below a legible size
+4. drop color when the capture is effectively monochrome
+5. re-encode (WebP, or optimized PNG when WebP isn't available)
+
+Grayscale is only applied to images without real color: test platforms mark
+the correct/wrong option in green/red, and Gemini needs that to fill
+`correct_answer`.
+
+Every stage reports bytes in/out and its duration.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageChops, ImageOps, features
+
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+
+WEBP_SUPPORTED = features.check("webp")
+
+# Settings per profile; question types map onto profiles below
+PREPROCESS_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {"max_long_edge": 1600, "min_short_edge": 720, "grayscale": "auto", "format": "WEBP", "quality": 82},
+    "text": {"max_long_edge": 1400, "min_short_edge": 640, "grayscale": "auto", "format": "WEBP", "quality": 78},
+    "visual": {"max_long_edge": 2048, "min_short_edge": 900, "grayscale": "never", "format": "WEBP", "quality": 88},
+}
+
+QUESTION_TYPE_PROFILES = {
+    "mcq": "text",
+    "passage": "text",
+    "cloze": "text",
+    "arithmetic": "text",
+    "algebra": "text",
+    "geometry": "visual",
+    "non_verbal": "visual",
+    "table_based": "visual",
+}
+
+BORDER_TOLERANCE = 12
+BORDER_PADDING = 8
+COLORFUL_SATURATION = 72  # 0-255 HSV saturation
+COLORFUL_PIXEL_SHARE = 0.002
+
+CONTENT_TYPES = {"WEBP": "image/webp", "PNG": "image/png"}
+EXTENSIONS = {"WEBP": "webp", "PNG": "png"}
+
+
+def get_profile(question_type: Optional[str] = None) -> Dict[str, Any]:
+    return PREPROCESS_PROFILES[QUESTION_TYPE_PROFILES.get((question_type or "").lower(), "default")]
+
+
+def _raw_size(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def _stage(stages: List[Dict[str, Any]], name: str, bytes_in: int, bytes_out: int, started: float) -> None:
+    stages.append({
+        "stage": name,
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+
+def auto_crop(image: Image.Image) -> Image.Image:
+    """Trim borders that have the same color as the top-left pixel"""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background).convert("L")
+    bbox = diff.point(lambda value: 255 if value > BORDER_TOLERANCE else 0).getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    bbox = (
+        max(0, left - BORDER_PADDING),
+        max(0, top - BORDER_PADDING),
+        min(image.width, right + BORDER_PADDING),
+        min(image.height, bottom + BORDER_PADDING),
+    )
+    if bbox == (0, 0, image.width, image.height):
+        return image
+    return image.crop(bbox)
+
+
+def cap_resolution(image: Image.Image, max_long_edge: int, min_short_edge: int) -> Image.Image:
+    long_edge = max(image.size)
+    short_edge = min(image.size)
+    if long_edge <= max_long_edge:
+        return image
+
+    scale = max_long_edge / long_edge
+    # Very tall captures: keep the text column wide enough to stay readable
+    if short_edge * scale < min_short_edge:
+        scale = min(1.0, min_short_edge / short_edge)
+    if scale >= 1.0:
+        return image
+
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS)
+
+
+def is_effectively_grayscale(image: Image.Image) -> bool:
+    if image.mode in ("L", "LA", "1"):
+        return True
+    sample = image.convert("RGB")
+    sample.thumbnail((256, 256))
+    saturation = sample.convert("HSV").getchannel("S")
+    # Look at the most saturated pixels, not the average: a small green tick matters
+    histogram = saturation.histogram()
+    total = sum(histogram)
+    colorful = sum(histogram[COLORFUL_SATURATION:])
+    return colorful <= total * COLORFUL_PIXEL_SHARE
+
+
+def preprocess_screenshot(image_bytes: bytes, question_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns {"bytes", "content_type", "extension", "bytes_in", "bytes_out", "stages"}.
+    Falls back to the original bytes if the image can't be decoded or the
+    re-encoded version isn't smaller.
+    """
+    profile = get_profile(question_type)
+    stages: List[Dict[str, Any]] = []
+    original = {
+        "bytes": image_bytes,
+        "content_type": None,
+        "extension": None,
+        "bytes_in": len(image_bytes),
+        "bytes_out": len(image_bytes),
+        "stages": stages,
+    }
+
+    started = time.perf_counter()
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+    except Exception as decode_error:
+        print(f"   ⚠️  Preprocessing skipped, image could not be decoded: {decode_error}")
+        return original
+    _stage(stages, "decode", len(image_bytes), _raw_size(image), started)
+
+    started = time.perf_counter()
+    before = _raw_size(image)
+    image = auto_crop(image)
+    _stage(stages, "auto_crop", before, _raw_size(image), started)
+
+    started = time.perf_counter()
+    before = _raw_size(image)
+    image = cap_resolution(image, profile["max_long_edge"], profile["min_short_edge"])
+    _stage(stages, "cap_resolution", before, _raw_size(image), started)
+
+    started = time.perf_counter()
+    before = _raw_size(image)
+    if profile["grayscale"] == "always" or (profile["grayscale"] == "auto" and is_effectively_grayscale(image)):
+        image = image.convert("L")
+    _stage(stages, "grayscale", before, _raw_size(image), started)
+
+    started = time.perf_counter()
+    before = _raw_size(image)
+    image_format = profile["format"] if WEBP_SUPPORTED or profile["format"] != "WEBP" else "PNG"
+    buffer = io.BytesIO()
+    if image_format == "WEBP":
+        image.save(buffer, "WEBP", quality=profile["quality"], method=4)
+    else:
+        image.save(buffer, "PNG", optimize=True)
+    encoded = buffer.getvalue()
+    _stage(stages, "encode", before, len(encoded), started)
+
+    if len(encoded) >= len(image_bytes):
+        return original
+
+    return {
+        "bytes": encoded,
+        "content_type": CONTENT_TYPES[image_format],
+        "extension": EXTENSIONS[image_format],
+        "bytes_in": len(image_bytes),
+        "bytes_out": len(encoded),
+        "stages": stages,
+    }
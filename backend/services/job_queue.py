@@ -0,0 +1,240 @@
+"""
+Small in-process job queue with a worker pool, retries and metrics.
+
+Jobs live in memory on the worker process that accepted them; anything that
+must survive a restart (e.g. the question row of an upload) is written to the
+database by the handler itself. Workers are started lazily on the running
+event loop the first time a job is submitted.
+
+Job lifecycle: queued -> running -> done
+                                 \\-> retrying (backoff) -> queued ...
+                                 \\-> dead (retries exhausted, kept in the dead-letter list)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+TERMINAL_STATUSES = ("done", "dead")
+
+
+class JobQueue:
+    def __init__(
+            self,
+            name: str,
+            handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+            workers: int = 4,
+            max_attempts: int = 3,
+            backoff_seconds: float = 2.0,
+            max_backoff_seconds: float = 60.0,
+            job_ttl_seconds: int = 3600
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.job_ttl_seconds = job_ttl_seconds
+
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # The loop only keeps weak references to tasks; pending retries live here
+        self._retry_tasks: Set[asyncio.Task] = set()
+        self._events: Dict[str, asyncio.Event] = {}
+
+        self.dead_letter: Deque[str] = deque(maxlen=200)
+        self._latencies: Deque[float] = deque(maxlen=500)
+        self._counters = {"submitted": 0, "succeeded": 0, "retried": 0, "dead": 0}
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    def _touch(self, job: Dict[str, Any], **changes: Any) -> None:
+        job.update(changes)
+        job["updated_at"] = time.time()
+        event = self._events.pop(job["id"], None)
+        if event is not None:
+            event.set()
+
+    def purge_expired(self) -> None:
+        """Drop finished jobs older than `job_ttl_seconds`, running their `on_expire` hooks"""
+        cutoff = time.time() - self.job_ttl_seconds
+        for job_id in [jid for jid, job in self._jobs.items()
+                       if job["status"] in TERMINAL_STATUSES and job["updated_at"] < cutoff]:
+            job = self._jobs.pop(job_id)
+            event = self._events.pop(job_id, None)
+            if event is not None:
+                event.set()
+            on_expire = job.get("on_expire")
+            if on_expire is not None:
+                try:
+                    on_expire(job)
+                except Exception as cleanup_error:
+                    print(f"⚠️  [{self.name}] cleanup of job {job_id} failed: {cleanup_error}")
+
+    # ---- public API ------------------------------------------------------
+
+    def submit(
+            self,
+            payload: Dict[str, Any],
+            owner: Optional[str] = None,
+            job_id: Optional[str] = None,
+            on_dead: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+            on_expire: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a job; must be called from the event loop.
+        `on_dead` runs when retries are exhausted, `on_expire` when a finished
+        job is dropped after `job_ttl_seconds`.
+        """
+        self.purge_expired()
+        self._ensure_workers()
+
+        job = {
+            "id": job_id or str(uuid.uuid4()),
+            "owner": owner,
+            "status": "queued",
+            "attempts": 0,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "progress": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "updated_at": time.time(),
+            "next_attempt_at": None,
+            "on_dead": on_dead,
+            "on_expire": on_expire,
+        }
+        self._jobs[job["id"]] = job
+        self._counters["submitted"] += 1
+        self._queue.put_nowait(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def jobs_for(self, owner: str) -> List[Dict[str, Any]]:
+        return [job for job in self._jobs.values() if job["owner"] == owner]
+
+    def set_progress(self, job: Dict[str, Any], **progress: Any) -> None:
+        self._touch(job, progress={**(job.get("progress") or {}), **progress})
+
+    async def wait_for_update(self, job_id: str, timeout: float) -> None:
+        """Block until the job changes (or `timeout` seconds pass)"""
+        if job_id not in self._jobs:
+            # Not held by this process: nothing will set an event for it
+            await asyncio.sleep(timeout)
+            return
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def public_view(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "progress": job["progress"],
+            "result": job["result"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "next_attempt_at": job["next_attempt_at"],
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+
+        latencies = sorted(self._latencies)
+        return {
+            "queue": self.name,
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "jobs_by_status": by_status,
+            "dead_letter": list(self.dead_letter),
+            **self._counters,
+            "latency_seconds": {
+                "count": len(latencies),
+                "mean": round(statistics.fmean(latencies), 3) if latencies else None,
+                "p50": round(latencies[len(latencies) // 2], 3) if latencies else None,
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+            },
+        }
+
+    # ---- workers ---------------------------------------------------------
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _requeue_later(self, job_id: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        job = self._jobs.get(job_id)
+        if job is not None and job["status"] == "retrying":
+            self._touch(job, status="queued", next_attempt_at=None)
+            self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue
+
+            job["attempts"] += 1
+            self._touch(job, status="running", started_at=job["started_at"] or time.time())
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                # Interrupted, not failed: put it back for the next worker
+                job["attempts"] -= 1
+                self._touch(job, status="queued")
+                self._queue.put_nowait(job_id)
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                if job["attempts"] < self.max_attempts:
+                    delay = self._backoff(job["attempts"])
+                    self._counters["retried"] += 1
+                    print(f"🔁 [{self.name}] job {job_id} failed (attempt {job['attempts']}): {error}; retry in {delay:.1f}s")
+                    self._touch(job, status="retrying", error=error, next_attempt_at=time.time() + delay)
+                    retry = asyncio.create_task(self._requeue_later(job_id, delay))
+                    self._retry_tasks.add(retry)
+                    retry.add_done_callback(self._retry_tasks.discard)
+                else:
+                    print(f"☠️  [{self.name}] job {job_id} moved to dead letter after {job['attempts']} attempts: {error}")
+                    self._counters["dead"] += 1
+                    self.dead_letter.append(job_id)
+                    self._touch(job, status="dead", error=error, finished_at=time.time())
+                    on_dead = job.get("on_dead")
+                    if on_dead is not None:
+                        try:
+                            await on_dead(job)
+                        except Exception as dead_error:
+                            print(f"⚠️  [{self.name}] dead-letter hook for {job_id} failed: {dead_error}")
+                continue
+
+            finished_at = time.time()
+            self._counters["succeeded"] += 1
+            self._latencies.append(finished_at - job["created_at"])
+            self._touch(job, status="done", result=result, error=None, finished_at=finished_at)
@@ -0,0 +1,216 @@
+"""
+Incremental parser for the JSON object Gemini streams back.
+
+Only the top level is tracked: as soon as a top-level value is complete a
+`field` event is emitted, and string values listed in `stream_keys` also emit
+`delta` events with the decoded text produced so far. Nested values (e.g. the
+`options` array) are buffered and decoded when they close.
+
+The model sometimes writes LaTeX with a single backslash (`\\frac`), which is
+either an invalid escape or silently turns into a form feed. Like
+`parse_json_safely`, backslashes in front of the known LaTeX commands - and in
+front of anything that isn't a JSON escape - are kept literally.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+LATEX_COMMANDS = ('frac', 'sqrt', 'theta', 'alpha', 'beta', 'gamma', 'int', 'sum', 'lim')
+_LOOKAHEAD = max(len(cmd) for cmd in LATEX_COMMANDS)
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_LATEX_FIX = re.compile(r'(?<!\\)\\(' + '|'.join(LATEX_COMMANDS) + r')')
+# The second half of a \u surrogate pair (characters outside the BMP, e.g. emoji), and its prefixes
+_LOW_SURROGATE = re.compile(r'\\u[dD][c-fC-F][0-9a-fA-F]{2}')
+_LOW_SURROGATE_START = re.compile(r'(\\(u([dD]([c-fC-F][0-9a-fA-F]?)?)?)?)?')
+
+
+def _loads_lenient(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return json.loads(_LATEX_FIX.sub(r'\\\\\1', raw))
+
+
+class IncrementalJSONParser:
+    def __init__(self, stream_keys: Iterable[str] = ()):
+        self.stream_keys = set(stream_keys)
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"      # start | key | colon | value | string | raw | after_value | done
+        self._key: Optional[str] = None
+        self._chars: List[str] = []  # decoded chars of the current key/string value
+        self._raw: List[str] = []    # raw text of the current non-string value
+        self._depth = 0
+        self._raw_in_string = False
+        self._raw_escape = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of model output and return the events it completed"""
+        self._buffer += chunk
+        events: List[Dict[str, Any]] = []
+        delta_start = len(self._chars) if self._state == "string" else None
+
+        while self._pos < len(self._buffer) and self._state != "done":
+            char = self._buffer[self._pos]
+            state = self._state
+
+            if state == "start":
+                self._pos += 1
+                if char == "{":
+                    self._state = "key"
+
+            elif state == "key":
+                self._pos += 1
+                if char == '"':
+                    self._chars = []
+                    self._state = "key_string"
+                elif char == "}":
+                    self._state = "done"
+
+            elif state in ("key_string", "string"):
+                if char == '"':
+                    self._pos += 1
+                    text = "".join(self._chars)
+                    if state == "key_string":
+                        self._key = text
+                        self._state = "colon"
+                    else:
+                        if delta_start is not None and self._key in self.stream_keys and len(self._chars) > delta_start:
+                            events.append({"type": "delta", "key": self._key, "text": text[delta_start:]})
+                        delta_start = None
+                        self._emit(events, text)
+                elif char == "\\":
+                    if not self._read_escape():
+                        break
+                else:
+                    self._pos += 1
+                    self._chars.append(char)
+
+            elif state == "colon":
+                self._pos += 1
+                if char == ":":
+                    self._state = "value"
+
+            elif state == "value":
+                if char.isspace():
+                    self._pos += 1
+                elif char == '"':
+                    self._pos += 1
+                    self._chars = []
+                    delta_start = 0
+                    self._state = "string"
+                else:
+                    self._raw, self._depth = [], 0
+                    self._raw_in_string = self._raw_escape = False
+                    self._state = "raw"
+
+            elif state == "raw":
+                if self._raw_in_string:
+                    self._pos += 1
+                    self._raw.append(char)
+                    if self._raw_escape:
+                        self._raw_escape = False
+                    elif char == "\\":
+                        self._raw_escape = True
+                    elif char == '"':
+                        self._raw_in_string = False
+                elif char in ",}" and self._depth == 0:
+                    # Scalar finished; leave the delimiter for after_value
+                    self._emit_raw(events)
+                elif char in "]}":
+                    self._pos += 1
+                    self._raw.append(char)
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._emit_raw(events)
+                else:
+                    self._pos += 1
+                    self._raw.append(char)
+                    if char in "[{":
+                        self._depth += 1
+                    elif char == '"':
+                        self._raw_in_string = True
+
+            elif state == "after_value":
+                self._pos += 1
+                if char == ",":
+                    self._state = "key"
+                elif char == "}":
+                    self._state = "done"
+
+        if self._state == "done":
+            self.done = True
+        elif (self._state == "string" and delta_start is not None and self._key in self.stream_keys
+              and len(self._chars) > delta_start):
+            events.append({"type": "delta", "key": self._key, "text": "".join(self._chars[delta_start:])})
+
+        # Drop consumed input so long responses don't keep growing the buffer
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        return events
+
+    def _read_escape(self) -> bool:
+        """Decode the escape at the cursor; False if more input is needed"""
+        rest = self._buffer[self._pos + 1:self._pos + 2 + _LOOKAHEAD]
+        if not rest:
+            return False
+
+        for cmd in LATEX_COMMANDS:
+            if rest.startswith(cmd):
+                self._chars.append("\\")
+                self._pos += 1
+                return True
+            if cmd.startswith(rest):
+                # Could still become a LaTeX command
+                return False
+
+        escape = rest[0]
+        if escape in _SIMPLE_ESCAPES:
+            self._chars.append(_SIMPLE_ESCAPES[escape])
+            self._pos += 2
+        elif escape == "u":
+            if len(rest) < 5:
+                return False
+            try:
+                code = int(rest[1:5], 16)
+            except ValueError:
+                self._chars.append("\\u")
+                self._pos += 2
+                return True
+            self._pos += 6
+            if 0xD800 <= code < 0xDC00:
+                # Combine with the low surrogate that follows, like json.loads
+                low = self._buffer[self._pos:self._pos + 6]
+                if len(low) < 6 and _LOW_SURROGATE_START.fullmatch(low):
+                    self._pos -= 6
+                    return False
+                if _LOW_SURROGATE.fullmatch(low):
+                    code = 0x10000 + ((code - 0xD800) << 10) + (int(low[2:], 16) - 0xDC00)
+                    self._pos += 6
+            self._chars.append(chr(code))
+        else:
+            # Not a JSON escape: keep the backslash (e.g. \cdot, \angle)
+            self._chars.append("\\")
+            self._pos += 1
+        return True
+
+    def _emit(self, events: List[Dict[str, Any]], value: Any) -> None:
+        self.fields[self._key] = value
+        events.append({"type": "field", "key": self._key, "value": value})
+        self._state = "after_value"
+
+    def _emit_raw(self, events: List[Dict[str, Any]]) -> None:
+        raw = "".join(self._raw).strip()
+        try:
+            value = _loads_lenient(raw)
+        except json.JSONDecodeError:
+            # Leave it to the full-response parse at the end
+            self._state = "after_value"
+            return
+        self._emit(events, value)
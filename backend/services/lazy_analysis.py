@@ -0,0 +1,258 @@
+"""
+Lazy long-form analysis for uploaded questions.
+
+With ANALYSIS_MODE=lazy the upload only runs the structured extraction and
+stores `content.analysis_status = "pending"`. The five-section analysis and
+practice question are generated the first time the question is opened
+(`/question/{id}`) or by the backfill queue, then merged into `content`.
+
+On the master key each generation for a question that wasn't uploaded today
+is metered: a unit is claimed from `lazy_analysis_usage` (per user and UTC
+day) before the Gemini call and released again if it fails.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from backend.services.ai_engine import ANALYSIS_FIELDS, generate_detailed_analysis
+from backend.services.db_errors import is_missing_function
+from backend.services.executor import run_blocking
+from backend.services.job_queue import TERMINAL_STATUSES, JobQueue
+
+ANALYSIS_BACKFILL_WORKERS = int(os.getenv("ANALYSIS_BACKFILL_WORKERS", "2"))
+IMAGE_DOWNLOAD_TIMEOUT_SECONDS = 15
+
+# question id -> event set when the in-flight generation finishes
+_in_flight: Dict[str, threading.Event] = {}
+_in_flight_lock = threading.Lock()
+
+
+def needs_analysis(row: Dict[str, Any]) -> bool:
+    return (row.get("content") or {}).get("analysis_status") == "pending"
+
+
+def keep_existing_analysis(existing_content: Optional[Dict[str, Any]], ai_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Content for a duplicate re-upload: a fresh (pending) extraction must not
+    replace an analysis the row already has, or it would cost another Gemini call.
+    """
+    existing_content = existing_content or {}
+    if ai_data.get("analysis_status") != "pending" or needs_analysis({"content": existing_content}):
+        return ai_data
+    if not existing_content.get("detailed_analysis"):
+        return ai_data
+    return {
+        **ai_data,
+        **{field: existing_content.get(field, "") for field in ANALYSIS_FIELDS},
+        "analysis_status": "complete",
+    }
+
+
+def analysis_day() -> str:
+    """The (UTC) day lazy analyses are metered in, the same day the upload quota counts"""
+    return datetime.utcnow().date().isoformat()
+
+
+def uploaded_today(row: Dict[str, Any]) -> bool:
+    """Today's uploads already counted against the quota: their analysis isn't metered again"""
+    created_at = row.get("created_at")
+    if not created_at:
+        return False
+    created = datetime.fromisoformat(created_at)
+    if created.tzinfo is not None:
+        created = created.astimezone(timezone.utc).replace(tzinfo=None)
+    return created.date().isoformat() == analysis_day()
+
+
+def claim_analyses(supabase_admin, user_id: str, allowance: int, count: int = 1,
+                   day: Optional[str] = None) -> int:
+    """
+    Reserve up to `count` metered analyses without the day's total going over
+    `allowance` (blocking); returns how many were granted. Without the
+    migration nothing is granted: the count can't be kept, so don't spend.
+    """
+    if count <= 0 or allowance <= 0:
+        return 0
+    try:
+        response = supabase_admin.rpc("claim_lazy_analyses", {
+            "p_user_id": user_id,
+            "p_day": day or analysis_day(),
+            "p_limit": allowance,
+            "p_count": count,
+        }).execute()
+    except Exception as e:
+        if not is_missing_function(e):
+            raise
+        print("⚠️  claim_lazy_analyses is missing (apply the migration); not generating metered analyses")
+        return 0
+    return int(response.data or 0)
+
+
+def release_analyses(supabase_admin, user_id: str, day: str, count: int = 1) -> None:
+    """Give back units claimed for analyses that weren't generated (blocking, never raises)"""
+    try:
+        supabase_admin.rpc("release_lazy_analyses", {
+            "p_user_id": user_id,
+            "p_day": day,
+            "p_count": count,
+        }).execute()
+    except Exception as e:
+        print(f"⚠️  Could not release {count} analysis unit(s) of user {user_id}: {e}")
+
+
+def _download_image(image_url: Optional[str]) -> Optional[bytes]:
+    if not image_url or not image_url.startswith("http"):
+        return None
+    try:
+        response = requests.get(image_url, timeout=IMAGE_DOWNLOAD_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.content
+    except Exception as download_error:
+        print(f"   ⚠️  Could not fetch question image, analyzing text only: {download_error}")
+        return None
+
+
+def _fetch_row(supabase_admin, question_id: str) -> Optional[Dict[str, Any]]:
+    response = supabase_admin.table("questions") \
+        .select("*") \
+        .eq("id", question_id) \
+        .execute()
+    return response.data[0] if response.data else None
+
+
+def ensure_detailed_analysis(supabase_admin, row: Dict[str, Any], api_key: Optional[str],
+                             allowance: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Generate and persist the analysis for a pending row (blocking).
+    Concurrent callers for the same question wait for the first one instead of
+    paying for a second Gemini call. With an `allowance` the generation is
+    metered and skipped once the day's analyses reach it. On failure the row
+    is returned unchanged and stays pending.
+    """
+    if not needs_analysis(row):
+        return row
+
+    question_id = row["id"]
+    with _in_flight_lock:
+        event = _in_flight.get(question_id)
+        owner = event is None
+        if owner:
+            event = _in_flight[question_id] = threading.Event()
+
+    if not owner:
+        event.wait(timeout=120)
+        return _fetch_row(supabase_admin, question_id) or row
+
+    claimed_day = None
+    try:
+        if allowance is not None:
+            claimed_day = analysis_day()
+            if not claim_analyses(supabase_admin, row["user_id"], allowance, day=claimed_day):
+                print(f"⚠️  Free daily limit reached, leaving the analysis of {question_id} pending")
+                claimed_day = None
+                return row
+
+        content = row.get("content") or {}
+        result = generate_detailed_analysis(content, _download_image(row.get("image_url")), api_key=api_key)
+        if "error" in result:
+            return row
+
+        updated_content = {**content, **{field: result[field] for field in ANALYSIS_FIELDS}}
+        updated_content["analysis_status"] = "complete"
+
+        # Only fill rows that are still pending (another worker may have won)
+        supabase_admin.table("questions") \
+            .update({"content": updated_content}) \
+            .eq("id", question_id) \
+            .eq("content->>analysis_status", "pending") \
+            .execute()
+
+        print(f"✅ Detailed analysis stored for question: {question_id}")
+        claimed_day = None
+        return {**row, "content": updated_content}
+
+    finally:
+        if claimed_day is not None:
+            release_analyses(supabase_admin, row["user_id"], claimed_day)
+        with _in_flight_lock:
+            _in_flight.pop(question_id, None)
+        event.set()
+
+
+async def _run_backfill_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = job["payload"]
+    supabase_admin = payload["supabase_admin"]
+
+    row = await run_blocking(_fetch_row, supabase_admin, job["id"])
+    if row is None or not needs_analysis(row):
+        await _release_job_unit(job)
+        return {"status": "missing" if row is None else "complete"}
+
+    row = await run_blocking(ensure_detailed_analysis, supabase_admin, row, payload["api_key"])
+    if needs_analysis(row):
+        raise RuntimeError("Detailed analysis could not be generated")
+    payload.pop("api_key", None)
+    return {"status": "complete"}
+
+
+async def _release_job_unit(job: Dict[str, Any]) -> None:
+    """A metered job that generated nothing hands its unit back"""
+    payload = job["payload"]
+    quota_day = payload.pop("quota_day", None)
+    if quota_day is not None:
+        await run_blocking(release_analyses, payload["supabase_admin"], job["owner"], quota_day)
+
+
+analysis_backfill_queue = JobQueue(
+    "analysis-backfill",
+    _run_backfill_job,
+    workers=ANALYSIS_BACKFILL_WORKERS
+)
+
+
+async def enqueue_analysis_backfill(supabase_admin, user_id: str, api_key: str, limit: int = 50,
+                                   allowance: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Queue analysis generation for the user's oldest pending questions.
+    With an `allowance` (master key) the metered ones are claimed up front, so
+    repeated calls can't queue more than the day's quota.
+    """
+    response = await run_blocking(
+        supabase_admin.table("questions")
+        .select("id,created_at")
+        .eq("user_id", user_id)
+        .eq("content->>analysis_status", "pending")
+        .order("created_at")
+        .limit(limit)
+        .execute
+    )
+
+    rows: List[Dict[str, Any]] = []
+    for row in response.data or []:
+        existing = analysis_backfill_queue.get(row["id"])
+        if existing is None or existing["status"] in TERMINAL_STATUSES:
+            rows.append(row)
+
+    quota_day = analysis_day()
+    metered_ids: List[str] = []
+    over_quota = 0
+    if allowance is not None:
+        metered = [row["id"] for row in rows if not uploaded_today(row)]
+        granted = await run_blocking(claim_analyses, supabase_admin, user_id, allowance, len(metered), quota_day)
+        metered_ids, over_quota = metered[:granted], len(metered) - granted
+        rows = [row for row in rows if row["id"] not in metered[granted:]]
+
+    for row in rows:
+        payload = {"supabase_admin": supabase_admin, "api_key": api_key}
+        if row["id"] in metered_ids:
+            payload["quota_day"] = quota_day
+        analysis_backfill_queue.submit(payload, owner=user_id, job_id=row["id"], on_dead=_release_job_unit)
+
+    print(f"🧠 Queued {len(rows)} questions for analysis backfill (user: {user_id}, over quota: {over_quota})")
+    return {"queued": len(rows), "pending_found": len(response.data or []), "over_quota": over_quota}
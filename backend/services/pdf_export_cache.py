@@ -0,0 +1,89 @@
+"""
+Disk cache of rendered revision PDFs.
+
+Re-downloading the same export (another device, a lost file) shouldn't re-run
+the full fetch and ReportLab render. Entries are keyed by the user, the
+normalized filters and options, and the data version returned by
+`fetch_export_version` (a hash of the matching question ids and their
+`updated_at`), so editing, adding or deleting a question produces a new key.
+The key doubles as the response ETag: a client sending it back in
+`If-None-Match` gets a 304 after only the version query.
+
+Bump PDF_LAYOUT_VERSION whenever the rendering changes so stale layouts are
+not served from the cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, BinaryIO, Dict, Optional
+
+from backend.services.disk_cache import DiskLRUCache
+from backend.services.pdf_service import PDF_EXPORT_MAX_QUESTIONS
+
+PDF_EXPORT_CACHE_ENABLED = os.getenv("PDF_EXPORT_CACHE_ENABLED", "true").lower() == "true"
+PDF_EXPORT_CACHE_DIR = os.getenv("PDF_EXPORT_CACHE_DIR", os.path.join(".cache", "pdf_exports"))
+PDF_EXPORT_CACHE_MAX_BYTES = int(os.getenv("PDF_EXPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+PDF_LAYOUT_VERSION = 2
+
+export_cache = DiskLRUCache(PDF_EXPORT_CACHE_DIR, PDF_EXPORT_CACHE_MAX_BYTES)
+
+
+def normalize_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Collapse filter combinations that select the same rows"""
+    subject = filters.get("subject", "all")
+    return {
+        "subject": subject,
+        # The topic is ignored by the query unless a subject is chosen
+        "topic": filters.get("topic", "all") if subject != "all" else "all",
+        "question_source": str(filters.get("question_source", "all")).lower(),
+        "date_range": filters.get("date_range", "all_time"),
+        "quantity": min(max(int(filters.get("quantity", 50)), 1), PDF_EXPORT_MAX_QUESTIONS),
+    }
+
+
+def export_cache_key(user_id: str, filters: Dict[str, Any], options: Dict[str, Any], data_version: str) -> str:
+    payload = json.dumps({
+        "layout": PDF_LAYOUT_VERSION,
+        "user": user_id,
+        "filters": normalize_filters(filters),
+        "options": {key: bool(value) for key, value in options.items()},
+        "data": data_version,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def etag_for(cache_key: str) -> str:
+    return f'"{cache_key}"'
+
+
+def etag_matches(if_none_match: Optional[str], cache_key: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    return any(tag.removeprefix("W/") == etag_for(cache_key) for tag in candidates)
+
+
+def open_cached_export(cache_key: str) -> Optional[BinaryIO]:
+    if not PDF_EXPORT_CACHE_ENABLED:
+        return None
+    return export_cache.open(cache_key)
+
+
+def store_export(cache_key: str, pdf_file: BinaryIO) -> None:
+    """Copy a rendered PDF into the cache and rewind it for streaming"""
+    if not PDF_EXPORT_CACHE_ENABLED:
+        return
+    try:
+        pdf_file.seek(0)
+        export_cache.put_file(cache_key, pdf_file)
+    except OSError as cache_error:
+        print(f"⚠️  Could not cache PDF export: {cache_error}")
+    finally:
+        pdf_file.seek(0)
@@ -0,0 +1,169 @@
+"""
+Background PDF exports.
+
+POST /api/pdf-exports queues a job and returns its id; a small worker pool
+fetches the questions and renders the PDF on the blocking pool while the job
+progress reports `rendered` / `total` questions. The finished file is written
+to PDF_EXPORT_JOB_DIR and served by the download endpoint until the job
+expires (PDF_EXPORT_JOB_TTL_SECONDS after it finished), when it is deleted.
+
+Each user may have at most PDF_EXPORT_MAX_ACTIVE_PER_USER exports queued or
+rendering at once. Exports already in the PDF export cache are copied from it
+instead of being rendered again.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import time
+from typing import Any, Dict, Optional
+
+from backend.services.executor import run_blocking
+from backend.services.job_queue import JobQueue
+from backend.services.pdf_export_cache import export_cache_key, open_cached_export, store_export
+from backend.services.pdf_service import fetch_export_version, fetch_questions_for_export, generate_custom_revision_pdf
+
+PDF_EXPORT_JOB_WORKERS = int(os.getenv("PDF_EXPORT_JOB_WORKERS", "2"))
+PDF_EXPORT_MAX_ACTIVE_PER_USER = int(os.getenv("PDF_EXPORT_MAX_ACTIVE_PER_USER", "2"))
+PDF_EXPORT_JOB_TTL_SECONDS = int(os.getenv("PDF_EXPORT_JOB_TTL_SECONDS", "1800"))
+PDF_EXPORT_JOB_DIR = os.getenv("PDF_EXPORT_JOB_DIR", os.path.join(".cache", "pdf_export_jobs"))
+
+ACTIVE_STATUSES = ("queued", "running", "retrying")
+
+
+class ExportLimitExceeded(Exception):
+    """The user already has the maximum number of exports in progress."""
+
+
+def _artifact_path(job_id: str) -> str:
+    return os.path.join(PDF_EXPORT_JOB_DIR, f"{job_id}.pdf")
+
+
+def _remove_artifact(job: Dict[str, Any]) -> None:
+    try:
+        os.unlink(_artifact_path(job["id"]))
+    except FileNotFoundError:
+        pass
+
+
+def _render_export(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    """Blocking part of an export job: fetch, render (or copy from cache) and write the artifact"""
+    payload = job["payload"]
+    supabase_admin, user_id = payload["supabase_admin"], job["owner"]
+    filters, options = payload["filters"], payload["options"]
+
+    cache_key = None
+    question_count = None
+    try:
+        data_version, question_count = fetch_export_version(supabase_admin, user_id, filters)
+        cache_key = export_cache_key(user_id, filters, options, data_version)
+    except Exception as version_error:
+        print(f"⚠️  PDF export cache bypassed: {version_error}")
+
+    os.makedirs(PDF_EXPORT_JOB_DIR, exist_ok=True)
+    path = _artifact_path(job["id"])
+    tmp_path = f"{path}.part"
+
+    cached = open_cached_export(cache_key) if cache_key is not None else None
+    try:
+        with open(tmp_path, "wb") as artifact:
+            if cached is not None:
+                with cached:
+                    shutil.copyfileobj(cached, artifact)
+            else:
+                report_progress(stage="fetching")
+                questions = fetch_questions_for_export(supabase_admin, user_id, filters, options)
+                question_count = len(questions)
+                report_progress(stage="rendering", rendered=0, total=question_count)
+                generate_custom_revision_pdf(
+                    questions,
+                    options,
+                    output=artifact,
+                    progress=lambda rendered, total: report_progress(rendered=rendered, total=total)
+                )
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if cached is None and cache_key is not None:
+        with open(path, "rb") as artifact:
+            store_export(cache_key, artifact)
+
+    return {"size_bytes": os.path.getsize(path), "question_count": question_count, "cached": cached is not None}
+
+
+async def _run_export_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+
+    def report_progress(**progress: Any) -> None:
+        # Called from the rendering thread; job state is only touched on the loop
+        loop.call_soon_threadsafe(lambda: export_queue.set_progress(job, **progress))
+
+    started = time.perf_counter()
+    result = await run_blocking(_render_export, job, report_progress)
+    export_queue.set_progress(job, stage="done")
+    print(f"📄 PDF export {job['id']} ready in {time.perf_counter() - started:.1f}s "
+          f"({result['size_bytes']} bytes{', from cache' if result['cached'] else ''})")
+    return result
+
+
+async def _export_failed(job: Dict[str, Any]) -> None:
+    _remove_artifact(job)
+
+
+def _remove_stale_artifacts() -> None:
+    """Delete expired artifacts whose jobs are gone (e.g. left behind by a restarted process)"""
+    if not os.path.isdir(PDF_EXPORT_JOB_DIR):
+        return
+    cutoff = time.time() - PDF_EXPORT_JOB_TTL_SECONDS
+    for entry in os.scandir(PDF_EXPORT_JOB_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+export_queue = JobQueue(
+    "pdf-export",
+    _run_export_job,
+    workers=PDF_EXPORT_JOB_WORKERS,
+    max_attempts=2,
+    job_ttl_seconds=PDF_EXPORT_JOB_TTL_SECONDS
+)
+
+
+def submit_export(supabase_admin, user_id: str, filters: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Queue an export for the user; must be called from the event loop"""
+    export_queue.purge_expired()
+    _remove_stale_artifacts()
+    active = [job for job in export_queue.jobs_for(user_id) if job["status"] in ACTIVE_STATUSES]
+    if len(active) >= PDF_EXPORT_MAX_ACTIVE_PER_USER:
+        raise ExportLimitExceeded()
+
+    job = export_queue.submit(
+        {"supabase_admin": supabase_admin, "filters": filters, "options": options},
+        owner=user_id,
+        on_dead=_export_failed,
+        on_expire=_remove_artifact
+    )
+    return export_queue.public_view(job)
+
+
+def get_export_job(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    export_queue.purge_expired()
+    job = export_queue.get(job_id)
+    if job is None or job["owner"] != user_id:
+        return None
+    return job
+
+
+def export_artifact_path(job: Dict[str, Any]) -> Optional[str]:
+    path = _artifact_path(job["id"])
+    return path if job["status"] == "done" and os.path.exists(path) else None
@@ -1,74 +1,225 @@
 from __future__ import annotations
 
+import hashlib
 import io
+import os
 import re
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Without pypdf every export renders on a single canvas
+    PdfReader = PdfWriter = None
+
+from backend.services.disk_cache import DiskLRUCache
+from backend.services.text_layout import block_height, fit_with_ellipsis, text_width, wrap_text
+
 MAX_IMAGE_WIDTH = 400
 PAGE_WIDTH, PAGE_HEIGHT = A4
 MARGIN_X = 50
 TOP_MARGIN = 60
 BOTTOM_MARGIN = 50
 LINE_HEIGHT = 16
-
-
+BOX_PADDING = 30
+SOLUTION_BOX_HEIGHT = 55
+NOTES_MAX_LINES = 2
+# Minimum analysis lines kept on the page with the rest of the question
+ANALYSIS_MIN_LINES = 3
+PENDING_ANALYSIS_TEXT = "Detailed analysis not generated yet. Open this question in the app to generate it."
+
+IMAGE_FETCH_WORKERS = int(os.getenv("PDF_IMAGE_FETCH_WORKERS", "8"))
+IMAGE_FETCH_TIMEOUT_SECONDS = 8
+PDF_IMAGE_CACHE_DIR = os.getenv("PDF_IMAGE_CACHE_DIR", os.path.join(".cache", "pdf_images"))
+PDF_IMAGE_CACHE_MAX_BYTES = int(os.getenv("PDF_IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Resized thumbnails keyed by width + URL: repeat exports make no network calls
+image_cache = DiskLRUCache(PDF_IMAGE_CACHE_DIR, PDF_IMAGE_CACHE_MAX_BYTES)
+
+# Rendered PDFs stay in memory up to this size, then spill to a temp file
+PDF_SPOOL_MAX_MEMORY = int(os.getenv("PDF_SPOOL_MAX_MEMORY", str(4 * 1024 * 1024)))
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Large exports are split at page boundaries and rendered in worker processes
+PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_QUESTIONS = int(os.getenv("PDF_PARALLEL_MIN_QUESTIONS", "150"))
+PDF_PARALLEL_MIN_PART_SIZE = 25
+
+PDF_TITLE = "SSC Smart Tracker - Revision Export"
+
+PDF_EXPORT_MAX_QUESTIONS = int(os.getenv("PDF_EXPORT_MAX_QUESTIONS", "500"))
+# Rows per keyset page when fetching an export (stays under PostgREST's max-rows)
+PDF_EXPORT_PAGE_SIZE = int(os.getenv("PDF_EXPORT_PAGE_SIZE", "250"))
+
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_FETCH_WORKERS, thread_name_prefix="pdf-images")
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+_render_pool: Optional[ProcessPoolExecutor] = None
+_render_pool_lock = threading.Lock()
+
+
+# Commands rendered as a single symbol
+LATEX_SYMBOLS = {
+    'sqrt': '√',
+    'circ': '°',
+    'times': '×',
+    'div': '÷',
+    'pm': '±',
+    'leq': '≤',
+    'le': '≤',
+    'geq': '≥',
+    'ge': '≥',
+    'neq': '≠',
+    'ne': '≠',
+    'approx': '≈',
+    'alpha': 'α',
+    'beta': 'β',
+    'gamma': 'γ',
+    'theta': 'θ',
+    'pi': 'π',
+    'Delta': 'Δ',
+    'cdot': '·',
+    'angle': '∠',
+    'triangle': '△',
+    'infty': '∞',
+    'degree': '°',
+}
+
+# Commands that only change formatting: keep their argument, drop the command
+LATEX_WRAPPERS = {'text', 'textbf', 'textit', 'mathrm', 'mathbf', 'mathit', 'operatorname', 'boxed', 'overline'}
+
+# Sizing/spacing commands that produce nothing (or a space)
+LATEX_SPACING = {'left': '', 'right': '', 'displaystyle': '', 'quad': ' ', 'qquad': ' ', ',': ' ', ';': ' ',
+                 ':': ' ', '!': '', ' ': ' ', '\\': ' '}
+
+# One pass over the text: plain runs, $$ before $, \sqrt[n], commands, escaped chars, braces
+_LATEX_TOKEN = re.compile(r'[^\\${}]+|\$\$?|\\sqrt\[[^\]]*\]|\\[a-zA-Z]+|\\.|[{}]', re.S)
+_COMPOUND = re.compile(r'[\s+\-/×÷·]')
+_FRACTIONS = {"frac", "dfrac", "tfrac"}
+_DROPPED = {"$", "$$", "}"}
+
+
+def _grouped(value: str) -> str:
+    value = value.strip()
+    return f"({value})" if _COMPOUND.search(value) else value
+
+
+def _latex_arguments(tokens, count: int):
+    """
+    Read `count` arguments ({...} groups, single commands or single characters).
+    Returns (arguments, leftover plain text that follows them).
+    """
+    arguments: List[str] = []
+    leftover = ""
+    while len(arguments) < count:
+        if leftover:
+            stripped = leftover.lstrip()
+            leftover = stripped[1:]
+            if stripped:
+                arguments.append(stripped[0])
+                continue
+
+        token = next(tokens, None)
+        if token is None:
+            arguments.append("")
+        elif token == "{":
+            arguments.append(_translate_latex(tokens, "}"))
+        elif token[0] == "\\":
+            arguments.append(_translate_command(token, tokens))
+        elif token not in _DROPPED:
+            # Plain text: \frac12 -> 1/2, only the first character is an argument
+            leftover = token
+    return arguments, leftover
+
+
+def _translate_command(token: str, tokens) -> str:
+    command = token[1:]
+    if not command.isalpha():
+        if command.startswith("sqrt["):
+            (radicand,), leftover = _latex_arguments(tokens, 1)
+            return f"{command[5:-1]}√{_grouped(radicand)}{leftover}"
+        # \% -> %, \$ -> $, \, -> space
+        return LATEX_SPACING.get(command, command)
+    if command in _FRACTIONS:
+        (numerator, denominator), leftover = _latex_arguments(tokens, 2)
+        return f"{_grouped(numerator)}/{_grouped(denominator)}{leftover}"
+    if command == "sqrt":
+        (radicand,), leftover = _latex_arguments(tokens, 1)
+        return f"√{_grouped(radicand)}{leftover}"
+    if command in LATEX_WRAPPERS:
+        (argument,), leftover = _latex_arguments(tokens, 1)
+        return argument + leftover
+    if command in LATEX_SPACING:
+        return LATEX_SPACING[command]
+    # Unknown commands keep their name, as before
+    return LATEX_SYMBOLS.get(command, command)
+
+
+def _translate_latex(tokens, until: str | None = None) -> str:
+    """Translate tokens up to the closing `until` brace (recursive for nested groups)"""
+    out: List[str] = []
+    append = out.append
+    for token in tokens:
+        first = token[0]
+        if first == "\\":
+            append(_translate_command(token, tokens))
+        elif first == "$" or first == "}":
+            # Math delimiters and stray braces are dropped
+            if token == until:
+                break
+        elif first == "{":
+            append(_translate_latex(tokens, "}"))
+        else:
+            append(token)
+    return "".join(out)
+
+
+def _flat_latex(tokens) -> str:
+    """Nesting too deep to translate: map symbols and drop braces/delimiters, no arguments"""
+    out: List[str] = []
+    for token in tokens:
+        if token[0] == "\\":
+            command = token[1:]
+            if command.startswith("sqrt["):
+                out.append(f"{command[5:-1]}√")
+            elif command == "sqrt":
+                out.append("√")
+            elif command not in _FRACTIONS and command not in LATEX_WRAPPERS:
+                out.append(LATEX_SPACING.get(command, LATEX_SYMBOLS.get(command, command)))
+        elif token not in _DROPPED and token != "{":
+            out.append(token)
+    return "".join(out)
+
+
+@lru_cache(maxsize=4096)
 def strip_latex(text: str) -> str:
     """Remove LaTeX formatting and convert to readable text"""
     if not text:
         return ""
 
-    # Convert common LaTeX symbols
-    replacements = {
-        r'\sqrt': '√',
-        r'\circ': '°',
-        r'\times': '×',
-        r'\div': '÷',
-        r'\pm': '±',
-        r'\leq': '≤',
-        r'\geq': '≥',
-        r'\neq': '≠',
-        r'\approx': '≈',
-        r'\alpha': 'α',
-        r'\beta': 'β',
-        r'\gamma': 'γ',
-        r'\theta': 'θ',
-        r'\pi': 'π',
-        r'\Delta': 'Δ',
-    }
-
-    result = text
-
-    # Replace LaTeX commands with symbols
-    for latex, symbol in replacements.items():
-        result = result.replace(latex, symbol)
-
-    # Remove $...$ inline math delimiters but keep content
-    result = re.sub(r'\$([^$]+)\$', r'\1', result)
-
-    # Remove $$...$$ display math delimiters
-    result = re.sub(r'\$\$([^$]+)\$\$', r'\1', result)
-
-    # Remove \frac{a}{b} and replace with a/b
-    result = re.sub(r'\\frac\{([^}]+)\}\{([^}]+)\}', r'\1/\2', result)
-
-    # Remove remaining backslashes (but not in common text)
-    result = re.sub(r'\\([a-zA-Z]+)', r'\1', result)
-
-    # Remove curly braces
-    result = result.replace('{', '').replace('}', '')
+    tokens = _LATEX_TOKEN.findall(text)
+    try:
+        result = _translate_latex(iter(tokens))
+    except RecursionError:
+        # Groups/fractions nested hundreds deep (OCR garbage): keep the text, lose the structure
+        result = _flat_latex(tokens)
 
     # Clean up extra spaces
-    result = re.sub(r'\s+', ' ', result).strip()
-
-    return result
+    return " ".join(result.split())
 
 
 def parse_date_range(date_range: str) -> str | None:
@@ -80,18 +231,37 @@ def parse_date_range(date_range: str) -> str | None:
     return None
 
 
-def fetch_questions_for_export(supabase_admin, user_id: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _export_quantity(filters: Dict[str, Any]) -> int:
+    return min(max(int(filters.get("quantity", 50)), 1), PDF_EXPORT_MAX_QUESTIONS)
+
+
+def _export_columns(options: Dict[str, Any]) -> str:
+    """Only what the renderer draws with these options; `content` is reduced to the keys it uses"""
+    columns = ["id", "created_at", "question_text", "options", "image_url"]
+    if options.get("include_solution") or options.get("include_answer_key"):
+        columns.append("correct_option")
+    if options.get("include_solution"):
+        columns.append("explanation:content->>explanation")
+    if options.get("include_ai_analysis"):
+        columns.append("detailed_analysis:content->>detailed_analysis")
+        columns.append("analysis_status:content->>analysis_status")
+    if options.get("include_user_notes"):
+        columns.append("manual_notes")
+    return ",".join(columns)
+
+
+def _export_query(supabase_admin, user_id: str, filters: Dict[str, Any], columns: str, cursor: Tuple[str, str] | None):
     subject = filters.get("subject", "all")
     topic = filters.get("topic", "all")
-    source = filters.get("question_source", "all")
+    source = str(filters.get("question_source", "all")).lower()
     date_range = filters.get("date_range", "all_time")
-    quantity = min(max(int(filters.get("quantity", 50)), 1), 500)
 
     query = (
         supabase_admin.table("questions")
-        .select("id,question_text,image_url,options,correct_option,content,manual_notes,subject,topic,created_at")
+        .select(columns)
         .eq("user_id", user_id)
         .order("created_at", desc=True)
+        .order("id", desc=True)
     )
 
     if subject != "all":
@@ -104,377 +274,588 @@ def fetch_questions_for_export(supabase_admin, user_id: str, filters: Dict[str,
     if date_threshold:
         query = query.gte("created_at", date_threshold)
 
-    response = query.limit(quantity).execute()
-    questions = response.data or []
-
-    # Source filtering based on image presence (heuristic)
-    if source != "all":
-        source_key = source.lower()
-
-        def matches_source(question: Dict[str, Any]) -> bool:
-            # Heuristic: questions with images are likely manual uploads
-            # questions without images might be from other sources
-            has_image = bool(question.get("image_url"))
-            if source_key == "manual_uploads":
-                return has_image
-            if source_key == "mock_tests":
-                return not has_image
-            return True
-
-        questions = [q for q in questions if matches_source(q)]
+    # Source heuristic: manual uploads have a screenshot, mock test questions don't
+    if source == "manual_uploads":
+        query = query.not_.is_("image_url", "null").neq("image_url", "")
+    elif source == "mock_tests":
+        query = query.or_("image_url.is.null,image_url.eq.")
+
+    if cursor is not None:
+        # Keyset: rows strictly after the last one seen in (created_at, id) order
+        created_at, question_id = cursor
+        query = query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{question_id}")'
+        )
 
-    return questions[:quantity]
+    return query
 
 
-def _draw_wrapped_text(
+def _fetch_export_rows(supabase_admin, user_id: str, filters: Dict[str, Any], columns: str) -> List[Dict[str, Any]]:
+    """All matching rows up to the requested quantity, fetched in keyset-paginated pages"""
+    quantity = _export_quantity(filters)
+    rows: List[Dict[str, Any]] = []
+    cursor = None
+    while len(rows) < quantity:
+        page_size = min(PDF_EXPORT_PAGE_SIZE, quantity - len(rows))
+        response = _export_query(supabase_admin, user_id, filters, columns, cursor).limit(page_size).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+        cursor = (page[-1]["created_at"], page[-1]["id"])
+    return rows
+
+
+def fetch_questions_for_export(
+        supabase_admin,
+        user_id: str,
+        filters: Dict[str, Any],
+        options: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    questions = _fetch_export_rows(supabase_admin, user_id, filters, _export_columns(options))
+    for question in questions:
+        question["content"] = {
+            key: question.pop(key) for key in ("explanation", "detailed_analysis", "analysis_status") if key in question
+        }
+    return questions
+
+
+def fetch_export_version(supabase_admin, user_id: str, filters: Dict[str, Any]) -> Tuple[str, int]:
+    """
+    Cheap fingerprint of the rows an export would contain: the same query,
+    projected to ids and `updated_at`. Any edit, addition or removal changes it.
+    Returns the version and the number of questions.
+    """
+    rows = _fetch_export_rows(supabase_admin, user_id, filters, "id,created_at,updated_at")
+
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(f"{row['id']}:{row.get('updated_at')}\n".encode())
+    return digest.hexdigest(), len(rows)
+
+
+def _draw_lines(
         pdf: canvas.Canvas,
-        text: str,
+        lines: List[str],
         x: float,
         y: float,
-        max_width: float,
         font_name: str = "Helvetica",
         font_size: int = 11
 ) -> float:
-    """Draw text with proper word wrapping"""
+    """Draw pre-wrapped lines, continuing on a new page at the bottom margin"""
     pdf.setFont(font_name, font_size)
-
-    # Strip LaTeX before rendering
-    clean_text = strip_latex(text or "")
-
-    words = clean_text.split()
-    if not words:
+    if not lines:
         return y - LINE_HEIGHT
 
-    line = ""
-    for word in words:
-        test_line = f"{line} {word}".strip()
-        if pdf.stringWidth(test_line, font_name, font_size) <= max_width:
-            line = test_line
-        else:
-            if line:  # Draw the current line
-                pdf.drawString(x, y, line)
-                y -= LINE_HEIGHT
-            line = word
-
-            # If single word is too long, break it
-            while pdf.stringWidth(line, font_name, font_size) > max_width:
-                # Find how many chars fit
-                for i in range(len(line), 0, -1):
-                    if pdf.stringWidth(line[:i], font_name, font_size) <= max_width:
-                        pdf.drawString(x, y, line[:i])
-                        y -= LINE_HEIGHT
-                        line = line[i:]
-                        break
-
-    # Draw remaining text
-    if line:
+    for line in lines:
+        if y < BOTTOM_MARGIN:
+            pdf.showPage()
+            y = PAGE_HEIGHT - TOP_MARGIN
+            pdf.setFont(font_name, font_size)
         pdf.drawString(x, y, line)
         y -= LINE_HEIGHT
+    return y
 
+
+def _ensure_space(pdf: canvas.Canvas, y: float, height: float) -> float:
+    """Start a new page unless `height` fits above the bottom margin (or we're already at the top)"""
+    if y - height < BOTTOM_MARGIN and y < PAGE_HEIGHT - TOP_MARGIN:
+        pdf.showPage()
+        return PAGE_HEIGHT - TOP_MARGIN
     return y
 
 
-def _draw_wrapped_text_in_box(
-        pdf: canvas.Canvas,
-        text: str,
-        x: float,
-        y: float,
-        box_width: float,
-        max_lines: int = 5,
-        font_name: str = "Helvetica",
-        font_size: int = 9
-) -> float:
-    """Draw text wrapped within a box with line limit"""
-    pdf.setFont(font_name, font_size)
+def _box_height(line_count: int) -> float:
+    # Title at 20pt, first text line at 35pt below the top, ~11pt padding under the last
+    return BOX_PADDING + line_count * LINE_HEIGHT
 
-    # Strip LaTeX
-    clean_text = strip_latex(text or "")
 
-    words = clean_text.split()
-    if not words:
-        return y - LINE_HEIGHT
+def _option_text(option: Any) -> str:
+    # Handle both string options and dict options with 'text' field
+    if isinstance(option, str):
+        return option
+    if isinstance(option, dict):
+        return option.get("text") or ""
+    return str(option)
 
-    lines_drawn = 0
-    line = ""
-    current_y = y
-
-    for word in words:
-        if lines_drawn >= max_lines:
-            # Add ellipsis to last line
-            if line:
-                # Truncate to fit ellipsis
-                while pdf.stringWidth(line + "...", font_name, font_size) > box_width and len(line) > 0:
-                    line = line[:-1]
-                pdf.drawString(x, current_y, line + "...")
-            break
 
-        test_line = f"{line} {word}".strip()
-        if pdf.stringWidth(test_line, font_name, font_size) <= box_width:
-            line = test_line
-        else:
-            if line:
-                pdf.drawString(x, current_y, line)
-                current_y -= LINE_HEIGHT
-                lines_drawn += 1
-            line = word
+def _layout_question(question: Dict[str, Any], options: Dict[str, Any], image: Image.Image | None) -> Dict[str, Any]:
+    """
+    Wrap every text block of a question once (LaTeX stripped). Heights are
+    computed from the same lines that get drawn, so pagination is exact.
+    """
+    content_width = PAGE_WIDTH - (2 * MARGIN_X)
+    box_text_width = content_width - 16
+
+    question_lines = wrap_text(strip_latex(question.get("question_text") or ""), content_width, "Helvetica", 11)
+    option_lines = [
+        wrap_text(strip_latex(f"{chr(65 + idx)}. {_option_text(option)}"), content_width - 10, "Helvetica", 11)
+        for idx, option in enumerate(question.get("options") or [])
+    ]
+
+    explanation_line = None
+    if options.get("include_solution"):
+        content = question.get("content", {})
+        explanation = content.get("explanation", "") if isinstance(content, dict) else ""
+        explanation_line = f"Explanation: {strip_latex(explanation or 'Not available')}"
+        if text_width(explanation_line, "Helvetica", 10) > box_text_width:
+            explanation_line = fit_with_ellipsis(explanation_line, box_text_width, "Helvetica", 10)
 
-    # Draw remaining line if within limit
-    if line and lines_drawn < max_lines:
-        pdf.drawString(x, current_y, line)
-        current_y -= LINE_HEIGHT
+    notes_lines = None
+    if options.get("include_user_notes") and question.get("manual_notes"):
+        notes_lines = wrap_text(strip_latex(str(question.get("manual_notes"))), box_text_width, "Helvetica", 9)
+        if len(notes_lines) > NOTES_MAX_LINES:
+            notes_lines = notes_lines[:NOTES_MAX_LINES]
+            notes_lines[-1] = fit_with_ellipsis(notes_lines[-1], box_text_width, "Helvetica", 9)
 
-    return current_y
+    analysis_lines: List[str] = []
+    if options.get("include_ai_analysis"):
+        content = question.get("content")
+        analysis = content.get("detailed_analysis") if isinstance(content, dict) else None
+        if isinstance(content, dict) and content.get("analysis_status") == "pending":
+            # Uploaded in lazy mode and never opened: say so instead of printing nothing
+            analysis = PENDING_ANALYSIS_TEXT
+        if analysis:
+            analysis_lines = wrap_text(strip_latex(str(analysis)), box_text_width, "Helvetica", 9)
+
+    # Everything above the analysis box
+    body_height = 20 + block_height(question_lines, LINE_HEIGHT) + 8
+    if image is not None:
+        body_height += image.height + 12
+    body_height += sum(block_height(lines, LINE_HEIGHT) for lines in option_lines)
+    if explanation_line is not None:
+        body_height += SOLUTION_BOX_HEIGHT + 10
+    if notes_lines is not None:
+        body_height += _box_height(len(notes_lines)) + 10
+
+    return {
+        "question_lines": question_lines,
+        "option_lines": option_lines,
+        "explanation_line": explanation_line,
+        "notes_lines": notes_lines,
+        "analysis_lines": analysis_lines,
+        "body_height": body_height,
+    }
 
 
-def _download_and_resize_image(image_url: str) -> Image.Image | None:
-    if not image_url:
-        return None
+def _required_height(layout: Dict[str, Any]) -> float:
+    """Space to keep together on one page: the whole question if it fits a page, else its start"""
+    analysis_count = len(layout["analysis_lines"])
+    full = layout["body_height"] + 15
+    start = layout["body_height"]
+    if analysis_count:
+        full += _box_height(analysis_count) + 10
+        start += _box_height(min(analysis_count, ANALYSIS_MIN_LINES)) + 10
+    return full if full <= PAGE_HEIGHT - TOP_MARGIN - BOTTOM_MARGIN else start
+
+
+def _get_http_session() -> requests.Session:
+    # One pooled session: keep-alive connections to the storage host are reused
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_FETCH_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def _fetch_thumbnail(image_url: str, width: int = MAX_IMAGE_WIDTH) -> bytes | None:
+    """Download, decode and resize one image; returns the encoded thumbnail (runs on the image pool)"""
+    cache_key = f"{width}:{image_url}"
+    cached = image_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        response = requests.get(image_url, timeout=8)
+        response = _get_http_session().get(image_url, timeout=IMAGE_FETCH_TIMEOUT_SECONDS)
         response.raise_for_status()
         image = Image.open(io.BytesIO(response.content))
         image = image.convert("RGB")
-        if image.width > MAX_IMAGE_WIDTH:
-            ratio = MAX_IMAGE_WIDTH / float(image.width)
+        if image.width > width:
+            ratio = width / float(image.width)
             resized_height = int(image.height * ratio)
-            image = image.resize((MAX_IMAGE_WIDTH, resized_height), Image.Resampling.LANCZOS)
-        return image
+            image = image.resize((width, resized_height), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG", compress_level=3)
+        thumbnail = buffer.getvalue()
     except Exception:
         return None
 
+    try:
+        image_cache.put(cache_key, thumbnail)
+    except OSError as cache_error:
+        print(f"⚠️  Could not cache PDF image: {cache_error}")
+    return thumbnail
 
-def _estimate_question_height(pdf: canvas.Canvas, question: Dict[str, Any], options: Dict[str, Any]) -> float:
-    width = PAGE_WIDTH - (2 * MARGIN_X)
-    height = 40
 
-    # Question text
-    text = strip_latex(question.get("question_text") or "")
-    height += max(2, len(text) // 80 + 1) * LINE_HEIGHT
+def prefetch_images(questions: List[Dict[str, Any]]) -> Dict[str, Future]:
+    """Start fetching every question image concurrently; url -> future of the thumbnail bytes"""
+    futures: Dict[str, Future] = {}
+    for question in questions:
+        image_url = question.get("image_url")
+        if image_url and image_url not in futures:
+            futures[image_url] = _image_executor.submit(_fetch_thumbnail, image_url)
+    return futures
 
-    # Options
-    option_list = question.get("options") or []
-    height += max(2, len(option_list)) * LINE_HEIGHT * 2
+
+def _download_and_resize_image(image_url: str, prefetched: Dict[str, Future] | None = None) -> Image.Image | None:
+    if not image_url:
+        return None
+
+    # Popped so thumbnails can be freed as the render loop moves on
+    future = prefetched.pop(image_url, None) if prefetched else None
+    thumbnail = future.result() if future is not None else _fetch_thumbnail(image_url)
+    return _open_thumbnail(thumbnail)
+
+
+def _open_thumbnail(thumbnail: bytes | None) -> Image.Image | None:
+    if thumbnail is None:
+        return None
+    try:
+        return Image.open(io.BytesIO(thumbnail))
+    except Exception:
+        return None
+
+
+def _draw_title(pdf: canvas.Canvas) -> float:
+    y = PAGE_HEIGHT - TOP_MARGIN
+    pdf.setTitle(PDF_TITLE)
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawString(MARGIN_X, y, "SSC Smart Tracker - Custom Revision PDF")
+    return y - 30
+
+
+def _draw_question(
+        pdf: canvas.Canvas,
+        index: int,
+        question: Dict[str, Any],
+        image: Image.Image | None,
+        layout: Dict[str, Any],
+        y: float
+) -> float:
+    # Question number
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(MARGIN_X, y, f"Q{index}.")
+    y -= 20
+
+    # Question text (LaTeX stripped)
+    y = _draw_lines(pdf, layout["question_lines"], MARGIN_X, y)
+    y -= 8
 
     # Image
-    if question.get("image_url"):
-        height += 180
+    if image:
+        y = _ensure_space(pdf, y, image.height + 12)
+        x = (PAGE_WIDTH - image.width) / 2
+        pdf.drawImage(
+            ImageReader(image),
+            x,
+            y - image.height,
+            width=image.width,
+            height=image.height,
+            preserveAspectRatio=True,
+            mask='auto'
+        )
+        y -= image.height + 12
 
-    # Solution box
-    if options.get("include_solution"):
-        height += 80
-    elif options.get("include_answer_key"):
-        height += 10
+    # Options (LaTeX stripped)
+    for lines in layout["option_lines"]:
+        y = _draw_lines(pdf, lines, MARGIN_X + 10, y)
 
-    # Notes box
-    if options.get("include_user_notes") and question.get("manual_notes"):
-        height += 70
+    # Solution box
+    if layout["explanation_line"] is not None:
+        box_height = SOLUTION_BOX_HEIGHT
+        box_top = y = _ensure_space(pdf, y, box_height)
+        pdf.setFillColorRGB(0.95, 0.97, 1)
+        pdf.rect(MARGIN_X, box_top - box_height, PAGE_WIDTH - (2 * MARGIN_X), box_height, fill=1, stroke=0)
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(MARGIN_X + 8, box_top - 20, f"Correct Option: {question.get('correct_option') or 'N/A'}")
+        pdf.setFont("Helvetica", 10)
+        pdf.drawString(MARGIN_X + 8, box_top - 36, layout["explanation_line"])
+        y -= (box_height + 10)
+
+    # User notes box
+    if layout["notes_lines"] is not None:
+        box_height = _box_height(len(layout["notes_lines"]))
+        box_top = y = _ensure_space(pdf, y, box_height)
+        pdf.setFillColorRGB(1, 0.98, 0.75)
+        pdf.rect(MARGIN_X, box_top - box_height, PAGE_WIDTH - (2 * MARGIN_X), box_height, fill=1, stroke=0)
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(MARGIN_X + 8, box_top - 20, "My Notes")
+        _draw_lines(pdf, layout["notes_lines"], MARGIN_X + 8, box_top - 35, "Helvetica", 9)
+        y = box_top - box_height - 10
+
+    # AI analysis box (FULL analysis, not truncated): split across pages as needed
+    remaining = layout["analysis_lines"]
+    title = "AI Analysis"
+    while remaining:
+        y = _ensure_space(pdf, y, _box_height(min(len(remaining), ANALYSIS_MIN_LINES)))
+        fits = max(1, int((y - BOTTOM_MARGIN - BOX_PADDING) // LINE_HEIGHT))
+        chunk, remaining = remaining[:fits], remaining[fits:]
+
+        box_height = _box_height(len(chunk))
+        box_top = y
+        pdf.setFillColorRGB(0.95, 0.95, 0.95)
+        pdf.rect(MARGIN_X, box_top - box_height, PAGE_WIDTH - (2 * MARGIN_X), box_height, fill=1, stroke=0)
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(MARGIN_X + 8, box_top - 20, title)
+        _draw_lines(pdf, chunk, MARGIN_X + 8, box_top - 35, "Helvetica", 9)
+        y = box_top - box_height - 10
+        title = "AI Analysis (continued)"
+
+    return y - 15
+
+
+def _render_questions(
+        pdf: canvas.Canvas,
+        questions: List[Dict[str, Any]],
+        images: Iterable[Image.Image | None],
+        options: Dict[str, Any],
+        y: float,
+        first_index: int = 1,
+        progress: Optional[Callable[[int, int], None]] = None
+) -> float:
+    for offset, (question, image) in enumerate(zip(questions, images)):
+        layout = _layout_question(question, options, image)
+        y = _ensure_space(pdf, y, _required_height(layout))
+        y = _draw_question(pdf, first_index + offset, question, image, layout, y)
 
-    # AI analysis box
-    if options.get("include_ai_analysis"):
-        content = question.get("content")
-        if isinstance(content, dict):
-            analysis = content.get("detailed_analysis")
-            if analysis:
-                # Estimate 5 lines max
-                height += 100
+        if progress is not None:
+            progress(offset + 1, len(questions))
+    return y
 
-    return min(height, PAGE_HEIGHT - TOP_MARGIN - BOTTOM_MARGIN - 10)
 
+def _answer_key_entries(questions: List[Dict[str, Any]], options: Dict[str, Any]) -> List[str]:
+    # The key page is only added when solutions aren't shown inline
+    if options.get("include_solution") or not options.get("include_answer_key"):
+        return []
+    return [f"Q{index}: {question.get('correct_option') or 'N/A'}" for index, question in enumerate(questions, 1)]
 
-def generate_custom_revision_pdf(questions: List[Dict[str, Any]], options: Dict[str, Any]) -> bytes:
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
 
+def _draw_answer_key(pdf: canvas.Canvas, answer_key: List[str]) -> None:
+    """Answer key, starting at the top of the current page"""
     y = PAGE_HEIGHT - TOP_MARGIN
-    answer_key: List[str] = []
-
-    pdf.setTitle("SSC Smart Tracker - Revision Export")
     pdf.setFont("Helvetica-Bold", 14)
-    pdf.drawString(MARGIN_X, y, "SSC Smart Tracker - Custom Revision PDF")
+    pdf.drawString(MARGIN_X, y, "Correct Answer Key")
     y -= 30
 
-    for index, question in enumerate(questions, 1):
-        needed_height = _estimate_question_height(pdf, question, options)
-        if y - needed_height < BOTTOM_MARGIN:
+    pdf.setFont("Helvetica", 11)
+    for answer in answer_key:
+        if y < BOTTOM_MARGIN:
             pdf.showPage()
             y = PAGE_HEIGHT - TOP_MARGIN
+            pdf.setFont("Helvetica", 11)
+        pdf.drawString(MARGIN_X, y, answer)
+        y -= LINE_HEIGHT
 
-        # Question number
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(MARGIN_X, y, f"Q{index}.")
-        y -= 20
-
-        # Question text (LaTeX stripped)
-        y = _draw_wrapped_text(
-            pdf,
-            question.get("question_text", ""),
-            MARGIN_X,
-            y,
-            PAGE_WIDTH - (2 * MARGIN_X)
-        )
-        y -= 8
-
-        # Image
-        image = _download_and_resize_image(question.get("image_url"))
-        if image:
-            x = (PAGE_WIDTH - image.width) / 2
-            pdf.drawImage(
-                ImageReader(image),
-                x,
-                y - image.height,
-                width=image.width,
-                height=image.height,
-                preserveAspectRatio=True,
-                mask='auto'
-            )
-            y -= image.height + 12
-
-        # Options (LaTeX stripped)
-        option_list = question.get("options") or []
-        for idx, option in enumerate(option_list):
-            label = chr(65 + idx)
-            # Handle both string options and dict options with 'text' field
-            option_text = option if isinstance(option, str) else (
-                option.get("text") if isinstance(option, dict) else str(option)
-            )
-            # Strip LaTeX from option text
-            clean_option = strip_latex(option_text)
-            y = _draw_wrapped_text(
-                pdf,
-                f"{label}. {clean_option}",
-                MARGIN_X + 10,
-                y,
-                PAGE_WIDTH - (2 * MARGIN_X) - 10
-            )
 
-        correct_option = question.get("correct_option")
-        content = question.get("content", {})
-        explanation = content.get("explanation", "") if isinstance(content, dict) else ""
+class _PaginationCanvas:
+    """Canvas stand-in for the planning pass: drawing is skipped, only page breaks count"""
+
+    def __init__(self):
+        self.pages = 1
+
+    def showPage(self) -> None:
+        self.pages += 1
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        return _ignore_drawing
+
+
+def _ignore_drawing(*args: Any, **kwargs: Any) -> None:
+    return None
 
-        # Solution box
-        if options.get("include_solution"):
-            box_height = 55
-            box_top = y
-            pdf.setFillColorRGB(0.95, 0.97, 1)
-            pdf.rect(MARGIN_X, box_top - box_height, PAGE_WIDTH - (2 * MARGIN_X), box_height, fill=1, stroke=0)
-            pdf.setFillColor(colors.black)
-            pdf.setFont("Helvetica-Bold", 10)
-            pdf.drawString(MARGIN_X + 8, box_top - 20, f"Correct Option: {correct_option or 'N/A'}")
-            pdf.setFont("Helvetica", 10)
-
-            # Truncate explanation to fit
-            clean_explanation = strip_latex(explanation or "Not available")
-            if len(clean_explanation) > 100:
-                clean_explanation = clean_explanation[:100] + "..."
-            pdf.drawString(MARGIN_X + 8, box_top - 36, f"Explanation: {clean_explanation}")
-            y -= (box_height + 10)
-        elif options.get("include_answer_key"):
-            answer_key.append(f"Q{index}: {correct_option or 'N/A'}")
-
-        # User notes box
-        if options.get("include_user_notes") and question.get("manual_notes"):
-            notes = strip_latex(str(question.get("manual_notes")))
-            box_height = 50
-            box_top = y
-            pdf.setFillColorRGB(1, 0.98, 0.75)
-            pdf.rect(MARGIN_X, box_top - box_height, PAGE_WIDTH - (2 * MARGIN_X), box_height, fill=1, stroke=0)
-            pdf.setFillColor(colors.black)
-            pdf.setFont("Helvetica-Bold", 10)
-            pdf.drawString(MARGIN_X + 8, box_top - 20, "My Notes")
-
-            # Wrap notes properly
-            box_width = PAGE_WIDTH - (2 * MARGIN_X) - 16
-            y = _draw_wrapped_text_in_box(
-                pdf,
-                notes,
-                MARGIN_X + 8,
-                box_top - 35,
-                box_width,
-                max_lines=2,
-                font_name="Helvetica",
-                font_size=9
+
+def _plan_parts(
+        questions: List[Dict[str, Any]],
+        images: List[Image.Image | None],
+        options: Dict[str, Any],
+        part_count: int
+) -> List[Tuple[int, int]]:
+    """
+    Split the export into (start, end) ranges that each begin on a fresh page.
+    Pagination only depends on the layout, so a part rendered on its own canvas
+    lays out exactly as it would in a single serial render.
+    """
+    pdf = _PaginationCanvas()
+    y = PAGE_HEIGHT - TOP_MARGIN - 30  # below the title
+    page_starts = []
+    for offset, (question, image) in enumerate(zip(questions, images)):
+        layout = _layout_question(question, options, image)
+        y = _ensure_space(pdf, y, _required_height(layout))
+        if offset and y == PAGE_HEIGHT - TOP_MARGIN:
+            page_starts.append(offset)
+        y = _draw_question(pdf, offset + 1, question, image, layout, y)
+
+    # Cut at the first fresh page after each ideal boundary
+    cuts = []
+    for part in range(1, part_count):
+        target = part * len(questions) // part_count
+        cut = next((start for start in page_starts if start >= target), None)
+        if cut is not None and (not cuts or cut - cuts[-1] >= PDF_PARALLEL_MIN_PART_SIZE):
+            cuts.append(cut)
+
+    bounds = [0, *cuts, len(questions)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _render_part(
+        questions: List[Dict[str, Any]],
+        thumbnails: List[bytes | None],
+        options: Dict[str, Any],
+        first_index: int,
+        with_title: bool
+) -> bytes:
+    """Render one part of a parallel export (runs in a worker process)"""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    y = _draw_title(pdf) if with_title else PAGE_HEIGHT - TOP_MARGIN
+    images = [_open_thumbnail(thumbnail) for thumbnail in thumbnails]
+    _render_questions(pdf, questions, images, options, y, first_index=first_index)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn: forking the server process would copy its threads' locks
+            _render_pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
             )
-            y = box_top - box_height - 10
-
-        # AI analysis box (FULL analysis, not truncated)
-        if options.get("include_ai_analysis"):
-            content = question.get("content")
-            analysis = None
-            if isinstance(content, dict):
-                analysis = content.get("detailed_analysis")
-
-            if analysis:
-                # Calculate how much space we need for the full analysis
-                clean_analysis = strip_latex(str(analysis))
-
-                # Estimate lines needed (roughly 80 chars per line)
-                estimated_lines = max(5, (len(clean_analysis) // 80) + 2)
-                box_height = min(estimated_lines * LINE_HEIGHT + 20, 200)  # Max 200px tall
-
-                # Check if we need a new page
-                if y - box_height < BOTTOM_MARGIN:
-                    pdf.showPage()
-                    y = PAGE_HEIGHT - TOP_MARGIN
-
-                box_top = y
-                pdf.setFillColorRGB(0.95, 0.95, 0.95)
-                pdf.rect(MARGIN_X, box_top - box_height, PAGE_WIDTH - (2 * MARGIN_X), box_height, fill=1, stroke=0)
-                pdf.setFillColor(colors.black)
-                pdf.setFont("Helvetica-Bold", 10)
-                pdf.drawString(MARGIN_X + 8, box_top - 20, "AI Analysis")
-
-                # Draw FULL AI analysis with proper wrapping (no line limit!)
-                box_width = PAGE_WIDTH - (2 * MARGIN_X) - 16
-                current_y = box_top - 35
-                pdf.setFont("Helvetica", 9)
-
-                # Word wrap without line limit
-                words = clean_analysis.split()
-                line = ""
-                for word in words:
-                    test_line = f"{line} {word}".strip()
-                    if pdf.stringWidth(test_line, "Helvetica", 9) <= box_width:
-                        line = test_line
-                    else:
-                        if line:
-                            pdf.drawString(MARGIN_X + 8, current_y, line)
-                            current_y -= LINE_HEIGHT
-                            # Check if we need to expand box or move to new page
-                            if current_y < box_top - box_height + 10:
-                                # Need more space - start new page
-                                if current_y < BOTTOM_MARGIN + 50:
-                                    pdf.showPage()
-                                    y = PAGE_HEIGHT - TOP_MARGIN
-                                    current_y = y - 20
-                                    pdf.setFont("Helvetica", 9)
-                        line = word
-
-                # Draw remaining text
-                if line:
-                    pdf.drawString(MARGIN_X + 8, current_y, line)
-                    current_y -= LINE_HEIGHT
-
-                y = min(box_top - box_height, current_y) - 10
-
-        y -= 15
-
-    # Answer key page
+        return _render_pool
+
+
+def _reset_render_pool() -> None:
+    global _render_pool
+    with _render_pool_lock:
+        _render_pool = None
+
+
+def _use_parallel_render(questions: List[Dict[str, Any]]) -> bool:
+    return PdfWriter is not None and PDF_RENDER_PROCESSES > 1 and len(questions) >= PDF_PARALLEL_MIN_QUESTIONS
+
+
+def _render_parallel(
+        questions: List[Dict[str, Any]],
+        options: Dict[str, Any],
+        output: BinaryIO,
+        progress: Optional[Callable[[int, int], None]] = None
+) -> None:
+    prefetched = prefetch_images(questions)
+    thumbnails = [prefetched[question["image_url"]].result() if question.get("image_url") else None
+                  for question in questions]
+    images = [_open_thumbnail(thumbnail) for thumbnail in thumbnails]
+
+    # Two parts per process so an image-heavy part doesn't hold up the rest
+    ranges = _plan_parts(questions, images, options, PDF_RENDER_PROCESSES * 2)
+    pool = _get_render_pool()
+    futures = [
+        pool.submit(_render_part, questions[start:end], thumbnails[start:end], options, start + 1, start == 0)
+        for start, end in ranges
+    ]
+    sizes = {future: end - start for future, (start, end) in zip(futures, ranges)}
+
+    rendered = 0
+    for future in as_completed(futures):
+        future.result()
+        rendered += sizes[future]
+        if progress is not None:
+            progress(rendered, len(questions))
+
+    writer = PdfWriter()
+    for future in futures:
+        writer.append(PdfReader(io.BytesIO(future.result())))
+
+    answer_key = _answer_key_entries(questions, options)
     if answer_key:
-        pdf.showPage()
-        y = PAGE_HEIGHT - TOP_MARGIN
-        pdf.setFont("Helvetica-Bold", 14)
-        pdf.drawString(MARGIN_X, y, "Correct Answer Key")
-        y -= 30
-
-        pdf.setFont("Helvetica", 11)
-        for answer in answer_key:
-            if y < BOTTOM_MARGIN:
-                pdf.showPage()
-                y = PAGE_HEIGHT - TOP_MARGIN
-                pdf.setFont("Helvetica", 11)
-            pdf.drawString(MARGIN_X, y, answer)
-            y -= LINE_HEIGHT
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _draw_answer_key(pdf, answer_key)
+        pdf.save()
+        writer.append(PdfReader(buffer))
+
+    writer.add_metadata({"/Title": PDF_TITLE})
+    writer.write(output)
+
+
+def generate_custom_revision_pdf(
+        questions: List[Dict[str, Any]],
+        options: Dict[str, Any],
+        output: BinaryIO | None = None,
+        progress: Optional[Callable[[int, int], None]] = None
+) -> bytes | None:
+    """
+    Render the export; writes into `output` if given, otherwise returns the PDF bytes.
+    `progress(rendered, total)` is called as questions are drawn. Large exports
+    are rendered in parallel processes when more than one is configured.
+    """
+    buffer = output if output is not None else io.BytesIO()
+
+    rendered = False
+    if _use_parallel_render(questions):
+        try:
+            _render_parallel(questions, options, buffer, progress)
+            rendered = True
+        except BrokenProcessPool as pool_error:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            _reset_render_pool()
+            print(f"⚠️  Parallel PDF render failed, rendering serially: {pool_error}")
+
+    if not rendered:
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+
+        # All images download/resize in parallel while the first pages are drawn
+        prefetched = prefetch_images(questions)
+        images = (_download_and_resize_image(question.get("image_url"), prefetched) for question in questions)
+
+        _render_questions(pdf, questions, images, options, _draw_title(pdf), progress=progress)
+
+        answer_key = _answer_key_entries(questions, options)
+        if answer_key:
+            pdf.showPage()
+            _draw_answer_key(pdf, answer_key)
+        pdf.save()
 
-    pdf.save()
-    buffer.seek(0)
-    return buffer.getvalue()
\ No newline at end of file
+    if output is not None:
+        return None
+    return buffer.getvalue()
+
+
+def render_pdf_to_spooled_file(
+        questions: List[Dict[str, Any]],
+        options: Dict[str, Any],
+        progress: Optional[Callable[[int, int], None]] = None
+) -> BinaryIO:
+    """
+    Render into a spooled temp file (memory up to PDF_SPOOL_MAX_MEMORY, disk
+    beyond) positioned at the start; the caller streams and closes it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_MEMORY)
+    try:
+        generate_custom_revision_pdf(questions, options, output=spool, progress=progress)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def iter_file_chunks(file: BinaryIO, chunk_size: int = PDF_STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield a file in chunks and close it afterwards (also if the client disconnects)"""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
\ No newline at end of file
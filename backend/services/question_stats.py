@@ -0,0 +1,157 @@
+"""
+Per-user question stats rollup (`user_question_stats`).
+
+One row per (user, subject, topic) with question / attempted counts, attempts,
+correct answers, the summed per-question accuracy and the mastery buckets. A
+trigger on `questions` (supabase/migrations) adds and removes each row's
+contribution on every insert, delete and counter-changing update, so the
+answer and review endpoints, uploads, imports, deletes and the browser's own
+supabase-js writes all keep it current, in the same transaction as the write.
+
+Dashboard reads of counts, accuracy and mastery then cost one indexed select
+of a few dozen rows instead of a scan of every question.
+
+Drift (a trigger disabled during a manual fix, rows edited by hand) is caught
+by the reconciliation job: for each user it rebuilds the rollup from scratch
+inside `reconcile_question_stats`, which rewrites the rows only if they differ
+and returns the groups that drifted. It runs every
+QUESTION_STATS_RECONCILE_INTERVAL_SECONDS (0 disables) and on demand from the
+admin endpoint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from backend.services.executor import run_blocking
+from backend.services.job_queue import JobQueue
+
+QUESTION_STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("QUESTION_STATS_RECONCILE_INTERVAL_SECONDS", "21600"))
+QUESTION_STATS_DRIFT_SAMPLES = 20
+
+STATS_COLUMNS = (
+    "subject,topic,question_count,attempted_count,total_attempts,total_correct,accuracy_sum,"
+    "new_count,learning_count,reviewing_count,mastered_count"
+)
+
+_last_report: Optional[Dict[str, Any]] = None
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+def fetch_question_stats(supabase_admin, user_id: str) -> Dict[str, Any]:
+    """The user's rollup as analytics aggregates: (subject, topic) groups and the mastery distribution"""
+    rows = supabase_admin.table("user_question_stats") \
+        .select(STATS_COLUMNS) \
+        .eq("user_id", user_id) \
+        .execute().data or []
+
+    groups = [
+        {
+            "subject": row["subject"] or None,
+            "topic": row["topic"] or None,
+            "count": row["question_count"],
+            "attempted": row["attempted_count"],
+            "attempts": row["total_attempts"],
+            "correct": row["total_correct"],
+            "accuracy_sum": row["accuracy_sum"],
+        }
+        for row in rows
+    ]
+    mastery = {
+        level: sum(row[f"{level}_count"] for row in rows)
+        for level in ("new", "learning", "reviewing", "mastered")
+    }
+    return {"groups": groups, "mastery": mastery}
+
+
+def reconcile_user(supabase_admin, user_id: str) -> List[Dict[str, Any]]:
+    """Rebuild one user's rollup; returns the groups that had drifted (empty when it was exact)"""
+    return supabase_admin.rpc("reconcile_question_stats", {"p_user_id": user_id}).execute().data or []
+
+
+def _reconcile(supabase_admin, user_ids: Optional[List[str]], report_progress) -> Dict[str, Any]:
+    if user_ids is None:
+        user_ids = [
+            row if isinstance(row, str) else row["question_stats_users"]
+            for row in supabase_admin.rpc("question_stats_users", {}).execute().data or []
+        ]
+
+    started = time.perf_counter()
+    drifted_users = 0
+    drifted_groups = 0
+    failed: List[str] = []
+    samples: List[Dict[str, Any]] = []
+
+    for index, user_id in enumerate(user_ids, start=1):
+        try:
+            drift = reconcile_user(supabase_admin, user_id)
+        except Exception as reconcile_error:
+            print(f"⚠️  Stats reconcile failed for user {user_id}: {reconcile_error}")
+            failed.append(user_id)
+            continue
+        if drift:
+            drifted_users += 1
+            drifted_groups += len(drift)
+            for group in drift[:QUESTION_STATS_DRIFT_SAMPLES - len(samples)]:
+                samples.append({"user_id": user_id, **group})
+        report_progress(checked=index, total=len(user_ids))
+
+    return {
+        "users": len(user_ids),
+        "drifted_users": drifted_users,
+        "drifted_groups": drifted_groups,
+        "failed_users": failed,
+        "drift_samples": samples,
+        "seconds": round(time.perf_counter() - started, 2),
+        "finished_at": time.time(),
+    }
+
+
+async def _run_reconcile_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    global _last_report
+    loop = asyncio.get_running_loop()
+    payload = job["payload"]
+
+    def report_progress(**progress: Any) -> None:
+        loop.call_soon_threadsafe(lambda: reconcile_queue.set_progress(job, **progress))
+
+    report = await run_blocking(_reconcile, payload["supabase_admin"], payload.get("user_ids"), report_progress)
+    _last_report = report
+    print(f"📊 Stats reconcile: {report['users']} users checked, {report['drifted_groups']} drifted groups "
+          f"in {report['drifted_users']} users fixed ({report['seconds']}s)")
+    return report
+
+
+reconcile_queue = JobQueue("question-stats-reconcile", _run_reconcile_job, workers=1, max_attempts=2)
+
+
+def submit_reconcile(supabase_admin, user_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Queue a reconciliation of the given users (all users when None); must be called from the event loop"""
+    job = reconcile_queue.submit({"supabase_admin": supabase_admin, "user_ids": user_ids})
+    return reconcile_queue.public_view(job)
+
+
+def reconcile_status() -> Dict[str, Any]:
+    return {
+        "interval_seconds": QUESTION_STATS_RECONCILE_INTERVAL_SECONDS,
+        "last_report": _last_report,
+        **reconcile_queue.metrics(),
+    }
+
+
+async def _reconcile_periodically(supabase_admin) -> None:
+    while True:
+        await asyncio.sleep(QUESTION_STATS_RECONCILE_INTERVAL_SECONDS)
+        submit_reconcile(supabase_admin)
+
+
+def schedule_reconciliation(supabase_admin) -> None:
+    """Start the periodic full reconciliation on the running loop (once per process)"""
+    global _scheduler_task
+    if QUESTION_STATS_RECONCILE_INTERVAL_SECONDS <= 0:
+        return
+    if _scheduler_task is None or _scheduler_task.done():
+        _scheduler_task = asyncio.create_task(_reconcile_periodically(supabase_admin))
@@ -0,0 +1,229 @@
+"""
+Batched review submission for a whole study session.
+
+A session submitted answer by answer costs a `select("*")` and an update per
+card (plus a token check per request). `submit_review_batch` takes the whole
+session instead: one projected select for every affected question, the
+scheduling step (backend/services/scheduling.py) run vectorized over the
+answers in order (a question answered twice in a session is stepped twice),
+and one `apply_review_batch` RPC that writes all the rows
+and records every answer's idempotency key in the same transaction. Each row
+is written only if its `times_attempted` is still the one the step started
+from, so an answer recorded meanwhile by another tab is never overwritten.
+
+Idempotency keys are generated by the client per answer. Keys that are
+already recorded replay the stored result instead of counting the attempt
+again, so an offline queue can resend a session as often as it needs to. When
+a concurrent retry records the same keys first, or a question changed after
+it was read, the RPC fails as a whole (serialization failure) and the batch is
+re-read and replayed.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.services.db_errors import is_missing_function, is_missing_table
+from backend.services.scheduling import review_cards
+
+REVIEW_BATCH_MAX = int(os.getenv("REVIEW_BATCH_MAX", "200"))
+REVIEW_BATCH_ATTEMPTS = 5
+CONFLICT_BACKOFF_SECONDS = 0.02
+
+REVIEW_BATCH_COLUMNS = (
+    "id,subject,topic,correct_option,times_attempted,times_correct,ease_factor,interval_days,next_review_date,"
+    "repetitions,fsrs_stability,fsrs_difficulty,last_attempted_at"
+)
+
+
+class ReviewBatchConflict(Exception):
+    """Concurrent writes kept invalidating the batch"""
+
+
+def conflict_backoff(attempt: int) -> None:
+    """Jittered exponential pause before re-reading after a lost write race"""
+    time.sleep(CONFLICT_BACKOFF_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+
+def review_result(update: Dict[str, Any], is_correct: bool, correct_answer: Optional[str]) -> Dict[str, Any]:
+    """What the review endpoints return for one answer"""
+    interval = update["interval_days"]
+    return {
+        "is_correct": is_correct,
+        "correct_answer": correct_answer,
+        "times_attempted": update["times_attempted"],
+        "times_correct": update["times_correct"],
+        "accuracy": round((update["times_correct"] / update["times_attempted"]) * 100, 1),
+        "next_review_date": update["next_review_date"],
+        "interval_days": interval,
+        "mastery_level": update["mastery_level"],
+        "message": f"Great! See you in {interval} day{'s' if interval != 1 else ''}!" if is_correct else "Let's review this again tomorrow!"
+    }
+
+
+def _answered_at(answer: Dict[str, Any], now: datetime) -> datetime:
+    """When an (offline) answer was given, as server-local time and never in the future"""
+    answered_at = answer.get("answered_at")
+    if answered_at is None:
+        return now
+    if answered_at.tzinfo is not None:
+        answered_at = answered_at.astimezone().replace(tzinfo=None)
+    return min(answered_at, now)
+
+
+def _recorded_results(supabase_admin, user_id: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    try:
+        rows = supabase_admin.table("review_submissions") \
+            .select("idempotency_key,result") \
+            .eq("user_id", user_id) \
+            .in_("idempotency_key", keys) \
+            .execute().data or []
+    except Exception as lookup_error:
+        # Only before the review batch migration; any other error must not count answers twice
+        if not is_missing_table(lookup_error):
+            raise
+        print(f"⚠️  review_submissions unavailable, idempotency keys not checked: {lookup_error}")
+        return {}
+    return {row["idempotency_key"]: row["result"] for row in rows}
+
+
+def _is_conflict(error: Exception) -> bool:
+    return getattr(error, "code", None) == "40001" or "40001" in str(error)
+
+
+def _apply(supabase_admin, user_id: str, updates: List[Dict[str, Any]], submissions: List[Dict[str, Any]]) -> None:
+    try:
+        supabase_admin.rpc("apply_review_batch", {
+            "p_user_id": user_id,
+            "p_updates": updates,
+            "p_submissions": submissions,
+        }).execute()
+        return
+    except Exception as rpc_error:
+        # A timeout or 5xx may come after the batch committed: rewriting the rows would apply it twice
+        if not is_missing_function(rpc_error):
+            raise
+        print(f"⚠️  apply_review_batch RPC unavailable, updating row by row: {rpc_error}")
+
+    for update in updates:
+        fields = {column: value for column, value in update.items() if column not in ("id", "expected_attempts")}
+        supabase_admin.table("questions").update(fields).eq("id", update["id"]).eq("user_id", user_id).execute()
+
+
+def _submit(
+        supabase_admin,
+        user_id: str,
+        answers: List[Dict[str, Any]],
+        now: datetime
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    recorded = _recorded_results(supabase_admin, user_id, list({answer["idempotency_key"] for answer in answers}))
+
+    question_ids = list({answer["question_id"] for answer in answers if answer["idempotency_key"] not in recorded})
+    questions: Dict[str, Dict[str, Any]] = {}
+    if question_ids:
+        rows = supabase_admin.table("questions") \
+            .select(REVIEW_BATCH_COLUMNS) \
+            .eq("user_id", user_id) \
+            .in_("id", question_ids) \
+            .execute().data or []
+        questions = {row["id"]: row for row in rows}
+    expected_attempts = {question_id: row.get("times_attempted") for question_id, row in questions.items()}
+
+    # A question's k-th answer in the batch goes into round k, so every round
+    # is one vectorized scheduling step over distinct questions
+    rounds: List[List[int]] = []
+    answers_per_question: Dict[str, int] = {}
+    first_with_key: Dict[str, int] = {}
+    for index, answer in enumerate(answers):
+        key = answer["idempotency_key"]
+        question_id = answer["question_id"]
+        if key in recorded or key in first_with_key or question_id not in questions:
+            continue
+        first_with_key[key] = index
+        round_number = answers_per_question.get(question_id, 0)
+        answers_per_question[question_id] = round_number + 1
+        if round_number == len(rounds):
+            rounds.append([])
+        rounds[round_number].append(index)
+
+    outcomes: Dict[int, Dict[str, Any]] = {}
+    submissions: List[Dict[str, Any]] = []
+    touched: Dict[str, Dict[str, Any]] = {}
+    for indexes in rounds:
+        batch = [answers[index] for index in indexes]
+        round_questions = [questions[answer["question_id"]] for answer in batch]
+        updates = review_cards(
+            round_questions,
+            [answer["is_correct"] for answer in batch],
+            [_answered_at(answer, now) for answer in batch]
+        )
+        for index, answer, question, update in zip(indexes, batch, round_questions, updates):
+            result = review_result(update, answer["is_correct"], question.get("correct_option"))
+            question.update(update, user_answer=answer["answer"])
+            touched[answer["question_id"]] = question
+            outcomes[index] = result
+            submissions.append({
+                "idempotency_key": answer["idempotency_key"],
+                "question_id": answer["question_id"],
+                "result": result,
+            })
+
+    results: List[Dict[str, Any]] = []
+    counts = {"applied": 0, "duplicate": 0, "not_found": 0}
+    for index, answer in enumerate(answers):
+        key = answer["idempotency_key"]
+        if key in recorded:
+            status, result = "duplicate", recorded[key]
+        elif index in outcomes:
+            status, result = "applied", outcomes[index]
+        elif key in first_with_key:
+            # A key repeated within the batch replays the first answer
+            status, result = "duplicate", outcomes[first_with_key[key]]
+        else:
+            status, result = "not_found", {}
+        counts[status] += 1
+        results.append({"idempotency_key": key, "question_id": answer["question_id"], "status": status, **result})
+
+    if touched:
+        updates = [
+            {
+                "id": question_id,
+                "expected_attempts": expected_attempts[question_id],
+                "user_answer": question["user_answer"],
+                **{column: question[column] for column in (
+                    "times_attempted", "times_correct", "last_attempted_at", "next_review_date",
+                    "ease_factor", "interval_days", "repetitions", "fsrs_stability", "fsrs_difficulty",
+                    "mastery_level"
+                )},
+            }
+            for question_id, question in touched.items()
+        ]
+        _apply(supabase_admin, user_id, updates, submissions)
+
+    return {"results": results, **counts}, list(touched.values())
+
+
+def submit_review_batch(
+        supabase_admin,
+        user_id: str,
+        answers: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Apply a session's answers ({question_id, answer, is_correct,
+    idempotency_key, answered_at}) in order. Returns the response (a result
+    per answer with status applied / duplicate / not_found, plus counts) and
+    the updated question rows.
+    """
+    for attempt in range(1, REVIEW_BATCH_ATTEMPTS + 1):
+        try:
+            return _submit(supabase_admin, user_id, answers, datetime.now())
+        except Exception as submit_error:
+            if not _is_conflict(submit_error):
+                raise
+            print(f"⚠️  Review batch conflicted with a concurrent write (attempt {attempt}), replaying")
+            conflict_backoff(attempt)
+    raise ReviewBatchConflict("Questions in this review batch are being changed by another request")
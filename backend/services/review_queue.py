@@ -0,0 +1,155 @@
+"""
+Review queue: due questions split into overdue / due_today / due_soon / upcoming.
+
+The queue used to `select("*")` every question due within a week (content JSON
+and analysis included) and bucket the rows in Python. Here the queue carries
+only the columns needed to list and prioritise items; the database counts the
+buckets (`review_queue_counts` RPC) and each bucket is read a page at a time in
+(next_review_date, id) order with an opaque keyset cursor, served by the
+(user_id, next_review_date, id) index. Full question bodies are fetched in
+batches when the client actually opens them.
+
+Bucket edges follow the old endpoint: overdue before today, due_today today,
+due_soon the next 3 days, upcoming the rest of the next 7 days (server time).
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+REVIEW_QUEUE_PAGE_SIZE = int(os.getenv("REVIEW_QUEUE_PAGE_SIZE", "50"))
+REVIEW_QUEUE_MAX_PAGE_SIZE = 200
+REVIEW_BODY_BATCH_MAX = int(os.getenv("REVIEW_BODY_BATCH_MAX", "50"))
+
+REVIEW_QUEUE_COLUMNS = (
+    "id,subject,topic,next_review_date,mastery_level,times_attempted,times_correct,ease_factor,interval_days"
+)
+BUCKETS = ("overdue", "due_today", "due_soon", "upcoming")
+
+
+class InvalidCursor(ValueError):
+    """The pagination cursor is malformed or belongs to another bucket."""
+
+
+def bucket_bounds(now: datetime) -> Dict[str, Tuple[Optional[str], Optional[str], bool]]:
+    """(gte, lt, end inclusive) per bucket as ISO timestamps"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    tomorrow = today + timedelta(days=1)
+    soon_end = today + timedelta(days=4)
+    week_end = now + timedelta(days=7)
+    return {
+        "overdue": (None, today.isoformat(), False),
+        "due_today": (today.isoformat(), tomorrow.isoformat(), False),
+        "due_soon": (tomorrow.isoformat(), soon_end.isoformat(), False),
+        "upcoming": (soon_end.isoformat(), week_end.isoformat(), True),
+    }
+
+
+def encode_cursor(bucket: str, row: Dict[str, Any]) -> str:
+    raw = json.dumps([bucket, row["next_review_date"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(bucket: str, cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_bucket, review_date, question_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as decode_error:
+        raise InvalidCursor("Malformed cursor") from decode_error
+    if cursor_bucket != bucket:
+        raise InvalidCursor("Cursor belongs to another bucket")
+    return str(review_date), str(question_id)
+
+
+def review_priority(item: Dict[str, Any], now: datetime) -> int:
+    """Same score as getReviewPriority in the frontend: weak, overdue and rarely tried first"""
+    attempts = item.get("times_attempted") or 0
+    accuracy = (item.get("times_correct") or 0) / attempts if attempts > 0 else 0
+    review_date = datetime.fromisoformat(item["next_review_date"])
+    reference = now if review_date.tzinfo is None else now.astimezone()
+    days_overdue = max(0.0, (reference - review_date).total_seconds() / 86400)
+
+    accuracy_score = (1 - accuracy) * 40
+    overdue_score = min(40.0, days_overdue * 10)
+    attempt_score = max(0, 20 - attempts * 2)
+    return int(accuracy_score + overdue_score + attempt_score + 0.5)
+
+
+def _bucket_query(supabase_admin, user_id: str, bucket: str, now: datetime, columns: str, **select_options):
+    start, end, inclusive = bucket_bounds(now)[bucket]
+    query = supabase_admin.table("questions").select(columns, **select_options).eq("user_id", user_id)
+    if start is not None:
+        query = query.gte("next_review_date", start)
+    return query.lte("next_review_date", end) if inclusive else query.lt("next_review_date", end)
+
+
+def fetch_bucket_counts(supabase_admin, user_id: str, now: datetime) -> Dict[str, int]:
+    bounds = bucket_bounds(now)
+    try:
+        response = supabase_admin.rpc("review_queue_counts", {
+            "p_user_id": user_id,
+            "p_today": bounds["due_today"][0],
+            "p_tomorrow": bounds["due_soon"][0],
+            "p_soon_end": bounds["upcoming"][0],
+            "p_week_end": bounds["upcoming"][1],
+        }).execute()
+        if response.data is not None:
+            return {bucket: int(response.data.get(bucket) or 0) for bucket in BUCKETS}
+    except Exception as rpc_error:
+        # e.g. the review queue migration hasn't been applied yet
+        print(f"⚠️  review_queue_counts RPC unavailable, counting per bucket: {rpc_error}")
+
+    return {
+        bucket: _bucket_query(supabase_admin, user_id, bucket, now, "id", count="exact", head=True).execute().count or 0
+        for bucket in BUCKETS
+    }
+
+
+def fetch_bucket_page(
+        supabase_admin,
+        user_id: str,
+        bucket: str,
+        now: datetime,
+        cursor: Optional[str] = None,
+        limit: int = REVIEW_QUEUE_PAGE_SIZE
+) -> Dict[str, Any]:
+    """One page of a bucket in due-date order; `next_cursor` is None on the last page"""
+    limit = max(1, min(limit, REVIEW_QUEUE_MAX_PAGE_SIZE))
+    query = _bucket_query(supabase_admin, user_id, bucket, now, REVIEW_QUEUE_COLUMNS) \
+        .order("next_review_date") \
+        .order("id")
+
+    if cursor is not None:
+        review_date, question_id = decode_cursor(bucket, cursor)
+        query = query.or_(
+            f'next_review_date.gt."{review_date}",'
+            f'and(next_review_date.eq."{review_date}",id.gt."{question_id}")'
+        )
+
+    # One extra row tells whether there is a next page without a count query
+    rows = query.limit(limit + 1).execute().data or []
+    items = rows[:limit]
+    for item in items:
+        item["priority"] = review_priority(item, now)
+
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(bucket, items[-1]) if len(rows) > limit else None,
+    }
+
+
+def fetch_question_bodies(supabase_admin, user_id: str, question_ids: List[str]) -> List[Dict[str, Any]]:
+    """Full rows for the given ids, in the requested order; unknown or foreign ids are skipped"""
+    if not question_ids:
+        return []
+    rows = supabase_admin.table("questions") \
+        .select("*") \
+        .eq("user_id", user_id) \
+        .in_("id", question_ids) \
+        .execute().data or []
+    by_id = {row["id"]: row for row in rows}
+    return [by_id[question_id] for question_id in question_ids if question_id in by_id]
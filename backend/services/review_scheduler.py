@@ -0,0 +1,337 @@
+"""
+Priority scheduler for review sessions.
+
+Each item's priority at time t is
+
+    static + topic_weakness(topic) + 10 * min(4, max(0, t - due))   (t, due in days)
+
+- static: low accuracy (up to 40), few attempts (up to 20) and a low SM-2 ease
+  factor (up to 10), as in the frontend's getReviewPriority plus the ease
+- topic_weakness: up to 10 points for the item's topic accuracy
+- overdue: 10 points per day overdue, capped at 40 after 4 days
+
+The overdue term changes with time, but only in a way heaps can keep ordered:
+within a topic, items more than 4 days overdue rank by `static` alone, and
+items less than 4 days overdue rank by `static - 10 * due` (the `10 * t` is
+shared). So every topic keeps three heaps, *pending* (not yet due, by due date),
+*ramping* (by static - 10 * due, with a due-date heap to tell when an item
+reaches the cap) and *capped* (by static), and items move forward lazily as
+time passes. Topic weakness is constant within a topic, so a session is a
+K-way merge over the topic heaps: O(T + K log N) for K items, N due items
+and T topics, instead of scoring and sorting every due question.
+
+The per-user state is built with one projected scan on first use and then
+updated in place by the answer/review write paths (`record_question`,
+`remove_question`). Superseded heap entries are skipped lazily and the heaps
+are compacted when they pile up. States expire after
+REVIEW_SCHEDULER_STATE_TTL_SECONDS so writes made elsewhere (e.g. the browser
+editing questions directly) are picked up by a rebuild.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+REVIEW_SCHEDULER_STATE_TTL_SECONDS = float(os.getenv("REVIEW_SCHEDULER_STATE_TTL_SECONDS", "900"))
+REVIEW_SCHEDULER_MAX_USERS = int(os.getenv("REVIEW_SCHEDULER_MAX_USERS", "500"))
+REVIEW_SESSION_SIZE = int(os.getenv("REVIEW_SESSION_SIZE", "20"))
+REVIEW_SESSION_MAX_SIZE = 100
+REVIEW_SCHEDULER_PAGE_SIZE = 1000
+
+SCHEDULER_COLUMNS = "id,subject,topic,next_review_date,times_attempted,times_correct,ease_factor"
+
+OVERDUE_POINTS_PER_DAY = 10.0
+OVERDUE_CAP_DAYS = 4.0
+MIN_EASE = 1.3
+DEFAULT_EASE = 2.5
+TOPIC_WEAKNESS_POINTS = 10.0
+
+SECONDS_PER_DAY = 86400.0
+
+
+def _to_days(timestamp: str) -> float:
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        # Naive timestamps are stored as UTC by Postgres
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp() / SECONDS_PER_DAY
+
+
+def static_score(times_attempted: int, times_correct: int, ease_factor: Optional[float]) -> float:
+    accuracy = times_correct / times_attempted if times_attempted > 0 else 0.0
+    ease = ease_factor or DEFAULT_EASE
+    accuracy_score = (1 - accuracy) * 40
+    attempt_score = max(0, 20 - times_attempted * 2)
+    ease_score = min(1.0, max(0.0, (DEFAULT_EASE - ease) / (DEFAULT_EASE - MIN_EASE))) * 10
+    return accuracy_score + attempt_score + ease_score
+
+
+def overdue_score(due: float, now: float) -> float:
+    return OVERDUE_POINTS_PER_DAY * min(OVERDUE_CAP_DAYS, max(0.0, now - due))
+
+
+class _TopicQueue:
+    """One topic's items in three lazily maintained heaps; see the module docstring"""
+
+    def __init__(self):
+        self.pending: List[Tuple[float, str, int]] = []       # (due, id, version)
+        self.ramping: List[Tuple[float, str, int]] = []       # (-(static - 10 * due), id, version)
+        self.ramping_due: List[Tuple[float, str, int]] = []   # (due, id, version)
+        self.capped: List[Tuple[float, str, int]] = []        # (-static, id, version)
+        self.entries = 0
+        self.live = 0
+        self.live_pending = 0
+
+    def push(self, item: Dict[str, Any], now: float) -> None:
+        self.live += 1
+        due, version = item["due"], item["version"]
+        if due > now:
+            item["stage"] = "pending"
+            heapq.heappush(self.pending, (due, item["id"], version))
+            self.entries += 1
+            self.live_pending += 1
+        elif due > now - OVERDUE_CAP_DAYS:
+            self._push_ramping(item)
+        else:
+            self._push_capped(item)
+
+    def _push_ramping(self, item: Dict[str, Any]) -> None:
+        item["stage"] = "ramping"
+        key = item["static"] - OVERDUE_POINTS_PER_DAY * item["due"]
+        heapq.heappush(self.ramping, (-key, item["id"], item["version"]))
+        heapq.heappush(self.ramping_due, (item["due"], item["id"], item["version"]))
+        self.entries += 2
+
+    def _push_capped(self, item: Dict[str, Any]) -> None:
+        item["stage"] = "capped"
+        heapq.heappush(self.capped, (-item["static"], item["id"], item["version"]))
+        self.entries += 1
+
+    def advance(self, items: Dict[str, Dict[str, Any]], now: float) -> None:
+        """Move items that became due to ramping, and items past the cap to capped"""
+        while self.pending and self.pending[0][0] <= now:
+            _, item_id, version = heapq.heappop(self.pending)
+            item = items.get(item_id)
+            if item is not None and item["version"] == version and item["stage"] == "pending":
+                self.live_pending -= 1
+                if item["due"] > now - OVERDUE_CAP_DAYS:
+                    self._push_ramping(item)
+                else:
+                    self._push_capped(item)
+        cap_edge = now - OVERDUE_CAP_DAYS
+        while self.ramping_due and self.ramping_due[0][0] <= cap_edge:
+            _, item_id, version = heapq.heappop(self.ramping_due)
+            item = items.get(item_id)
+            if item is not None and item["version"] == version and item["stage"] == "ramping":
+                self._push_capped(item)
+
+    def live_top(self, heap: List[Tuple[float, str, int]], stage: str, items: Dict[str, Dict[str, Any]]):
+        """Drop superseded entries from the top of `heap` and return the live item there, if any"""
+        while heap:
+            _, item_id, version = heap[0]
+            item = items.get(item_id)
+            if item is not None and item["version"] == version and item["stage"] == stage:
+                return item
+            heapq.heappop(heap)
+        return None
+
+
+class UserReviewState:
+    def __init__(self, built_at: float):
+        self.built_at = built_at
+        self.lock = threading.Lock()
+        self.items: Dict[str, Dict[str, Any]] = {}
+        self.topics: Dict[str, _TopicQueue] = {}
+        # topic -> [attempts, correct] over the user's scheduled questions
+        self.topic_totals: Dict[str, List[int]] = {}
+
+    def _topic_key(self, row: Dict[str, Any]) -> str:
+        return f"{row.get('subject') or ''}\x1f{row.get('topic') or ''}"
+
+    def topic_weakness(self, topic: str) -> float:
+        attempts, correct = self.topic_totals.get(topic, (0, 0))
+        accuracy = correct / attempts if attempts > 0 else 0.5
+        return (1 - accuracy) * TOPIC_WEAKNESS_POINTS
+
+    def upsert(self, row: Dict[str, Any], now: float) -> None:
+        self.remove(row["id"])
+        if not row.get("next_review_date"):
+            return
+
+        attempts = row.get("times_attempted") or 0
+        correct = row.get("times_correct") or 0
+        topic = self._topic_key(row)
+        item = {
+            "id": row["id"],
+            "subject": row.get("subject"),
+            "topic": row.get("topic"),
+            "topic_key": topic,
+            "next_review_date": row["next_review_date"],
+            "due": _to_days(row["next_review_date"]),
+            "static": static_score(attempts, correct, row.get("ease_factor")),
+            "attempts": attempts,
+            "correct": correct,
+            "version": 0,
+            "stage": None,
+        }
+        previous = self.items.get(row["id"])
+        item["version"] = previous["version"] + 1 if previous is not None else 0
+        self.items[row["id"]] = item
+
+        totals = self.topic_totals.setdefault(topic, [0, 0])
+        totals[0] += attempts
+        totals[1] += correct
+        queue = self.topics.get(topic)
+        if queue is None:
+            queue = self.topics[topic] = _TopicQueue()
+        queue.push(item, now)
+        if queue.entries > 64 and queue.entries > 3 * queue.live:
+            self._compact(topic, now)
+
+    def remove(self, item_id: str) -> None:
+        item = self.items.get(item_id)
+        if item is None or item["stage"] is None:
+            return
+        totals = self.topic_totals[item["topic_key"]]
+        totals[0] -= item["attempts"]
+        totals[1] -= item["correct"]
+        queue = self.topics[item["topic_key"]]
+        queue.live -= 1
+        if item["stage"] == "pending":
+            queue.live_pending -= 1
+        # Heap entries go stale; keep the record (without a stage) so versions keep increasing
+        item["stage"] = None
+
+    def _compact(self, topic: str, now: float) -> None:
+        """Rebuild a topic's heaps from its live entries, dropping the superseded ones"""
+        old = self.topics[topic]
+        queue = self.topics[topic] = _TopicQueue()
+        for heap, stage in ((old.pending, "pending"), (old.ramping, "ramping"), (old.capped, "capped")):
+            for _, item_id, version in heap:
+                item = self.items.get(item_id)
+                if item is not None and item["version"] == version and item["stage"] == stage:
+                    queue.push(item, now)
+
+    def top(self, limit: int, now: float) -> List[Dict[str, Any]]:
+        """The `limit` highest-priority due items, best first"""
+        # Candidate heap over the best live entry of each (topic, stage) heap
+        candidates: List[Tuple[float, str, str]] = []
+        for topic, queue in self.topics.items():
+            queue.advance(self.items, now)
+            for stage in ("ramping", "capped"):
+                self._push_candidate(candidates, topic, stage, now)
+
+        session: List[Dict[str, Any]] = []
+        popped: List[Tuple[str, str, Tuple[float, str, int]]] = []
+        while candidates and len(session) < limit:
+            negative_priority, topic, stage = heapq.heappop(candidates)
+            queue = self.topics[topic]
+            heap = queue.ramping if stage == "ramping" else queue.capped
+            entry = heapq.heappop(heap)
+            popped.append((topic, stage, entry))
+            item = self.items[entry[1]]
+            session.append({
+                "id": item["id"],
+                "subject": item["subject"],
+                "topic": item["topic"],
+                "next_review_date": item["next_review_date"],
+                "priority": round(-negative_priority, 1),
+            })
+            self._push_candidate(candidates, topic, stage, now)
+
+        # Serving a session doesn't consume it: put the entries back
+        for topic, stage, entry in popped:
+            queue = self.topics[topic]
+            heapq.heappush(queue.ramping if stage == "ramping" else queue.capped, entry)
+        return session
+
+    def _push_candidate(self, candidates: List[Tuple[float, str, str]], topic: str, stage: str, now: float) -> None:
+        queue = self.topics[topic]
+        heap = queue.ramping if stage == "ramping" else queue.capped
+        item = queue.live_top(heap, stage, self.items)
+        if item is not None:
+            priority = item["static"] + self.topic_weakness(topic) + overdue_score(item["due"], now)
+            heapq.heappush(candidates, (-priority, topic, stage))
+
+    def due_count(self) -> int:
+        """Due items as of the last `top` call (which advances the pending heaps)"""
+        return sum(queue.live - queue.live_pending for queue in self.topics.values())
+
+
+_states: "OrderedDict[str, UserReviewState]" = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def _load_state(supabase_admin, user_id: str) -> UserReviewState:
+    now = time.time() / SECONDS_PER_DAY
+    state = UserReviewState(time.monotonic())
+    last_id = None
+    while True:
+        query = supabase_admin.table("questions") \
+            .select(SCHEDULER_COLUMNS) \
+            .eq("user_id", user_id) \
+            .not_.is_("next_review_date", "null") \
+            .order("id") \
+            .limit(REVIEW_SCHEDULER_PAGE_SIZE)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.execute().data or []
+        for row in page:
+            state.upsert(row, now)
+        if len(page) < REVIEW_SCHEDULER_PAGE_SIZE:
+            return state
+        last_id = page[-1]["id"]
+
+
+def _state_for(supabase_admin, user_id: str) -> UserReviewState:
+    with _states_lock:
+        state = _states.get(user_id)
+        if state is not None and time.monotonic() - state.built_at < REVIEW_SCHEDULER_STATE_TTL_SECONDS:
+            _states.move_to_end(user_id)
+            return state
+
+    state = _load_state(supabase_admin, user_id)
+    with _states_lock:
+        _states[user_id] = state
+        _states.move_to_end(user_id)
+        while len(_states) > REVIEW_SCHEDULER_MAX_USERS:
+            _states.popitem(last=False)
+    return state
+
+
+def next_session(supabase_admin, user_id: str, limit: int = REVIEW_SESSION_SIZE) -> Dict[str, Any]:
+    """Top-`limit` due questions by priority, from the user's incrementally maintained state"""
+    limit = max(1, min(limit, REVIEW_SESSION_MAX_SIZE))
+    state = _state_for(supabase_admin, user_id)
+    now = time.time() / SECONDS_PER_DAY
+    with state.lock:
+        items = state.top(limit, now)
+        return {"items": items, "due_count": state.due_count()}
+
+
+def record_question(user_id: str, row: Dict[str, Any]) -> None:
+    """
+    Apply a write to a loaded state: `row` needs id, subject, topic,
+    next_review_date, times_attempted, times_correct and ease_factor
+    """
+    with _states_lock:
+        state = _states.get(user_id)
+    if state is None:
+        return
+    with state.lock:
+        state.upsert(row, time.time() / SECONDS_PER_DAY)
+
+
+def remove_question(user_id: str, question_id: str) -> None:
+    with _states_lock:
+        state = _states.get(user_id)
+    if state is None:
+        return
+    with state.lock:
+        state.remove(question_id)
@@ -0,0 +1,349 @@
+"""
+Spaced-repetition scheduling engine (SM-2 and FSRS) on NumPy arrays.
+
+Cards are a dict of equal-length arrays (`CARD_FIELDS`) and `step` applies one
+review to every card at once, so a single answer, a study-session batch and a
+million-card simulation all run the same code:
+
+- SM-2: `repetitions` counts consecutive correct answers (reset by a miss);
+  the interval goes 1 day, 6 days, then interval * ease, and the ease factor
+  moves by the quality-4 / quality-0 updates, floored at 1.3. The backend
+  used to step on `times_correct` instead, so a card answered correctly
+  after a lapse jumped straight to a long interval.
+- FSRS (v4.5 with the published default weights): a per-card memory state,
+  stability (days until recall drops to 90%) and difficulty (1-10), updated
+  from the grade (correct = Good, wrong = Again) and the elapsed time; the
+  next interval is the time until recall falls to the desired retention.
+
+Both memory models are updated on every review and SCHEDULER_ALGORITHM picks
+which one sets the interval, so switching algorithms never starts cards from
+scratch. Intervals are capped at MAX_INTERVAL_DAYS. Mastery levels keep the
+backend's accuracy/attempt rule.
+
+`forecast_load` replays a deck forward day by day, drawing each due review's
+outcome from the card's FSRS recall probability (or its smoothed accuracy
+before it has a memory state), to project the daily review load.
+"""
+
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+SM2 = "sm2"
+FSRS = "fsrs"
+ALGORITHMS = (SM2, FSRS)
+SCHEDULER_ALGORITHM = os.getenv("SCHEDULER_ALGORITHM", SM2)
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+MAX_INTERVAL_DAYS = 36500
+
+FSRS_WEIGHTS = np.array([
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+])
+FSRS_DECAY = -0.5
+FSRS_FACTOR = 0.9 ** (1 / FSRS_DECAY) - 1
+FSRS_DESIRED_RETENTION = float(os.getenv("FSRS_DESIRED_RETENTION", "0.9"))
+GRADE_AGAIN = 1
+GRADE_GOOD = 3
+
+MASTERY_LEVELS = ("new", "learning", "reviewing", "mastered")
+LEARNING, REVIEWING, MASTERED = 1, 2, 3
+
+CARD_FIELDS = (
+    "ease_factor", "interval_days", "repetitions", "times_attempted", "times_correct",
+    "stability", "difficulty", "elapsed_days",
+)
+SCHEDULING_COLUMNS = (
+    "id,ease_factor,interval_days,repetitions,times_attempted,times_correct,"
+    "fsrs_stability,fsrs_difficulty,last_attempted_at,next_review_date"
+)
+SCHEDULING_PAGE_SIZE = 1000
+FORECAST_MAX_DAYS = 365
+
+
+def _days_until(timestamp: str, now: datetime) -> float:
+    """Signed days from `now` to an ISO timestamp (naive ones are UTC, as stored by Postgres)"""
+    parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    if now.tzinfo is None:
+        now = now.astimezone()
+    return (parsed - now).total_seconds() / 86400
+
+
+def _days_since(timestamp: Optional[str], now: datetime) -> float:
+    return max(0.0, -_days_until(timestamp, now)) if timestamp else np.nan
+
+
+def card_arrays(
+        questions: Sequence[Dict[str, Any]],
+        now: Union[datetime, Sequence[datetime]]
+) -> Dict[str, np.ndarray]:
+    """
+    Question rows as card arrays; missing values get the defaults the endpoints
+    always used. `now` (one time, or one per row) dates `elapsed_days`.
+    """
+    times = now if isinstance(now, (list, tuple)) else [now] * len(questions)
+
+    def column(name: str, default: float, dtype=np.float64) -> np.ndarray:
+        values = (question.get(name) for question in questions)
+        return np.fromiter(
+            (default if value is None else value for value in values), dtype=dtype, count=len(questions)
+        )
+
+    ease = column("ease_factor", DEFAULT_EASE)
+    interval = column("interval_days", 1, np.int64)
+    return {
+        # `or` semantics: 0 counts as unset, as in the old inline code
+        "ease_factor": np.where(ease == 0, DEFAULT_EASE, ease),
+        "interval_days": np.where(interval == 0, 1, interval),
+        "repetitions": column("repetitions", 0, np.int64),
+        "times_attempted": column("times_attempted", 0, np.int64),
+        "times_correct": column("times_correct", 0, np.int64),
+        "stability": column("fsrs_stability", np.nan),
+        "difficulty": column("fsrs_difficulty", np.nan),
+        "elapsed_days": np.fromiter(
+            (_days_since(question.get("last_attempted_at"), at) for question, at in zip(questions, times)),
+            dtype=np.float64, count=len(questions)
+        ),
+    }
+
+
+def retrievability(stability: np.ndarray, elapsed_days: np.ndarray) -> np.ndarray:
+    """FSRS probability of recall after `elapsed_days`"""
+    return (1 + FSRS_FACTOR * elapsed_days / stability) ** FSRS_DECAY
+
+
+def _fsrs_initial_difficulty(grade: np.ndarray) -> np.ndarray:
+    return FSRS_WEIGHTS[4] - (grade - 3) * FSRS_WEIGHTS[5]
+
+
+def _fsrs_step(stability: np.ndarray, difficulty: np.ndarray, elapsed_days: np.ndarray, correct: np.ndarray):
+    w = FSRS_WEIGHTS
+    grade = np.where(correct, GRADE_GOOD, GRADE_AGAIN)
+    first = np.isnan(stability) | np.isnan(difficulty)
+    # Placeholder state for first reviews keeps the formulas below NaN-free
+    known_stability = np.where(first, 1.0, stability)
+    known_difficulty = np.where(first, _fsrs_initial_difficulty(grade), difficulty)
+    recall = retrievability(known_stability, np.where(np.isnan(elapsed_days), 0.0, elapsed_days))
+
+    next_difficulty = known_difficulty - w[6] * (grade - 3)
+    next_difficulty = w[7] * _fsrs_initial_difficulty(np.full_like(grade, GRADE_GOOD)) + (1 - w[7]) * next_difficulty
+    recalled_stability = known_stability * (
+        np.exp(w[8]) * (11 - known_difficulty) * known_stability ** -w[9] * np.expm1(w[10] * (1 - recall)) + 1
+    )
+    forgotten_stability = (
+        w[11] * known_difficulty ** -w[12] * ((known_stability + 1) ** w[13] - 1) * np.exp(w[14] * (1 - recall))
+    )
+
+    new_stability = np.where(
+        first, w[grade - 1], np.where(correct, recalled_stability, np.minimum(forgotten_stability, known_stability))
+    )
+    new_difficulty = np.clip(np.where(first, known_difficulty, next_difficulty), 1.0, 10.0)
+    return np.maximum(new_stability, 0.01), new_difficulty
+
+
+def _fsrs_interval(stability: np.ndarray) -> np.ndarray:
+    days = stability / FSRS_FACTOR * (FSRS_DESIRED_RETENTION ** (1 / FSRS_DECAY) - 1)
+    return np.clip(np.rint(days), 1, MAX_INTERVAL_DAYS).astype(np.int64)
+
+
+def step(cards: Dict[str, np.ndarray], correct: np.ndarray, algorithm: str = SCHEDULER_ALGORITHM) -> Dict[str, np.ndarray]:
+    """One review for every card (`correct` is a bool array); returns the new card arrays plus `mastery` codes"""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown scheduling algorithm: {algorithm}")
+    correct = np.asarray(correct, dtype=bool)
+    ease = cards["ease_factor"]
+    interval = cards["interval_days"]
+
+    times_attempted = cards["times_attempted"] + 1
+    times_correct = cards["times_correct"] + correct
+    repetitions = np.where(correct, cards["repetitions"] + 1, 0)
+
+    quality = np.where(correct, 4, 0)
+    new_ease = np.maximum(MIN_EASE, ease + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
+    sm2_interval = np.where(
+        ~correct, 1,
+        np.where(repetitions == 1, 1, np.where(repetitions == 2, 6, np.rint(interval * ease)))
+    )
+    sm2_interval = np.clip(sm2_interval, 1, MAX_INTERVAL_DAYS).astype(np.int64)
+
+    stability, difficulty = _fsrs_step(cards["stability"], cards["difficulty"], cards["elapsed_days"], correct)
+
+    accuracy = times_correct / np.maximum(times_attempted, 1)
+    mastery = np.select(
+        [times_attempted <= 2, (accuracy >= 0.8) & (times_attempted >= 5), accuracy >= 0.6],
+        [LEARNING, MASTERED, REVIEWING],
+        LEARNING
+    )
+
+    return {
+        "ease_factor": np.round(new_ease, 2),
+        "interval_days": sm2_interval if algorithm == SM2 else _fsrs_interval(stability),
+        "repetitions": repetitions,
+        "times_attempted": times_attempted,
+        "times_correct": times_correct,
+        "stability": stability,
+        "difficulty": difficulty,
+        "elapsed_days": np.zeros_like(cards["elapsed_days"]),
+        "mastery": mastery,
+    }
+
+
+def review_cards(
+        questions: Sequence[Dict[str, Any]],
+        correct: Sequence[bool],
+        answered_at: Sequence[datetime],
+        algorithm: str = SCHEDULER_ALGORITHM
+) -> List[Dict[str, Any]]:
+    """One review per question row, in one vectorized step; returns each row's new review columns"""
+    if not questions:
+        return []
+    stepped = step(card_arrays(questions, list(answered_at)), np.asarray(correct, dtype=bool), algorithm)
+
+    columns = {field: values.tolist() for field, values in stepped.items()}
+    updates = []
+    for index, at in enumerate(answered_at):
+        interval = columns["interval_days"][index]
+        updates.append({
+            "times_attempted": columns["times_attempted"][index],
+            "times_correct": columns["times_correct"][index],
+            "last_attempted_at": at.isoformat(),
+            "next_review_date": (at + timedelta(days=interval)).isoformat(),
+            "ease_factor": columns["ease_factor"][index],
+            "interval_days": interval,
+            "repetitions": columns["repetitions"][index],
+            "fsrs_stability": round(columns["stability"][index], 4),
+            "fsrs_difficulty": round(columns["difficulty"][index], 4),
+            "mastery_level": MASTERY_LEVELS[columns["mastery"][index]],
+        })
+    return updates
+
+
+def review_card(
+        question: Dict[str, Any],
+        is_correct: bool,
+        answered_at: datetime,
+        algorithm: str = SCHEDULER_ALGORITHM
+) -> Dict[str, Any]:
+    """The new review columns after one answer"""
+    return review_cards([question], [is_correct], [answered_at], algorithm)[0]
+
+
+def forecast_load(
+        cards: Dict[str, np.ndarray],
+        due_in_days: np.ndarray,
+        days: int = 30,
+        algorithm: str = SCHEDULER_ALGORITHM,
+        new_cards_per_day: float = 0.0,
+        seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Simulate `days` days of reviews: every card due on a day is reviewed, with
+    the outcome drawn from its recall probability, and rescheduled by `step`.
+    New cards arrive at `new_cards_per_day` (Poisson) and are first reviewed
+    the day they arrive. `due_in_days` is each card's next review relative to
+    day 0 (overdue cards are due on day 0).
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = rng.poisson(new_cards_per_day, days) if new_cards_per_day > 0 else np.zeros(days, dtype=np.int64)
+    existing = len(due_in_days)
+    total = existing + int(arrivals.sum())
+
+    deck = {}
+    for field in CARD_FIELDS:
+        values = cards[field]
+        if field in ("stability", "difficulty"):
+            fill = np.nan
+        else:
+            fill = {"ease_factor": DEFAULT_EASE, "interval_days": 1, "elapsed_days": np.nan}.get(field, 0)
+        deck[field] = np.concatenate([values, np.full(total - existing, fill, dtype=values.dtype)])
+    due_day = np.concatenate([
+        np.maximum(0, np.floor(due_in_days)).astype(np.int64),
+        np.repeat(np.arange(days), arrivals),
+    ])
+    last_review_day = np.where(np.isnan(deck["elapsed_days"]), np.nan, -deck["elapsed_days"])
+
+    timeline = []
+    for day in range(days):
+        due = np.flatnonzero(due_day == day)
+        if len(due):
+            batch = {field: deck[field][due] for field in CARD_FIELDS}
+            batch["elapsed_days"] = day - last_review_day[due]
+            remembered = np.where(
+                np.isnan(batch["stability"]),
+                (batch["times_correct"] + 1) / (batch["times_attempted"] + 2),
+                retrievability(batch["stability"], np.nan_to_num(batch["elapsed_days"]))
+            )
+            correct = rng.random(len(due)) < remembered
+            stepped = step(batch, correct, algorithm)
+            for field in CARD_FIELDS:
+                deck[field][due] = stepped[field]
+            last_review_day[due] = day
+            due_day[due] = day + stepped["interval_days"]
+            lapses = int(len(due) - correct.sum())
+        else:
+            lapses = 0
+        timeline.append({"day": day, "reviews": int(len(due)), "lapses": lapses, "new": int(arrivals[day])})
+
+    reviews = [entry["reviews"] for entry in timeline]
+    return {
+        "algorithm": algorithm,
+        "cards": total,
+        "days": timeline,
+        "total_reviews": int(sum(reviews)),
+        "peak_reviews": int(max(reviews, default=0)),
+        "average_reviews": round(sum(reviews) / days, 1) if days else 0,
+    }
+
+
+def _load_cards(supabase_admin, user_id: str) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    last_id = None
+    while True:
+        query = supabase_admin.table("questions") \
+            .select(SCHEDULING_COLUMNS) \
+            .eq("user_id", user_id) \
+            .order("id") \
+            .limit(SCHEDULING_PAGE_SIZE)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        page = query.execute().data or []
+        rows.extend(page)
+        if len(page) < SCHEDULING_PAGE_SIZE:
+            return rows
+        last_id = page[-1]["id"]
+
+
+def forecast_user_load(
+        supabase_admin,
+        user_id: str,
+        days: int = 30,
+        algorithm: str = SCHEDULER_ALGORITHM,
+        seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """Forecast a user's daily reviews from their current deck and their last 30 days' upload rate"""
+    now = datetime.now(timezone.utc)
+    rows = _load_cards(supabase_admin, user_id)
+    added = supabase_admin.table("questions") \
+        .select("id", count="exact", head=True) \
+        .eq("user_id", user_id) \
+        .gte("created_at", (now - timedelta(days=30)).isoformat()) \
+        .execute().count or 0
+
+    # Questions never scheduled are due now
+    due_in_days = np.array([
+        _days_until(row["next_review_date"], now) if row.get("next_review_date") else 0.0 for row in rows
+    ], dtype=np.float64)
+
+    forecast = forecast_load(
+        card_arrays(rows, now), due_in_days, days, algorithm, new_cards_per_day=added / 30, seed=seed
+    )
+    forecast["new_cards_per_day"] = round(added / 30, 2)
+    return forecast
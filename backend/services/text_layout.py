@@ -0,0 +1,143 @@
+"""
+Line layout for the PDF export.
+
+ReportLab's `stringWidth` re-measures the whole string on every call, so
+wrapping by re-measuring `f"{line} {word}"` per word is quadratic in the line
+length, and breaking long words char by char is quadratic again. Here glyph
+widths are cached per font, word widths are summed once, and line ends are
+found with a binary search over cumulative word widths. The standard PDF
+fonts have no kerning, so a string's width is exactly the sum of its glyphs
+and the lines match what `stringWidth` would produce.
+
+`wrap_text` returns the exact lines that get drawn, so heights computed from
+it (`block_height`) can drive pagination instead of character-count guesses.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+# Room for float error in summed widths, far below a visible difference
+_EPSILON = 1e-6
+
+
+class FontMetrics:
+    """Glyph and word widths for one font at 1pt, scaled per call"""
+
+    def __init__(self, font_name: str):
+        self.font_name = font_name
+        self._glyphs: Dict[str, float] = {}
+        self._words: Dict[str, float] = {}
+
+    def glyph_width(self, char: str) -> float:
+        width = self._glyphs.get(char)
+        if width is None:
+            width = self._glyphs[char] = stringWidth(char, self.font_name, 1000) / 1000
+        return width
+
+    def word_width(self, word: str) -> float:
+        width = self._words.get(word)
+        if width is None:
+            glyphs = self._glyphs
+            width = 0.0
+            for char in word:
+                glyph = glyphs.get(char)
+                width += glyph if glyph is not None else self.glyph_width(char)
+            if len(self._words) < 50_000:
+                self._words[word] = width
+        return width
+
+
+_metrics: Dict[str, FontMetrics] = {}
+
+
+def font_metrics(font_name: str) -> FontMetrics:
+    metrics = _metrics.get(font_name)
+    if metrics is None:
+        metrics = _metrics[font_name] = FontMetrics(font_name)
+    return metrics
+
+
+def text_width(text: str, font_name: str, font_size: float) -> float:
+    return font_metrics(font_name).word_width(text) * font_size
+
+
+def _split_long_word(metrics: FontMetrics, word: str, limit: float) -> Tuple[List[str], str, float]:
+    """Break a word wider than `limit` (1pt units): full-width pieces, the remainder and its width"""
+    prefix = list(accumulate(metrics.glyph_width(char) for char in word))
+    pieces = []
+    start, offset = 0, 0.0
+    while prefix[-1] - offset > limit + _EPSILON:
+        # At least one glyph per line, even if a single glyph is wider than the limit
+        end = max(start + 1, bisect_right(prefix, offset + limit + _EPSILON))
+        pieces.append(word[start:end])
+        start, offset = end, prefix[end - 1]
+    if start == len(word):
+        # The last piece is itself wider than the limit: it is the remainder, not an empty string
+        start = len(word) - len(pieces.pop())
+        offset = prefix[start - 1] if start else 0.0
+    return pieces, word[start:], prefix[-1] - offset
+
+
+def wrap_text(text: str, max_width: float, font_name: str = "Helvetica", font_size: float = 11) -> List[str]:
+    """Greedy word wrap; words wider than a line are broken across lines"""
+    words = text.split()
+    if not words:
+        return []
+
+    metrics = font_metrics(font_name)
+    limit = max_width / font_size
+    space = metrics.glyph_width(" ")
+
+    # cumulative[k] = width of words[:k], each followed by a space
+    cumulative = [0.0]
+    cumulative.extend(accumulate(metrics.word_width(word) + space for word in words))
+
+    lines: List[str] = []
+    index = 0
+    # A long word's remainder that starts the current line, with its width
+    head: Optional[str] = None
+    head_width = 0.0
+
+    while index < len(words):
+        if head is None:
+            # Largest end with cumulative[end] - cumulative[index] - space <= limit
+            end = bisect_right(cumulative, cumulative[index] + limit + space + _EPSILON, lo=index + 1) - 1
+            if end > index:
+                lines.append(" ".join(words[index:end]))
+                index = end
+                continue
+
+            pieces, head, head_width = _split_long_word(metrics, words[index], limit)
+            lines.extend(pieces)
+            index += 1
+            continue
+
+        # Fit following words after the remainder: head + space + words[index:end]
+        budget = limit - head_width
+        end = bisect_right(cumulative, cumulative[index] + budget + _EPSILON, lo=index) - 1
+        lines.append(" ".join([head, *words[index:end]]))
+        index = max(end, index)
+        head = None
+
+    if head is not None:
+        lines.append(head)
+    return lines
+
+
+def block_height(lines: List[str], line_height: float) -> float:
+    """Height taken by drawn lines; an empty block still advances one line"""
+    return max(1, len(lines)) * line_height
+
+
+def fit_with_ellipsis(line: str, max_width: float, font_name: str, font_size: float, ellipsis: str = "...") -> str:
+    """Longest prefix of `line` that fits `max_width` together with the ellipsis"""
+    metrics = font_metrics(font_name)
+    limit = max_width / font_size - metrics.word_width(ellipsis)
+    prefix = list(accumulate(metrics.glyph_width(char) for char in line))
+    keep = bisect_right(prefix, limit + _EPSILON)
+    return line[:keep].rstrip() + ellipsis
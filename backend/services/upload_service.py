@@ -0,0 +1,858 @@
+"""
+Screenshot upload pipeline.
+
+The steps of an upload only depend on each other partially:
+
+    quota check ──► Gemini analysis ──► duplicate lookup ──┐
+    storage upload ────────────────────────────────────────┴──► insert/update
+
+so they run as concurrent tasks and end-to-end latency is close to the Gemini
+call alone. If anything fails (quota exceeded, analysis error, client gone) the
+pending tasks are cancelled and an image that already reached storage is
+removed again so no orphaned objects are left in the bucket.
+
+Screenshots the user already uploaded are answered from the analysis cache
+and skip both Gemini and the storage upload. Everything else is preprocessed
+(cropped, downscaled, re-encoded) before it is stored or sent to Gemini.
+
+Streaming mode (`run_streaming_upload_pipeline`) forwards fields of the Gemini
+response as they are generated.
+
+Async mode (`enqueue_upload_analysis`) answers right after inserting a
+`status="pending"` row; a job on `analysis_queue` then runs the same steps and
+fills the row in, retrying Gemini failures with backoff. Retries exhausted
+leave the row as `status="failed"` with the stored image. Jobs only live in
+memory, so rows whose job was lost (restart, redeploy) are failed by a sweep
+once they are older than ANALYSIS_JOB_TIMEOUT_SECONDS.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from backend.services.ai_engine import analyze_screenshot, analyze_screenshot_stream
+from backend.services.analysis_cache import analysis_cache
+from backend.services.analytics_service import invalidate_analytics
+from backend.services.db_errors import is_missing_column
+from backend.services.executor import iterate_blocking, run_blocking
+from backend.services.image_preprocess import IMAGE_PREPROCESS_ENABLED, preprocess_screenshot
+from backend.services.job_queue import TERMINAL_STATUSES, JobQueue
+from backend.services.lazy_analysis import keep_existing_analysis
+
+QUESTION_IMAGES_BUCKET = "question-images"
+GEMINI_CONCURRENCY_PER_KEY = int(os.getenv("GEMINI_CONCURRENCY_PER_KEY", "3"))
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "8"))
+ANALYSIS_JOB_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3"))
+ANALYSIS_JOB_BACKOFF_SECONDS = float(os.getenv("ANALYSIS_JOB_BACKOFF_SECONDS", "2"))
+# Longer than any job takes with all its retries: a row still pending after this has lost its job
+ANALYSIS_JOB_TIMEOUT_SECONDS = int(os.getenv("ANALYSIS_JOB_TIMEOUT_SECONDS", "900"))
+ANALYSIS_RECOVERY_INTERVAL_SECONDS = int(os.getenv("ANALYSIS_RECOVERY_INTERVAL_SECONDS", "300"))
+
+PENDING_QUESTION_TEXT = "Analyzing screenshot..."
+FAILED_QUESTION_TEXT = "Screenshot analysis failed. Please upload it again."
+INTERRUPTED_ANALYSIS_ERROR = "Analysis was interrupted before it finished (server restart)"
+
+# sha256(api key) -> semaphore limiting in-flight Gemini calls for that key
+_key_semaphores: "OrderedDict[str, asyncio.Semaphore]" = OrderedDict()
+
+# Keeps fire-and-forget tasks (cleanup, cache writes) alive until they finish
+_background_tasks: Set[asyncio.Task] = set()
+_recovery_task: Optional[asyncio.Task] = None
+
+
+class UploadQuotaExceeded(Exception):
+    """The free daily upload limit has been used up."""
+
+
+class AnalysisFailed(Exception):
+    """Gemini could not analyze the screenshot."""
+
+
+def upload_day_start() -> datetime:
+    """Start of the (UTC) day the free-tier quota counts uploads in"""
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def uploads_today(supabase_admin, user_id: str) -> int:
+    """The user's uploads today, as counted by the free-tier quota (blocking)"""
+    day_start = upload_day_start()
+    day_end = day_start + timedelta(days=1)
+
+    todays_uploads = supabase_admin.table("questions") \
+        .select("id", count="exact") \
+        .eq("user_id", user_id) \
+        .gte("created_at", day_start.isoformat()) \
+        .lt("created_at", day_end.isoformat()) \
+        .execute()
+    return todays_uploads.count or 0
+
+
+async def count_uploads_today(supabase_admin, user_id: str) -> int:
+    return await run_blocking(uploads_today, supabase_admin, user_id)
+
+
+def build_storage_path(user_id: str, filename: Optional[str], extension: Optional[str] = None) -> str:
+    file_extension = extension or (filename.split('.')[-1] if filename and '.' in filename else 'png')
+    return f"{user_id}/{uuid.uuid4()}.{file_extension}"
+
+
+async def upload_image(supabase_admin, path: str, contents: bytes, content_type: Optional[str]) -> Optional[str]:
+    """Upload to storage and return the public URL (None on failure - not critical)"""
+    try:
+        print(f"☁️  Uploading to Supabase Storage: {path}")
+        bucket = supabase_admin.storage.from_(QUESTION_IMAGES_BUCKET)
+        await run_blocking(bucket.upload, path, contents, file_options={"content-type": content_type or "image/png"})
+
+        image_url = bucket.get_public_url(path)
+        print(f"✅ Image uploaded: {image_url}")
+        return image_url
+    except Exception as storage_error:
+        print(f"⚠️  Storage upload failed: {storage_error}")
+        return None
+
+
+async def _discard_upload(supabase_admin, upload_task: asyncio.Task, path: str) -> None:
+    # A storage PUT already running in a worker thread can't be interrupted,
+    # so wait for it to land and then delete the object.
+    try:
+        image_url = await upload_task
+    except BaseException:
+        return
+    if not image_url:
+        return
+    try:
+        await run_blocking(supabase_admin.storage.from_(QUESTION_IMAGES_BUCKET).remove, [path])
+        print(f"🧹 Removed orphaned upload: {path}")
+    except Exception as cleanup_error:
+        print(f"⚠️  Failed to remove orphaned upload {path}: {cleanup_error}")
+
+
+def _run_in_background(coroutine) -> None:
+    task = asyncio.create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def discard_upload_in_background(supabase_admin, upload_task: asyncio.Task, path: str) -> None:
+    _run_in_background(_discard_upload(supabase_admin, upload_task, path))
+
+
+async def _store_in_cache(user_id: str, contents: bytes, ai_data: Dict[str, Any], image_url: Optional[str]) -> None:
+    try:
+        await run_blocking(analysis_cache.put, user_id, contents, ai_data, image_url)
+    except Exception as cache_error:
+        print(f"⚠️  Failed to cache analysis: {cache_error}")
+
+
+async def lookup_cached_analysis(user_id: str, contents: bytes) -> Optional[Dict[str, Any]]:
+    if analysis_cache is None:
+        return None
+    try:
+        return await run_blocking(analysis_cache.get, user_id, contents)
+    except Exception as cache_error:
+        print(f"⚠️  Analysis cache lookup failed: {cache_error}")
+        return None
+
+
+async def find_duplicate_id(supabase_admin, user_id: str, question_text: str) -> Optional[str]:
+    existing_q = await run_blocking(
+        supabase_admin.table("questions")
+        .select("id")
+        .eq("question_text", question_text)
+        .eq("user_id", user_id)
+        .execute
+    )
+    return existing_q.data[0]['id'] if existing_q.data else None
+
+
+def build_question_row(user_id: str, image_url: Optional[str], ai_data: Dict[str, Any]) -> Dict[str, Any]:
+    question_text = ai_data.get("question_text", "")
+
+    return {
+        "user_id": user_id,
+        "image_url": image_url,
+
+        # Enhanced question data
+        "question_text": question_text,
+        "question_context": ai_data.get("question_context", ""),
+        "actual_question": ai_data.get("actual_question", question_text),
+
+        "subject": ai_data.get("subject"),
+        "topic": ai_data.get("topic"),
+
+        # Options and answers
+        "options": ai_data.get("options", []),
+        "correct_option": ai_data.get("correct_answer"),
+
+        # Question metadata
+        "question_type": ai_data.get("question_type", "mcq"),
+        "has_visual_elements": ai_data.get("has_visual_elements", False),
+        "visual_complexity": ai_data.get("visual_complexity", "low"),
+        "ai_confidence": ai_data.get("ai_confidence", "high"),
+
+        # Complete AI response
+        "content": ai_data,
+
+        "status": "analyzed"
+    }
+
+
+async def save_question(
+        supabase_admin,
+        user_id: str,
+        image_url: Optional[str],
+        ai_data: Dict[str, Any],
+        existing_id: Optional[str]
+) -> Dict[str, Any]:
+    if existing_id:
+        print(f"♻️ Duplicate found. Using existing ID: {existing_id}")
+
+        existing = await run_blocking(
+            supabase_admin.table("questions").select("content").eq("id", existing_id).execute
+        )
+        ai_data = keep_existing_analysis(existing.data[0].get("content") if existing.data else None, ai_data)
+
+        # Update with new image and analysis if available
+        if image_url:
+            await run_blocking(
+                supabase_admin.table("questions").update({
+                    "image_url": image_url,
+                    "content": ai_data
+                }).eq("id", existing_id).execute
+            )
+            invalidate_analytics(user_id)
+        return {"id": existing_id, "is_duplicate": True, "ai_data": ai_data}
+
+    print(f"💾 Inserting new question for user: {user_id}")
+    response = await run_blocking(
+        supabase_admin.table("questions").insert(build_question_row(user_id, image_url, ai_data)).execute
+    )
+
+    invalidate_analytics(user_id)
+
+    new_id = None
+    if response.data:
+        new_id = response.data[0]['id']
+        print(f"✅ Question saved! ID: {new_id}")
+    else:
+        print(f"⚠️  Insert returned no data")
+
+    return {"id": new_id, "is_duplicate": False}
+
+
+async def prepare_image(contents: bytes, content_type: Optional[str], question_type: Optional[str]) -> Dict[str, Any]:
+    """Downscale/crop/re-encode the screenshot; falls back to the original bytes"""
+    if IMAGE_PREPROCESS_ENABLED:
+        try:
+            prepared = await run_blocking(preprocess_screenshot, contents, question_type)
+            stages = ", ".join(f"{s['stage']} {s['ms']}ms" for s in prepared["stages"])
+            print(f"🗜️  Preprocessed: {prepared['bytes_in']} → {prepared['bytes_out']} bytes ({stages})")
+            if prepared["content_type"]:
+                return prepared
+        except Exception as preprocess_error:
+            print(f"⚠️  Preprocessing failed, using original image: {preprocess_error}")
+
+    return {
+        "bytes": contents,
+        "content_type": content_type,
+        "extension": None,
+        "bytes_in": len(contents),
+        "bytes_out": len(contents),
+        "stages": [],
+    }
+
+
+async def _check_quota(supabase_admin, user_id: str, daily_limit: int) -> None:
+    used_today = await count_uploads_today(supabase_admin, user_id)
+    if used_today >= daily_limit:
+        raise UploadQuotaExceeded()
+
+
+def _key_semaphore(api_key: str) -> asyncio.Semaphore:
+    key_id = hashlib.sha256(api_key.encode()).hexdigest()
+    semaphore = _key_semaphores.get(key_id)
+    if semaphore is None:
+        semaphore = _key_semaphores[key_id] = asyncio.Semaphore(GEMINI_CONCURRENCY_PER_KEY)
+        if len(_key_semaphores) > 1024:
+            _key_semaphores.popitem(last=False)
+    _key_semaphores.move_to_end(key_id)
+    return semaphore
+
+
+async def _analyze(contents: bytes, api_key: str, quota_task: Optional[asyncio.Task]) -> Dict[str, Any]:
+    # Free-tier uploads spend the master key, so don't start Gemini until the
+    # (fast) quota query has passed. Uploads with the user's own key start at once.
+    if quota_task is not None:
+        await quota_task
+
+    async with _key_semaphore(api_key):
+        ai_data = await run_blocking(analyze_screenshot, contents, api_key=api_key)
+    if "error" in ai_data:
+        print(f"❌ Gemini error: {ai_data['error']}")
+        raise AnalysisFailed(ai_data["error"])
+
+    print(f"✅ Gemini analysis complete")
+    print(f"   Type: {ai_data.get('question_type')}")
+    print(f"   Visual Elements: {ai_data.get('has_visual_elements')}")
+    print(f"   AI Confidence: {ai_data.get('ai_confidence')}")
+    return ai_data
+
+
+async def run_upload_pipeline(
+        supabase_admin,
+        user_id: str,
+        contents: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        api_key: str,
+        daily_limit: Optional[int] = None,
+        question_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Quota check, storage upload and Gemini analysis run concurrently; the
+    duplicate lookup overlaps with the upload if it is still in flight.
+    Pass `daily_limit=None` to skip the quota check (user-supplied key);
+    `question_type` is an optional client hint that picks the preprocessing profile.
+    """
+    cached = await lookup_cached_analysis(user_id, contents)
+    if cached is not None:
+        print(f"⚡ Analysis cache hit ({cached['match']}), skipping Gemini and storage")
+        ai_data = cached["ai_data"]
+        image_url = cached["image_url"]
+        existing_id = await find_duplicate_id(supabase_admin, user_id, ai_data.get("question_text", ""))
+        # An existing row already points at the cached image, leave it alone
+        saved = await save_question(supabase_admin, user_id, None if existing_id else image_url, ai_data, existing_id)
+        return _upload_result(saved, ai_data, image_url, cached=True)
+
+    prepared = await prepare_image(contents, content_type, question_type)
+    storage_path = build_storage_path(user_id, filename, prepared["extension"])
+
+    quota_task = None
+    if daily_limit is not None:
+        quota_task = asyncio.create_task(_check_quota(supabase_admin, user_id, daily_limit))
+    upload_task = asyncio.create_task(
+        upload_image(supabase_admin, storage_path, prepared["bytes"], prepared["content_type"])
+    )
+    ai_task = asyncio.create_task(_analyze(prepared["bytes"], api_key, quota_task))
+    duplicate_task = None
+
+    try:
+        ai_data = await ai_task
+
+        duplicate_task = asyncio.create_task(
+            find_duplicate_id(supabase_admin, user_id, ai_data.get("question_text", ""))
+        )
+        image_url = await asyncio.shield(upload_task)
+        existing_id = await duplicate_task
+
+        saved = await save_question(supabase_admin, user_id, image_url, ai_data, existing_id)
+
+        if analysis_cache is not None:
+            _run_in_background(_store_in_cache(user_id, contents, ai_data, image_url))
+
+    except BaseException:
+        for task in (quota_task, ai_task, duplicate_task):
+            if task is not None and not task.done():
+                task.cancel()
+        discard_upload_in_background(supabase_admin, upload_task, storage_path)
+        raise
+
+    result = _upload_result(saved, ai_data, image_url, cached=False)
+    result["preprocessing"] = {"bytes_in": prepared["bytes_in"], "bytes_out": prepared["bytes_out"]}
+    return result
+
+
+async def run_streaming_upload_pipeline(
+        supabase_admin,
+        user_id: str,
+        contents: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        api_key: str,
+        daily_limit: Optional[int] = None,
+        question_type: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Same steps as run_upload_pipeline, but yields the analysis while Gemini
+    generates it: "field"/"delta" events from the model stream, then one
+    {"type": "saved", ...} event with the usual upload result plus `timing`.
+    """
+    cached = await lookup_cached_analysis(user_id, contents)
+    if cached is not None:
+        print(f"⚡ Analysis cache hit ({cached['match']}), skipping Gemini and storage")
+        ai_data = cached["ai_data"]
+        for key, value in ai_data.items():
+            yield {"type": "field", "key": key, "value": value}
+        image_url = cached["image_url"]
+        existing_id = await find_duplicate_id(supabase_admin, user_id, ai_data.get("question_text", ""))
+        saved = await save_question(supabase_admin, user_id, None if existing_id else image_url, ai_data, existing_id)
+        yield {"type": "saved", **_upload_result(saved, ai_data, image_url, cached=True), "timing": None}
+        return
+
+    prepared = await prepare_image(contents, content_type, question_type)
+    storage_path = build_storage_path(user_id, filename, prepared["extension"])
+
+    quota_task = None
+    if daily_limit is not None:
+        quota_task = asyncio.create_task(_check_quota(supabase_admin, user_id, daily_limit))
+    upload_task = asyncio.create_task(
+        upload_image(supabase_admin, storage_path, prepared["bytes"], prepared["content_type"])
+    )
+    duplicate_task = None
+
+    try:
+        if quota_task is not None:
+            await quota_task
+
+        ai_data, timing = None, None
+        async with _key_semaphore(api_key):
+            async for event in iterate_blocking(analyze_screenshot_stream, prepared["bytes"], api_key=api_key):
+                if event["type"] == "result":
+                    ai_data, timing = event["data"], event["timing"]
+                else:
+                    yield event
+
+        if ai_data is None or "error" in ai_data:
+            error = ai_data["error"] if ai_data else "Analysis stream ended without a result"
+            print(f"❌ Gemini error: {error}")
+            raise AnalysisFailed(error)
+
+        duplicate_task = asyncio.create_task(
+            find_duplicate_id(supabase_admin, user_id, ai_data.get("question_text", ""))
+        )
+        image_url = await asyncio.shield(upload_task)
+        existing_id = await duplicate_task
+
+        saved = await save_question(supabase_admin, user_id, image_url, ai_data, existing_id)
+
+        if analysis_cache is not None:
+            _run_in_background(_store_in_cache(user_id, contents, ai_data, image_url))
+
+    except BaseException:
+        for task in (quota_task, duplicate_task):
+            if task is not None and not task.done():
+                task.cancel()
+        discard_upload_in_background(supabase_admin, upload_task, storage_path)
+        raise
+
+    result = _upload_result(saved, ai_data, image_url, cached=False)
+    result["preprocessing"] = {"bytes_in": prepared["bytes_in"], "bytes_out": prepared["bytes_out"]}
+    yield {"type": "saved", **result, "timing": timing}
+
+
+def _upload_result(saved: Dict[str, Any], ai_data: Dict[str, Any], image_url: Optional[str], cached: bool) -> Dict[str, Any]:
+    # A duplicate answers with the row's content (which may keep its earlier analysis)
+    ai_data = saved.get("ai_data", ai_data)
+    return {
+        "status": "success",
+        "id": saved["id"],
+        "data": ai_data,
+        "image_url": image_url,
+        "has_visual_elements": ai_data.get("has_visual_elements", False),
+        "ai_confidence": ai_data.get("ai_confidence", "high"),
+        "is_duplicate": saved["is_duplicate"],
+        "cached": cached
+    }
+
+
+async def _process_batch_item(
+        supabase_admin,
+        user_id: str,
+        index: int,
+        upload: Tuple[Optional[str], Optional[str], bytes],
+        api_key: str,
+        question_type: Optional[str]
+) -> Dict[str, Any]:
+    filename, content_type, contents = upload
+    item: Dict[str, Any] = {"index": index, "filename": filename, "upload_task": None, "storage_path": None}
+
+    cached = await lookup_cached_analysis(user_id, contents)
+    if cached is not None:
+        item.update(ai_data=cached["ai_data"], image_url=cached["image_url"], cached=True)
+        return item
+
+    prepared = await prepare_image(contents, content_type, question_type)
+    item["storage_path"] = build_storage_path(user_id, filename, prepared["extension"])
+    item["upload_task"] = asyncio.create_task(
+        upload_image(supabase_admin, item["storage_path"], prepared["bytes"], prepared["content_type"])
+    )
+    try:
+        item["ai_data"] = await _analyze(prepared["bytes"], api_key, None)
+        item["image_url"] = await asyncio.shield(item["upload_task"])
+    except BaseException as item_error:
+        discard_upload_in_background(supabase_admin, item["upload_task"], item["storage_path"])
+        item["upload_task"] = None
+        if not isinstance(item_error, Exception):
+            raise
+        item["error"] = str(item_error) or type(item_error).__name__
+        return item
+
+    item["cached"] = False
+    if analysis_cache is not None:
+        _run_in_background(_store_in_cache(user_id, contents, item["ai_data"], item["image_url"]))
+    return item
+
+
+def question_text_hash(question_text: Optional[str]) -> str:
+    """The questions.question_text_hash column: md5 of the UTF-8 text"""
+    return hashlib.md5((question_text or "").encode()).hexdigest()
+
+
+async def _find_duplicate_ids(supabase_admin, user_id: str, texts: List[str]) -> Dict[str, str]:
+    """question_text -> id of the user's existing row, in one lookup by text hash"""
+    hashes = {question_text_hash(text): text for text in texts}
+    try:
+        existing = await run_blocking(
+            supabase_admin.table("questions")
+            .select("id,question_text_hash")
+            .eq("user_id", user_id)
+            .in_("question_text_hash", list(hashes))
+            .execute
+        )
+    except Exception as lookup_error:
+        if not is_missing_column(lookup_error):
+            raise
+        # The question text hash migration hasn't been applied yet
+        ids = await asyncio.gather(*(find_duplicate_id(supabase_admin, user_id, text) for text in texts))
+        return {text: question_id for text, question_id in zip(texts, ids) if question_id}
+    return {hashes[row["question_text_hash"]]: row["id"] for row in existing.data or []}
+
+
+async def _bulk_save(supabase_admin, user_id: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One duplicate lookup + one bulk insert for every analyzed item of a batch"""
+    texts = list({item["ai_data"].get("question_text", "") for item in items})
+    existing_ids = await _find_duplicate_ids(supabase_admin, user_id, texts) if texts else {}
+
+    saved: List[Dict[str, Any]] = []
+    to_insert: List[Dict[str, Any]] = []
+    first_in_batch: Dict[str, Dict[str, Any]] = {}
+
+    for item in items:
+        question_text = item["ai_data"].get("question_text", "")
+        result = {"type": "saved", "index": item["index"], "image_url": item["image_url"], "cached": item["cached"]}
+
+        if question_text in existing_ids or question_text in first_in_batch:
+            if question_text in existing_ids:
+                result.update(id=existing_ids[question_text], is_duplicate=True)
+            else:
+                # Same question twice in one batch: resolved once the first one is inserted
+                result.update(is_duplicate=True, duplicate_of=first_in_batch[question_text])
+            # Unlike the single upload, a batch doesn't rewrite existing rows, so
+            # the copy we just stored for a duplicate isn't referenced anywhere
+            if item["upload_task"] is not None:
+                discard_upload_in_background(supabase_admin, item["upload_task"], item["storage_path"])
+                item["upload_task"] = None
+                result["image_url"] = None
+        else:
+            first_in_batch[question_text] = result
+            result["is_duplicate"] = False
+            to_insert.append(build_question_row(user_id, item["image_url"], item["ai_data"]))
+        saved.append(result)
+
+    if to_insert:
+        print(f"💾 Bulk inserting {len(to_insert)} questions for user: {user_id}")
+        response = await run_blocking(supabase_admin.table("questions").insert(to_insert).execute)
+        invalidate_analytics(user_id)
+        inserted = response.data or []
+        for result, row in zip([r for r in saved if r.get("is_duplicate") is False], inserted):
+            result["id"] = row.get("id")
+
+    for result in saved:
+        original = result.pop("duplicate_of", None)
+        if original is not None:
+            result["id"] = original.get("id")
+
+    return saved
+
+
+async def run_batch_upload_pipeline(
+        supabase_admin,
+        user_id: str,
+        uploads: List[Tuple[Optional[str], Optional[str], bytes]],
+        api_key: str,
+        daily_limit: Optional[int] = None,
+        question_type: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analyze many screenshots and yield per-item events as they finish.
+
+    `uploads` is a list of (filename, content_type, bytes). The daily quota is
+    checked once for the whole batch; Gemini calls share the per-key
+    concurrency limit. Analyzed items are saved with a single bulk insert.
+
+    Events: {"type": "item", "status": "analyzed"|"failed"|"rejected", ...},
+    then one {"type": "saved", ...} per analyzed item and a final {"type": "summary"}.
+    """
+    accepted = len(uploads)
+    if daily_limit is not None:
+        used_today = await count_uploads_today(supabase_admin, user_id)
+        accepted = max(0, min(accepted, daily_limit - used_today))
+
+    summary = {"type": "summary", "total": len(uploads), "analyzed": 0, "failed": 0, "rejected": 0,
+               "saved": 0, "duplicates": 0}
+
+    for index in range(accepted, len(uploads)):
+        summary["rejected"] += 1
+        yield {
+            "type": "item",
+            "index": index,
+            "filename": uploads[index][0],
+            "status": "rejected",
+            "error": "Free daily limit reached. Add your Gemini API key in settings to continue uploads."
+        }
+
+    tasks = [
+        asyncio.create_task(_process_batch_item(supabase_admin, user_id, index, uploads[index], api_key, question_type))
+        for index in range(accepted)
+    ]
+    analyzed: List[Dict[str, Any]] = []
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            if "error" in item:
+                summary["failed"] += 1
+                yield {"type": "item", "index": item["index"], "filename": item["filename"],
+                       "status": "failed", "error": item["error"]}
+                continue
+
+            summary["analyzed"] += 1
+            analyzed.append(item)
+            yield {"type": "item", "index": item["index"], "filename": item["filename"], "status": "analyzed",
+                   "cached": item["cached"], "data": item["ai_data"]}
+
+        analyzed.sort(key=lambda entry: entry["index"])
+        saved = await _bulk_save(supabase_admin, user_id, analyzed) if analyzed else []
+
+    except BaseException:
+        # Client went away or the insert failed: nothing of this batch is kept
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        for item in analyzed:
+            if item["upload_task"] is not None:
+                discard_upload_in_background(supabase_admin, item["upload_task"], item["storage_path"])
+        raise
+
+    for result in saved:
+        summary["saved"] += 1
+        summary["duplicates"] += 1 if result["is_duplicate"] else 0
+        yield result
+
+    yield summary
+
+
+# ---- async mode ------------------------------------------------------------
+
+async def _mark_analysis_failed(job: Dict[str, Any]) -> None:
+    payload = job["payload"]
+    await run_blocking(
+        payload["supabase_admin"].table("questions").update({
+            "status": "failed",
+            "question_text": FAILED_QUESTION_TEXT,
+            "image_url": payload.get("image_url"),
+            "content": {"error": job["error"]}
+        }).eq("id", job["id"]).execute
+    )
+    _release_job_payload(payload)
+
+
+def _release_job_payload(payload: Dict[str, Any]) -> None:
+    # Finished jobs stay around for polling; don't keep the image and key with them
+    for key in ("contents", "prepared", "api_key"):
+        payload.pop(key, None)
+
+
+async def _run_analysis_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    payload = job["payload"]
+    supabase_admin = payload["supabase_admin"]
+    user_id = payload["user_id"]
+    question_id = job["id"]
+    contents = payload["contents"]
+
+    # The cache and the storage upload are only needed once; retries redo Gemini
+    if "cached" not in payload:
+        cached = await lookup_cached_analysis(user_id, contents)
+        payload["cached"] = cached is not None
+        if cached is not None:
+            print(f"⚡ Analysis cache hit ({cached['match']}) for pending question {question_id}")
+            payload["ai_data"] = cached["ai_data"]
+            payload["image_url"] = cached["image_url"]
+
+    if "ai_data" not in payload:
+        if "prepared" not in payload:
+            payload["prepared"] = await prepare_image(contents, payload["content_type"], payload["question_type"])
+        prepared = payload["prepared"]
+
+        upload_task = None
+        if "image_url" not in payload:
+            storage_path = build_storage_path(user_id, payload["filename"], prepared["extension"])
+            upload_task = asyncio.create_task(
+                upload_image(supabase_admin, storage_path, prepared["bytes"], prepared["content_type"])
+            )
+
+        analysis_queue.set_progress(job, stage="analyzing")
+        try:
+            payload["ai_data"] = await _analyze(prepared["bytes"], payload["api_key"], None)
+        finally:
+            # Keep the image even if Gemini failed: a failed row still shows it
+            if upload_task is not None:
+                payload["image_url"] = await asyncio.shield(upload_task)
+
+    analysis_queue.set_progress(job, stage="saving")
+    ai_data = payload["ai_data"]
+    image_url = payload.get("image_url")
+
+    existing_q = await run_blocking(
+        supabase_admin.table("questions")
+        .select("id")
+        .eq("question_text", ai_data.get("question_text", ""))
+        .eq("user_id", user_id)
+        .neq("id", question_id)
+        .execute
+    )
+    existing_id = existing_q.data[0]['id'] if existing_q.data else None
+
+    if existing_id:
+        # Same behaviour as the synchronous upload: the existing row wins
+        saved = await save_question(supabase_admin, user_id, image_url, ai_data, existing_id)
+        await run_blocking(supabase_admin.table("questions").delete().eq("id", question_id).execute)
+    else:
+        row = build_question_row(user_id, image_url, ai_data)
+        row.pop("user_id")
+        await run_blocking(supabase_admin.table("questions").update(row).eq("id", question_id).execute)
+        saved = {"id": question_id, "is_duplicate": False}
+        print(f"✅ Pending question analyzed: {question_id}")
+    # The placeholder row got its subject/topic, or was replaced by the existing one
+    invalidate_analytics(user_id)
+
+    if analysis_cache is not None and not payload["cached"]:
+        _run_in_background(_store_in_cache(user_id, contents, ai_data, image_url))
+
+    _release_job_payload(payload)
+    return _upload_result(saved, ai_data, image_url, cached=payload["cached"])
+
+
+analysis_queue = JobQueue(
+    "screenshot-analysis",
+    _run_analysis_job,
+    workers=ANALYSIS_JOB_WORKERS,
+    max_attempts=ANALYSIS_JOB_MAX_ATTEMPTS,
+    backoff_seconds=ANALYSIS_JOB_BACKOFF_SECONDS
+)
+
+
+async def enqueue_upload_analysis(
+        supabase_admin,
+        user_id: str,
+        contents: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        api_key: str,
+        daily_limit: Optional[int] = None,
+        question_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Insert a pending question row and queue its analysis.
+    The job id is the question id, so clients can also watch the row itself.
+    """
+    if daily_limit is not None:
+        await _check_quota(supabase_admin, user_id, daily_limit)
+
+    response = await run_blocking(
+        supabase_admin.table("questions").insert({
+            "user_id": user_id,
+            "question_text": PENDING_QUESTION_TEXT,
+            "content": {},
+            "status": "pending"
+        }).execute
+    )
+    invalidate_analytics(user_id)
+    if not response.data:
+        raise RuntimeError("Could not create pending question")
+    question_id = response.data[0]['id']
+    print(f"🕒 Pending question created: {question_id}")
+
+    job = analysis_queue.submit(
+        {
+            "supabase_admin": supabase_admin,
+            "user_id": user_id,
+            "contents": contents,
+            "filename": filename,
+            "content_type": content_type,
+            "api_key": api_key,
+            "question_type": question_type,
+        },
+        owner=user_id,
+        job_id=question_id,
+        on_dead=_mark_analysis_failed
+    )
+    return {"status": "queued", "job_id": job["id"], "id": question_id}
+
+
+# ---- recovery of pending rows whose job was lost ----------------------------
+
+def is_orphaned_pending(row: Dict[str, Any]) -> bool:
+    """A pending row with no live job on this process, older than any job can take"""
+    if row.get("status") != "pending":
+        return False
+    job = analysis_queue.get(row["id"])
+    if job is not None and job["status"] not in TERMINAL_STATUSES:
+        return False
+    created_at = datetime.fromisoformat(row["created_at"])
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at < datetime.utcnow() - timedelta(seconds=ANALYSIS_JOB_TIMEOUT_SECONDS)
+
+
+def fail_orphaned_pending(supabase_admin, question_ids: List[str]) -> None:
+    """
+    Mark lost pending rows failed (blocking). The screenshot only reaches storage
+    and the user's key only lives in the job, so there is nothing to re-run.
+    """
+    if not question_ids:
+        return
+    supabase_admin.table("questions").update({
+        "status": "failed",
+        "question_text": FAILED_QUESTION_TEXT,
+        "content": {"error": INTERRUPTED_ANALYSIS_ERROR}
+    }).in_("id", question_ids).eq("status", "pending").execute()
+
+
+def recover_pending_questions(supabase_admin) -> int:
+    """Fail every pending row whose job was lost (restart, redeploy, dead worker); blocking"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ANALYSIS_JOB_TIMEOUT_SECONDS)
+    rows = supabase_admin.table("questions") \
+        .select("id,status,created_at") \
+        .eq("status", "pending") \
+        .lt("created_at", cutoff.isoformat()) \
+        .execute().data or []
+    orphaned = [row["id"] for row in rows if is_orphaned_pending(row)]
+    fail_orphaned_pending(supabase_admin, orphaned)
+    if orphaned:
+        print(f"🧹 Marked {len(orphaned)} interrupted pending uploads as failed")
+    return len(orphaned)
+
+
+async def _recover_periodically(supabase_admin) -> None:
+    while True:
+        try:
+            await run_blocking(recover_pending_questions, supabase_admin)
+        except Exception as recovery_error:
+            print(f"⚠️  Pending upload recovery failed: {recovery_error}")
+        await asyncio.sleep(ANALYSIS_RECOVERY_INTERVAL_SECONDS)
+
+
+def schedule_pending_recovery(supabase_admin) -> None:
+    """Sweep lost pending rows now and every ANALYSIS_RECOVERY_INTERVAL_SECONDS (once per process)"""
+    global _recovery_task
+    if ANALYSIS_RECOVERY_INTERVAL_SECONDS <= 0:
+        return
+    if _recovery_task is None or _recovery_task.done():
+        _recovery_task = asyncio.create_task(_recover_periodically(supabase_admin))
@@ -438,7 +438,7 @@ function Dashboard({
             )}
 
             {activeTab === 'analytics' && (
-              <AnalyticsDashboard mistakes={mistakes} />
+              <AnalyticsDashboard />
             )}
           </div>
         </div>
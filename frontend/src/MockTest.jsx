@@ -5,6 +5,43 @@ import remarkMath from 'remark-math'
 import rehypeKatex from 'rehype-katex'
 import 'katex/dist/katex.min.css'
 import { normalizeMathText } from './utils/mathText'
+import { ANALYSIS_PENDING_TEXT, isAnalysisPending, useLazyAnalysis } from './hooks/useLazyAnalysis'
+
+// Lazy mode: pending analyses are generated one question at a time, on request,
+// so reviewing a whole test doesn't spend the daily limit on every question
+function AiSolution({ question, RenderText }) {
+  const [requested, setRequested] = useState(false)
+  const { content, loading, pending } = useLazyAnalysis(question, requested)
+  const analysis = content?.detailed_analysis || question.content?.detailed_analysis
+
+  if (!analysis && !isAnalysisPending(question)) return null
+
+  return (
+    <div className="mt-4 p-4 bg-orange-50 dark:bg-orange-900/20 border border-orange-200 dark:border-orange-700 rounded-lg">
+      <div className="flex items-center gap-2 mb-3">
+        <span className="text-orange-600 dark:text-orange-400 font-semibold text-sm">
+          🤖 AI Solution:
+        </span>
+      </div>
+      <div className="text-sm text-gray-800 dark:text-gray-200">
+        {analysis ? (
+          <RenderText content={analysis} />
+        ) : loading ? (
+          <span className="italic text-gray-500 dark:text-gray-400">Generating analysis…</span>
+        ) : pending ? (
+          <span className="italic text-gray-500 dark:text-gray-400">{ANALYSIS_PENDING_TEXT}</span>
+        ) : (
+          <button
+            onClick={() => setRequested(true)}
+            className="px-3 py-1.5 bg-orange-500 hover:bg-orange-600 text-white text-xs font-semibold rounded-lg transition-all"
+          >
+            Generate AI solution
+          </button>
+        )}
+      </div>
+    </div>
+  )
+}
 
 function MockTest({ questions, onComplete, onExit, timeLimit }) {
   const [currentIndex, setCurrentIndex] = useState(0)
@@ -193,18 +230,7 @@ function MockTest({ questions, onComplete, onExit, timeLimit }) {
                       </div>
 
                       {/* Show AI Analysis when toggle is ON */}
-                      {showImageDescriptions && q.content?.detailed_analysis && (
-                        <div className="mt-4 p-4 bg-orange-50 dark:bg-orange-900/20 border border-orange-200 dark:border-orange-700 rounded-lg">
-                          <div className="flex items-center gap-2 mb-3">
-                            <span className="text-orange-600 dark:text-orange-400 font-semibold text-sm">
-                              🤖 AI Solution:
-                            </span>
-                          </div>
-                          <div className="text-sm text-gray-800 dark:text-gray-200">
-                            <RenderText content={q.content.detailed_analysis} />
-                          </div>
-                        </div>
-                      )}
+                      {showImageDescriptions && <AiSolution question={q} RenderText={RenderText} />}
                     </div>
                   </div>
                 </div>
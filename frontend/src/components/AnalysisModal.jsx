@@ -4,23 +4,35 @@ import remarkMath from 'remark-math';
 import rehypeKatex from 'rehype-katex';
 import 'katex/dist/katex.min.css';
 import { normalizeMathText, formatAnalysisText } from '../utils/mathText';
+import { ANALYSIS_PENDING_TEXT, isAnalysisPending, useLazyAnalysis } from '../hooks/useLazyAnalysis';
 
 function AnalysisModal({ isOpen, analysis, question, onClose, onPrev, onNext, hasPrev = false, hasNext = false }) {
+  // Lazy mode: a pending question gets its analysis generated when opened
+  const { content: lazyContent, loading: analysisLoading, pending: analysisPending } =
+    useLazyAnalysis(analysis ? null : question, isOpen);
+
   if (!isOpen) return null;
 
-  const data = analysis || (question?.content ?
+  const data = analysis || lazyContent || (question?.content ?
     (typeof question.content === 'string' ? JSON.parse(question.content) : question.content)
     : null);
 
   if (!data && !question) return null;
 
-  const displayData = data || {
+  const analysisPlaceholder = analysisLoading ? 'Generating analysis…'
+    : analysisPending ? ANALYSIS_PENDING_TEXT
+    : 'Analysis not available';
+
+  const displayData = data ? {
+    ...data,
+    detailed_analysis: data.detailed_analysis || (isAnalysisPending({ content: data }) ? analysisPlaceholder : undefined)
+  } : {
     subject: question?.subject,
     topic: question?.topic,
     question_text: question?.question_text,
     options: question?.options,
     correct_answer: question?.correct_option,
-    detailed_analysis: question?.content?.detailed_analysis || 'Analysis not available'
+    detailed_analysis: question?.content?.detailed_analysis || analysisPlaceholder
   };
 
   const RenderText = ({ content, wrapExpression = false, className = '' }) => (
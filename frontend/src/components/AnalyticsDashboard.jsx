@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import {
   LineChart, Line, BarChart, Bar, PieChart, Pie, Cell,
   XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, Area, AreaChart
@@ -8,27 +8,67 @@ import {
   AlertTriangle, CheckCircle, Calendar, Clock, Zap
 } from 'lucide-react'
 import { motion } from 'framer-motion'
-import {
-  getAccuracyTrend,
-  getSubjectBreakdown,
-  getTopicBreakdown,
-  getStudyHeatmap,
-  getInsights,
-  getMasteryDistribution,
-  getBestStudyTime
-} from '../utils/analytics'
-
-function AnalyticsDashboard({ mistakes }) {
+import { supabase } from '../supabaseClient'
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000'
+
+async function fetchAnalytics(path) {
+  const { data: { session } } = await supabase.auth.getSession()
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    headers: { Authorization: `Bearer ${session?.access_token}` }
+  })
+  if (!response.ok) throw new Error(`Analytics request failed (${response.status})`)
+  return response.json()
+}
+
+function AnalyticsDashboard() {
   const [selectedSubject, setSelectedSubject] = useState('All')
+  const [summary, setSummary] = useState(null)
+  const [subjectTopics, setSubjectTopics] = useState(null)
+  const [error, setError] = useState(null)
+
+  // All charts are aggregated server-side; the summary is a few KB however many questions there are
+  useEffect(() => {
+    const tzOffset = new Date().getTimezoneOffset()
+    fetchAnalytics(`/analytics/summary?tz_offset=${tzOffset}`)
+      .then(setSummary)
+      .catch(err => setError(err.message))
+  }, [])
+
+  useEffect(() => {
+    setSubjectTopics(null)
+    if (selectedSubject === 'All') return
+    let cancelled = false
+    fetchAnalytics(`/analytics/topics?subject=${encodeURIComponent(selectedSubject)}`)
+      .then(topics => { if (!cancelled) setSubjectTopics(topics) })
+      .catch(err => setError(err.message))
+    return () => { cancelled = true }
+  }, [selectedSubject])
+
+  if (error) {
+    return (
+      <div className="text-center py-12 text-red-600 dark:text-red-400">
+        Could not load analytics: {error}
+      </div>
+    )
+  }
+
+  if (!summary) {
+    return (
+      <div className="text-center py-12 text-gray-600 dark:text-gray-400">
+        Loading analytics...
+      </div>
+    )
+  }
 
-  // Calculate all analytics
-  const accuracyTrend = getAccuracyTrend(mistakes)
-  const subjectBreakdown = getSubjectBreakdown(mistakes)
-  const topicBreakdown = getTopicBreakdown(mistakes, selectedSubject)
-  const studyHeatmap = getStudyHeatmap(mistakes)
-  const insights = getInsights(mistakes)
-  const masteryDist = getMasteryDistribution(mistakes)
-  const bestTime = getBestStudyTime(mistakes)
+  const accuracyTrend = summary.accuracy_trend
+  const subjectBreakdown = summary.subjects
+  const topicBreakdown = selectedSubject === 'All' ? summary.topics : (subjectTopics || [])
+  const studyHeatmap = summary.heatmap
+  const insights = summary.insights
+  const masteryDist = summary.mastery
+  const bestTime = summary.best_time
+  const totalQuestions = summary.total_questions
 
   // Chart colors
   const COLORS = {
@@ -45,7 +85,7 @@ function AnalyticsDashboard({ mistakes }) {
     visible: { opacity: 1, y: 0, transition: { duration: 0.3 } }
   }
 
-  if (mistakes.length === 0) {
+  if (totalQuestions === 0) {
     return (
       <div className="text-center py-12">
         <BarChart size={64} className="mx-auto mb-4 text-gray-400 opacity-50" />
@@ -383,7 +423,7 @@ function AnalyticsDashboard({ mistakes }) {
               <div className="h-3 bg-gray-200 dark:bg-gray-700 rounded-full overflow-hidden">
                 <div
                   className="h-full bg-gray-400 rounded-full transition-all"
-                  style={{ width: `${(masteryDist.new / mistakes.length) * 100}%` }}
+                  style={{ width: `${(masteryDist.new / totalQuestions) * 100}%` }}
                 />
               </div>
             </div>
@@ -396,7 +436,7 @@ function AnalyticsDashboard({ mistakes }) {
               <div className="h-3 bg-gray-200 dark:bg-gray-700 rounded-full overflow-hidden">
                 <div
                   className="h-full bg-orange-500 rounded-full transition-all"
-                  style={{ width: `${(masteryDist.learning / mistakes.length) * 100}%` }}
+                  style={{ width: `${(masteryDist.learning / totalQuestions) * 100}%` }}
                 />
               </div>
             </div>
@@ -409,7 +449,7 @@ function AnalyticsDashboard({ mistakes }) {
               <div className="h-3 bg-gray-200 dark:bg-gray-700 rounded-full overflow-hidden">
                 <div
                   className="h-full bg-yellow-500 rounded-full transition-all"
-                  style={{ width: `${(masteryDist.reviewing / mistakes.length) * 100}%` }}
+                  style={{ width: `${(masteryDist.reviewing / totalQuestions) * 100}%` }}
                 />
               </div>
             </div>
@@ -422,7 +462,7 @@ function AnalyticsDashboard({ mistakes }) {
               <div className="h-3 bg-gray-200 dark:bg-gray-700 rounded-full overflow-hidden">
                 <div
                   className="h-full bg-green-500 rounded-full transition-all"
-                  style={{ width: `${(masteryDist.mastered / mistakes.length) * 100}%` }}
+                  style={{ width: `${(masteryDist.mastered / totalQuestions) * 100}%` }}
                 />
               </div>
             </div>
@@ -3,6 +3,9 @@ import { FileDown, Loader2, X } from 'lucide-react'
 import { supabase } from '../supabaseClient'
 
 const API_BASE_URL = 'http://127.0.0.1:8000'
+const EXPORT_POLL_INTERVAL_MS = 1000
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms))
 
 function ExportModal({ isOpen, onClose, mistakes = [] }) {
   const [filters, setFilters] = useState({
@@ -22,6 +25,7 @@ function ExportModal({ isOpen, onClose, mistakes = [] }) {
 
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
+  const [progress, setProgress] = useState(null)
 
   const subjects = useMemo(() => {
     return [...new Set(mistakes.map(m => m.subject).filter(Boolean))]
@@ -37,20 +41,44 @@ function ExportModal({ isOpen, onClose, mistakes = [] }) {
   const handleExport = async () => {
     setLoading(true)
     setError('')
+    setProgress(null)
 
     try {
       const { data: { session } } = await supabase.auth.getSession()
-      const response = await fetch(`${API_BASE_URL}/api/generate-custom-pdf`, {
+      const authHeaders = { 'Authorization': `Bearer ${session?.access_token}` }
+
+      const createResponse = await fetch(`${API_BASE_URL}/api/pdf-exports`, {
         method: 'POST',
         headers: {
-          'Authorization': `Bearer ${session?.access_token}`,
+          ...authHeaders,
           'Content-Type': 'application/json'
         },
         body: JSON.stringify({ filters, options })
       })
 
+      if (!createResponse.ok) {
+        const body = await createResponse.json().catch(() => ({}))
+        throw new Error(body.detail || 'Failed to generate export PDF')
+      }
+
+      // Poll the background job until the PDF is rendered
+      let job = await createResponse.json()
+      while (job.status !== 'done') {
+        if (job.status === 'dead') {
+          throw new Error('Failed to generate export PDF')
+        }
+        await sleep(EXPORT_POLL_INTERVAL_MS)
+        const statusResponse = await fetch(`${API_BASE_URL}/api/pdf-exports/${job.job_id}`, { headers: authHeaders })
+        if (!statusResponse.ok) {
+          throw new Error('Lost track of the export, please try again')
+        }
+        job = await statusResponse.json()
+        setProgress(job.progress)
+      }
+
+      const response = await fetch(`${API_BASE_URL}/api/pdf-exports/${job.job_id}/download`, { headers: authHeaders })
       if (!response.ok) {
-        throw new Error('Failed to generate export PDF')
+        throw new Error('Failed to download export PDF')
       }
 
       const blob = await response.blob()
@@ -67,9 +95,14 @@ function ExportModal({ isOpen, onClose, mistakes = [] }) {
       setError(err.message || 'Export failed')
     } finally {
       setLoading(false)
+      setProgress(null)
     }
   }
 
+  const progressLabel = progress?.stage === 'rendering' && progress.total
+    ? `Rendering ${progress.rendered}/${progress.total}...`
+    : 'Generating...'
+
   return (
     <div className="fixed inset-0 z-50 flex items-center justify-center p-4 bg-black/50 backdrop-blur-sm">
       <div className="w-full max-w-3xl rounded-2xl border border-gray-200 dark:border-gray-700 bg-white dark:bg-gray-900 shadow-2xl">
@@ -128,6 +161,12 @@ function ExportModal({ isOpen, onClose, mistakes = [] }) {
             </div>
           </div>
 
+          {loading && progress?.total > 0 && (
+            <div className="h-2 w-full rounded-full bg-gray-200 dark:bg-gray-700 overflow-hidden">
+              <div className="h-full bg-blue-600 transition-all" style={{ width: `${Math.round((progress.rendered / progress.total) * 100)}%` }} />
+            </div>
+          )}
+
           {error && <div className="text-sm text-red-500">{error}</div>}
         </div>
 
@@ -135,7 +174,7 @@ function ExportModal({ isOpen, onClose, mistakes = [] }) {
           <button onClick={onClose} className="px-4 py-2 rounded-lg border border-gray-300 dark:border-gray-600">Cancel</button>
           <button onClick={handleExport} disabled={loading} className="px-4 py-2 rounded-lg bg-blue-600 text-white flex items-center gap-2 disabled:opacity-50">
             {loading ? <Loader2 size={16} className="animate-spin" /> : <FileDown size={16} />}
-            {loading ? 'Generating...' : 'Export PDF'}
+            {loading ? progressLabel : 'Export PDF'}
           </button>
         </div>
       </div>
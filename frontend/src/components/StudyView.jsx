@@ -1,5 +1,6 @@
 import { useEffect, useState, useRef } from 'react'
 import { ChevronLeft, ChevronRight, Trash2, Pencil, Save, X, Plus, Minus, Maximize2, Minimize2, BookOpen, StickyNote, Sparkles, Eye, EyeOff } from 'lucide-react'
+import { ANALYSIS_PENDING_TEXT, useLazyAnalysis } from '../hooks/useLazyAnalysis'
 
 // KaTeX for LaTeX rendering
 const KATEX_CDN = 'https://cdn.jsdelivr.net/npm/katex@0.16.9/dist/katex.min.js'
@@ -119,6 +120,7 @@ function StudyView({ question, isOpen, onClose, onPrev, onNext, hasPrev, hasNext
   const [form, setForm] = useState(null)
   const [showAnswer, setShowAnswer] = useState(false)
   const [saving, setSaving] = useState(false)
+  const { content: lazyContent, loading: analysisLoading, pending: analysisPending } = useLazyAnalysis(question, isOpen)
 
   useEffect(() => {
     if (!question) return
@@ -136,6 +138,8 @@ function StudyView({ question, isOpen, onClose, onPrev, onNext, hasPrev, hasNext
 
   if (!isOpen || !question || !form) return null
 
+  const detailedAnalysis = lazyContent?.detailed_analysis || question?.content?.detailed_analysis
+
   const options = ['A', 'B', 'C', 'D']
   const subjectColors = {
     Math: 'bg-violet-500/20 text-violet-300 border-violet-500/30',
@@ -395,10 +399,14 @@ function StudyView({ question, isOpen, onClose, onPrev, onNext, hasPrev, hasNext
         {/* ── Gemini Analysis card ── */}
         <SectionCard icon={Sparkles} title="Gemini Analysis" accent="violet">
           <div className="p-5">
-            {question?.content?.detailed_analysis ? (
+            {detailedAnalysis ? (
               <div className="text-slate-300 text-sm leading-relaxed">
-                <LatexText text={question.content.detailed_analysis} />
+                <LatexText text={detailedAnalysis} />
               </div>
+            ) : analysisLoading ? (
+              <p className="text-slate-500 text-sm italic">Generating analysis…</p>
+            ) : analysisPending ? (
+              <p className="text-slate-500 text-sm italic">{ANALYSIS_PENDING_TEXT}</p>
             ) : (
               <p className="text-slate-600 text-sm italic">No analysis available for this question.</p>
             )}
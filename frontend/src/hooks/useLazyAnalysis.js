@@ -0,0 +1,58 @@
+import { useEffect, useState } from 'react'
+import { supabase } from '../supabaseClient'
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000'
+const GEMINI_API_KEY_STORAGE_KEY = 'ssc_gemini_api_key'
+
+export const ANALYSIS_PENDING_TEXT =
+  'Analysis not generated yet (free daily limit reached?). Open this question again tomorrow, or add your Gemini API key in settings.'
+
+export function isAnalysisPending(question) {
+  return question?.content?.analysis_status === 'pending'
+}
+
+// Uploads only store the extraction; the backend writes the analysis on first read.
+// `content` is the question's content once fetched, `pending` stays true when the
+// backend left it pending (free daily limit reached or generation failed).
+export function useLazyAnalysis(question, enabled = true) {
+  const [content, setContent] = useState(null)
+  const [loading, setLoading] = useState(false)
+  const [failed, setFailed] = useState(false)
+
+  useEffect(() => {
+    setContent(null)
+    setLoading(false)
+    setFailed(false)
+    if (!enabled || !question?.id || !isAnalysisPending(question)) return
+
+    let cancelled = false
+    setLoading(true)
+    ;(async () => {
+      try {
+        const { data: { session } } = await supabase.auth.getSession()
+        const geminiKey = localStorage.getItem(GEMINI_API_KEY_STORAGE_KEY)?.trim()
+        const response = await fetch(`${API_BASE_URL}/question/${question.id}`, {
+          headers: {
+            Authorization: `Bearer ${session?.access_token}`,
+            ...(geminiKey ? { 'X-Gemini-Api-Key': geminiKey } : {})
+          }
+        })
+        if (!response.ok) throw new Error(`Analysis request failed (${response.status})`)
+        const data = await response.json()
+        if (!cancelled) setContent(data?.content || null)
+      } catch (err) {
+        console.error(err)
+        if (!cancelled) setFailed(true)
+      } finally {
+        if (!cancelled) setLoading(false)
+      }
+    })()
+
+    return () => { cancelled = true }
+  }, [enabled, question?.id])
+
+  const pending = isAnalysisPending(question) && !loading &&
+    (failed || (content ? content.analysis_status === 'pending' : false))
+
+  return { content, loading, pending }
+}
@@ -2,7 +2,7 @@ import { useState } from 'react'
 import { supabase } from '../supabaseClient'
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:8000'
-const BULK_CONCURRENCY = 3
+const BATCH_SIZE = 10
 const GEMINI_API_KEY_STORAGE_KEY = 'ssc_gemini_api_key'
 
 console.log('🔥 Vercel built this with API URL:', import.meta.env.VITE_API_BASE_URL)
@@ -106,10 +106,10 @@ export function useUpload(onSuccess) {
       throw new Error(authMessage)
     }
 
-    let nextIndex = 0
     let shouldStop = false
+    let stopReason = 'Skipped after Gemini quota/rate-limit error'
     const seenQuestionIds = new Set()
-    const startedIndexes = new Set()
+    const processedIndexes = new Set()
 
     const updateProgress = () => {
       if (onProgress) {
@@ -117,11 +117,50 @@ export function useUpload(onSuccess) {
       }
     }
 
-    const uploadOne = async (file) => {
+    const markFailed = (fileName, message) => {
+      results.failed += 1
+      results.failedFiles.push({ file: fileName, error: message })
+    }
+
+    // The batch endpoint streams NDJSON: an "item" line as each file is analyzed
+    // (or fails/is rejected), a "saved" line per stored question, then a "summary".
+    const handleEvent = (event, batch, offset) => {
+      const fileName = batch[event.index]?.name
+
+      if (event.type === 'item') {
+        if (event.status === 'analyzed') return
+        if (event.status === 'rejected') {
+          // Daily limit reached: later batches would only be rejected too
+          results.skipped += 1
+          markFailed(fileName, event.error)
+          shouldStop = true
+          stopReason = 'Skipped: free daily limit reached'
+        } else {
+          results.aiFailed += 1
+          markFailed(fileName, event.error)
+          if (/quota|resourceexhausted|rate limit/i.test(event.error || '')) shouldStop = true
+        }
+        processedIndexes.add(offset + event.index)
+        results.processed = processedIndexes.size
+        updateProgress()
+      } else if (event.type === 'saved') {
+        results.success += 1
+        if (event.is_duplicate || (event.id && seenQuestionIds.has(event.id))) results.duplicates += 1
+        if (event.id) seenQuestionIds.add(event.id)
+        if (!event.image_url && !event.is_duplicate) results.storageFailed += 1
+        processedIndexes.add(offset + event.index)
+        results.processed = processedIndexes.size
+        updateProgress()
+      } else if (event.type === 'error') {
+        throw new Error(event.error)
+      }
+    }
+
+    const uploadBatch = async (batch, offset) => {
       const formData = new FormData()
-      formData.append('file', file)
+      batch.forEach((file) => formData.append('files', file))
 
-      const response = await fetch(`${API_BASE_URL}/upload-screenshot/`, {
+      const response = await fetch(`${API_BASE_URL}/upload-screenshots/batch`, {
         method: 'POST',
         headers: {
           Authorization: `Bearer ${token}`,
@@ -130,60 +169,58 @@ export function useUpload(onSuccess) {
         body: formData
       })
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         const message = await normalizeErrorMessage(response)
-        const isQuotaError = response.status === 429 || /quota|resourceexhausted|rate limit/i.test(message)
-        if (isQuotaError) shouldStop = true
-
-        results.failed += 1
-        results.aiFailed += 1
-        results.failedFiles.push({ file: file.name, error: message })
+        if (response.status === 429 || /quota|resourceexhausted|rate limit/i.test(message)) shouldStop = true
+        batch.forEach((file, index) => {
+          results.aiFailed += 1
+          markFailed(file.name, message)
+          processedIndexes.add(offset + index)
+        })
+        results.processed = processedIndexes.size
+        updateProgress()
         return
       }
 
-      const payload = await response.json()
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffered = ''
 
-      results.success += 1
-      if (payload?.is_duplicate || (payload?.id && seenQuestionIds.has(payload.id))) results.duplicates += 1
-      if (payload?.id) seenQuestionIds.add(payload.id)
-      if (!payload?.image_url) results.storageFailed += 1
-    }
-
-    const worker = async () => {
       while (true) {
-        if (shouldStop) break
-
-        const currentIndex = nextIndex
-        nextIndex += 1
-
-        if (currentIndex >= total) break
+        const { value, done } = await reader.read()
+        buffered += decoder.decode(value || new Uint8Array(), { stream: !done })
 
-        const file = fileList[currentIndex]
-        startedIndexes.add(currentIndex)
+        const lines = buffered.split('\n')
+        buffered = lines.pop()
+        lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line), batch, offset))
 
-        try {
-          await uploadOne(file)
-        } catch (err) {
-          results.failed += 1
-          results.failedFiles.push({ file: file.name, error: err.message })
-        } finally {
-          results.processed += 1
-          updateProgress()
-        }
+        if (done) break
       }
     }
 
-    const concurrency = Math.min(BULK_CONCURRENCY, total)
-    await Promise.all(Array.from({ length: concurrency }, () => worker()))
+    for (let offset = 0; offset < total && !shouldStop; offset += BATCH_SIZE) {
+      const batch = fileList.slice(offset, offset + BATCH_SIZE)
+      try {
+        await uploadBatch(batch, offset)
+      } catch (err) {
+        batch.forEach((file, index) => {
+          if (processedIndexes.has(offset + index)) return
+          markFailed(file.name, err.message)
+          processedIndexes.add(offset + index)
+        })
+        results.processed = processedIndexes.size
+        updateProgress()
+      }
+    }
 
     if (shouldStop && results.processed < total) {
       const skippedFiles = fileList
         .map((file, index) => ({ file, index }))
-        .filter(({ index }) => !startedIndexes.has(index))
-        .map(({ file }) => ({ file: file.name, error: 'Skipped after Gemini quota/rate-limit error' }))
+        .filter(({ index }) => !processedIndexes.has(index))
+        .map(({ file }) => ({ file: file.name, error: stopReason }))
 
-      results.skipped = skippedFiles.length
-      results.failed += results.skipped
+      results.skipped += skippedFiles.length
+      results.failed += skippedFiles.length
       results.failedFiles.push(...skippedFiles)
       results.processed = total
       updateProgress()
@@ -1,76 +1,9 @@
 /**
- * SM-2 Spaced Repetition Algorithm
- * Based on SuperMemo 2 algorithm
- * Used by Anki and other successful SRS systems
+ * Review queue helpers.
+ * Scheduling (SM-2 / FSRS) happens on the backend, in backend/services/scheduling.py,
+ * when answers are submitted to /question/{id}/review or /questions/review/batch.
  */
 
-/**
- * Calculate next review date using SM-2 algorithm
- * @param {boolean} wasCorrect - Whether user answered correctly
- * @param {number} currentEaseFactor - Current ease factor (default 2.5)
- * @param {number} currentInterval - Current interval in days (default 1)
- * @param {number} repetitions - Number of successful repetitions (default 0)
- * @returns {Object} - { nextReviewDate, easeFactor, interval, repetitions, masteryLevel }
- */
-export function calculateNextReview(wasCorrect, currentEaseFactor = 2.5, currentInterval = 1, repetitions = 0) {
-  let newEaseFactor = currentEaseFactor
-  let newInterval = currentInterval
-  let newRepetitions = repetitions
-
-  if (wasCorrect) {
-    // Correct answer - increase interval
-    newRepetitions += 1
-
-    if (newRepetitions === 1) {
-      newInterval = 1 // Review tomorrow
-    } else if (newRepetitions === 2) {
-      newInterval = 6 // Review in 6 days
-    } else {
-      newInterval = Math.round(currentInterval * currentEaseFactor)
-    }
-
-    // Adjust ease factor (gets easier if consistently correct)
-    // EF' = EF + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
-    // For correct answer, we'll use quality = 4 (good)
-    newEaseFactor = currentEaseFactor + (0.1 - (5 - 4) * (0.08 + (5 - 4) * 0.02))
-    newEaseFactor = Math.max(1.3, newEaseFactor) // Minimum ease factor
-
-  } else {
-    // Incorrect answer - reset interval but keep some progress
-    newRepetitions = 0
-    newInterval = 1 // Review tomorrow
-
-    // Decrease ease factor (question is harder)
-    // For incorrect answer, we'll use quality = 0 (fail)
-    newEaseFactor = currentEaseFactor + (0.1 - (5 - 0) * (0.08 + (5 - 0) * 0.02))
-    newEaseFactor = Math.max(1.3, newEaseFactor)
-  }
-
-  // Calculate next review date
-  const nextReviewDate = new Date()
-  nextReviewDate.setDate(nextReviewDate.getDate() + newInterval)
-
-  // Determine mastery level
-  let masteryLevel = 'new'
-  if (newRepetitions === 0) {
-    masteryLevel = 'learning'
-  } else if (newRepetitions <= 2) {
-    masteryLevel = 'learning'
-  } else if (newRepetitions <= 5) {
-    masteryLevel = 'reviewing'
-  } else {
-    masteryLevel = 'mastered'
-  }
-
-  return {
-    nextReviewDate: nextReviewDate.toISOString(),
-    easeFactor: parseFloat(newEaseFactor.toFixed(2)),
-    intervalDays: newInterval,
-    repetitions: newRepetitions,
-    masteryLevel
-  }
-}
-
 /**
  * Get review priority score (higher = more urgent)
  * @param {string} nextReviewDate - ISO date string
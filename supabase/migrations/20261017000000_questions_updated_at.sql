@@ -0,0 +1,21 @@
+-- Row version for the PDF export cache: every write to a question bumps updated_at.
+
+alter table public.questions
+    add column if not exists updated_at timestamptz not null default now();
+
+update public.questions set updated_at = created_at where created_at is not null;
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+drop trigger if exists questions_set_updated_at on public.questions;
+create trigger questions_set_updated_at
+    before update on public.questions
+    for each row execute function public.set_updated_at();
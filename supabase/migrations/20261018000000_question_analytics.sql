@@ -0,0 +1,91 @@
+-- Raw aggregates behind the /analytics endpoints, grouped in Postgres so the
+-- API never downloads question rows (or their content JSON) to build charts.
+-- backend/services/analytics_service.py shapes the result into the chart data.
+
+create index if not exists questions_user_last_attempted_idx
+    on public.questions (user_id, last_attempted_at)
+    where last_attempted_at is not null;
+
+create or replace function public.question_analytics(p_user_id uuid, p_tz_offset_minutes integer default 0)
+returns jsonb
+language sql
+stable
+as $$
+    with q as (
+        select subject, topic, mastery_level, created_at, last_attempted_at,
+               coalesce(times_attempted, 0) as attempts,
+               coalesce(times_correct, 0) as correct
+        from public.questions
+        where user_id = p_user_id
+    )
+    select jsonb_build_object(
+        'groups', coalesce((
+            select jsonb_agg(jsonb_build_object(
+                'subject', subject,
+                'topic', topic,
+                'count', count,
+                'attempted', attempted,
+                'attempts', attempts,
+                'correct', correct,
+                'accuracy_sum', accuracy_sum
+            ))
+            from (
+                select subject, topic,
+                       count(*) as count,
+                       count(*) filter (where attempts > 0) as attempted,
+                       sum(attempts) filter (where attempts > 0) as attempts,
+                       sum(correct) filter (where attempts > 0) as correct,
+                       sum(correct::float8 / attempts) filter (where attempts > 0) as accuracy_sum
+                from q
+                group by subject, topic
+            ) g
+        ), '[]'::jsonb),
+        'mastery', coalesce((
+            select jsonb_object_agg(level, count)
+            from (
+                select coalesce(mastery_level, 'new') as level, count(*) as count
+                from q
+                group by 1
+            ) m
+        ), '{}'::jsonb),
+        'days', coalesce((
+            select jsonb_agg(jsonb_build_object(
+                'date', day, 'uploads', uploads, 'reviews', reviews,
+                'attempts', attempts, 'correct', correct
+            ))
+            from (
+                select day,
+                       count(*) filter (where kind = 'upload') as uploads,
+                       count(*) filter (where kind = 'review') as reviews,
+                       coalesce(sum(attempts) filter (where trend), 0) as attempts,
+                       coalesce(sum(correct) filter (where trend), 0) as correct
+                from (
+                    select 'upload' as kind, (created_at at time zone 'utc')::date as day,
+                           0 as attempts, 0 as correct, false as trend
+                    from q
+                    where created_at >= now() - interval '90 days'
+                    union all
+                    select 'review', (last_attempted_at at time zone 'utc')::date,
+                           attempts, correct,
+                           attempts > 0 and last_attempted_at >= now() - interval '30 days'
+                    from q
+                    where last_attempted_at >= now() - interval '90 days'
+                ) activity
+                group by day
+            ) d
+        ), '[]'::jsonb),
+        'hours', coalesce((
+            select jsonb_agg(jsonb_build_object('hour', hour, 'attempts', attempts, 'correct', correct))
+            from (
+                -- p_tz_offset_minutes is the browser's getTimezoneOffset(): UTC minus local time
+                select extract(hour from (last_attempted_at at time zone 'utc')
+                                         - make_interval(mins => p_tz_offset_minutes))::int as hour,
+                       sum(attempts) as attempts,
+                       sum(correct) as correct
+                from q
+                where last_attempted_at is not null and attempts > 0
+                group by 1
+            ) h
+        ), '[]'::jsonb)
+    );
+$$;
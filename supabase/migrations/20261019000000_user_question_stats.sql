@@ -0,0 +1,337 @@
+-- Per-user rollup of question counters, one row per (subject, topic).
+--
+-- Kept up to date incrementally by a trigger on questions, so every write path
+-- (answers, reviews, uploads, imports, deletes, and the browser's own writes
+-- through supabase-js) adjusts exactly the counters it touched in the same
+-- transaction. reconcile_question_stats rebuilds a user's rows from scratch
+-- and reports any drift; backend/services/question_stats.py runs it as a job.
+
+create table if not exists public.user_question_stats (
+    user_id uuid not null,
+    -- '' stands for a missing subject/topic so the key can be a primary key
+    subject text not null default '',
+    topic text not null default '',
+    question_count bigint not null default 0,
+    attempted_count bigint not null default 0,
+    total_attempts bigint not null default 0,
+    total_correct bigint not null default 0,
+    -- Sum of per-question accuracy (correct / attempts) for the average accuracy
+    accuracy_sum double precision not null default 0,
+    new_count bigint not null default 0,
+    learning_count bigint not null default 0,
+    reviewing_count bigint not null default 0,
+    mastered_count bigint not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (user_id, subject, topic)
+);
+
+alter table public.user_question_stats enable row level security;
+
+drop policy if exists "Users read own question stats" on public.user_question_stats;
+create policy "Users read own question stats"
+    on public.user_question_stats for select
+    using (auth.uid() = user_id);
+
+create index if not exists questions_user_created_idx
+    on public.questions (user_id, created_at desc);
+
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one question's contribution
+create or replace function public.question_stats_add(
+    p_user_id uuid,
+    p_subject text,
+    p_topic text,
+    p_mastery_level text,
+    p_attempts integer,
+    p_correct integer,
+    p_sign integer
+)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    attempted boolean := p_attempts > 0;
+    level text := coalesce(p_mastery_level, 'new');
+begin
+    insert into public.user_question_stats as s (
+        user_id, subject, topic, question_count, attempted_count, total_attempts, total_correct,
+        accuracy_sum, new_count, learning_count, reviewing_count, mastered_count
+    )
+    values (
+        p_user_id, coalesce(p_subject, ''), coalesce(p_topic, ''),
+        p_sign,
+        case when attempted then p_sign else 0 end,
+        case when attempted then p_sign * p_attempts else 0 end,
+        case when attempted then p_sign * p_correct else 0 end,
+        case when attempted then p_sign * (p_correct::float8 / p_attempts) else 0 end,
+        case when level = 'new' then p_sign else 0 end,
+        case when level = 'learning' then p_sign else 0 end,
+        case when level = 'reviewing' then p_sign else 0 end,
+        case when level = 'mastered' then p_sign else 0 end
+    )
+    on conflict (user_id, subject, topic) do update set
+        question_count = s.question_count + excluded.question_count,
+        attempted_count = s.attempted_count + excluded.attempted_count,
+        total_attempts = s.total_attempts + excluded.total_attempts,
+        total_correct = s.total_correct + excluded.total_correct,
+        accuracy_sum = s.accuracy_sum + excluded.accuracy_sum,
+        new_count = s.new_count + excluded.new_count,
+        learning_count = s.learning_count + excluded.learning_count,
+        reviewing_count = s.reviewing_count + excluded.reviewing_count,
+        mastered_count = s.mastered_count + excluded.mastered_count,
+        updated_at = now();
+
+    if p_sign < 0 then
+        delete from public.user_question_stats
+        where user_id = p_user_id
+          and subject = coalesce(p_subject, '')
+          and topic = coalesce(p_topic, '')
+          and question_count <= 0;
+    end if;
+end;
+$$;
+
+
+create or replace function public.questions_stats_rollup()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    -- Shared per-user lock: writers don't block each other, a running
+    -- reconcile_question_stats (exclusive) holds them off until it commits
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform pg_advisory_xact_lock_shared(hashtext(old.user_id::text));
+        perform public.question_stats_add(
+            old.user_id, old.subject, old.topic, old.mastery_level,
+            coalesce(old.times_attempted, 0), coalesce(old.times_correct, 0), -1
+        );
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform pg_advisory_xact_lock_shared(hashtext(new.user_id::text));
+        perform public.question_stats_add(
+            new.user_id, new.subject, new.topic, new.mastery_level,
+            coalesce(new.times_attempted, 0), coalesce(new.times_correct, 0), 1
+        );
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists questions_stats_rollup_insert_delete on public.questions;
+create trigger questions_stats_rollup_insert_delete
+    after insert or delete on public.questions
+    for each row execute function public.questions_stats_rollup();
+
+-- Content, analysis and notes edits don't touch the counters
+drop trigger if exists questions_stats_rollup_update on public.questions;
+create trigger questions_stats_rollup_update
+    after update of user_id, subject, topic, mastery_level, times_attempted, times_correct on public.questions
+    for each row
+    when (
+        old.user_id is distinct from new.user_id
+        or old.subject is distinct from new.subject
+        or old.topic is distinct from new.topic
+        or old.mastery_level is distinct from new.mastery_level
+        or old.times_attempted is distinct from new.times_attempted
+        or old.times_correct is distinct from new.times_correct
+    )
+    execute function public.questions_stats_rollup();
+
+
+-- The rollup rows a user should have, computed from their questions
+create or replace function public.question_stats_expected(p_user_id uuid)
+returns setof public.user_question_stats
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select
+        p_user_id,
+        coalesce(subject, ''),
+        coalesce(topic, ''),
+        count(*),
+        count(*) filter (where coalesce(times_attempted, 0) > 0),
+        coalesce(sum(times_attempted) filter (where coalesce(times_attempted, 0) > 0), 0),
+        coalesce(sum(coalesce(times_correct, 0)) filter (where coalesce(times_attempted, 0) > 0), 0),
+        coalesce(sum(coalesce(times_correct, 0)::float8 / times_attempted)
+                 filter (where coalesce(times_attempted, 0) > 0), 0),
+        count(*) filter (where coalesce(mastery_level, 'new') = 'new'),
+        count(*) filter (where mastery_level = 'learning'),
+        count(*) filter (where mastery_level = 'reviewing'),
+        count(*) filter (where mastery_level = 'mastered'),
+        now()
+    from public.questions
+    where user_id = p_user_id
+    group by coalesce(subject, ''), coalesce(topic, '');
+$$;
+
+
+-- Compare a user's rollup with a from-scratch rebuild; rewrite it if they differ.
+-- Returns the groups that drifted with their expected and actual counters.
+create or replace function public.reconcile_question_stats(p_user_id uuid)
+returns table (subject text, topic text, expected jsonb, actual jsonb)
+language plpgsql
+security definer
+set search_path = public
+as $$
+#variable_conflict use_column
+begin
+    perform pg_advisory_xact_lock(hashtext(p_user_id::text));
+
+    return query
+    with expected as (
+        select * from public.question_stats_expected(p_user_id)
+    ),
+    actual as (
+        select * from public.user_question_stats s where s.user_id = p_user_id
+    )
+    select
+        coalesce(e.subject, a.subject),
+        coalesce(e.topic, a.topic),
+        to_jsonb(e) - 'user_id' - 'subject' - 'topic' - 'updated_at',
+        to_jsonb(a) - 'user_id' - 'subject' - 'topic' - 'updated_at'
+    from expected e
+    full join actual a on a.subject = e.subject and a.topic = e.topic
+    where e.subject is null
+       or a.subject is null
+       or (e.question_count, e.attempted_count, e.total_attempts, e.total_correct,
+           e.new_count, e.learning_count, e.reviewing_count, e.mastered_count)
+          is distinct from
+          (a.question_count, a.attempted_count, a.total_attempts, a.total_correct,
+           a.new_count, a.learning_count, a.reviewing_count, a.mastered_count)
+       -- accuracy_sum is a float running total; ignore rounding noise
+       or abs(e.accuracy_sum - a.accuracy_sum) > 1e-6;
+
+    if found then
+        delete from public.user_question_stats s where s.user_id = p_user_id;
+        insert into public.user_question_stats select * from public.question_stats_expected(p_user_id);
+    end if;
+end;
+$$;
+
+
+create or replace function public.question_stats_users()
+returns setof uuid
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select user_id from public.questions
+    union
+    select user_id from public.user_question_stats;
+$$;
+
+
+-- These run with the owner's rights and take any user id, so they must not be
+-- reachable through /rest/v1/rpc: only the backend's service role may call
+-- them. The trigger function keeps definer rights for the rollup writes; as a
+-- trigger it can't be called directly, and no role needs EXECUTE on it.
+revoke execute on function
+    public.question_stats_add(uuid, text, text, text, integer, integer, integer),
+    public.questions_stats_rollup(),
+    public.question_stats_expected(uuid),
+    public.reconcile_question_stats(uuid),
+    public.question_stats_users()
+from public, anon, authenticated;
+
+grant execute on function
+    public.question_stats_add(uuid, text, text, text, integer, integer, integer),
+    public.question_stats_expected(uuid),
+    public.reconcile_question_stats(uuid),
+    public.question_stats_users()
+to service_role;
+
+
+-- Backfill existing users
+insert into public.user_question_stats
+select e.*
+from (select distinct user_id from public.questions) u,
+     lateral public.question_stats_expected(u.user_id) e
+on conflict (user_id, subject, topic) do nothing;
+
+
+-- The analytics RPC reads the (subject, topic) counters and the mastery
+-- distribution from the rollup; only the dated buckets still scan questions,
+-- and those are limited to the last 90 days by the (user_id, date) indexes.
+create or replace function public.question_analytics(p_user_id uuid, p_tz_offset_minutes integer default 0)
+returns jsonb
+language sql
+stable
+as $$
+    with q as (
+        select created_at, last_attempted_at,
+               coalesce(times_attempted, 0) as attempts,
+               coalesce(times_correct, 0) as correct
+        from public.questions
+        where user_id = p_user_id
+          and (created_at >= now() - interval '90 days'
+               or last_attempted_at >= now() - interval '90 days')
+    ),
+    stats as (
+        select * from public.user_question_stats where user_id = p_user_id
+    )
+    select jsonb_build_object(
+        'groups', coalesce((
+            select jsonb_agg(jsonb_build_object(
+                'subject', nullif(subject, ''),
+                'topic', nullif(topic, ''),
+                'count', question_count,
+                'attempted', attempted_count,
+                'attempts', total_attempts,
+                'correct', total_correct,
+                'accuracy_sum', accuracy_sum
+            ))
+            from stats
+        ), '[]'::jsonb),
+        'mastery', jsonb_build_object(
+            'new', coalesce((select sum(new_count) from stats), 0),
+            'learning', coalesce((select sum(learning_count) from stats), 0),
+            'reviewing', coalesce((select sum(reviewing_count) from stats), 0),
+            'mastered', coalesce((select sum(mastered_count) from stats), 0)
+        ),
+        'days', coalesce((
+            select jsonb_agg(jsonb_build_object(
+                'date', day, 'uploads', uploads, 'reviews', reviews,
+                'attempts', attempts, 'correct', correct
+            ))
+            from (
+                select day,
+                       count(*) filter (where kind = 'upload') as uploads,
+                       count(*) filter (where kind = 'review') as reviews,
+                       coalesce(sum(attempts) filter (where trend), 0) as attempts,
+                       coalesce(sum(correct) filter (where trend), 0) as correct
+                from (
+                    select 'upload' as kind, (created_at at time zone 'utc')::date as day,
+                           0 as attempts, 0 as correct, false as trend
+                    from q
+                    where created_at >= now() - interval '90 days'
+                    union all
+                    select 'review', (last_attempted_at at time zone 'utc')::date,
+                           attempts, correct,
+                           attempts > 0 and last_attempted_at >= now() - interval '30 days'
+                    from q
+                    where last_attempted_at >= now() - interval '90 days'
+                ) activity
+                group by day
+            ) d
+        ), '[]'::jsonb),
+        'hours', coalesce((
+            select jsonb_agg(jsonb_build_object('hour', hour, 'attempts', attempts, 'correct', correct))
+            from (
+                select extract(hour from (last_attempted_at at time zone 'utc')
+                                         - make_interval(mins => p_tz_offset_minutes))::int as hour,
+                       sum(times_attempted) as attempts,
+                       sum(coalesce(times_correct, 0)) as correct
+                from public.questions
+                where user_id = p_user_id and last_attempted_at is not null and times_attempted > 0
+                group by 1
+            ) h
+        ), '[]'::jsonb)
+    );
+$$;
@@ -0,0 +1,28 @@
+-- Review queue: bucket pages are read in (next_review_date, id) order per user
+-- and the bucket counts are computed here instead of from downloaded rows.
+
+create index if not exists questions_user_next_review_idx
+    on public.questions (user_id, next_review_date, id)
+    where next_review_date is not null;
+
+create or replace function public.review_queue_counts(
+    p_user_id uuid,
+    p_today timestamptz,
+    p_tomorrow timestamptz,
+    p_soon_end timestamptz,
+    p_week_end timestamptz
+)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'overdue', count(*) filter (where next_review_date < p_today),
+        'due_today', count(*) filter (where next_review_date >= p_today and next_review_date < p_tomorrow),
+        'due_soon', count(*) filter (where next_review_date >= p_tomorrow and next_review_date < p_soon_end),
+        'upcoming', count(*) filter (where next_review_date >= p_soon_end)
+    )
+    from public.questions
+    where user_id = p_user_id
+      and next_review_date <= p_week_end;
+$$;
@@ -0,0 +1,87 @@
+-- Batched review submission with idempotency keys.
+--
+-- A study session's answers are applied by apply_review_batch in one
+-- transaction: one update for all the affected questions plus one row per
+-- answer in review_submissions. Each answer carries a client-generated key,
+-- so a retried (or offline-queued and resent) batch replays the stored results
+-- instead of counting the attempts twice.
+
+create table if not exists public.review_submissions (
+    user_id uuid not null,
+    idempotency_key text not null,
+    question_id uuid not null,
+    -- The per-answer result returned the first time, replayed on retries
+    result jsonb not null,
+    created_at timestamptz not null default now(),
+    primary key (user_id, idempotency_key)
+);
+
+alter table public.review_submissions enable row level security;
+
+drop policy if exists "Users read own review submissions" on public.review_submissions;
+create policy "Users read own review submissions"
+    on public.review_submissions for select
+    using (auth.uid() = user_id);
+
+create index if not exists review_submissions_user_created_idx
+    on public.review_submissions (user_id, created_at);
+
+
+-- p_updates: question rows (id plus the review columns) to write.
+-- p_submissions: [{idempotency_key, question_id, result}] for every answer.
+-- Fails with serialization_failure (40001) without writing anything if any
+-- key is already recorded, i.e. a concurrent retry of the same answers won.
+create or replace function public.apply_review_batch(
+    p_user_id uuid,
+    p_updates jsonb,
+    p_submissions jsonb
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    recorded integer;
+    updated integer;
+begin
+    with inserted as (
+        insert into public.review_submissions (user_id, idempotency_key, question_id, result)
+        select p_user_id, s.idempotency_key, s.question_id, s.result
+        from jsonb_to_recordset(p_submissions) as s(idempotency_key text, question_id uuid, result jsonb)
+        on conflict (user_id, idempotency_key) do nothing
+        returning 1
+    )
+    select count(*) into recorded from inserted;
+
+    if recorded < jsonb_array_length(p_submissions) then
+        raise exception 'review answers already recorded' using errcode = '40001';
+    end if;
+
+    -- jsonb_populate_recordset casts each value to the column's own type
+    update public.questions q set
+        user_answer = u.user_answer,
+        times_attempted = u.times_attempted,
+        times_correct = u.times_correct,
+        last_attempted_at = u.last_attempted_at,
+        next_review_date = u.next_review_date,
+        ease_factor = u.ease_factor,
+        interval_days = u.interval_days,
+        mastery_level = u.mastery_level
+    from jsonb_populate_recordset(null::public.questions, p_updates) u
+    where q.id = u.id
+      and q.user_id = p_user_id;
+    get diagnostics updated = row_count;
+
+    -- Retries come within minutes or days; old keys only cost space
+    delete from public.review_submissions
+    where user_id = p_user_id
+      and created_at < now() - interval '30 days';
+
+    return updated;
+end;
+$$;
+
+-- Takes any user id with the owner's rights: backend (service role) only
+revoke execute on function public.apply_review_batch(uuid, jsonb, jsonb) from public, anon, authenticated;
+grant execute on function public.apply_review_batch(uuid, jsonb, jsonb) to service_role;
@@ -0,0 +1,105 @@
+-- Answer counters are incremented by the database instead of being read,
+-- incremented in Python and written back, which lost attempts when two tabs
+-- (or the app and the extension) answered the same question at once.
+
+-- One answer: checks it, bumps the counters and returns the new stats in a
+-- single statement. Returns null when the question isn't the user's.
+create or replace function public.record_answer_attempt(
+    p_user_id uuid,
+    p_question_id uuid,
+    p_answer text
+)
+returns jsonb
+language sql
+security definer
+set search_path = public
+as $$
+    update public.questions set
+        user_answer = p_answer,
+        times_attempted = coalesce(times_attempted, 0) + 1,
+        times_correct = coalesce(times_correct, 0)
+                        + case when p_answer is not distinct from correct_option then 1 else 0 end,
+        last_attempted_at = now()
+    where id = p_question_id
+      and user_id = p_user_id
+    returning jsonb_build_object(
+        'is_correct', p_answer is not distinct from correct_option,
+        'correct_option', correct_option,
+        'times_attempted', times_attempted,
+        'times_correct', times_correct,
+        'subject', subject,
+        'topic', topic,
+        'next_review_date', next_review_date,
+        'ease_factor', ease_factor
+    );
+$$;
+
+-- Takes any user id with the owner's rights: backend (service role) only
+revoke execute on function public.record_answer_attempt(uuid, uuid, text) from public, anon, authenticated;
+grant execute on function public.record_answer_attempt(uuid, uuid, text) to service_role;
+
+
+-- Review batches are computed from the rows as read; each update now carries
+-- the times_attempted it was computed from ("expected_attempts") and the
+-- batch fails with serialization_failure (40001) if any row moved on in the
+-- meantime, so the caller re-reads and recomputes instead of overwriting.
+create or replace function public.apply_review_batch(
+    p_user_id uuid,
+    p_updates jsonb,
+    p_submissions jsonb
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    recorded integer;
+    updated integer;
+begin
+    with inserted as (
+        insert into public.review_submissions (user_id, idempotency_key, question_id, result)
+        select p_user_id, s.idempotency_key, s.question_id, s.result
+        from jsonb_to_recordset(p_submissions) as s(idempotency_key text, question_id uuid, result jsonb)
+        on conflict (user_id, idempotency_key) do nothing
+        returning 1
+    )
+    select count(*) into recorded from inserted;
+
+    if recorded < jsonb_array_length(p_submissions) then
+        raise exception 'review answers already recorded' using errcode = '40001';
+    end if;
+
+    -- jsonb_populate_record casts each value to the column's own type
+    update public.questions q set
+        user_answer = u.user_answer,
+        times_attempted = u.times_attempted,
+        times_correct = u.times_correct,
+        last_attempted_at = u.last_attempted_at,
+        next_review_date = u.next_review_date,
+        ease_factor = u.ease_factor,
+        interval_days = u.interval_days,
+        mastery_level = u.mastery_level
+    from jsonb_array_elements(p_updates) x,
+         lateral jsonb_populate_record(null::public.questions, x) u
+    where q.id = u.id
+      and q.user_id = p_user_id
+      and q.times_attempted is not distinct from (x ->> 'expected_attempts')::integer;
+    get diagnostics updated = row_count;
+
+    if updated < jsonb_array_length(p_updates) then
+        raise exception 'questions changed while the review batch was computed' using errcode = '40001';
+    end if;
+
+    -- Retries come within minutes or days; old keys only cost space
+    delete from public.review_submissions
+    where user_id = p_user_id
+      and created_at < now() - interval '30 days';
+
+    return updated;
+end;
+$$;
+
+-- create or replace keeps the grants from 20261021, restated here so this definition stands alone
+revoke execute on function public.apply_review_batch(uuid, jsonb, jsonb) from public, anon, authenticated;
+grant execute on function public.apply_review_batch(uuid, jsonb, jsonb) to service_role;
@@ -0,0 +1,89 @@
+-- Per-question scheduling state for backend/services/scheduling.py:
+-- the SM-2 repetition count (consecutive correct answers; the interval used
+-- to be stepped on times_correct) and the FSRS memory state.
+
+alter table public.questions
+    add column if not exists repetitions integer not null default 0,
+    add column if not exists fsrs_stability double precision,
+    add column if not exists fsrs_difficulty double precision;
+
+-- Best reconstruction of the streak from the last review: a wrong last answer
+-- means it was reset, otherwise the interval tells how far the 1 / 6 / n*ease
+-- ladder got. FSRS state starts empty and is initialised on the next review.
+-- The streak isn't exported, so this mustn't invalidate the PDF export cache.
+alter table public.questions disable trigger questions_set_updated_at;
+
+update public.questions set repetitions = case
+        when coalesce(times_correct, 0) = 0 or user_answer is distinct from correct_option then 0
+        when coalesce(interval_days, 1) <= 1 then 1
+        when interval_days <= 6 then 2
+        else 3
+    end
+where times_attempted > 0;
+
+alter table public.questions enable trigger questions_set_updated_at;
+
+
+-- The review batch writes the new scheduling columns too
+create or replace function public.apply_review_batch(
+    p_user_id uuid,
+    p_updates jsonb,
+    p_submissions jsonb
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    recorded integer;
+    updated integer;
+begin
+    with inserted as (
+        insert into public.review_submissions (user_id, idempotency_key, question_id, result)
+        select p_user_id, s.idempotency_key, s.question_id, s.result
+        from jsonb_to_recordset(p_submissions) as s(idempotency_key text, question_id uuid, result jsonb)
+        on conflict (user_id, idempotency_key) do nothing
+        returning 1
+    )
+    select count(*) into recorded from inserted;
+
+    if recorded < jsonb_array_length(p_submissions) then
+        raise exception 'review answers already recorded' using errcode = '40001';
+    end if;
+
+    -- jsonb_populate_record casts each value to the column's own type
+    update public.questions q set
+        user_answer = u.user_answer,
+        times_attempted = u.times_attempted,
+        times_correct = u.times_correct,
+        last_attempted_at = u.last_attempted_at,
+        next_review_date = u.next_review_date,
+        ease_factor = u.ease_factor,
+        interval_days = u.interval_days,
+        repetitions = u.repetitions,
+        fsrs_stability = u.fsrs_stability,
+        fsrs_difficulty = u.fsrs_difficulty,
+        mastery_level = u.mastery_level
+    from jsonb_array_elements(p_updates) x,
+         lateral jsonb_populate_record(null::public.questions, x) u
+    where q.id = u.id
+      and q.user_id = p_user_id
+      and q.times_attempted is not distinct from (x ->> 'expected_attempts')::integer;
+    get diagnostics updated = row_count;
+
+    if updated < jsonb_array_length(p_updates) then
+        raise exception 'questions changed while the review batch was computed' using errcode = '40001';
+    end if;
+
+    -- Retries come within minutes or days; old keys only cost space
+    delete from public.review_submissions
+    where user_id = p_user_id
+      and created_at < now() - interval '30 days';
+
+    return updated;
+end;
+$$;
+
+revoke execute on function public.apply_review_batch(uuid, jsonb, jsonb) from public, anon, authenticated;
+grant execute on function public.apply_review_batch(uuid, jsonb, jsonb) to service_role;
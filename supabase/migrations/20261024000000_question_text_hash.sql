@@ -0,0 +1,11 @@
+-- Batch uploads look up duplicates by a hash of the question text: whole
+-- texts in an in.(...) filter break on quotes (PostgREST's quoting doesn't
+-- escape them) and long passages overflow the URL.
+-- Matches backend/services/upload_service.question_text_hash.
+
+alter table public.questions
+    add column if not exists question_text_hash text
+        generated always as (md5(coalesce(question_text, ''))) stored;
+
+create index if not exists questions_user_text_hash_idx
+    on public.questions (user_id, question_text_hash);
@@ -0,0 +1,88 @@
+-- Free-tier metering of lazy analyses (ANALYSIS_MODE=lazy).
+--
+-- Analyses generated later for older questions spend the master Gemini key
+-- like uploads do. Each one is counted here per user and (UTC) day: the
+-- backend claims a unit before every generation and hands it back when the
+-- generation fails, so uploads + analyses stay within the daily limit no
+-- matter how often the backfill endpoint is called.
+
+create table if not exists public.lazy_analysis_usage (
+    user_id uuid not null,
+    day date not null,
+    generated integer not null default 0,
+    primary key (user_id, day)
+);
+
+alter table public.lazy_analysis_usage enable row level security;
+
+drop policy if exists "Users read own analysis usage" on public.lazy_analysis_usage;
+create policy "Users read own analysis usage"
+    on public.lazy_analysis_usage for select
+    using (auth.uid() = user_id);
+
+
+-- Reserve up to p_count analyses for p_day without the day's total going over
+-- p_limit; returns how many were granted. The row lock serializes concurrent
+-- claims of the same user.
+create or replace function public.claim_lazy_analyses(
+    p_user_id uuid,
+    p_day date,
+    p_limit integer,
+    p_count integer default 1
+)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    used integer;
+    granted integer;
+begin
+    insert into public.lazy_analysis_usage (user_id, day)
+    values (p_user_id, p_day)
+    on conflict (user_id, day) do nothing;
+
+    select generated into used
+    from public.lazy_analysis_usage
+    where user_id = p_user_id and day = p_day
+    for update;
+
+    granted := least(greatest(p_count, 0), greatest(p_limit - used, 0));
+    if granted > 0 then
+        update public.lazy_analysis_usage
+        set generated = used + granted
+        where user_id = p_user_id and day = p_day;
+    end if;
+
+    -- Only today's row matters
+    delete from public.lazy_analysis_usage
+    where user_id = p_user_id and day < p_day - 7;
+
+    return granted;
+end;
+$$;
+
+
+-- Give back units claimed for generations that didn't happen
+create or replace function public.release_lazy_analyses(p_user_id uuid, p_day date, p_count integer default 1)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    update public.lazy_analysis_usage
+    set generated = greatest(generated - greatest(p_count, 0), 0)
+    where user_id = p_user_id and day = p_day;
+$$;
+
+-- They take any user id: backend (service role) only
+revoke execute on function
+    public.claim_lazy_analyses(uuid, date, integer, integer),
+    public.release_lazy_analyses(uuid, date, integer)
+from public, anon, authenticated;
+
+grant execute on function
+    public.claim_lazy_analyses(uuid, date, integer, integer),
+    public.release_lazy_analyses(uuid, date, integer)
+to service_role;
@@ -0,0 +1,248 @@
+"""In-memory stand-ins for the synchronous Supabase client, with optional latency"""
+
+import itertools
+import operator
+import re
+import threading
+import time
+
+from postgrest.exceptions import APIError
+
+
+_OPERATORS = {"eq": operator.eq, "gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+_OR_TOKEN = re.compile(r'(and|or)\(|\)|,|([\w>-]+)\.(\w+)\.("[^"]*"|[^,()]*)')
+
+
+def parse_logic_filter(expression):
+    """PostgREST's `or=(...)` syntax (nested and(...)/or(...), col.op."value") as a row predicate"""
+    tokens = iter(_OR_TOKEN.finditer(expression))
+
+    def group(combine):
+        parts = []
+        for token in tokens:
+            if token.group(1):
+                parts.append(group(all if token.group(1) == "and" else any))
+            elif token.group(0) == ")":
+                break
+            elif token.group(2):
+                column, name, value = token.group(2), token.group(3), token.group(4).strip('"')
+                compare = _OPERATORS[name]
+                parts.append(lambda row, column=column, compare=compare, value=value:
+                             row.get(column) is not None and compare(str(row.get(column)), value))
+        return lambda row: combine(part(row) for part in parts)
+
+    return group(any)
+
+
+class Response:
+    def __init__(self, data=None, count=None):
+        self.data = data if data is not None else []
+        self.count = count
+
+
+class Query:
+    """Chainable query recording its filters; execute() sleeps like a PostgREST round trip"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.kind = "select"
+        self.payload = None
+        self.filters = []
+        self.row_filters = []
+        self.columns = []
+        self.ordering = []
+        self.row_limit = None
+        self.single_row = False
+
+    def select(self, columns="*", **kwargs):
+        self.columns = [column.split(":")[-1] for column in columns.split(",")]
+        return self
+
+    def insert(self, payload):
+        self.kind, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.kind, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.kind = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, lambda cell: cell == value))
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self.filters.append((column, lambda cell: cell in values))
+        return self
+
+    def is_(self, column, value):
+        self.filters.append((column, lambda cell: cell is None if value == "null" else cell == value))
+        return self
+
+    # ISO timestamps / numbers compare correctly as long as a test uses one format per column
+    def lt(self, column, value):
+        self.filters.append((column, lambda cell: cell is not None and cell < value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append((column, lambda cell: cell is not None and cell <= value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append((column, lambda cell: cell is not None and cell > value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append((column, lambda cell: cell is not None and cell >= value))
+        return self
+
+    def or_(self, filters, **kwargs):
+        self.row_filters.append(parse_logic_filter(filters))
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count, **kwargs):
+        self.row_limit = count
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def __getattr__(self, name):
+        # neq / range ... don't matter to these fakes
+        return lambda *args, **kwargs: self
+
+    @staticmethod
+    def _cell(row, column):
+        # "content->>analysis_status" reads a key of a JSON column as text
+        column, _, key = column.partition("->>")
+        cell = row.get(column)
+        if key:
+            value = (cell or {}).get(key)
+            return None if value is None else str(value)
+        return cell
+
+    def _matches(self, row):
+        return all(predicate(self._cell(row, column)) for column, predicate in self.filters) and \
+            all(predicate(row) for predicate in self.row_filters)
+
+    def _select(self, rows):
+        for column, desc in reversed(self.ordering):
+            rows = sorted(rows, key=lambda row: (self._cell(row, column) is None, self._cell(row, column)),
+                          reverse=desc)
+        return rows if self.row_limit is None else rows[:self.row_limit]
+
+    def _check_columns(self):
+        if self.table in self.client.missing_tables:
+            raise APIError({"code": "PGRST205", "message": f"Could not find the table 'public.{self.table}'"})
+        for column in self.columns + [column for column, _ in self.filters]:
+            if column in self.client.missing_columns:
+                raise APIError({"code": "42703", "message": f"column {self.table}.{column} does not exist"})
+
+    def _generate(self, row):
+        for column, compute in self.client.generated.get(self.table, {}).items():
+            row[column] = compute(row)
+        return row
+
+    def execute(self):
+        time.sleep(self.client.db_delay)
+        self._check_columns()
+        with self.client.lock:
+            self.client.calls.append((self.table, self.kind, self.payload))
+            rows = self.client.tables.setdefault(self.table, [])
+            if self.kind == "insert":
+                inserted = []
+                for row in self.payload if isinstance(self.payload, list) else [self.payload]:
+                    row = self._generate({"id": str(next(self.client.ids)), **row})
+                    rows.append(row)
+                    inserted.append(dict(row))
+                return Response(inserted)
+            matching = [row for row in rows if self._matches(row)]
+            if self.kind == "select":
+                matching = self._select(matching)
+                if self.single_row:
+                    if len(matching) != 1:
+                        raise APIError({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"})
+                    return Response(dict(matching[0]), count=1)
+            if self.kind == "update":
+                for row in matching:
+                    row.update(self.payload)
+                    self._generate(row)
+            elif self.kind == "delete":
+                rows[:] = [row for row in rows if not self._matches(row)]
+            return Response([dict(row) for row in matching], count=len(matching))
+
+
+class Rpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        time.sleep(self.client.db_delay)
+        function = self.client.functions.get(self.name)
+        if function is None:
+            raise APIError({"code": "PGRST202", "message": f"Could not find the function public.{self.name}"})
+        self.client.calls.append(("rpc", self.name, self.params))
+        return Response(function(self.params))
+
+
+class Bucket:
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, path, contents, file_options=None):
+        time.sleep(self.client.storage_delay)
+        with self.client.lock:
+            self.client.uploaded.append(path)
+
+    def get_public_url(self, path):
+        return f"https://storage.test/{path}"
+
+    def remove(self, paths):
+        with self.client.lock:
+            self.client.removed.extend(paths)
+
+
+class Storage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, bucket):
+        return Bucket(self.client)
+
+
+class FakeSupabase:
+    def __init__(self, db_delay=0.0, storage_delay=0.0):
+        self.db_delay = db_delay
+        self.storage_delay = storage_delay
+        self.tables = {}
+        self.calls = []
+        self.uploaded = []
+        self.removed = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.storage = Storage(self)
+        # table -> {column: row -> value}, like Postgres generated columns
+        self.generated = {}
+        # Columns whose migration "isn't applied": using them fails like PostgREST does
+        self.missing_columns = set()
+        self.missing_tables = set()
+        # rpc name -> params -> data; unregistered functions fail like PostgREST's "not found"
+        self.functions = {}
+
+    def table(self, name):
+        return Query(self, name)
+
+    def rpc(self, name, params=None):
+        return Rpc(self, name, params or {})
@@ -0,0 +1,61 @@
+import io
+import sqlite3
+
+from PIL import Image, ImageDraw
+
+from backend.services.analysis_cache import AnalysisCache
+
+
+def screenshot(text):
+    # Same layout for every question, only the wording differs
+    image = Image.new("RGB", (900, 500), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((20, 20, 880, 80), fill=(40, 90, 200))
+    draw.text((40, 120), text, fill="black")
+    for row, option in enumerate("ABCD"):
+        draw.text((40, 200 + 60 * row), f"({option}) option {option} for {text}", fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_only_byte_identical_screenshots_hit(tmp_path):
+    cache = AnalysisCache(path=str(tmp_path / "cache.sqlite3"))
+    shots = [screenshot(f"Question {number}: what is {number} x 7?") for number in range(20)]
+
+    cache.put("user-1", shots[0], {"question_text": "q0"}, "https://storage.test/q0.png")
+    for shot in shots[1:]:
+        assert cache.get("user-1", shot) is None
+
+    hit = cache.get("user-1", shots[0])
+    assert hit == {"ai_data": {"question_text": "q0"}, "image_url": "https://storage.test/q0.png", "match": "exact"}
+    assert cache.get("user-2", shots[0]) is None
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    shot = screenshot("persisted")
+    AnalysisCache(path=path).put("user-1", shot, {"question_text": "q"}, None)
+
+    reopened = AnalysisCache(path=path)
+    assert reopened.get("user-1", shot)["ai_data"] == {"question_text": "q"}
+    assert reopened.snapshot()["disk_hits"] == 1
+
+
+def test_cache_files_with_the_old_perceptual_columns_still_work(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    db = sqlite3.connect(path)
+    bands = ", ".join(f"band{i} INTEGER" for i in range(8))
+    db.execute(
+        f"CREATE TABLE analysis_cache (user_id TEXT NOT NULL, content_hash TEXT NOT NULL, phash INTEGER, {bands}, "
+        "ai_data TEXT NOT NULL, image_url TEXT, size_bytes INTEGER NOT NULL, last_access REAL NOT NULL, "
+        "PRIMARY KEY (user_id, content_hash))"
+    )
+    db.execute("CREATE INDEX idx_analysis_cache_band0 ON analysis_cache (user_id, band0)")
+    db.commit()
+    db.close()
+
+    cache = AnalysisCache(path=path)
+    shot = screenshot("legacy")
+    cache.put("user-1", shot, {"question_text": "legacy"}, None)
+    assert AnalysisCache(path=path).get("user-1", shot)["ai_data"] == {"question_text": "legacy"}
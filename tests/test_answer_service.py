@@ -0,0 +1,48 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from backend.services.answer_service import QuestionNotFound, record_answer
+from tests.fakes import FakeSupabase
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSupabase()
+    fake.tables["questions"] = [
+        {"id": "q1", "user_id": "u1", "correct_option": "B", "times_attempted": 2, "times_correct": 1}
+    ]
+    return fake
+
+
+def attempts(fake):
+    return fake.tables["questions"][0]["times_attempted"]
+
+
+def test_versioned_update_without_the_migration(fake):
+    result = record_answer(fake, "u1", "q1", "B")
+    assert (result["is_correct"], result["times_attempted"], result["times_correct"]) == (True, 3, 2)
+    assert attempts(fake) == 3
+
+    with pytest.raises(QuestionNotFound):
+        record_answer(fake, "u2", "q1", "B")
+
+
+@pytest.mark.parametrize("code", ["PGRST000", "57014", "40001"])
+def test_other_rpc_errors_are_raised_without_counting_again(fake, code):
+    def timed_out(params):
+        # The increment may have committed before the error reached us
+        raise APIError({"code": code, "message": "canceling statement due to statement timeout"})
+
+    fake.functions["record_answer_attempt"] = timed_out
+    with pytest.raises(APIError):
+        record_answer(fake, "u1", "q1", "B")
+    assert attempts(fake) == 2
+
+
+def test_rpc_result_is_returned(fake):
+    fake.functions["record_answer_attempt"] = lambda params: {"is_correct": params["p_answer"] == "B", "times_attempted": 3}
+    assert record_answer(fake, "u1", "q1", "B") == {"is_correct": True, "times_attempted": 3}
+
+    fake.functions["record_answer_attempt"] = lambda params: None
+    with pytest.raises(QuestionNotFound):
+        record_answer(fake, "u1", "missing", "B")
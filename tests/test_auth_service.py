@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+import uuid
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+from jwt.algorithms import ECAlgorithm
+
+from backend.services.auth_service import TokenVerifier
+
+ISSUER = "http://127.0.0.1/auth/v1"
+
+
+def make_key(kid):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    jwk = ECAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update(kid=kid, use="sig", alg="ES256")
+    return private_key, jwk
+
+
+def make_token(private_key, kid, **overrides):
+    claims = {
+        "sub": str(uuid.uuid4()),
+        "aud": "authenticated",
+        "iss": ISSUER,
+        "exp": int(time.time()) + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm="ES256", headers={"kid": kid})
+
+
+@pytest.fixture
+def jwks(stub_server):
+    keys = {"keys": []}
+
+    def publish(*jwks):
+        keys["keys"] = list(jwks)
+
+    url = stub_server.route(
+        "/auth/v1/.well-known/jwks.json",
+        lambda request: json.dumps(keys).encode(),
+        content_type="application/json",
+    )
+    return url, publish
+
+
+def make_verifier(url, **kwargs):
+    return TokenVerifier(jwks_url=url, issuer=ISSUER, **kwargs)
+
+
+def test_valid_token_is_verified_and_cached(jwks, stub_server):
+    url, publish = jwks
+    private_key, jwk = make_key("k1")
+    publish(jwk)
+    verifier = make_verifier(url)
+    token = make_token(private_key, "k1", sub="user-1")
+
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert verifier.cached(token)["sub"] == "user-1"
+    assert verifier.verify(token)["sub"] == "user-1"
+    assert verifier.misses == 1
+    assert stub_server.requests["/auth/v1/.well-known/jwks.json"] == 1
+
+
+def test_forged_expired_and_foreign_tokens_are_rejected(jwks):
+    url, publish = jwks
+    private_key, jwk = make_key("k1")
+    publish(jwk)
+    verifier = make_verifier(url)
+    forger, _ = make_key("k1")
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(make_token(forger, "k1"))
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(make_token(private_key, "k1", exp=int(time.time()) - 60))
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier.verify(make_token(private_key, "k1", aud="anon"))
+    with pytest.raises(jwt.InvalidIssuerError):
+        verifier.verify(make_token(private_key, "k1", iss="https://elsewhere/auth/v1"))
+    with pytest.raises(jwt.DecodeError):
+        verifier.verify("not-a-token")
+
+
+def test_unknown_kids_refresh_the_key_set_at_most_once_per_cooldown(jwks, stub_server):
+    url, publish = jwks
+    private_key, jwk = make_key("k1")
+    publish(jwk)
+    verifier = make_verifier(url, jwks_refresh_cooldown=60)
+    verifier.verify(make_token(private_key, "k1"))
+
+    for _ in range(50):
+        with pytest.raises(jwt.InvalidKeyError):
+            verifier.verify(make_token(private_key, uuid.uuid4().hex))
+
+    assert verifier.jwks_fetches == 1
+    assert stub_server.requests["/auth/v1/.well-known/jwks.json"] == 1
+
+
+def test_rotated_key_is_picked_up_after_the_cooldown(jwks, stub_server):
+    url, publish = jwks
+    old_key, old_jwk = make_key("k1")
+    publish(old_jwk)
+    verifier = make_verifier(url, jwks_refresh_cooldown=0)
+    verifier.verify(make_token(old_key, "k1"))
+
+    new_key, new_jwk = make_key("k2")
+    publish(old_jwk, new_jwk)
+    assert verifier.verify(make_token(new_key, "k2", sub="rotated"))["sub"] == "rotated"
+    assert stub_server.requests["/auth/v1/.well-known/jwks.json"] == 2
+
+
+def test_unreachable_jwks_endpoint_is_rate_limited(stub_server):
+    url = stub_server.route("/auth/v1/.well-known/jwks.json", b"down", status=503)
+    private_key, _ = make_key("k1")
+    verifier = make_verifier(url, jwks_refresh_cooldown=60)
+
+    for _ in range(5):
+        with pytest.raises(jwt.PyJWTError):
+            verifier.verify(make_token(private_key, "k1"))
+
+    assert stub_server.requests["/auth/v1/.well-known/jwks.json"] == 1
+
+
+def test_hs256_tokens_use_the_shared_secret():
+    verifier = TokenVerifier(jwks_url=None, issuer=None, jwt_secret="s3cret")
+    token = jwt.encode(
+        {"sub": "legacy", "aud": "authenticated", "exp": int(time.time()) + 60},
+        "s3cret",
+        algorithm="HS256",
+    )
+    assert verifier.verify(token)["sub"] == "legacy"
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(jwt.encode({"sub": "x", "aud": "authenticated", "exp": int(time.time()) + 60}, "other", algorithm="HS256"))
+
+
+def test_get_current_user_fetches_the_jwks_off_the_event_loop(stub_server, monkeypatch):
+    from backend import main
+
+    private_key, jwk = make_key("k1")
+    url = stub_server.route(
+        "/auth/v1/.well-known/jwks.json",
+        json.dumps({"keys": [jwk]}).encode(),
+        content_type="application/json",
+        delay=0.5,
+    )
+    monkeypatch.setattr(main, "token_verifier", make_verifier(url))
+    token = make_token(private_key, "k1", sub="user-1")
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        user_id = await main.get_current_user(f"Bearer {token}")
+        ticking.cancel()
+        with pytest.raises(HTTPException):
+            await main.get_current_user(f"Bearer {make_token(private_key, 'unknown')}")
+        return user_id, ticks
+
+    user_id, ticks = asyncio.run(scenario())
+    assert user_id == "user-1"
+    # The loop kept running while the slow JWKS request was in flight
+    assert ticks >= 20
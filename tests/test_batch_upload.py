@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from postgrest.exceptions import APIError
+from postgrest.utils import sanitize_param
+
+from backend.services import analytics_service
+from backend.services.upload_service import _bulk_save, question_text_hash, save_question
+from tests.fakes import FakeSupabase
+
+QUOTED = 'Find x, if "a" = 2 (and b: 3)'
+PASSAGE = "Read the passage below and answer. " * 300
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSupabase()
+    fake.generated["questions"] = {"question_text_hash": lambda row: question_text_hash(row.get("question_text"))}
+    fake.table("questions").insert({"user_id": "u1", "question_text": QUOTED}).execute()
+    fake.table("questions").insert({"user_id": "u2", "question_text": PASSAGE}).execute()
+    return fake
+
+
+def items(*texts):
+    return [
+        {"index": index, "ai_data": {"question_text": text, "options": []}, "image_url": f"img{index}.png",
+         "cached": False, "upload_task": None, "storage_path": None}
+        for index, text in enumerate(texts)
+    ]
+
+
+def save(fake, texts):
+    return asyncio.run(_bulk_save(fake, "u1", items(*texts)))
+
+
+def test_duplicates_are_found_by_text_hash(fake):
+    saved = save(fake, [QUOTED, PASSAGE, "New question", PASSAGE])
+
+    assert [result["is_duplicate"] for result in saved] == [True, False, False, True]
+    assert saved[0]["id"] == "1"
+    # Another user's copy isn't a duplicate; the repeat within the batch points at the new row
+    assert saved[3]["id"] == saved[1]["id"] != "2"
+    assert len([row for row in fake.tables["questions"] if row["user_id"] == "u1"]) == 3
+
+    # Hashes go into the in.(...) filter as they are, however long or quoted the text
+    assert sanitize_param(QUOTED) == f'"{QUOTED}"'
+    assert sanitize_param(question_text_hash(QUOTED)) == question_text_hash(QUOTED)
+    assert len(question_text_hash(PASSAGE)) == 32
+
+    # Saving the same batch again finds them all
+    assert all(result["is_duplicate"] for result in save(fake, [QUOTED, PASSAGE, "New question"]))
+
+
+def test_falls_back_to_text_lookups_before_the_migration(fake):
+    fake.missing_columns.add("question_text_hash")
+    saved = save(fake, [QUOTED, "Another question"])
+    assert [result["is_duplicate"] for result in saved] == [True, False]
+    assert saved[0]["id"] == "1"
+
+
+def test_other_lookup_errors_fail_the_save(fake, monkeypatch):
+    def unavailable(self):
+        raise APIError({"code": "PGRST000", "message": "Could not connect to the database"})
+
+    monkeypatch.setattr(type(fake.table("questions")), "execute", unavailable)
+    with pytest.raises(APIError):
+        save(fake, [QUOTED])
+
+
+
+def test_saving_invalidates_cached_analytics(fake):
+    def cache_overview():
+        analytics_service._cached(("u1", None), lambda: {"question_count": 2})
+        assert ("u1", None) in analytics_service._cache
+
+    def cached():
+        return ("u1", None) in analytics_service._cache
+
+    cache_overview()
+    save(fake, ["Brand new question"])
+    assert not cached()
+
+    # Single and streaming uploads save through save_question, duplicates included
+    cache_overview()
+    asyncio.run(save_question(fake, "u1", "a.png", {"question_text": "Another"}, None))
+    assert not cached()
+    cache_overview()
+    asyncio.run(save_question(fake, "u1", "b.png", {"question_text": QUOTED}, "1"))
+    assert not cached()
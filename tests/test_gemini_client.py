@@ -0,0 +1,182 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.ai.generativelanguage as glm
+import pytest
+from google.api_core import client_options as client_options_lib
+
+from backend.services.gemini_client import GeminiClientPool
+
+GENERATE_PATH = "/v1beta/models/gemini-flash-latest:generateContent"
+STREAM_PATH = "/v1beta/models/gemini-flash-latest:streamGenerateContent"
+
+
+def candidate(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def echo(request):
+    """Answers with the API key the request was sent with and its prompt"""
+    time.sleep(random.uniform(0, 0.005))
+    prompt = json.loads(request.body)["contents"][0]["parts"][0]["text"]
+    return json.dumps(candidate(f"{request.headers['x-goog-api-key']}|{prompt}")).encode()
+
+
+@pytest.fixture
+def gemini(stub_server):
+    stub_server.route(GENERATE_PATH, echo, content_type="application/json")
+    return stub_server
+
+
+def rest_pool(server, **kwargs):
+    return GeminiClientPool(transport="rest", api_endpoint=server.url, **kwargs)
+
+
+def test_keys_never_cross_between_concurrent_requests(gemini):
+    # A small pool so clients are evicted and recreated while calls are running
+    pool = rest_pool(gemini, max_clients=4)
+    keys = [f"key-{index}" for index in range(12)]
+
+    def call(index):
+        key = random.choice(keys)
+        prompt = f"prompt-{index}"
+        return key, prompt, pool.get_model(key).generate_content([prompt]).text
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(call, range(400)))
+
+    assert all(text == f"{key}|{prompt}" for key, prompt, text in results)
+    stats = pool.stats()
+    assert stats["evicted"] > 0
+    assert stats["in_flight"] == 0
+    assert stats["closed"] == stats["evicted"]
+
+
+def test_images_are_sent_as_uploaded(gemini):
+    png = bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de"
+        "0000000c4944415408d763f8ffff3f0005fe02fea7d6a4e40000000049454e44ae426082"
+    )
+    seen = {}
+
+    def capture(request):
+        seen.update(json.loads(request.body)["contents"][0]["parts"][1]["inlineData"])
+        return json.dumps(candidate("ok")).encode()
+
+    gemini.route(GENERATE_PATH, capture, content_type="application/json")
+    assert rest_pool(gemini).get_model("k").generate_content(["describe", png]).text == "ok"
+    assert seen["mimeType"] == "image/png"
+
+
+def test_streamed_chunks_and_blocked_prompts(gemini):
+    gemini.route(
+        STREAM_PATH,
+        json.dumps([candidate("Hel"), candidate("lo")]).encode(),
+        content_type="application/json",
+    )
+    pool = rest_pool(gemini)
+    chunks = [chunk.text for chunk in pool.get_model("k").generate_content(["hi"], stream=True)]
+    assert chunks == ["Hel", "lo"]
+    assert pool.stats()["in_flight"] == 0
+
+    gemini.route(GENERATE_PATH, json.dumps({"promptFeedback": {"blockReason": 1}}).encode(),
+                 content_type="application/json")
+    with pytest.raises(ValueError, match="SAFETY"):
+        pool.get_model("k").generate_content(["hi"]).text
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.transport = FakeTransport()
+
+
+class FakeClientPool(GeminiClientPool):
+    def _make_client(self, api_key):
+        return FakeClient(api_key)
+
+
+def test_evicted_client_is_closed_only_after_its_last_call():
+    pool = FakeClientPool(max_clients=1)
+    in_call = threading.Event()
+    finish = threading.Event()
+    leased = {}
+
+    def long_call():
+        with pool.lease("key-1") as client:
+            leased["client"] = client
+            in_call.set()
+            finish.wait(5)
+            assert not client.transport.closed
+
+    worker = threading.Thread(target=long_call)
+    worker.start()
+    in_call.wait(5)
+
+    with pool.lease("key-2"):
+        pass
+    assert pool.stats()["evicted"] == 1
+    assert not leased["client"].transport.closed
+
+    finish.set()
+    worker.join(5)
+    assert leased["client"].transport.closed
+
+    # Idle clients are closed right away
+    with pool.lease("key-3"):
+        pass
+    assert pool.stats() == {"clients": 1, "in_flight": 0, "created": 3, "evicted": 2, "closed": 2}
+
+
+def test_pooled_calls_skip_per_call_client_setup(gemini):
+    """What the pool saves per call: building a client (and channel) for the key"""
+    runs = 30
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        glm.GenerativeServiceClient(client_options=client_options_lib.ClientOptions(api_key="k"))
+    fresh_ms = (time.perf_counter() - started) * 1000 / runs
+
+    pool = GeminiClientPool()
+    with pool.lease("k"):
+        pass
+    started = time.perf_counter()
+    for _ in range(runs):
+        with pool.lease("k"):
+            pass
+    pooled_ms = (time.perf_counter() - started) * 1000 / runs
+
+    # Over HTTP as well: a fresh client per call versus the pooled one. Local
+    # connections are cheap, so this is reported rather than asserted.
+    gemini.route(GENERATE_PATH, json.dumps(candidate("ok")).encode(), content_type="application/json")
+    request = glm.GenerateContentRequest(
+        model="models/gemini-flash-latest",
+        contents=[glm.Content(role="user", parts=[glm.Part(text="hi")])],
+    )
+    options = client_options_lib.ClientOptions(api_key="k", api_endpoint=gemini.url)
+    started = time.perf_counter()
+    for _ in range(runs):
+        glm.GenerativeServiceClient(transport="rest", client_options=options).generate_content(request)
+    fresh_call_ms = (time.perf_counter() - started) * 1000 / runs
+
+    model = rest_pool(gemini).get_model("k")
+    model.generate_content(["warm up"])
+    started = time.perf_counter()
+    for _ in range(runs):
+        model.generate_content(["hi"])
+    pooled_call_ms = (time.perf_counter() - started) * 1000 / runs
+
+    print(f"\nclient setup: fresh {fresh_ms:.3f} ms, pooled {pooled_ms:.4f} ms; "
+          f"local REST call: fresh client {fresh_call_ms:.2f} ms, pooled {pooled_call_ms:.2f} ms")
+    assert pooled_ms * 20 < fresh_ms
@@ -0,0 +1,105 @@
+import io
+import random
+
+from PIL import Image, ImageDraw, ImageOps
+
+from backend.services import image_preprocess
+from backend.services.image_preprocess import BORDER_PADDING, preprocess_screenshot
+
+
+def screenshot(size, text_box, tick=None):
+    """A white capture with dark 'text' lines inside `text_box` and an optional green tick"""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(size[0] * size[1])
+    left, top, right, bottom = text_box
+    for y in range(top, bottom - 10, 24):
+        end = rng.randint(left + (right - left) // 2, right)
+        draw.rectangle((left, y, end, y + 10), fill=(30, 30, 30))
+    if tick:
+        draw.rectangle(tick, fill=(20, 170, 60))
+    return image
+
+
+def png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", compress_level=0)
+    return buffer.getvalue()
+
+
+def stage(result, name):
+    return next(stage for stage in result["stages"] if stage["stage"] == name)
+
+
+def decode(result):
+    return Image.open(io.BytesIO(result["bytes"]))
+
+
+def test_margins_are_cropped_and_output_is_smaller():
+    image = screenshot((1000, 1200), (200, 300, 800, 900))
+    result = preprocess_screenshot(png(image))
+
+    left, top, right, bottom = ImageOps.invert(image.convert("L")).getbbox()
+    assert decode(result).size == (right - left + 2 * BORDER_PADDING, bottom - top + 2 * BORDER_PADDING)
+    assert decode(result).width < 700 and decode(result).height < 700
+    assert result["bytes_out"] < result["bytes_in"]
+    assert [entry["stage"] for entry in result["stages"]] == ["decode", "auto_crop", "cap_resolution", "grayscale", "encode"]
+
+
+def test_resolution_is_capped_per_profile_but_keeps_tall_captures_legible():
+    wide = png(screenshot((3000, 1500), (0, 0, 3000, 1500)))
+    assert decode(preprocess_screenshot(wide)).size == (1600, 800)
+    assert decode(preprocess_screenshot(wide, "mcq")).size == (1400, 700)
+    assert decode(preprocess_screenshot(wide, "geometry")).size == (2048, 1024)
+
+    # Scaling the long edge to 1400 would leave a 233px wide column; it stays 640 wide
+    tall = png(screenshot((1000, 6000), (0, 0, 1000, 6000)))
+    assert decode(preprocess_screenshot(tall, "mcq")).size == (640, 3840)
+
+    small = png(screenshot((900, 1200), (0, 0, 900, 1200)))
+    assert decode(preprocess_screenshot(small)).size == (900, 1200)
+
+
+def test_color_is_dropped_only_when_nothing_is_colorful():
+    plain = preprocess_screenshot(png(screenshot((800, 800), (50, 50, 750, 750))))
+    grayscale = stage(plain, "grayscale")
+    assert grayscale["bytes_out"] * 3 == grayscale["bytes_in"]
+
+    # A small green "correct answer" tick keeps the color
+    ticked = preprocess_screenshot(png(screenshot((800, 800), (50, 50, 750, 750), tick=(60, 400, 100, 440))))
+    grayscale = stage(ticked, "grayscale")
+    assert grayscale["bytes_out"] == grayscale["bytes_in"]
+    red, green, blue = decode(ticked).convert("RGB").getpixel((80 - 50 + BORDER_PADDING, 420 - 50 + BORDER_PADDING))
+    assert green > red + 60 and green > blue + 60
+
+    # Visual questions never lose their color
+    visual = preprocess_screenshot(png(screenshot((800, 800), (50, 50, 750, 750))), "geometry")
+    assert stage(visual, "grayscale")["bytes_out"] == stage(visual, "grayscale")["bytes_in"]
+
+
+def test_webp_output_and_png_fallback(monkeypatch):
+    capture = png(screenshot((1000, 1000), (100, 100, 900, 900)))
+
+    if image_preprocess.WEBP_SUPPORTED:
+        result = preprocess_screenshot(capture)
+        assert (result["content_type"], result["extension"]) == ("image/webp", "webp")
+        assert result["bytes"][:4] == b"RIFF" and result["bytes"][8:12] == b"WEBP"
+
+    monkeypatch.setattr(image_preprocess, "WEBP_SUPPORTED", False)
+    result = preprocess_screenshot(capture)
+    assert (result["content_type"], result["extension"]) == ("image/png", "png")
+    assert decode(result).format == "PNG"
+
+
+def test_undecodable_or_already_small_images_are_left_alone():
+    garbage = b"not an image at all"
+    result = preprocess_screenshot(garbage)
+    assert result["bytes"] is garbage and result["content_type"] is None
+
+    # Already compressed harder than the profile would: re-encoding can't make it smaller
+    rng = random.Random(3)
+    noise = Image.frombytes("RGB", (64, 64), bytes(rng.randrange(256) for _ in range(64 * 64 * 3)))
+    buffer = io.BytesIO()
+    noise.save(buffer, "WEBP", quality=1)
+    compressed = buffer.getvalue()
+    assert preprocess_screenshot(compressed)["bytes"] is compressed
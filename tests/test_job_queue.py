@@ -0,0 +1,90 @@
+import asyncio
+import gc
+
+from backend.services.job_queue import JobQueue
+
+
+def test_retries_survive_garbage_collection():
+    attempts = []
+
+    async def flaky(job):
+        attempts.append(job["attempts"])
+        if job["attempts"] < 3:
+            raise RuntimeError("try again")
+        return "ok"
+
+    async def scenario():
+        queue = JobQueue("test", flaky, workers=1, max_attempts=3, backoff_seconds=0.05)
+        job = queue.submit({})
+        for _ in range(100):
+            gc.collect()
+            if job["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert job["result"] == "ok"
+    assert attempts == [1, 2, 3]
+
+
+def test_cancelled_job_is_requeued_for_the_next_worker():
+    async def scenario():
+        running = asyncio.Event()
+        calls = []
+
+        async def handler(job):
+            calls.append(job["attempts"])
+            if len(calls) == 1:
+                running.set()
+                await asyncio.sleep(3600)
+            return "second run"
+
+        queue = JobQueue("test", handler, workers=1)
+        job = queue.submit({})
+        await running.wait()
+        assert job["status"] == "running"
+
+        for task in queue._worker_tasks:
+            task.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert job["status"] == "queued"
+        assert job["attempts"] == 0
+
+        # The next submit restarts the workers, which pick the job up again
+        other = queue.submit({})
+        for _ in range(100):
+            if job["status"] == other["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        return job, calls
+
+    job, calls = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert job["result"] == "second run"
+    # The interrupted run didn't count as an attempt
+    assert calls == [1, 1, 1]
+
+
+def test_waiting_on_unknown_jobs_creates_no_events():
+    async def handler(job):
+        return "ok"
+
+    async def scenario():
+        queue = JobQueue("test", handler, workers=1)
+        await asyncio.gather(*(queue.wait_for_update(f"elsewhere-{index}", timeout=0.01) for index in range(50)))
+        assert queue._events == {}
+
+        job = queue.submit({})
+        await queue.wait_for_update(job["id"], timeout=1)
+        for _ in range(100):
+            if job["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        return queue, job
+
+    queue, job = asyncio.run(scenario())
+    assert job["status"] == "done"
+    assert queue._events == {}
@@ -0,0 +1,92 @@
+import json
+import random
+
+import pytest
+
+from backend.services.json_stream import IncrementalJSONParser
+
+STREAMED = {"detailed_analysis", "question_text"}
+
+PAYLOAD = json.dumps({
+    "question_text": 'Tab\there, "quoted", back\\slash, line\nbreak, caf\u00e9 \u2211 \U0001f600',
+    "options": [{"label": "A", "text": "x, y}"}, {"label": "B", "text": "[1]"}],
+    "correct_answer": "B",
+    "confidence": 0.875,
+    "is_diagram": False,
+    "topic": None,
+    "detailed_analysis": "Step 1: \u00bd of 10 is 5 \\ done / \u0000 \u001f end",
+}, ensure_ascii=True)
+
+
+def run(chunks, stream_keys=STREAMED):
+    parser = IncrementalJSONParser(stream_keys=stream_keys)
+    events = [event for chunk in chunks for event in parser.feed(chunk)]
+    return parser, events
+
+
+def check(parser, events, expected):
+    assert parser.done
+    assert parser.fields == expected
+    fields = {event["key"]: event["value"] for event in events if event["type"] == "field"}
+    assert fields == expected
+    for key in STREAMED & expected.keys():
+        streamed = "".join(event["text"] for event in events if event["type"] == "delta" and event["key"] == key)
+        assert streamed == expected[key]
+
+
+def test_payload_split_at_every_offset():
+    expected = json.loads(PAYLOAD)
+    # ensure_ascii turns every non-ASCII char into \u escapes (and the emoji into a surrogate pair)
+    assert "\\u00e9" in PAYLOAD and "\\ud83d\\ude00" in PAYLOAD
+
+    for offset in range(len(PAYLOAD) + 1):
+        check(*run([PAYLOAD[:offset], PAYLOAD[offset:]]), expected)
+
+
+def test_payload_fed_one_char_and_random_chunks_at_a_time():
+    expected = json.loads(PAYLOAD)
+    check(*run(list(PAYLOAD)), expected)
+
+    rng = random.Random(7)
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(PAYLOAD)), rng.randint(1, 12)))
+        chunks = [PAYLOAD[start:end] for start, end in zip([0, *cuts], [*cuts, len(PAYLOAD)])]
+        check(*run(chunks), expected)
+
+
+def test_unescaped_latex_backslashes_are_kept_at_any_split():
+    # What the model writes: single backslashes in front of LaTeX commands
+    raw = '{"question_text": "Find \\frac{1}{2} of \\theta, \\cdot \\alpha\\n", "value": 1}'
+    expected = {"question_text": "Find \\frac{1}{2} of \\theta, \\cdot \\alpha\n", "value": 1}
+
+    for offset in range(len(raw) + 1):
+        check(*run([raw[:offset], raw[offset:]]), expected)
+
+
+@pytest.mark.parametrize("text", ["prefix text ```json\n", ""])
+def test_text_around_the_object_is_ignored(text):
+    parser, events = run([text, PAYLOAD, "\n```"])
+    check(parser, events, json.loads(PAYLOAD))
+
+
+# No letters that start a LaTeX command, where the parser deliberately differs from json.loads
+ALPHABET = 'xyzXYZ 019,:{}[]"\\/\n\t\b\f\r\x00\x1fé∑\U0001f600'
+
+
+def test_random_payloads_match_json_loads():
+    rng = random.Random(11)
+
+    def text():
+        return "".join(rng.choices(ALPHABET, k=rng.randint(0, 20)))
+
+    for _ in range(300):
+        value = {
+            "question_text": text(),
+            "options": [{"label": text(), "text": text()} for _ in range(rng.randint(0, 3))],
+            "score": rng.choice([rng.randint(-5, 5), rng.random(), True, None]),
+            "detailed_analysis": text(),
+        }
+        payload = json.dumps(value, ensure_ascii=rng.random() < 0.5)
+        cuts = sorted(rng.sample(range(1, len(payload)), min(len(payload) - 1, rng.randint(1, 20))))
+        chunks = [payload[start:end] for start, end in zip([0, *cuts], [*cuts, len(payload)])]
+        check(*run(chunks), value)
@@ -0,0 +1,187 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from backend.services import lazy_analysis
+from backend.services.job_queue import TERMINAL_STATUSES, JobQueue
+from backend.services.lazy_analysis import keep_existing_analysis
+from tests.fakes import FakeSupabase
+
+COMPLETE = {
+    "question_text": "What is 2 + 2?",
+    "detailed_analysis": "Listen up, aspirant. The Core Concept ...",
+    "practice_question": "What is 3 + 3?",
+    "practice_answer": "6",
+    "analysis_status": "complete",
+}
+PENDING = {"question_text": "What is 2 + 2?", "options": [{"label": "A", "text": "4"}], "analysis_status": "pending"}
+
+
+def test_pending_extraction_keeps_an_existing_analysis():
+    merged = keep_existing_analysis(COMPLETE, PENDING)
+    assert merged["analysis_status"] == "complete"
+    assert merged["detailed_analysis"] == COMPLETE["detailed_analysis"]
+    assert merged["options"] == PENDING["options"]
+
+    # Rows from before lazy mode have an analysis but no status
+    legacy = {key: value for key, value in COMPLETE.items() if key != "analysis_status"}
+    assert keep_existing_analysis(legacy, PENDING)["analysis_status"] == "complete"
+
+    # Nothing to keep, or a fresh full analysis: the new data wins
+    assert keep_existing_analysis({"analysis_status": "pending"}, PENDING) is PENDING
+    assert keep_existing_analysis(None, PENDING) is PENDING
+    assert keep_existing_analysis(COMPLETE, {**COMPLETE, "detailed_analysis": "new"})["detailed_analysis"] == "new"
+
+
+def test_duplicate_reupload_does_not_discard_the_analysis():
+    from backend.services.upload_service import _upload_result, save_question
+
+    fake = FakeSupabase()
+    fake.tables["questions"] = [{"id": "q1", "user_id": "u1", "image_url": "old.png", "content": dict(COMPLETE)}]
+
+    saved = asyncio.run(save_question(fake, "u1", "new.png", dict(PENDING), "q1"))
+
+    row = fake.tables["questions"][0]
+    assert row["image_url"] == "new.png"
+    assert row["content"]["analysis_status"] == "complete"
+    assert row["content"]["detailed_analysis"] == COMPLETE["detailed_analysis"]
+    assert _upload_result(saved, PENDING, "new.png", cached=False)["data"]["analysis_status"] == "complete"
+
+
+def test_pdf_marks_pending_analyses():
+    from backend.services.pdf_service import PENDING_ANALYSIS_TEXT, _export_columns, _layout_question
+
+    options = {"include_ai_analysis": True}
+    assert "analysis_status:content->>analysis_status" in _export_columns(options)
+
+    question = {"question_text": "What is 2 + 2?", "options": [], "content": {"analysis_status": "pending"}}
+    layout = _layout_question(question, options, None)
+    assert " ".join(layout["analysis_lines"]) == PENDING_ANALYSIS_TEXT
+
+    question["content"] = {"detailed_analysis": "Core concept", "analysis_status": "complete"}
+    assert _layout_question(question, options, None)["analysis_lines"] == ["Core concept"]
+
+
+def usage_functions(fake):
+    """claim_lazy_analyses / release_lazy_analyses as the migration defines them"""
+    lock = threading.Lock()
+    usage = fake.tables.setdefault("lazy_analysis_usage", {})
+
+    def claim(params):
+        with lock:
+            key = (params["p_user_id"], params["p_day"])
+            used = usage.get(key, 0)
+            granted = min(max(params["p_count"], 0), max(params["p_limit"] - used, 0))
+            usage[key] = used + granted
+            return granted
+
+    def release(params):
+        with lock:
+            key = (params["p_user_id"], params["p_day"])
+            usage[key] = max(usage.get(key, 0) - params["p_count"], 0)
+
+    fake.functions.update(claim_lazy_analyses=claim, release_lazy_analyses=release)
+    return usage
+
+
+def created(days_ago):
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).isoformat()
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    """A free-tier user with 13 of 15 uploads used today and pending questions from earlier days"""
+    from backend import main
+
+    fake = FakeSupabase()
+    fake.tables["questions"] = [
+        {"id": f"old{index}", "user_id": "u1", "created_at": created(3 + index), "content": dict(PENDING)}
+        for index in range(5)
+    ] + [{"id": "today", "user_id": "u1", "created_at": created(0), "content": dict(PENDING)}]
+    fake.tables["questions"] += [{"user_id": "u1", "created_at": created(0), "content": {}} for _ in range(12)]
+    fake.usage = usage_functions(fake)
+    monkeypatch.setattr(main, "supabase_admin", fake)
+    monkeypatch.setattr(main, "resolve_gemini_key", lambda user_id, key: ("master", "free-tier", None if key else 15))
+
+    fake.generated_for = []
+    fake.fail_generation = False
+
+    def generate(content, image_bytes, api_key=None):
+        fake.generated_for.append(content)
+        if fake.fail_generation:
+            return {"error": "Gemini unavailable"}
+        return {field: f"{field} text" for field in COMPLETE if field in lazy_analysis.ANALYSIS_FIELDS}
+
+    monkeypatch.setattr(lazy_analysis, "generate_detailed_analysis", generate)
+    return fake
+
+
+def status(fake, question_id):
+    row = next(row for row in fake.tables["questions"] if row.get("id") == question_id)
+    return row["content"]["analysis_status"]
+
+
+def used(fake):
+    return sum(fake.usage.values())
+
+
+def test_free_tier_analyses_are_metered_per_generation(quota):
+    from backend.main import get_question
+
+    # A failed generation hands its unit back
+    quota.fail_generation = True
+    assert get_question("old0", "u1", None)["content"]["analysis_status"] == "pending"
+    assert used(quota) == 0
+    quota.fail_generation = False
+
+    # 13 uploads leave 2 analyses; opening the same question again costs nothing
+    for question_id in ("old0", "old1", "old1", "old2"):
+        get_question(question_id, "u1", None)
+    assert [status(quota, f"old{index}") for index in range(3)] == ["complete", "complete", "pending"]
+    assert used(quota) == 2
+
+    # Today's uploads already paid for their analysis; the user's own key isn't limited
+    assert get_question("today", "u1", None)["content"]["analysis_status"] == "complete"
+    assert get_question("old2", "u1", "own-key")["content"]["analysis_status"] == "complete"
+    assert used(quota) == 2
+    assert len(quota.generated_for) == 5
+
+
+def test_repeated_backfills_cannot_exceed_the_daily_limit(quota, monkeypatch):
+    from backend.main import backfill_question_analysis
+
+    queue = JobQueue("analysis-backfill-test", lazy_analysis._run_backfill_job, workers=2, backoff_seconds=0)
+    monkeypatch.setattr(lazy_analysis, "analysis_backfill_queue", queue)
+
+    async def finished():
+        while any(job["status"] not in TERMINAL_STATUSES for job in queue._jobs.values()):
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        first = await backfill_question_analysis(50, "u1", None)
+        # Straight away (jobs still queued) and after they ran: nothing left to spend
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exceeded:
+                await backfill_question_analysis(50, "u1", None)
+            assert exceeded.value.status_code == 403
+            await finished()
+        return first
+
+    first = asyncio.run(scenario())
+
+    # Today's upload plus the two oldest questions the quota had left analyses for
+    assert (first["queued"], first["over_quota"]) == (3, 3)
+    assert len(quota.generated_for) == 3 and used(quota) == 2
+    assert [status(quota, question_id) for question_id in ("today", "old4", "old3", "old2")] == \
+           ["complete", "complete", "complete", "pending"]
+
+
+def test_metered_generation_fails_closed_without_the_migration(quota):
+    from backend.main import get_question
+
+    quota.functions.clear()
+    assert get_question("old0", "u1", None)["content"]["analysis_status"] == "pending"
+    assert quota.generated_for == []
@@ -0,0 +1,306 @@
+"""
+The supabase/migrations applied to a scratch database on a real Postgres.
+
+Skipped unless TEST_DATABASE_URL points at a server where the user can create
+databases and roles (e.g. `host=/tmp port=5432 user=postgres dbname=postgres`).
+"""
+
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+MIGRATIONS = sorted((Path(__file__).parent.parent / "supabase" / "migrations").glob("*.sql"))
+
+# What a Supabase project provides before the migrations run: the API roles
+# (which get EXECUTE on every new function in public by default), auth.uid()
+# reading the caller's JWT, and the questions table.
+SUPABASE_BASE = """
+do $$
+declare
+    role_name text;
+begin
+    foreach role_name in array array['anon', 'authenticated', 'service_role'] loop
+        if not exists (select from pg_roles where rolname = role_name) then
+            execute format('create role %I nologin', role_name);
+        end if;
+    end loop;
+end;
+$$;
+
+grant usage on schema public to anon, authenticated, service_role;
+alter default privileges in schema public grant all on tables to anon, authenticated, service_role;
+alter default privileges in schema public grant all on functions to anon, authenticated, service_role;
+
+create schema if not exists auth;
+create or replace function auth.uid() returns uuid language sql stable as $$
+    select nullif(current_setting('request.jwt.claim.sub', true), '')::uuid
+$$;
+
+create table public.questions (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null,
+    question_text text,
+    subject text,
+    topic text,
+    mastery_level text default 'new',
+    created_at timestamptz default now(),
+    last_attempted_at timestamptz,
+    times_attempted integer default 0,
+    times_correct integer default 0,
+    next_review_date timestamptz,
+    ease_factor double precision,
+    interval_days integer,
+    content jsonb,
+    image_url text,
+    status text,
+    correct_option text,
+    user_answer text
+);
+"""
+
+# security definer functions that take a user id: only the backend may call them
+SERVICE_ROLE_FUNCTIONS = [
+    "public.question_stats_add(uuid, text, text, text, integer, integer, integer)",
+    "public.question_stats_expected(uuid)",
+    "public.reconcile_question_stats(uuid)",
+    "public.question_stats_users()",
+    "public.apply_review_batch(uuid, jsonb, jsonb)",
+    "public.record_answer_attempt(uuid, uuid, text)",
+    "public.claim_lazy_analyses(uuid, date, integer, integer)",
+    "public.release_lazy_analyses(uuid, date, integer)",
+]
+
+
+@pytest.fixture(scope="module")
+def database():
+    dsn = os.getenv("TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    name = f"migrations_test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(dsn, autocommit=True) as admin:
+        admin.execute(f"create database {name} encoding 'UTF8' template template0")
+    url = psycopg.conninfo.make_conninfo(dsn, dbname=name)
+    try:
+        with psycopg.connect(url, autocommit=True) as conn:
+            conn.execute(SUPABASE_BASE)
+            for migration in MIGRATIONS:
+                conn.execute(migration.read_text())
+        yield url
+    finally:
+        with psycopg.connect(dsn, autocommit=True) as admin:
+            admin.execute(f"drop database if exists {name} with (force)")
+
+
+def service_connection(url):
+    """A connection acting as the backend's service role"""
+    conn = psycopg.connect(url, autocommit=True)
+    conn.execute("set role service_role")
+    return conn
+
+
+def add_question(url, user_id, correct_option="B"):
+    with psycopg.connect(url, autocommit=True) as conn:
+        return str(conn.execute(
+            "insert into public.questions (user_id, subject, correct_option) values (%s, 'Maths', %s) returning id",
+            (user_id, correct_option),
+        ).fetchone()[0])
+
+
+def counters(url, question_id):
+    with psycopg.connect(url) as conn:
+        return conn.execute(
+            "select times_attempted, times_correct from public.questions where id = %s", (question_id,)
+        ).fetchone()
+
+
+def can_execute(conn, role, function):
+    return conn.execute("select has_function_privilege(%s, %s, 'execute')", (role, function)).fetchone()[0]
+
+
+@pytest.mark.parametrize("function", SERVICE_ROLE_FUNCTIONS)
+def test_definer_functions_are_not_callable_by_api_clients(database, function):
+    with psycopg.connect(database) as conn:
+        assert not can_execute(conn, "anon", function)
+        assert not can_execute(conn, "authenticated", function)
+        assert can_execute(conn, "service_role", function)
+
+
+def test_trigger_rollup_still_runs_for_browser_writes(database):
+    user_id = str(uuid.uuid4())
+    with psycopg.connect(database) as conn:
+        assert not can_execute(conn, "authenticated", "public.questions_stats_rollup()")
+
+        # The trigger fires with the owner's rights even when the writer can't call the functions
+        conn.execute("grant insert on public.questions to authenticated")
+        conn.execute("set local role authenticated")
+        conn.execute(
+            "insert into public.questions (user_id, subject, topic) values (%s, 'Maths', 'Algebra')",
+            (user_id,),
+        )
+        conn.execute("reset role")
+        count = conn.execute(
+            "select question_count from public.user_question_stats where user_id = %s", (user_id,)
+        ).fetchone()
+        assert count == (1,)
+
+
+def test_no_definer_function_is_left_callable_by_api_clients(database):
+    with psycopg.connect(database) as conn:
+        exposed = conn.execute(
+            """
+            select p.oid::regprocedure::text from pg_proc p
+            where p.pronamespace = 'public'::regnamespace
+              and p.prosecdef
+              and (has_function_privilege('anon', p.oid, 'execute')
+                   or has_function_privilege('authenticated', p.oid, 'execute'))
+            """
+        ).fetchall()
+    assert exposed == []
+
+
+def test_api_clients_cannot_record_answers_for_other_users(database):
+    question_id = add_question(database, uuid.uuid4())
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("set role authenticated")
+        with pytest.raises(psycopg.errors.InsufficientPrivilege):
+            conn.execute("select public.record_answer_attempt(%s, %s, 'B')", (str(uuid.uuid4()), question_id))
+
+
+def test_concurrent_answers_are_all_counted(database):
+    user_id = str(uuid.uuid4())
+    question_id = add_question(database, user_id)
+    answers = ["B" if index % 3 else "A" for index in range(48)]
+    connections = [service_connection(database) for _ in answers]
+    start = threading.Barrier(len(answers))
+
+    def answer(args):
+        conn, choice = args
+        start.wait()
+        return conn.execute(
+            "select public.record_answer_attempt(%s, %s, %s)", (user_id, question_id, choice)
+        ).fetchone()[0]
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(answers)) as executor:
+            results = list(executor.map(answer, zip(connections, answers)))
+    finally:
+        for conn in connections:
+            conn.close()
+
+    correct = answers.count("B")
+    assert counters(database, question_id) == (len(answers), correct)
+    # Every call saw its own increment: no two answers read the same counters
+    assert sorted(result["times_attempted"] for result in results) == list(range(1, len(answers) + 1))
+    assert sum(result["is_correct"] for result in results) == correct
+
+    with service_connection(database) as conn:
+        assert conn.execute(
+            "select public.record_answer_attempt(%s, %s, 'B')", (str(uuid.uuid4()), question_id)
+        ).fetchone()[0] is None
+
+
+def review_batch(conn, user_id, question_id, expected_attempts, key):
+    update = {"id": question_id, "expected_attempts": expected_attempts, "user_answer": "B",
+              "times_attempted": (expected_attempts or 0) + 1, "times_correct": 1,
+              "mastery_level": "learning", "interval_days": 1, "repetitions": 1}
+    submission = {"idempotency_key": key, "question_id": question_id, "result": {"is_correct": True}}
+    return conn.execute(
+        "select public.apply_review_batch(%s, %s::jsonb, %s::jsonb)",
+        (user_id, psycopg.types.json.Jsonb([update]), psycopg.types.json.Jsonb([submission])),
+    ).fetchone()[0]
+
+
+def test_review_batch_rejects_stale_and_replayed_answers(database):
+    user_id = str(uuid.uuid4())
+    question_id = add_question(database, user_id)
+
+    with service_connection(database) as conn:
+        assert review_batch(conn, user_id, question_id, 0, "first") == 1
+
+        # Computed from the row before "first" was applied: nothing is written
+        with pytest.raises(psycopg.errors.SerializationFailure):
+            review_batch(conn, user_id, question_id, 0, "stale")
+        assert conn.execute(
+            "select count(*) from public.review_submissions where idempotency_key = 'stale'"
+        ).fetchone()[0] == 0
+
+        with pytest.raises(psycopg.errors.SerializationFailure):
+            review_batch(conn, user_id, question_id, 1, "first")
+
+    assert counters(database, question_id) == (1, 1)
+
+
+def test_concurrent_review_batches_from_the_same_read_apply_once(database):
+    user_id = str(uuid.uuid4())
+    question_id = add_question(database, user_id)
+    runs = 16
+    connections = [service_connection(database) for _ in range(runs)]
+    start = threading.Barrier(runs)
+
+    def submit(index):
+        start.wait()
+        try:
+            return review_batch(connections[index], user_id, question_id, 0, f"key-{index}")
+        except psycopg.errors.SerializationFailure:
+            return 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=runs) as executor:
+            applied = list(executor.map(submit, range(runs)))
+    finally:
+        for conn in connections:
+            conn.close()
+
+    assert sum(applied) == 1
+    assert counters(database, question_id) == (1, 1)
+    with psycopg.connect(database) as conn:
+        assert conn.execute(
+            "select count(*) from public.review_submissions where user_id = %s", (user_id,)
+        ).fetchone()[0] == 1
+
+
+def test_concurrent_analysis_claims_stay_within_the_limit(database):
+    user_id = str(uuid.uuid4())
+    runs = 12
+    connections = [service_connection(database) for _ in range(runs)]
+    start = threading.Barrier(runs)
+
+    def claim(index):
+        start.wait()
+        return connections[index].execute(
+            "select public.claim_lazy_analyses(%s, '2026-10-25', 10, %s)", (user_id, 1 + index % 3)
+        ).fetchone()[0]
+
+    try:
+        with ThreadPoolExecutor(max_workers=runs) as executor:
+            granted = list(executor.map(claim, range(runs)))
+    finally:
+        for conn in connections:
+            conn.close()
+
+    assert sum(granted) == 10
+    with service_connection(database) as conn:
+        conn.execute("select public.release_lazy_analyses(%s, '2026-10-25', 3)", (user_id,))
+        # Released units can be claimed again; another day has its own count
+        assert conn.execute("select public.claim_lazy_analyses(%s, '2026-10-25', 10, 5)", (user_id,)).fetchone()[0] == 3
+        assert conn.execute("select public.claim_lazy_analyses(%s, '2026-10-26', 10, 5)", (user_id,)).fetchone()[0] == 5
+
+
+def test_question_text_hash_matches_the_backend(database):
+    from backend.services.upload_service import question_text_hash
+
+    texts = ['Find x, if "a" = 2', "café √2 \U0001f600", "", None]
+    with psycopg.connect(database, autocommit=True) as conn:
+        for text in texts:
+            stored = conn.execute(
+                "insert into public.questions (user_id, question_text) values (%s, %s) returning question_text_hash",
+                (str(uuid.uuid4()), text),
+            ).fetchone()[0]
+            assert stored == question_text_hash(text)
@@ -0,0 +1,94 @@
+import io
+import time
+
+import pytest
+from PIL import Image
+
+from backend.services import pdf_service
+from backend.services.disk_cache import DiskLRUCache
+
+FETCH_DELAY = 0.3
+
+
+def png(width, height, color="navy"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def image_cache(tmp_path, monkeypatch):
+    def make():
+        cache = DiskLRUCache(str(tmp_path / "pdf_images"), 16 * 1024 * 1024)
+        monkeypatch.setattr(pdf_service, "image_cache", cache)
+        return cache
+
+    make()
+    monkeypatch.setattr(pdf_service, "IMAGE_FETCH_TIMEOUT_SECONDS", 0.5)
+    return make
+
+
+def thumbnails(questions):
+    futures = pdf_service.prefetch_images(questions)
+    return {url: future.result() for url, future in futures.items()}
+
+
+def test_images_are_fetched_in_parallel_and_resized(stub_server, image_cache):
+    urls = [
+        stub_server.route(f"/img/{index}.png", png(1200, 600), content_type="image/png", delay=FETCH_DELAY)
+        for index in range(pdf_service.IMAGE_FETCH_WORKERS)
+    ]
+    small = stub_server.route("/img/small.png", png(100, 50), content_type="image/png", delay=FETCH_DELAY)
+    questions = [{"image_url": url} for url in urls + [small, urls[0]]]
+
+    started = time.perf_counter()
+    fetched = thumbnails(questions)
+    elapsed = time.perf_counter() - started
+
+    # 9 distinct URLs on IMAGE_FETCH_WORKERS threads: two rounds, against nine serially
+    assert elapsed < FETCH_DELAY * (len(urls) + 1) / 2
+    assert sum(stub_server.requests.values()) == len(urls) + 1
+    assert Image.open(io.BytesIO(fetched[urls[0]])).size == (pdf_service.MAX_IMAGE_WIDTH, 200)
+    assert Image.open(io.BytesIO(fetched[small])).size == (100, 50)
+
+
+def test_failed_and_slow_images_are_skipped_not_cached(stub_server, image_cache):
+    missing = f"{stub_server.url}/img/missing.png"
+    broken = stub_server.route("/img/broken.png", b"<html>not an image</html>", content_type="text/html")
+    slow = stub_server.route("/img/slow.png", png(10, 10), content_type="image/png", delay=2)
+    good = stub_server.route("/img/good.png", png(10, 10), content_type="image/png")
+
+    started = time.perf_counter()
+    fetched = thumbnails([{"image_url": url} for url in (missing, broken, slow, good)])
+    assert time.perf_counter() - started < 1.5
+
+    assert fetched[missing] is None
+    assert fetched[broken] is None
+    assert fetched[slow] is None
+    assert fetched[good] is not None
+    assert pdf_service.image_cache.get(f"{pdf_service.MAX_IMAGE_WIDTH}:{slow}") is None
+
+    # The export still renders, without the images that failed
+    questions = [
+        {"id": str(index), "question_text": f"Question {index}", "options": ["1", "2"], "image_url": url}
+        for index, url in enumerate((missing, broken, good))
+    ]
+    pdf = pdf_service.generate_custom_revision_pdf(questions, {"include_ai_analysis": False})
+    assert pdf.startswith(b"%PDF")
+
+
+def test_repeat_exports_are_served_from_the_disk_cache(stub_server, image_cache):
+    urls = [stub_server.route(f"/img/{index}.png", png(800, 400), content_type="image/png") for index in range(5)]
+    questions = [{"image_url": url} for url in urls]
+
+    first = thumbnails(questions)
+    assert sum(stub_server.requests.values()) == 5
+
+    # A new cache object over the same directory, as after a restart
+    image_cache()
+    assert thumbnails(questions) == first
+    assert sum(stub_server.requests.values()) == 5
+
+    # Keyed by URL and target width
+    assert pdf_service._fetch_thumbnail(urls[0], width=200) is not None
+    assert sum(stub_server.requests.values()) == 6
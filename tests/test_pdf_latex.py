@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+from backend.services.pdf_service import strip_latex
+
+
+@pytest.mark.parametrize("latex, text", [
+    (r"$$x^2 + 1$$ and $y$", "x^2 + 1 and y"),
+    (r"\frac{a}{b}", "a/b"),
+    (r"\frac{\frac{a}{b}}{c}", "(a/b)/c"),
+    (r"\dfrac{1}{\sqrt{x+1}}", "1/(√(x+1))"),
+    (r"\sqrt[3]{27} = 3", "3√27 = 3"),
+    (r"\sqrt[n]{a b}", "n√(a b)"),
+    (r"\frac12 + \frac ab", "1/2 + a/b"),
+    (r"It costs \$5 (\%20 off)", "It costs $5 (%20 off)"),
+    (r"\angle ABC = 90\degree, \alpha \times \beta", "∠ ABC = 90°, α × β"),
+    (r"\text{Area} = \left( \pi r^{2} \right)", "Area = ( π r^2 )"),
+    (r"\unknown{x}", "unknownx"),
+    ("", ""),
+])
+def test_known_conversions(latex, text):
+    assert strip_latex(latex) == text
+
+
+def test_deep_nesting_falls_back_instead_of_raising():
+    depth = sys.getrecursionlimit() + 10
+    assert strip_latex("{" * depth + "x") == "x"
+    assert strip_latex(r"\frac{" * depth + "x" + "}{1}" * depth) == "x" + "1" * depth
+    assert strip_latex(r"\sqrt[3]{" * depth + r"\alpha") == "3√" * depth + "α"
+    # Ordinary input after it is still translated
+    assert strip_latex(r"\frac{1}{2}") == "1/2"
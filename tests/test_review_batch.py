@@ -0,0 +1,57 @@
+import pytest
+from postgrest.exceptions import APIError
+
+from backend.services.review_batch import submit_review_batch
+from tests.fakes import FakeSupabase
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSupabase()
+    fake.tables["questions"] = [{
+        "id": "q1", "user_id": "u1", "correct_option": "B", "times_attempted": 2, "times_correct": 1,
+        "ease_factor": 2.5, "interval_days": 1, "next_review_date": None, "repetitions": 1,
+        "fsrs_stability": None, "fsrs_difficulty": None, "last_attempted_at": None,
+    }]
+    fake.tables["review_submissions"] = []
+    return fake
+
+
+def submit(fake):
+    answer = {"question_id": "q1", "answer": "B", "is_correct": True, "idempotency_key": "k1", "answered_at": None}
+    return submit_review_batch(fake, "u1", [answer])
+
+
+def attempts(fake):
+    return fake.tables["questions"][0]["times_attempted"]
+
+
+def failing(code):
+    def rpc(params):
+        raise APIError({"code": code, "message": "failed"})
+    return rpc
+
+
+def test_rows_are_updated_directly_only_without_the_migration(fake):
+    fake.missing_tables.add("review_submissions")
+    response, _ = submit(fake)
+    assert response["applied"] == 1
+    assert attempts(fake) == 3
+
+
+@pytest.mark.parametrize("code", ["PGRST000", "57014", "500"])
+def test_other_rpc_errors_fail_the_batch_without_writing(fake, code):
+    # e.g. a statement timeout reported after the batch committed
+    fake.functions["apply_review_batch"] = failing(code)
+    with pytest.raises(APIError):
+        submit(fake)
+    assert attempts(fake) == 2
+
+
+def test_idempotency_lookup_errors_fail_the_batch(fake):
+    fake.functions["apply_review_batch"] = lambda params: None
+    fake.missing_columns.add("idempotency_key")
+    with pytest.raises(APIError):
+        submit(fake)
+    assert attempts(fake) == 2
+    assert not [call for call in fake.calls if call[0] == "rpc"]
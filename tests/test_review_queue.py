@@ -0,0 +1,76 @@
+import asyncio
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from backend.services.review_queue import InvalidCursor, decode_cursor, encode_cursor, fetch_bucket_page
+from tests.fakes import FakeSupabase
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def due(hours):
+    return (NOW + timedelta(hours=hours)).isoformat()
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSupabase()
+    # Due today: five share one timestamp, so only the id breaks the tie
+    shared = [(f"q{index:02d}", due(-2)) for index in (7, 3, 11, 1, 5)]
+    others = [("q02", due(-6)), ("q04", due(3)), ("q09", due(-1)), ("q06", due(-2) + ".5")]
+    # Outside the bucket: yesterday, tomorrow, another user
+    outside = [("q08", due(-24)), ("q10", due(20))]
+    fake.tables["questions"] = [
+        {"id": question_id, "user_id": "u1", "next_review_date": date, "times_attempted": 1, "times_correct": 0}
+        for question_id, date in shared + others + outside
+    ] + [{"id": "q00", "user_id": "u2", "next_review_date": due(-2)}]
+    return fake
+
+
+def test_cursor_round_trip():
+    row = {"id": "0b4f9c7e-1d2a-4c3b-9f8e-7a6b5c4d3e2f", "next_review_date": "2026-10-17T10:00:00+00:00"}
+    cursor = encode_cursor("due_today", row)
+    assert "=" not in cursor
+    assert decode_cursor("due_today", cursor) == (row["next_review_date"], row["id"])
+
+
+@pytest.mark.parametrize("cursor, message", [
+    (encode_cursor("overdue", {"id": "q1", "next_review_date": "2026-10-16T10:00:00"}), "another bucket"),
+    ("not a cursor!", "Malformed"),
+    (base64.urlsafe_b64encode(b"[1, 2]").decode(), "Malformed"),
+    (base64.urlsafe_b64encode(b"\xff\xfe").decode(), "Malformed"),
+    ("", "Malformed"),
+])
+def test_bad_cursors_are_rejected(fake, monkeypatch, cursor, message):
+    from backend import main
+
+    with pytest.raises(InvalidCursor, match=message):
+        decode_cursor("due_today", cursor)
+
+    monkeypatch.setattr(main, "supabase_admin", fake)
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(main.get_review_queue_page("due_today", cursor, 3, "u1"))
+    assert rejected.value.status_code == 400
+
+
+def test_pages_cover_the_bucket_once_across_tied_due_dates(fake):
+    expected = sorted(
+        (row for row in fake.tables["questions"] if row["user_id"] == "u1" and row["next_review_date"][:10] == "2026-10-17"),
+        key=lambda row: (row["next_review_date"], row["id"]),
+    )
+
+    seen, cursor = [], None
+    while True:
+        page = fetch_bucket_page(fake, "u1", "due_today", NOW, cursor, limit=2)
+        assert len(page["items"]) <= 2
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [row["id"] for row in expected]
+    assert len(seen) == 9
+    assert all(isinstance(item["priority"], int) for item in page["items"])
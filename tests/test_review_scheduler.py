@@ -0,0 +1,118 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.services import review_scheduler
+from backend.services.review_scheduler import (
+    SECONDS_PER_DAY,
+    UserReviewState,
+    overdue_score,
+    static_score,
+)
+
+TOPICS = [("Math", "Algebra"), ("Math", "Geometry"), ("English", None), (None, None)]
+
+
+def timestamp(days):
+    return datetime.fromtimestamp(days * SECONDS_PER_DAY, tz=timezone.utc).isoformat()
+
+
+def random_row(rng, question_id, now):
+    subject, topic = rng.choice(TOPICS)
+    attempts = rng.randint(0, 12)
+    return {
+        "id": question_id,
+        "subject": subject,
+        "topic": topic,
+        "next_review_date": None if rng.random() < 0.05 else timestamp(now + rng.uniform(-9, 3)),
+        "times_attempted": attempts,
+        "times_correct": rng.randint(0, attempts),
+        "ease_factor": rng.choice([None, 1.3, 1.9, 2.5, 2.8]),
+    }
+
+
+def brute_force(rows, now):
+    """Score every live row from scratch: {id: priority} of the due ones"""
+    totals = {}
+    for row in rows.values():
+        key = (row["subject"] or "", row["topic"] or "")
+        attempts, correct = totals.get(key, (0, 0))
+        totals[key] = (attempts + row["times_attempted"], correct + row["times_correct"])
+
+    scores = {}
+    for row in rows.values():
+        due = datetime.fromisoformat(row["next_review_date"]).timestamp() / SECONDS_PER_DAY
+        if due > now:
+            continue
+        attempts, correct = totals[(row["subject"] or "", row["topic"] or "")]
+        weakness = (1 - (correct / attempts if attempts else 0.5)) * 10
+        static = static_score(row["times_attempted"], row["times_correct"], row["ease_factor"])
+        scores[row["id"]] = static + weakness + overdue_score(due, now)
+    return scores
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_top_and_due_count_match_a_full_score_and_sort(seed, monkeypatch):
+    rng = random.Random(seed)
+    compactions = []
+    original_compact = UserReviewState._compact
+    monkeypatch.setattr(UserReviewState, "_compact",
+                        lambda self, topic, now: compactions.append(topic) or original_compact(self, topic, now))
+
+    now = 20000.0
+    state = UserReviewState(built_at=0)
+    rows = {}
+
+    for step in range(600):
+        action = rng.random()
+        if action < 0.6:
+            row = random_row(rng, f"q{rng.randrange(60)}", now)
+            state.upsert(row, now)
+            if row["next_review_date"]:
+                rows[row["id"]] = row
+            else:
+                rows.pop(row["id"], None)
+        elif action < 0.75 and rows:
+            question_id = rng.choice(sorted(rows))
+            state.remove(question_id)
+            del rows[question_id]
+        else:
+            now += rng.uniform(0, 1.5)
+
+        limit = rng.randint(1, 30)
+        session = state.top(limit, now)
+        expected = brute_force(rows, now)
+
+        assert state.due_count() == len(expected)
+        ids = [item["id"] for item in session]
+        assert len(ids) == len(set(ids)) == min(limit, len(expected))
+        # Same priorities in the same order; among ties any of the tied items may come first
+        assert [expected[question_id] for question_id in ids] == \
+               pytest.approx(sorted(expected.values(), reverse=True)[:limit], abs=1e-6)
+        for item in session:
+            assert item["priority"] == round(expected[item["id"]], 1)
+            assert item["next_review_date"] == rows[item["id"]]["next_review_date"]
+
+    # Stale heap entries piled up and were compacted along the way
+    assert compactions
+
+
+def test_record_question_updates_a_loaded_state(monkeypatch):
+    now = 20000.0
+    monkeypatch.setattr(review_scheduler.time, "time", lambda: now * SECONDS_PER_DAY)
+    state = UserReviewState(built_at=0)
+    monkeypatch.setitem(review_scheduler._states, "u1", state)
+
+    row = {"id": "q1", "subject": "Math", "topic": "Algebra", "next_review_date": timestamp(now - 1),
+           "times_attempted": 2, "times_correct": 0, "ease_factor": 2.5}
+    review_scheduler.record_question("u1", row)
+    assert [item["id"] for item in state.top(5, now)] == ["q1"]
+
+    # Answered correctly and pushed out: no longer due
+    review_scheduler.record_question("u1", {**row, "times_attempted": 3, "times_correct": 1,
+                                            "next_review_date": timestamp(now + 3)})
+    assert state.top(5, now) == [] and state.due_count() == 0
+
+    review_scheduler.remove_question("u1", "q1")
+    assert state.top(5, now + 10) == [] and state.due_count() == 0
@@ -0,0 +1,124 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from backend.services.scheduling import (
+    FSRS,
+    SM2,
+    card_arrays,
+    forecast_load,
+    review_card,
+    review_cards,
+    step,
+)
+
+START = datetime(2026, 1, 5, 9, 0)
+
+
+def trajectory(answers, algorithm):
+    """Intervals of one card answered on each due date"""
+    question, at, intervals = {}, START, []
+    for correct in answers:
+        update = review_card(question, correct, at, algorithm)
+        intervals.append(update["interval_days"])
+        question = {**question, **update}
+        at += timedelta(days=update["interval_days"])
+    return intervals, question
+
+
+def test_sm2_trajectory_resets_after_a_miss():
+    intervals, card = trajectory([True, True, True, True, False, True, True, True], SM2)
+    # 1, 6, then interval * ease (2.5 stays 2.5 on quality 4); a miss drops the ease to 1.7
+    assert intervals == [1, 6, 15, 38, 1, 1, 6, 10]
+    assert (card["ease_factor"], card["repetitions"]) == (1.7, 3)
+    assert (card["times_attempted"], card["times_correct"]) == (8, 7)
+
+
+def test_fsrs_trajectory_grows_with_stability_and_shrinks_after_a_lapse():
+    intervals, card = trajectory([True, True, True, True, False, True], FSRS)
+    assert intervals[:4] == [4, 15, 49, 146]
+    assert intervals[4] < intervals[3] and intervals[5] > intervals[4]
+    assert card["fsrs_stability"] == pytest.approx(intervals[5], abs=0.5)
+    assert 1 <= card["fsrs_difficulty"] <= 10
+
+    # Missing the first review starts from the "again" stability
+    assert review_card({}, False, START, FSRS)["interval_days"] == 1
+
+
+def random_question(rng):
+    question = {
+        "ease_factor": rng.choice([None, 0, 1.3, 2.5, 2.9]),
+        "interval_days": rng.choice([None, 0, 1, 6, 40]),
+        "repetitions": rng.choice([None, 0, 1, 2, 7]),
+        "times_attempted": rng.randint(0, 20),
+        "fsrs_stability": rng.choice([None, 0.5, 3.7, 120.0]),
+        "fsrs_difficulty": rng.choice([None, 1.0, 5.2, 9.9]),
+        "last_attempted_at": rng.choice([None, (START - timedelta(days=rng.uniform(0, 90))).isoformat()]),
+    }
+    question["times_correct"] = rng.randint(0, question["times_attempted"])
+    return question
+
+
+@pytest.mark.parametrize("algorithm", [SM2, FSRS])
+def test_vectorized_step_matches_one_card_at_a_time(algorithm):
+    rng = random.Random(7)
+    questions = [random_question(rng) for _ in range(300)]
+    correct = [rng.random() < 0.7 for _ in questions]
+    answered_at = [START + timedelta(hours=rng.randint(0, 48)) for _ in questions]
+
+    batch = review_cards(questions, correct, answered_at, algorithm)
+    assert batch == [
+        review_card(question, is_correct, at, algorithm)
+        for question, is_correct, at in zip(questions, correct, answered_at)
+    ]
+
+    # The raw arrays agree element by element too
+    stepped = step(card_arrays(questions, answered_at), np.array(correct), algorithm)
+    for index in range(0, len(questions), 37):
+        single = step(card_arrays([questions[index]], [answered_at[index]]), np.array([correct[index]]), algorithm)
+        for field, values in single.items():
+            np.testing.assert_allclose(values, stepped[field][index:index + 1])
+
+    with pytest.raises(ValueError):
+        step(card_arrays(questions, START), np.array(correct), "leitner")
+
+
+def deck(count, seed):
+    rng = random.Random(seed)
+    questions = [random_question(rng) for _ in range(count)]
+    due_in_days = np.array([rng.uniform(-5, 20) for _ in questions])
+    return card_arrays(questions, START), due_in_days
+
+
+def test_seeded_forecast_is_reproducible_and_consistent():
+    cards, due_in_days = deck(200, seed=3)
+    forecast = forecast_load(cards, due_in_days, days=30, algorithm=FSRS, new_cards_per_day=2, seed=11)
+
+    again = forecast_load(*deck(200, seed=3), days=30, algorithm=FSRS, new_cards_per_day=2, seed=11)
+    assert again == forecast
+
+    days = forecast["days"]
+    assert len(days) == 30 and [entry["day"] for entry in days] == list(range(30))
+    assert forecast["cards"] == 200 + sum(entry["new"] for entry in days)
+    assert forecast["total_reviews"] == sum(entry["reviews"] for entry in days)
+    assert forecast["peak_reviews"] == max(entry["reviews"] for entry in days)
+    assert all(0 <= entry["lapses"] <= entry["reviews"] for entry in days)
+    # Overdue cards and day 0's arrivals are all reviewed on day 0
+    assert days[0]["reviews"] == int((due_in_days < 1).sum()) + days[0]["new"]
+    # The input deck isn't modified
+    assert np.array_equal(cards["times_attempted"], deck(200, seed=3)[0]["times_attempted"])
+
+
+def test_forecast_of_an_empty_deck():
+    empty = card_arrays([], START)
+    forecast = forecast_load(empty, np.array([]), days=14, seed=1)
+    assert forecast["cards"] == forecast["total_reviews"] == forecast["peak_reviews"] == 0
+    assert forecast["average_reviews"] == 0
+    assert [entry["reviews"] for entry in forecast["days"]] == [0] * 14
+
+    # New cards still arrive and get reviewed
+    growing = forecast_load(empty, np.array([]), days=14, new_cards_per_day=3, seed=1)
+    assert growing["cards"] == sum(entry["new"] for entry in growing["days"]) > 0
+    assert growing["total_reviews"] >= growing["cards"]
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from backend.services.text_layout import wrap_text
+
+
+def naive_wrap(text, max_width, font_name="Helvetica", font_size=11):
+    """The per-word `stringWidth` wrap that `wrap_text` replaces"""
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if stringWidth(candidate, font_name, font_size) <= max_width + 1e-6:
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        line = ""
+        for char in word:
+            if line and stringWidth(line + char, font_name, font_size) > max_width + 1e-6:
+                lines.append(line)
+                line = ""
+            line += char
+    if line:
+        lines.append(line)
+    return lines
+
+
+@pytest.mark.parametrize("width", [5, 8, 40, 120, 400])
+def test_lines_match_the_naive_wrap(width):
+    rng = random.Random(width)
+    alphabet = "abcdefghijklmnopqrstuvwxyzMW√,.-"
+    for _ in range(200):
+        words = ["".join(rng.choices(alphabet, k=rng.randint(1, 30))) for _ in range(rng.randint(1, 20))]
+        text = " ".join(words)
+        lines = wrap_text(text, width)
+        assert lines == naive_wrap(text, width)
+        assert all(lines)
+        assert "".join(lines).replace(" ", "") == text.replace(" ", "")
+
+
+def test_glyphs_wider_than_the_line_get_a_line_each():
+    assert wrap_text("qh√,", 5) == ["q", "h", "√", ","]
+    assert wrap_text("√", 5) == ["√"]
+    assert wrap_text("ab √ cd", 5) == ["a", "b", "√", "c", "d"]
+    assert wrap_text("   ", 100) == []
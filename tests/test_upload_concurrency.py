@@ -0,0 +1,91 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+
+from tests.fakes import FakeSupabase
+
+GEMINI_SECONDS = 0.4
+
+
+@pytest.fixture
+def app(monkeypatch):
+    from backend import main
+    from backend.services import upload_service
+
+    fake = FakeSupabase(db_delay=0.02, storage_delay=0.2)
+
+    def slow_analysis(contents, api_key=None, **kwargs):
+        # The Gemini SDK blocks its thread for the whole request
+        time.sleep(GEMINI_SECONDS)
+        return {"question_text": f"question {uuid.uuid4()}", "options": [], "subject": "Maths"}
+
+    monkeypatch.setattr(main, "supabase_admin", fake)
+    monkeypatch.setattr(upload_service, "analyze_screenshot", slow_analysis)
+    monkeypatch.setattr(upload_service, "analysis_cache", None)
+    monkeypatch.setattr(upload_service, "IMAGE_PREPROCESS_ENABLED", False)
+    main.app.dependency_overrides[main.get_current_user] = lambda: "user-1"
+    yield main.app, fake
+    main.app.dependency_overrides.clear()
+
+
+async def upload_many(app, count):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post(
+                "/upload-screenshot/",
+                files={"file": (f"shot{index}.png", b"\x89PNG" + bytes([index]), "image/png")},
+                # Own keys: no quota query and no shared per-key Gemini limit
+                headers={"x-gemini-api-key": f"key-{uuid.uuid4()}"},
+            )
+            for index in range(count)
+        ])
+        return time.perf_counter() - started, responses
+
+
+def test_concurrent_uploads_take_about_as_long_as_one(app):
+    app, fake = app
+    single, responses = asyncio.run(upload_many(app, 1))
+    assert [response.status_code for response in responses] == [200]
+
+    concurrent, responses = asyncio.run(upload_many(app, 8))
+    assert [response.status_code for response in responses] == [200] * 8
+    assert len({response.json()["id"] for response in responses}) == 8
+    assert len(fake.uploaded) == 9
+
+    # Serially this would be 8x; blocking work overlaps in the thread pool
+    assert single >= GEMINI_SECONDS
+    assert concurrent < single * 2
+
+
+def test_async_uploads_invalidate_analytics_when_the_row_is_filled_in(app):
+    from backend.services import analytics_service
+    from backend.services.upload_service import analysis_queue
+
+    app, fake = app
+
+    def cache_overview():
+        analytics_service._cached(("user-1", None), lambda: {"question_count": 0})
+
+    async def upload():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            cache_overview()
+            response = await client.post(
+                "/upload-screenshot/async",
+                files={"file": ("shot.png", b"\x89PNG async", "image/png")},
+                headers={"x-gemini-api-key": f"key-{uuid.uuid4()}"},
+            )
+            # The pending row counts as a question right away
+            assert ("user-1", None) not in analytics_service._cache
+            cache_overview()
+            job_id = response.json()["job_id"]
+            while analysis_queue.get(job_id)["status"] != "done":
+                await asyncio.sleep(0.02)
+            return job_id
+
+    job_id = asyncio.run(upload())
+    assert ("user-1", None) not in analytics_service._cache
+    assert next(row for row in fake.tables["questions"] if row["id"] == job_id)["subject"] == "Maths"
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.services import upload_service
+from backend.services.upload_service import FAILED_QUESTION_TEXT, PENDING_QUESTION_TEXT, recover_pending_questions
+from tests.fakes import FakeSupabase
+
+
+def created(minutes_ago):
+    return (datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)).isoformat()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    from backend import main
+
+    fake = FakeSupabase()
+    pending = {"user_id": "u1", "question_text": PENDING_QUESTION_TEXT, "status": "pending", "content": {}}
+    fake.tables["questions"] = [
+        {"id": "lost", "created_at": created(60), **pending},
+        {"id": "recent", "created_at": created(1), **pending},
+        {"id": "running", "created_at": created(60), **pending},
+        {"id": "done", "created_at": created(60), "user_id": "u1", "question_text": "Q", "status": "analyzed"},
+    ]
+    # A job of this process that is still retrying past the timeout
+    monkeypatch.setitem(upload_service.analysis_queue._jobs, "running", {"id": "running", "status": "retrying"})
+    monkeypatch.setattr(upload_service, "ANALYSIS_JOB_TIMEOUT_SECONDS", 15 * 60)
+    monkeypatch.setattr(main, "supabase_admin", fake)
+    return fake
+
+
+def rows(fake):
+    return {row["id"]: row for row in fake.tables["questions"]}
+
+
+def test_sweep_fails_pending_rows_whose_job_was_lost(fake):
+    assert recover_pending_questions(fake) == 1
+
+    lost = rows(fake)["lost"]
+    assert lost["status"] == "failed"
+    assert lost["question_text"] == FAILED_QUESTION_TEXT
+    assert lost["content"]["error"]
+    assert {key: row["status"] for key, row in rows(fake).items()} == {
+        "lost": "failed", "recent": "pending", "running": "pending", "done": "analyzed"
+    }
+    assert recover_pending_questions(fake) == 0
+
+
+def test_job_status_reports_lost_jobs_as_failed(fake):
+    from backend.main import get_upload_job_status
+
+    status = asyncio.run(get_upload_job_status("lost", "u1"))
+    assert (status["status"], status["question_status"]) == ("dead", "failed")
+    assert rows(fake)["lost"]["status"] == "failed"
+
+    # Possibly still running on another worker process
+    assert asyncio.run(get_upload_job_status("recent", "u1"))["status"] == "pending"